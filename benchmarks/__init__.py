@@ -0,0 +1,9 @@
+""" Benchmarks of *wc_env_manager*
+
+Run the benchmarks with `python -m benchmarks` from the root of the repository.
+
+:Author: Jonathan Karr <jonrkarr@gmail.com>
+:Date: 2020-02-14
+:Copyright: 2020, Karr Lab
+:License: MIT
+"""
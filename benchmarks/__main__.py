@@ -0,0 +1,61 @@
+""" Command line interface for the benchmarks of *wc_env_manager*
+
+Examples::
+
+    python -m benchmarks
+    python -m benchmarks --backend docker --max-param 100
+    python -m benchmarks --name discovery --compare benchmarks/results/0.0.1-fake-py3.7.6.json
+
+:Author: Jonathan Karr <jonrkarr@gmail.com>
+:Date: 2020-02-14
+:Copyright: 2020, Karr Lab
+:License: MIT
+"""
+
+from . import suite
+import argparse
+import sys
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m benchmarks', description='Benchmark the operations of wc_env_manager')
+    parser.add_argument('--backend', choices=suite.BACKENDS, default='fake',
+                        help='Run against an in-process fake of Docker or the local Docker daemon')
+    parser.add_argument('--name', action='append', dest='names', default=None,
+                        help='Only run the benchmarks whose names begin with this prefix (can be repeated)')
+    parser.add_argument('--repeat', type=int, default=5, help='Number of times to time each operation')
+    parser.add_argument('--max-param', type=int, default=None,
+                        help='Skip benchmarks with larger parameters (e.g., numbers of containers)')
+    parser.add_argument('--docker-image', default=suite.DOCKER_IMAGE, help='Image of the containers of the benchmarks')
+    parser.add_argument('--output', default=None,
+                        help='Path to save the results (default: benchmarks/results/<version>-<backend>-py<version>.json)')
+    parser.add_argument('--no-save', action='store_true', help="Don't save the results")
+    parser.add_argument('--compare', default=None, help='Path to results to compare with, e.g., of a previous release')
+    parser.add_argument('--threshold', type=float, default=1.25,
+                        help='Ratio of median durations above which a benchmark is reported as a regression')
+    args = parser.parse_args(argv)
+
+    results = suite.run_benchmarks(backend=args.backend, names=args.names, repeat=args.repeat,
+                                   max_param=args.max_param, docker_image=args.docker_image)
+
+    if not args.no_save:
+        filename = args.output or suite.get_results_filename(results)
+        suite.save_results(results, filename)
+        print('Saved results to {}'.format(filename))
+
+    if args.compare:
+        comparisons, regressions = suite.compare_results(suite.load_results(args.compare), results,
+                                                         threshold=args.threshold)
+        print('\n{:<45} {:>12} {:>12} {:>8}'.format('Benchmark', 'Baseline', 'Current', 'Ratio'))
+        for comparison in comparisons:
+            print('{:<45} {:>9.2f} ms {:>9.2f} ms {:>7.2f}x{}'.format(
+                comparison['key'], comparison['baseline'] * 1e3, comparison['median'] * 1e3, comparison['ratio'],
+                '  REGRESSION' if comparison['key'] in regressions else ''))
+        if regressions:
+            return 1
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
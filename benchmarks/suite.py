@@ -0,0 +1,471 @@
+""" Benchmarks of the operations of :obj:`wc_env_manager.core.WcEnvManager`
+
+Each benchmark is a generator function which prepares its inputs, yields the operation to time,
+and cleans up after the operation has been timed. Benchmarks are run against an in-process fake
+of the docker-py client (`fake`) or against the local Docker daemon (`docker`).
+
+:Author: Jonathan Karr <jonrkarr@gmail.com>
+:Date: 2020-02-14
+:Copyright: 2020, Karr Lab
+:License: MIT
+"""
+
+from datetime import datetime, timedelta
+import collections
+import json
+import mock
+import os
+import platform
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+import wc_env_manager
+import wc_env_manager.core
+import wc_env_manager.fake_docker
+
+BACKENDS = ('fake', 'docker')
+DOCKER_IMAGE = 'debian:buster-slim'
+CONTAINER_NAME_FORMAT = 'wc_env_benchmark-%Y-%m-%d-%H-%M-%S'
+RESULTS_DIRNAME = os.path.join(os.path.dirname(__file__), 'results')
+
+Benchmark = collections.namedtuple('Benchmark', ['name', 'func', 'params', 'backends', 'description'])
+BENCHMARKS = []
+
+
+def benchmark(name, params=(None,), backends=BACKENDS):
+    """ Register a benchmark
+
+    Args:
+        name (:obj:`str`): name
+        params (:obj:`tuple`, optional): values of the parameter of the benchmark (e.g., numbers of containers)
+        backends (:obj:`tuple` of :obj:`str`, optional): backends which the benchmark can be run against
+
+    Returns:
+        :obj:`callable`: decorator
+    """
+    def decorator(func):
+        BENCHMARKS.append(Benchmark(name, func, params, backends, (func.__doc__ or '').strip()))
+        return func
+    return decorator
+
+
+class BenchmarkEnvironment(object):
+    """ Docker client, managers, containers, and temporary files for benchmarks
+
+    Attributes:
+        backend (:obj:`str`): backend (`fake` or `docker`)
+        docker_image (:obj:`str`): image of the containers of the benchmarks
+        client (:obj:`docker.client.DockerClient` or :obj:`wc_env_manager.fake_docker.FakeDockerClient`): Docker client
+        temp_dirname (:obj:`str`): directory for temporary files
+        _containers (:obj:`list`): containers created by the benchmarks
+        _managers (:obj:`list` of :obj:`wc_env_manager.core.WcEnvManager`): managers created by the benchmarks
+    """
+
+    def __init__(self, backend, docker_image=DOCKER_IMAGE):
+        """
+        Args:
+            backend (:obj:`str`): backend (`fake` or `docker`)
+            docker_image (:obj:`str`, optional): image of the containers of the benchmarks
+        """
+        self.backend = backend
+        self.docker_image = docker_image
+        if backend == 'fake':
+            # the benchmarks transfer files to and from containers and execute processes in them
+            self.client = wc_env_manager.fake_docker.FakeDockerClient(
+                exec_handler=wc_env_manager.fake_docker.run_on_host, root='/')
+            self.client.add_image([docker_image if ':' in docker_image else docker_image + ':latest'])
+        else:
+            import docker
+            self.client = docker.from_env()
+            try:
+                self.client.images.get(docker_image)
+            except docker.errors.ImageNotFound:
+                self.client.images.pull(docker_image)
+        self.temp_dirname = tempfile.mkdtemp()
+        self._containers = []
+        self._managers = []
+
+    def make_manager(self, **config):
+        """ Make a manager which uses the Docker client of the environment
+
+        Args:
+            config (:obj:`dict`): configuration
+
+        Returns:
+            :obj:`wc_env_manager.core.WcEnvManager`: manager
+        """
+        config.setdefault('verbose', False)
+        config.setdefault('container', {})
+        config['container'].setdefault('name_format', CONTAINER_NAME_FORMAT)
+        mgr = wc_env_manager.core.WcEnvManager(config, docker_client=self.client)
+        self._managers.append(mgr)
+        return mgr
+
+    def make_containers(self, n_containers, running=False):
+        """ Make containers whose names match the name format of the benchmarks
+
+        Args:
+            n_containers (:obj:`int`): number of containers
+            running (:obj:`bool`, optional): if :obj:`True`, start the containers
+
+        Returns:
+            :obj:`list`: containers
+        """
+        containers = []
+        start = datetime(2020, 1, 1) + timedelta(days=len(self._containers))
+        for i_container in range(n_containers):
+            name = (start + timedelta(seconds=i_container)).strftime(CONTAINER_NAME_FORMAT)
+            if self.backend == 'fake':
+                container = self.client.add_container(self.docker_image, name=name, running=running)
+            else:
+                container = self.client.containers.create(self.docker_image, name=name, command=['sleep', 'infinity'])
+                if running:
+                    container.start()
+                    container.reload()
+            self._containers.append(container)
+            containers.append(container)
+        return containers
+
+    def make_container_dirname(self, mgr):
+        """ Make a temporary directory within the current container of a manager
+
+        Args:
+            mgr (:obj:`wc_env_manager.core.WcEnvManager`): manager
+
+        Returns:
+            :obj:`str`: path of the directory within the container
+        """
+        if self.backend == 'fake':
+            # the file system of fake containers is the file system of the host
+            return tempfile.mkdtemp(dir=self.temp_dirname)
+        return mgr._exec_in_container(['mktemp', '-d']).decode().strip()
+
+    def make_local_dirname(self, n_files=0, file_size=0):
+        """ Make a temporary directory on the host
+
+        Args:
+            n_files (:obj:`int`, optional): number of files to write to the directory
+            file_size (:obj:`int`, optional): size of each file (bytes)
+
+        Returns:
+            :obj:`str`: path of the directory
+        """
+        dirname = tempfile.mkdtemp(dir=self.temp_dirname)
+        for i_file in range(n_files):
+            subdirname = os.path.join(dirname, 'dir-{}'.format(i_file % 10))
+            if not os.path.isdir(subdirname):
+                os.mkdir(subdirname)
+            with open(os.path.join(subdirname, 'file-{}.dat'.format(i_file)), 'wb') as file:
+                file.write(os.urandom(file_size))
+        return dirname
+
+    def reset_calls(self):
+        """ Reset the counts of the requests to the Docker API """
+        if self.backend == 'fake':
+            self.client.calls.clear()
+
+    def get_calls(self):
+        """ Get the counts of the requests to the Docker API
+
+        Returns:
+            :obj:`dict`: dictionary which maps each endpoint to the number of requests, or
+                :obj:`None` for the Docker backend
+        """
+        if self.backend == 'fake':
+            return dict(self.client.calls)
+        return None
+
+    def cleanup(self):
+        """ Remove the containers and temporary files of the environment """
+        for mgr in self._managers:
+            mgr.close()
+        for container in self._containers:
+            try:
+                container.remove(force=True)
+            except Exception:
+                pass
+        self._containers = []
+        shutil.rmtree(self.temp_dirname)
+
+
+@benchmark('requirements.resolve', params=(10, 100))
+def bench_resolve_requirements(env, n_packages):
+    """ Resolve the requirements of N WC packages with 50 requirements each (`get_required_python_packages`) """
+    mgr = env.make_manager()
+    mgr.config['image']['python_packages'] = '\n'.join(
+        'git+https://github.com/KarrLab/pkg_{}.git#egg=pkg_{}'.format(i, i) for i in range(n_packages))
+
+    def clone_from(url, dirname):
+        os.makedirs(os.path.join(dirname, 'tests'))
+        i_package = int(url.rpartition('_')[2])
+        with open(os.path.join(dirname, 'requirements.txt'), 'w') as file:
+            for i_req in range(40):
+                file.write('dep_{}>=1.{}  # dependency\n'.format((i_package + i_req) % 200, i_req % 5))
+            file.write('cylp\ngurobi\nxpress\n')
+            file.write('git+https://github.com/KarrLab/pkg_0.git#egg=pkg_0\n')
+        with open(os.path.join(dirname, 'tests', 'requirements.txt'), 'w') as file:
+            for i_req in range(10):
+                file.write('test_dep_{}\n'.format(i_req))
+
+    with mock.patch('git.Repo.clone_from', side_effect=clone_from):
+        yield mgr.get_required_python_packages
+
+
+@benchmark('context.image', params=(10, 1000), backends=('fake',))
+def bench_prepare_image_context(env, n_files):
+    """ Prepare the context for the image with N files to copy and render its Dockerfile (`build_image`) """
+    mgr = env.make_manager()
+    mgr.config['image']['config_path'] = os.path.join(env.temp_dirname, 'no-config')
+    mgr.config['image']['paths_to_copy'] = {
+        'data': {
+            'host': env.make_local_dirname(n_files=n_files, file_size=1024),
+            'image': '/root/data',
+        },
+    }
+    mgr.config['image']['tags'] = ['benchmark']
+    yield mgr.build_image
+
+
+@benchmark('transfer.sync', params=(100, 1000))
+def bench_sync_path(env, n_files):
+    """ Synchronize a directory of N 4 KiB files into an empty directory of a container (`sync_path`) """
+    mgr = env.make_manager()
+    mgr.set_container(env.make_containers(1, running=True)[0])
+    local_dirname = env.make_local_dirname(n_files=n_files, file_size=4096)
+    yield lambda: mgr.sync_path(local_dirname, env.make_container_dirname(mgr))
+
+
+@benchmark('transfer.sync_unchanged', params=(100, 1000))
+def bench_sync_path_unchanged(env, n_files):
+    """ Synchronize a directory of N 4 KiB files which are already in the container (`sync_path`) """
+    mgr = env.make_manager()
+    mgr.set_container(env.make_containers(1, running=True)[0])
+    local_dirname = env.make_local_dirname(n_files=n_files, file_size=4096)
+    container_dirname = env.make_container_dirname(mgr)
+    mgr.sync_path(local_dirname, container_dirname)
+    yield lambda: mgr.sync_path(local_dirname, container_dirname)
+
+
+@benchmark('transfer.retrieve', params=(100, 1000))
+def bench_retrieve_path(env, n_files):
+    """ Retrieve a directory of N 4 KiB files from a container with gzip compression (`retrieve_path`) """
+    mgr = env.make_manager()
+    mgr.set_container(env.make_containers(1, running=True)[0])
+    container_dirname = env.make_container_dirname(mgr)
+    mgr.sync_path(env.make_local_dirname(n_files=n_files, file_size=4096), container_dirname)
+    yield lambda: mgr.retrieve_path(container_dirname, tempfile.mkdtemp(dir=env.temp_dirname), codec='gzip')
+
+
+@benchmark('exec.round_trip')
+def bench_exec_round_trip(env, param):
+    """ Run a process in a container and wait for its output (`run_process_in_container`) """
+    mgr = env.make_manager()
+    mgr.set_container(env.make_containers(1, running=True)[0])
+    yield lambda: mgr.run_process_in_container(['true'])
+
+
+@benchmark('discovery.containers', params=(10, 100, 1000))
+def bench_get_containers(env, n_containers):
+    """ Discover the WC containers among N containers (`get_containers`) """
+    env.make_containers(n_containers)
+    mgr = env.make_manager()
+    yield mgr.get_containers
+
+
+@benchmark('discovery.containers_state_cache', params=(10, 100, 1000))
+def bench_get_containers_state_cache(env, n_containers):
+    """ Discover the WC containers among N containers with the event-driven state cache (`get_containers`) """
+    env.make_containers(n_containers)
+    mgr = env.make_manager(state_cache=True)
+    yield mgr.get_containers
+
+
+@benchmark('stats.latest_container', params=(10, 100))
+def bench_get_latest_container(env, n_containers):
+    """ Find the most recently read of N running containers from their statistics (`get_latest_container`) """
+    env.make_containers(n_containers, running=True)
+    mgr = env.make_manager()
+    yield mgr.get_latest_container
+
+
+@benchmark('stats.container')
+def bench_get_container_stats(env, param):
+    """ Collect the CPU, memory, and network statistics of a container (`get_container_stats`) """
+    mgr = env.make_manager()
+    mgr.set_container(env.make_containers(1, running=True)[0])
+    yield mgr.get_container_stats
+
+
+def run_benchmarks(backend='fake', names=None, repeat=5, max_param=None, docker_image=DOCKER_IMAGE, verbose=True):
+    """ Run benchmarks
+
+    Args:
+        backend (:obj:`str`, optional): backend (`fake` or `docker`)
+        names (:obj:`list` of :obj:`str`, optional): prefixes of the names of the benchmarks to run. Default: all
+        repeat (:obj:`int`, optional): number of times to time each operation
+        max_param (:obj:`int`, optional): maximum value of the parameters of the benchmarks (e.g.,
+            to limit the number of containers created in the Docker daemon)
+        docker_image (:obj:`str`, optional): image of the containers of the benchmarks
+        verbose (:obj:`bool`, optional): if :obj:`True`, print the result of each benchmark
+
+    Returns:
+        :obj:`dict`: results
+    """
+    results = {
+        'version': wc_env_manager.__version__,
+        'backend': backend,
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'date': datetime.now().isoformat(),
+        'repeat': repeat,
+        'benchmarks': [],
+    }
+
+    for bench in BENCHMARKS:
+        if backend not in bench.backends:
+            continue
+        if names and not any(bench.name.startswith(name) for name in names):
+            continue
+        for param in bench.params:
+            if param is not None and max_param is not None and param > max_param:
+                continue
+
+            env = BenchmarkEnvironment(backend, docker_image=docker_image)
+            try:
+                operations = bench.func(env, param)
+                operation = next(operations)
+                try:
+                    durations = []
+                    calls = None
+                    for i_repeat in range(repeat):
+                        env.reset_calls()
+                        start = time.perf_counter()
+                        operation()
+                        durations.append(time.perf_counter() - start)
+                        if i_repeat == 0:
+                            calls = env.get_calls()
+                finally:
+                    operations.close()
+            finally:
+                env.cleanup()
+
+            result = {
+                'name': bench.name,
+                'param': param,
+                'min': min(durations),
+                'median': statistics.median(durations),
+                'mean': statistics.mean(durations),
+                'calls': calls,
+            }
+            results['benchmarks'].append(result)
+            if verbose:
+                print(format_result(result))
+                sys.stdout.flush()
+
+    return results
+
+
+def format_result(result):
+    """ Format the result of a benchmark
+
+    Args:
+        result (:obj:`dict`): result
+
+    Returns:
+        :obj:`str`: formatted result
+    """
+    name = get_result_key(result)
+    text = '{:<45} median {:>10.2f} ms   min {:>10.2f} ms'.format(name, result['median'] * 1e3, result['min'] * 1e3)
+    if result['calls'] is not None:
+        text += '   {:>6} API requests'.format(sum(result['calls'].values()))
+    return text
+
+
+def get_result_key(result):
+    """ Get the key of the result of a benchmark
+
+    Args:
+        result (:obj:`dict`): result
+
+    Returns:
+        :obj:`str`: key (name and parameter of the benchmark)
+    """
+    if result['param'] is None:
+        return result['name']
+    return '{}[{}]'.format(result['name'], result['param'])
+
+
+def get_results_filename(results, dirname=RESULTS_DIRNAME):
+    """ Get the default path to save results to
+
+    Args:
+        results (:obj:`dict`): results
+        dirname (:obj:`str`, optional): directory for results
+
+    Returns:
+        :obj:`str`: path
+    """
+    return os.path.join(dirname, '{}-{}-py{}.json'.format(results['version'], results['backend'], results['python']))
+
+
+def save_results(results, filename):
+    """ Save results to a JSON file
+
+    Args:
+        results (:obj:`dict`): results
+        filename (:obj:`str`): path
+    """
+    dirname = os.path.dirname(filename)
+    if dirname and not os.path.isdir(dirname):
+        os.makedirs(dirname)
+    with open(filename, 'w') as file:
+        json.dump(results, file, indent=2, sort_keys=True)
+
+
+def load_results(filename):
+    """ Load results from a JSON file
+
+    Args:
+        filename (:obj:`str`): path
+
+    Returns:
+        :obj:`dict`: results
+    """
+    with open(filename, 'r') as file:
+        return json.load(file)
+
+
+def compare_results(baseline, results, threshold=1.25):
+    """ Compare results with the results of a baseline (e.g., a previous release)
+
+    Args:
+        baseline (:obj:`dict`): results of the baseline
+        results (:obj:`dict`): results
+        threshold (:obj:`float`, optional): ratio of the median durations above which a benchmark is
+            considered to have regressed
+
+    Returns:
+        :obj:`tuple`:
+
+            * :obj:`list` of :obj:`dict`: comparison of each benchmark which was run for both sets of results
+            * :obj:`list` of :obj:`str`: keys of the benchmarks which regressed
+    """
+    baseline_results = {get_result_key(result): result for result in baseline['benchmarks']}
+    comparisons = []
+    regressions = []
+    for result in results['benchmarks']:
+        key = get_result_key(result)
+        if key not in baseline_results:
+            continue
+        ratio = result['median'] / max(baseline_results[key]['median'], 1e-9)
+        comparisons.append({
+            'key': key,
+            'baseline': baseline_results[key]['median'],
+            'median': result['median'],
+            'ratio': ratio,
+        })
+        if ratio > threshold:
+            regressions.append(key)
+    return comparisons, regressions
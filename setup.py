@@ -40,7 +40,7 @@ setuptools.setup(
     author_email="info@karrlab.org",
     license="MIT",
     keywords='whole-cell computational systems biology docker dependencies',
-    packages=setuptools.find_packages(exclude=['tests', 'tests.*']),
+    packages=setuptools.find_packages(exclude=['tests', 'tests.*', 'benchmarks', 'benchmarks.*']),
     package_data=md.package_data,
     install_requires=md.install_requires,
     extras_require=md.extras_require,
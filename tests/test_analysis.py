@@ -0,0 +1,127 @@
+""" Tests for wc_env_manager.analysis
+
+:Author: Jonathan Karr <jonrkarr@gmail.com>
+:Date: 2020-02-14
+:Copyright: 2020, Karr Lab
+:License: MIT
+"""
+
+from wc_env_manager.fake_docker import make_layer
+import hashlib
+import io
+import unittest
+import wc_env_manager.analysis
+import wc_env_manager.fake_docker
+
+
+class AnalysisTestCase(unittest.TestCase):
+    def setUp(self):
+        self.layers = [
+            make_layer({
+                'usr/lib/libx.so': b'x' * 100,
+                'usr/local/lib/python3.7/site-packages/numpy/core.so': b'n' * 400,
+                'tmp/build/solver.tar.gz': b's' * 300,
+                'root/.cache/pip/wheel': b'w' * 50,
+                'etc/config': b'c' * 10,
+            }),
+            make_layer({
+                'usr/lib/libx.so': b'X' * 120,
+                'tmp/build/.wh..wh..opq': b'',
+                'root/.cache/.wh.pip': b'',
+            }),
+        ]
+
+    def test_index_layer(self):
+        index = wc_env_manager.analysis.index_layer(io.BytesIO(self.layers[1]))
+        self.assertEqual(index.digest, 'sha256:' + hashlib.sha256(self.layers[1]).hexdigest())
+        self.assertEqual(index.files, {'/usr/lib/libx.so': 120})
+        self.assertEqual(index.deleted, ['/root/.cache/pip'])
+        self.assertEqual(index.opaque_dirs, ['/tmp/build'])
+        self.assertEqual(index.size, 120)
+
+        index = wc_env_manager.analysis.index_layer(io.BytesIO(self.layers[0]), digest='sha256:abc')
+        self.assertEqual(index.digest, 'sha256:abc')
+        self.assertEqual(index.size, 860)
+
+    def test_analyze_image_archive(self):
+        client = wc_env_manager.fake_docker.FakeDockerClient()
+        image = client.add_image(['karrlab/wc_env:latest'], layers=self.layers)
+
+        analysis = wc_env_manager.analysis.analyze_image_archive(
+            image.save(chunk_size=100), image.attrs['RootFS']['Layers'], image=image.id, tags=image.tags)
+        self.assertEqual(analysis.tags, ['karrlab/wc_env:latest'])
+        self.assertEqual(sorted(analysis.files.keys()), [
+            '/etc/config',
+            '/usr/lib/libx.so',
+            '/usr/local/lib/python3.7/site-packages/numpy/core.so',
+        ])
+        self.assertEqual(analysis.files['/usr/lib/libx.so'], (120, 1))
+        self.assertEqual(analysis.size, 530)
+        self.assertEqual(sorted((file.path, file.size, file.layer, file.hidden_by, file.reason)
+                                for file in analysis.wasted), [
+            ('/root/.cache/pip/wheel', 50, 0, 1, 'deleted'),
+            ('/tmp/build/solver.tar.gz', 300, 0, 1, 'deleted'),
+            ('/usr/lib/libx.so', 100, 0, 1, 'overwritten'),
+        ])
+        self.assertEqual(analysis.wasted_bytes, 450)
+        self.assertEqual([(summary['size'], summary['files'], summary['wasted'])
+                          for summary in analysis.get_layer_summaries()], [(860, 5, 450), (120, 1, 0)])
+
+        with self.assertRaisesRegex(ValueError, 'does not contain layers'):
+            wc_env_manager.analysis.analyze_image_archive(image.save(), ['sha256:' + '0' * 64])
+
+    def test_whiteouts(self):
+        lower = wc_env_manager.analysis.LayerIndex()
+        lower.files = {'/a/x': 1, '/a/b/y': 2, '/ab/z': 4, '/a.txt': 8, '/c/w': 16}
+        upper = wc_env_manager.analysis.LayerIndex()
+        upper.deleted = ['/a', '/a/b']
+        upper.opaque_dirs = ['/c']
+        upper.files = {'/c/v': 32}
+        analysis = wc_env_manager.analysis.ImageAnalysis([lower, upper])
+
+        # paths which only share a prefix with a whiteout (e.g., `/ab`) are not hidden
+        self.assertEqual(analysis.files, {'/ab/z': (4, 0), '/a.txt': (8, 0), '/c/v': (32, 1)})
+        self.assertEqual(sorted((file.path, file.reason) for file in analysis.wasted), [
+            ('/a/b/y', 'deleted'), ('/a/x', 'deleted'), ('/c/w', 'deleted'),
+        ])
+
+    def test_directories_and_artifacts(self):
+        analysis = wc_env_manager.analysis.ImageAnalysis([
+            wc_env_manager.analysis.index_layer(io.BytesIO(self.layers[0])),
+        ])
+        self.assertEqual(analysis.get_directory_sizes(depth=2), {
+            '/usr': 500,
+            '/usr/lib': 100,
+            '/usr/local': 400,
+            '/tmp': 300,
+            '/tmp/build': 300,
+            '/root': 50,
+            '/root/.cache': 50,
+            '/etc': 10,
+        })
+        self.assertEqual(analysis.get_largest_directories(depth=3, n=3), [
+            ('/usr/local/lib', 400),
+            ('/tmp/build', 300),
+            ('/usr/lib', 100),
+        ])
+        self.assertEqual(analysis.get_build_artifacts(), [
+            ('/tmp/build/solver.tar.gz', 300, 'temporary file'),
+            ('/root/.cache/pip/wheel', 50, 'download cache'),
+        ])
+        self.assertEqual(analysis.get_build_artifacts(patterns=[('*.so', 'library')]), [
+            ('/usr/local/lib/python3.7/site-packages/numpy/core.so', 400, 'library'),
+            ('/usr/lib/libx.so', 100, 'library'),
+        ])
+
+    def test_diff_analyses(self):
+        old = wc_env_manager.analysis.ImageAnalysis([
+            wc_env_manager.analysis.index_layer(io.BytesIO(self.layers[0])),
+        ])
+        new = wc_env_manager.analysis.ImageAnalysis([
+            wc_env_manager.analysis.index_layer(io.BytesIO(layer)) for layer in self.layers
+        ])
+        self.assertEqual(wc_env_manager.analysis.diff_analyses(old, new, depth=1), [
+            ('/tmp', 300, 0),
+            ('/root', 50, 0),
+            ('/usr', 500, 520),
+        ])
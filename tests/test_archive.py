@@ -0,0 +1,124 @@
+""" Tests for wc_env_manager.archive
+
+:Author: Jonathan Karr <jonrkarr@gmail.com>
+:Date: 2020-02-10
+:Copyright: 2020, Karr Lab
+:License: MIT
+"""
+
+import hashlib
+import io
+import os
+import shutil
+import tarfile
+import tempfile
+import unittest
+import wc_env_manager.archive
+
+
+class IteratorReaderTestCase(unittest.TestCase):
+    def test(self):
+        reader = io.BufferedReader(wc_env_manager.archive.IteratorReader([b'abc', b'', b'defgh', b'i']))
+        self.assertEqual(reader.read(2), b'ab')
+        self.assertEqual(reader.read(5), b'cdefg')
+        self.assertEqual(reader.read(), b'hi')
+        self.assertEqual(reader.read(), b'')
+
+    def test_iter_file(self):
+        blocks = list(wc_env_manager.archive.iter_file(io.BytesIO(b'abcdefg'), block_size=3))
+        self.assertEqual(blocks, [b'abc', b'def', b'g'])
+
+    def test_hashing_reader(self):
+        reader = wc_env_manager.archive.HashingReader(io.BytesIO(b'abcdefg'))
+        self.assertEqual(reader.read(3), b'abc')
+        self.assertEqual(reader.read(), b'defg')
+        self.assertEqual(reader.hash.hexdigest(), hashlib.sha256(b'abcdefg').hexdigest())
+
+
+class ExtractTarMemberTestCase(unittest.TestCase):
+    def setUp(self):
+        self.dirname = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.dirname)
+
+    def _extract(self, name):
+        archive = io.BytesIO()
+        with tarfile.open(fileobj=archive, mode='w') as tar_file:
+            info = tarfile.TarInfo(name)
+            info.size = 3
+            tar_file.addfile(info, io.BytesIO(b'abc'))
+        archive.seek(0)
+        with tarfile.open(fileobj=archive, mode='r|') as tar_file:
+            for member in tar_file:
+                wc_env_manager.archive.extract_tar_member(tar_file, member, os.path.join(self.dirname, 'out'))
+
+    def test(self):
+        self._extract('a/b.txt')
+        with open(os.path.join(self.dirname, 'out', 'a', 'b.txt'), 'rb') as file:
+            self.assertEqual(file.read(), b'abc')
+
+    def test_outside_of_directory(self):
+        with self.assertRaises(ValueError):
+            self._extract('../b.txt')
+        with self.assertRaises(ValueError):
+            self._extract('a/../../b.txt')
+        self.assertFalse(os.path.exists(os.path.join(self.dirname, 'b.txt')))
+
+
+class ChunkedWriterReaderTestCase(unittest.TestCase):
+    def setUp(self):
+        self.dirname = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.dirname)
+
+    def test_write_read(self):
+        data = os.urandom(2500)
+        writer = wc_env_manager.archive.ChunkedWriter(self.dirname, 'data', 1000)
+        writer.write(data[0:700])
+        writer.write(data[700:])
+        writer.close()
+
+        self.assertEqual([chunk['file'] for chunk in writer.chunks], ['data.00000', 'data.00001', 'data.00002'])
+        self.assertEqual([chunk['size'] for chunk in writer.chunks], [1000, 1000, 500])
+        self.assertEqual(writer.chunks[2]['sha256'], hashlib.sha256(data[2000:]).hexdigest())
+        for chunk in writer.chunks:
+            self.assertTrue(wc_env_manager.archive.is_chunk_complete(self.dirname, chunk))
+
+        reader = io.BufferedReader(wc_env_manager.archive.ChunkedReader(self.dirname, writer.chunks))
+        self.assertEqual(reader.read(), data)
+        reader.close()
+
+        # incomplete chunk
+        with open(os.path.join(self.dirname, 'data.00002'), 'wb') as file:
+            file.write(data[2000:2100])
+        self.assertFalse(wc_env_manager.archive.is_chunk_complete(self.dirname, writer.chunks[2]))
+
+        # truncated final chunk is detected even if the stream isn't read to its end
+        reader = wc_env_manager.archive.ChunkedReader(self.dirname, writer.chunks)
+        buffer = bytearray(1000)
+        self.assertEqual(reader.readinto(buffer), 1000)
+        self.assertEqual(reader.readinto(buffer), 1000)
+        with self.assertRaisesRegex(ValueError, 'data.00002 is corrupted'):
+            reader.readinto(bytearray(10))
+        reader.close()
+
+        # corrupted chunk is detected before any of its bytes are read
+        with open(os.path.join(self.dirname, 'data.00001'), 'r+b') as file:
+            file.write(b'\x00' * 10)
+        reader = wc_env_manager.archive.ChunkedReader(self.dirname, writer.chunks)
+        self.assertEqual(reader.readinto(buffer), 1000)
+        with self.assertRaisesRegex(ValueError, 'data.00001 is corrupted'):
+            reader.readinto(buffer)
+        reader.close()
+
+
+class GetChainIdsTestCase(unittest.TestCase):
+    def test(self):
+        diff_ids = ['sha256:' + 'a' * 64, 'sha256:' + 'b' * 64]
+        chain_ids = wc_env_manager.archive.get_chain_ids(diff_ids)
+        self.assertEqual(chain_ids[0], diff_ids[0])
+        self.assertEqual(chain_ids[1], 'sha256:' + hashlib.sha256(
+            '{} {}'.format(diff_ids[0], diff_ids[1]).encode()).hexdigest())
+        self.assertEqual(wc_env_manager.archive.get_chain_ids([]), [])
@@ -0,0 +1,77 @@
+""" Tests of the benchmarks of wc_env_manager
+
+:Author: Jonathan Karr <jonrkarr@gmail.com>
+:Date: 2020-02-14
+:Copyright: 2020, Karr Lab
+:License: MIT
+"""
+
+from benchmarks import __main__
+from benchmarks import suite
+import capturer
+import os
+import shutil
+import tempfile
+import unittest
+
+
+class BenchmarksTestCase(unittest.TestCase):
+    def setUp(self):
+        self.dirname = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.dirname)
+
+    def test_run_benchmarks(self):
+        results = suite.run_benchmarks(names=['discovery', 'exec', 'transfer.sync'], repeat=2, max_param=100,
+                                       verbose=False)
+        self.assertEqual(results['backend'], 'fake')
+        keys = [suite.get_result_key(result) for result in results['benchmarks']]
+        self.assertEqual(keys, [
+            'transfer.sync[100]',
+            'transfer.sync_unchanged[100]',
+            'exec.round_trip',
+            'discovery.containers[10]',
+            'discovery.containers[100]',
+            'discovery.containers_state_cache[10]',
+            'discovery.containers_state_cache[100]',
+        ])
+        for result in results['benchmarks']:
+            self.assertGreaterEqual(result['median'], result['min'])
+
+        calls = {suite.get_result_key(result): result['calls'] for result in results['benchmarks']}
+        self.assertEqual(calls['exec.round_trip'], {'containers.exec_run': 1})
+        self.assertEqual(calls['discovery.containers[100]'], {'containers.list': 1, 'containers.get': 100})
+        self.assertEqual(calls['discovery.containers_state_cache[100]'], {})
+
+    def test_save_compare_results(self):
+        baseline = {'benchmarks': [
+            {'name': 'a', 'param': None, 'median': 1.},
+            {'name': 'b', 'param': 10, 'median': 1.},
+        ]}
+        results = {'version': '0.0.1', 'backend': 'fake', 'python': '3.7.6', 'benchmarks': [
+            {'name': 'a', 'param': None, 'median': 1.1},
+            {'name': 'b', 'param': 10, 'median': 2.},
+            {'name': 'c', 'param': None, 'median': 2.},
+        ]}
+
+        filename = suite.get_results_filename(results, dirname=self.dirname)
+        self.assertEqual(filename, os.path.join(self.dirname, '0.0.1-fake-py3.7.6.json'))
+        suite.save_results(results, filename)
+        self.assertEqual(suite.load_results(filename), results)
+
+        comparisons, regressions = suite.compare_results(baseline, results)
+        self.assertEqual([comparison['key'] for comparison in comparisons], ['a', 'b[10]'])
+        self.assertEqual(regressions, ['b[10]'])
+
+    def test_main(self):
+        filename = os.path.join(self.dirname, 'results.json')
+        with capturer.CaptureOutput(relay=False) as capture_output:
+            self.assertEqual(__main__.main(['--name', 'exec', '--repeat', '1', '--output', filename]), 0)
+        self.assertIn('exec.round_trip', capture_output.get_text())
+        self.assertTrue(os.path.isfile(filename))
+
+        with capturer.CaptureOutput(relay=False) as capture_output:
+            self.assertEqual(__main__.main(['--name', 'exec', '--repeat', '1', '--no-save',
+                                            '--compare', filename, '--threshold', '1e6']), 0)
+        self.assertIn('Baseline', capture_output.get_text())
@@ -6,9 +6,12 @@
 :License: MIT
 """
 
+import mock
 import os
 import pathlib
 import pkg_resources
+import shutil
+import tempfile
 import unittest
 import wc_env_manager.config.core
 
@@ -45,3 +48,79 @@ class Test(unittest.TestCase):
         self.assertEqual(
             config['wc_env_manager']['base_image']['dockerfile_template_path'],
             '{}/Dockerfile'.format(pathlib.Path.home()))
+
+
+class CacheTestCase(unittest.TestCase):
+    def setUp(self):
+        self.dirname = tempfile.mkdtemp()
+        self.user_config_filename = os.path.join(self.dirname, 'wc_env_manager.cfg')
+        paths = wc_env_manager.config.core.get_config_paths()
+        paths['user'] = (self.user_config_filename,)
+
+        self.patches = [
+            mock.patch.object(wc_env_manager.config.core, 'CACHE_FILENAME',
+                              os.path.join(self.dirname, 'cache', 'config.pickle')),
+            mock.patch.object(wc_env_manager.config.core, 'get_config_paths', return_value=paths),
+        ]
+        for patch in self.patches:
+            patch.start()
+        wc_env_manager.config.core.clear_config_cache()
+
+    def tearDown(self):
+        wc_env_manager.config.core.clear_config_cache()
+        for patch in self.patches:
+            patch.stop()
+        shutil.rmtree(self.dirname)
+
+    def test_cache(self):
+        read_config = wc_env_manager.config.core._read_config
+        with mock.patch.object(wc_env_manager.config.core, '_read_config', side_effect=read_config) as patched:
+            config = wc_env_manager.config.core.get_config()
+            self.assertEqual(patched.call_count, 1)
+            self.assertTrue(os.path.isfile(wc_env_manager.config.core.CACHE_FILENAME))
+
+            # in-memory cache
+            config_2 = wc_env_manager.config.core.get_config()
+            self.assertEqual(patched.call_count, 1)
+            self.assertEqual(config_2, config)
+
+            # configurations aren't shared
+            config_2['wc_env_manager']['verbose'] = not config['wc_env_manager']['verbose']
+            self.assertEqual(wc_env_manager.config.core.get_config(), config)
+
+            # on-disk cache
+            wc_env_manager.config.core._cache.clear()
+            self.assertEqual(wc_env_manager.config.core.get_config(), config)
+            self.assertEqual(patched.call_count, 1)
+
+            # invalidated by changes to the configuration files
+            with open(self.user_config_filename, 'w') as file:
+                file.write('[wc_env_manager]\n    max_workers = 3\n')
+            config = wc_env_manager.config.core.get_config()
+            self.assertEqual(patched.call_count, 2)
+            self.assertEqual(config['wc_env_manager']['max_workers'], 3)
+
+            # invalidated by environment variables
+            with mock.patch.dict(os.environ, {'CONFIG__DOT__wc_env_manager__DOT__max_workers': '5'}):
+                config = wc_env_manager.config.core.get_config()
+            self.assertEqual(patched.call_count, 3)
+            self.assertEqual(config['wc_env_manager']['max_workers'], 5)
+
+    def test_cache_extra(self):
+        extra = {
+            'wc_env_manager': {
+                'max_workers': '4',
+                'base_image': {
+                    'dockerfile_template_path': '${HOME}/Dockerfile',
+                },
+            },
+        }
+        config = wc_env_manager.config.core.get_config(extra=extra)
+        self.assertEqual(config, wc_env_manager.config.core.get_config(extra=extra, use_cache=False))
+        self.assertEqual(config['wc_env_manager']['max_workers'], 4)
+        self.assertEqual(config['wc_env_manager']['base_image']['dockerfile_template_path'],
+                         '{}/Dockerfile'.format(pathlib.Path.home()))
+
+        # invalid extra configuration is reported as if the configuration were read without the cache
+        with self.assertRaisesRegex(Exception, 'max_workers'):
+            wc_env_manager.config.core.get_config(extra={'wc_env_manager': {'max_workers': 'many'}})
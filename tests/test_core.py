@@ -8,9 +8,12 @@
 """
 
 import capturer
+import contextlib
 import datetime
 import docker
 import git
+import io
+import logging
 import mock
 import os
 import re
@@ -19,9 +22,12 @@ import stat
 import subprocess
 import sys
 import tempfile
+import threading
 import time
 import unittest
 import wc_env_manager.core
+import wc_env_manager.fake_docker
+import wc_env_manager.layer_order
 import whichcraft
 import yaml
 
@@ -131,6 +137,22 @@ class WcEnvManagerBuildRemoveBaseImageTestCase(unittest.TestCase):
             mgr.build_base_image()
             self.assertRegex(capture_output.get_text(), r'Step 1/\d+ : FROM ubuntu')
 
+    def test_build_base_image_slim(self):
+        mgr = self.mgr
+        config = mgr.config['base_image']
+        with open(config['dockerfile_template_path'], 'w') as file:
+            file.write('FROM ubuntu\n')
+            file.write('RUN head -c 1000000 /dev/zero > /tmp/build-artifact\n')
+            file.write('{% if slim %}RUN rm /tmp/build-artifact '
+                       '&& printf "size_before=2\\nsize_after=1\\n" > /etc/docker-image-slim-report{% endif %}\n')
+            file.write('CMD bash\n')
+
+        image = mgr.build_base_image(profile='slim')
+        self.assertEqual(mgr.get_base_image_slim_report(image), {'size_before': 2, 'size_after': 1})
+
+        image = mgr.build_base_image(profile='full')
+        self.assertEqual(mgr.get_base_image_slim_report(image), None)
+
     def test_build_base_image_context_error(self):
         mgr = self.mgr
 
@@ -489,6 +511,37 @@ class WcEnvManagerNetworkTestCase(unittest.TestCase):
             time.sleep(1.)
         self.assertTrue(connected)
 
+    def test_get_cache_build_args(self):
+        mgr = self.mgr
+        self.assertEqual(mgr.get_cache_build_args(), {})
+
+        mgr.config['network']['containers']['apt_cache__'] = {
+            'image': 'sameersbn/apt-cacher-ng',
+            'cache': 'apt',
+        }
+        mgr.config['network']['containers']['pypi_cache__'] = {
+            'image': 'epicwink/proxpi',
+            'cache': 'pypi',
+            'url': 'http://pypi_cache__:5001/index/',
+        }
+        mgr.config['network']['containers']['http_cache__'] = {
+            'image': 'ubuntu/squid',
+            'cache': 'http',
+        }
+        mgr.config['network']['containers']['ccache__'] = {
+            'image': 'redis',
+            'cache': 'ccache',
+        }
+        self.assertEqual(mgr.get_cache_build_args(), {
+            'apt_proxy': 'http://apt_cache__:3142',
+            'pip_index_url': 'http://pypi_cache__:5001/index/',
+            'pip_trusted_host': 'pypi_cache__',
+            'http_proxy': 'http://http_cache__:3128',
+            'https_proxy': 'http://http_cache__:3128',
+            'ccache_remote_storage': 'redis://ccache__:6379',
+            'no_proxy': 'apt_cache__,pypi_cache__,http_cache__,ccache__',
+        })
+
     def test_remove(self):
         mgr = self.mgr
 
@@ -609,6 +662,41 @@ class WcEnvManagerContainerTestCase(unittest.TestCase):
             mgr.setup_container(upgrade=True)
             self.assertRegex(capture_output.get_text(), '(Successfully installed|Requirement already up-to-date)')
 
+    def test_setup_container_incremental_upgrade(self):
+        mgr = self.mgr
+        mgr.config['verbose'] = True
+        mgr.build_container()
+
+        mgr.config['container']['python_packages'] = '''
+        git+https://github.com/KarrLab/pkg_utils.git#egg=pkg_utils
+        '''
+        mgr.setup_container()
+        self.assertEqual(mgr.get_installed_python_package_revisions(),
+                         {'git+https://github.com/KarrLab/pkg_utils.git#egg=pkg_utils': None})
+
+        mgr.setup_container(upgrade=True)
+        revisions = mgr.get_installed_python_package_revisions()
+        self.assertRegex(revisions['git+https://github.com/KarrLab/pkg_utils.git#egg=pkg_utils'], r'^[0-9a-f]{40}$')
+
+        # unchanged packages are not reinstalled
+        with capturer.CaptureOutput(relay=False) as capture_output:
+            mgr.setup_container(upgrade=True, incremental=True)
+            self.assertNotRegex(capture_output.get_text(), 'pkg_utils')
+
+        # changed packages are reinstalled
+        mgr.set_installed_python_package_revisions({})
+        with capturer.CaptureOutput(relay=False) as capture_output:
+            mgr.setup_container(upgrade=True, incremental=True)
+            self.assertRegex(capture_output.get_text(), 'pkg_utils')
+        self.assertEqual(mgr.get_installed_python_package_revisions(), revisions)
+
+    def test_sort_python_packages_by_dependencies(self):
+        mgr = self.mgr
+        mgr.build_container()
+        mgr.run_process_in_container(['pip{}'.format(mgr.config['image']['python_version']), 'install', 'requests'])
+        self.assertEqual(mgr.sort_python_packages_by_dependencies(['requests', 'urllib3', '-e /root/host/idna']),
+                         ['urllib3', '-e /root/host/idna', 'requests'])
+
     def test_setup_container_with_python_packages_error(self):
         mgr = self.mgr
         mgr.config['image']['python_packages'] = ''
@@ -674,6 +762,148 @@ class WcEnvManagerContainerTestCase(unittest.TestCase):
 
         shutil.rmtree(temp_dir_name)
 
+    def test_retrieve_path(self):
+        mgr = self.mgr
+        mgr.build_container()
+        mgr.run_process_in_container(['bash', '-c', (
+            'mkdir -p /tmp/results/checkpoints '
+            '&& head -c 100000 /dev/zero > /tmp/results/a.h5 '
+            '&& echo 1,2 > /tmp/results/b.csv '
+            '&& echo ckpt > /tmp/results/checkpoints/c.csv '
+            '&& echo log > /tmp/results/log.txt')])
+
+        for codec in ['none', 'gzip', 'xz', 'zstd']:
+            local_dir_name = tempfile.mkdtemp()
+            report = mgr.retrieve_path('/tmp/results', local_dir_name, codec=codec,
+                                       level=3 if codec != 'none' else None,
+                                       include=['*.h5', '*.csv'], exclude=['checkpoints'])
+            self.assertEqual(report.files, ['a.h5', 'b.csv'])
+            self.assertEqual(report.bytes_uncompressed, 100004)
+            if codec != 'none':
+                self.assertLess(report.bytes_compressed, 10000)
+            self.assertEqual(sorted(os.listdir(local_dir_name)), ['a.h5', 'b.csv'])
+            with open(os.path.join(local_dir_name, 'b.csv'), 'r') as file:
+                self.assertEqual(file.read(), '1,2\n')
+            shutil.rmtree(local_dir_name)
+
+        local_dir_name = tempfile.mkdtemp()
+        report = mgr.retrieve_path('/tmp/results', local_dir_name)
+        self.assertEqual(report.files, ['a.h5', 'b.csv', 'checkpoints/c.csv', 'log.txt'])
+        _, exit_code = mgr.run_process_in_container(['bash', '-c', 'ls /tmp/tmp.*'], check=False)
+        self.assertNotEqual(exit_code, 0)
+
+        with self.assertRaisesRegex(wc_env_manager.WcEnvManagerError, 'Codec must be'):
+            mgr.retrieve_path('/tmp/results', local_dir_name, codec='bz2')
+        shutil.rmtree(local_dir_name)
+
+    def test_sync_path(self):
+        mgr = self.mgr
+        mgr.build_container()
+
+        local_dir_name = tempfile.mkdtemp()
+        os.makedirs(os.path.join(local_dir_name, 'a', 'b'))
+        for name, data in [('x.txt', 'x' * 1000), ('a/y.txt', 'y' * 2000), ('a/b/z.txt', 'z' * 3000)]:
+            with open(os.path.join(local_dir_name, name), 'w') as file:
+                file.write(data)
+
+        # to container
+        report = mgr.sync_path(local_dir_name, '/tmp/sync')
+        self.assertEqual(report.files_transferred, ['a/b/z.txt', 'a/y.txt', 'x.txt'])
+        self.assertEqual(report.bytes_transferred, 6000)
+        self.assertEqual(report.bytes_saved, 0)
+        output, _ = mgr.run_process_in_container(['wc', '-c', '/tmp/sync/a/b/z.txt'])
+        self.assertEqual(output, '3000 /tmp/sync/a/b/z.txt')
+
+        report = mgr.sync_path(local_dir_name, '/tmp/sync')
+        self.assertEqual(report.files_transferred, [])
+        self.assertEqual(report.bytes_saved, 6000)
+
+        # file with the same size but different content
+        with open(os.path.join(local_dir_name, 'a', 'y.txt'), 'w') as file:
+            file.write('Y' * 2000)
+        os.utime(os.path.join(local_dir_name, 'a', 'y.txt'), (0, 0))
+        report = mgr.sync_path(local_dir_name, '/tmp/sync')
+        self.assertEqual(report.files_transferred, ['a/y.txt'])
+        self.assertEqual(report.bytes_saved, 4000)
+
+        # file with a different modification time but the same content
+        os.utime(os.path.join(local_dir_name, 'x.txt'), (0, 0))
+        report = mgr.sync_path(local_dir_name, '/tmp/sync')
+        self.assertEqual(report.files_transferred, [])
+        output, _ = mgr.run_process_in_container(['stat', '-c', '%Y', '/tmp/sync/x.txt'])
+        self.assertEqual(output, '0')
+
+        # delete extraneous files
+        mgr.run_process_in_container(['touch', '/tmp/sync/extra.txt'])
+        report = mgr.sync_path(local_dir_name, '/tmp/sync')
+        self.assertEqual(report.files_deleted, [])
+        report = mgr.sync_path(local_dir_name, '/tmp/sync', delete=True)
+        self.assertEqual(report.files_deleted, ['extra.txt'])
+        _, exit_code = mgr.run_process_in_container(['test', '-f', '/tmp/sync/extra.txt'], check=False)
+        self.assertNotEqual(exit_code, 0)
+
+        # from container
+        mgr.run_process_in_container(['bash', '-c', 'echo abc > /tmp/sync/a/new.txt'])
+        report = mgr.sync_path(local_dir_name, '/tmp/sync',
+                               direction=wc_env_manager.core.SyncDirection.from_container)
+        self.assertEqual(report.files_transferred, ['a/new.txt'])
+        with open(os.path.join(local_dir_name, 'a', 'new.txt'), 'r') as file:
+            self.assertEqual(file.read(), 'abc\n')
+
+        with self.assertRaisesRegex(wc_env_manager.WcEnvManagerError, 'does not exist'):
+            mgr.sync_path(os.path.join(local_dir_name, 'missing'), '/tmp/sync')
+
+        shutil.rmtree(local_dir_name)
+
+    def test_watch_paths(self):
+        mgr = self.mgr
+        mgr.build_container()
+
+        local_dir_name = tempfile.mkdtemp()
+        with open(os.path.join(local_dir_name, 'a.txt'), 'w') as file:
+            file.write('a')
+        paths = {local_dir_name: {'container': '/tmp/watch', 'exclude': ['*.pyc']}}
+
+        def is_file(path):
+            _, exit_code = mgr.run_process_in_container(['test', '-f', path], check=False)
+            return exit_code == 0
+
+        def wait_for(condition):
+            for i_try in range(50):
+                if condition():
+                    return True
+                time.sleep(0.1)
+            return False
+
+        stop_event = threading.Event()
+        reports = []
+        thread = threading.Thread(target=lambda: reports.append(mgr.watch_paths(paths, stop_event=stop_event)))
+        thread.start()
+        try:
+            self.assertTrue(wait_for(lambda: is_file('/tmp/watch/a.txt')))
+
+            os.makedirs(os.path.join(local_dir_name, 'b'))
+            with open(os.path.join(local_dir_name, 'b', 'c.txt'), 'w') as file:
+                file.write('c')
+            with open(os.path.join(local_dir_name, 'd.pyc'), 'w') as file:
+                file.write('d')
+            self.assertTrue(wait_for(lambda: is_file('/tmp/watch/b/c.txt')))
+
+            os.remove(os.path.join(local_dir_name, 'a.txt'))
+            self.assertTrue(wait_for(lambda: not is_file('/tmp/watch/a.txt')))
+            self.assertFalse(is_file('/tmp/watch/d.pyc'))
+        finally:
+            stop_event.set()
+            thread.join()
+
+        self.assertIn('b/c.txt', reports[0].files_transferred)
+        self.assertEqual(reports[0].files_deleted, ['a.txt'])
+
+        with self.assertRaisesRegex(wc_env_manager.WcEnvManagerError, 'No directories'):
+            mgr.watch_paths({})
+
+        shutil.rmtree(local_dir_name)
+
     def test_set_container(self):
         mgr = self.mgr
         container = mgr.build_container()
@@ -699,6 +929,34 @@ class WcEnvManagerContainerTestCase(unittest.TestCase):
         containers = mgr.get_containers()
         self.assertEqual(containers, [container])
 
+    def test_state_cache(self):
+        mgr = self.mgr
+        mgr.config['state_cache'] = True
+        self.assertEqual(mgr.get_latest_image(mgr.config['image']['repo'] + ':test'), mgr._image)
+        self.assertEqual(mgr.get_containers(), [])
+
+        container = mgr.build_container()
+        for i_try in range(50):
+            if mgr.get_containers():
+                break
+            time.sleep(0.1)
+        self.assertEqual(mgr.get_containers(), [container])
+        self.assertEqual(mgr.get_latest_container(), container)
+        self.assertEqual(mgr.get_containers(image_version='test'), [])
+
+        mgr.set_container(container.name)
+        self.assertEqual(mgr._container, container)
+
+        mgr.remove_containers(force=True)
+        for i_try in range(50):
+            if not mgr.get_containers():
+                break
+            time.sleep(0.1)
+        self.assertEqual(mgr.get_containers(), [])
+
+        mgr.close()
+        self.assertEqual(mgr._state_cache, None)
+
     def test_run_process_in_container(self):
         mgr = self.mgr
         mgr.build_container()
@@ -757,10 +1015,837 @@ class WcEnvManagerContainerTestCase(unittest.TestCase):
         mgr = self.mgr
         container = mgr.build_container()
         self.assertNotEqual(mgr._container, None)
-        mgr.remove_containers(force=True)
+        results = mgr.remove_containers(force=True)
+        self.assertEqual([result.container for result in results], [container.name])
+        self.assertEqual([result.error for result in results], [None])
         self.assertEqual(mgr._container, None)
         self.assertEqual(mgr.get_containers(), [])
 
+    def test_get_containers_filters(self):
+        mgr = self.mgr
+        mgr.config['container']['labels'] = {'key': 'value'}
+        container = mgr.build_container()
+
+        self.assertEqual(mgr.get_containers(older_than=datetime.timedelta(0)), [container])
+        self.assertEqual(mgr.get_containers(older_than=datetime.timedelta(days=1)), [])
+        self.assertEqual(mgr.get_containers(image_version='test'), [])
+        self.assertEqual(mgr.get_containers(labels={'key': 'value'}), [container])
+        self.assertEqual(mgr.get_containers(labels={'key': 'other'}), [])
+
+    def test_stop_start_restart_containers(self):
+        mgr = self.mgr
+        mgr.config['container']['name_format'] = 'wc_env-%Y-%m-%d-%H-%M-%S-%f'
+        containers = [mgr.build_container() for i_container in range(3)]
+        names = sorted(container.name for container in containers)
+
+        for method in [mgr.stop_containers, mgr.start_containers, mgr.restart_containers]:
+            results = method(max_workers=2)
+            self.assertEqual(sorted(result.container for result in results), names)
+            self.assertEqual([result.error for result in results], [None] * 3)
+            self.assertTrue(all(result.duration >= 0. for result in results))
+
+        results = mgr.stop_containers(containers=[containers[0]])
+        self.assertEqual([result.container for result in results], [containers[0].name])
+
+    def test_run_concurrently_errors(self):
+        mgr = self.mgr
+
+        def operation(name):
+            if name == 'b':
+                raise ValueError('error b')
+            return name.upper()
+
+        results = mgr.run_concurrently(operation, ['a', 'b', 'c'])
+        self.assertEqual([result.result for result in results], ['A', None, 'C'])
+        self.assertEqual([str(result.error) if result.error else None for result in results], [None, 'error b', None])
+        with self.assertRaisesRegex(wc_env_manager.WcEnvManagerError, 'b: error b'):
+            mgr._raise_concurrent_errors('Operations failed', results)
+
+
+@unittest.skipIf(whichcraft.which('docker') is None, 'Test requires Docker and Docker isn''t installed.')
+class WcEnvManagerGarbageCollectionTestCase(unittest.TestCase):
+    def setUp(self):
+        self.mgr = mgr = wc_env_manager.core.WcEnvManager()
+        mgr.config['base_image']['repo_unsquashed'] = 'karrlab/test_gc_unsquashed'
+        mgr.config['base_image']['repo'] = 'karrlab/test_gc'
+        mgr.config['base_image']['tags'] = ['latest']
+        mgr.config['image']['repo'] = 'karrlab/test_gc_image'
+        mgr.config['image']['tags'] = ['latest']
+
+        self.context_path = tempfile.mkdtemp()
+        dockerfile_path = os.path.join(self.context_path, 'Dockerfile')
+        for i_version in range(1, 4):
+            with open(dockerfile_path, 'w') as file:
+                file.write('FROM busybox\n')
+                file.write('RUN head -c {} /dev/urandom > /data\n'.format(i_version * 1000000))
+            tags = ['0.0.{}'.format(i_version)]
+            if i_version == 3:
+                tags.append('latest')
+            mgr._build_image('karrlab/test_gc', tags, dockerfile_path, {}, self.context_path)
+
+    def tearDown(self):
+        shutil.rmtree(self.context_path)
+        for image in self.mgr._docker_client.images.list(name='karrlab/test_gc'):
+            self.mgr._docker_client.images.remove(image.id, force=True)
+
+    def test_get_image_inventory(self):
+        mgr = self.mgr
+        inventory = [image for image in mgr.get_image_inventory() if image['repo'] == 'karrlab/test_gc']
+        self.assertEqual(sorted(image['version'] for image in inventory), ['0.0.1', '0.0.2', '0.0.3'])
+        for image in inventory:
+            self.assertGreaterEqual(image['size'], 1000000)
+            self.assertEqual(image['containers'], [])
+
+    def test_collect_garbage(self):
+        mgr = self.mgr
+
+        report = mgr.collect_garbage(keep_versions=1, dry_run=True)
+        self.assertTrue(report.dry_run)
+        versions = sorted(image['version'] for image in report.images if image['repo'] == 'karrlab/test_gc')
+        self.assertEqual(versions, ['0.0.1', '0.0.2'])
+        self.assertGreaterEqual(report.bytes_reclaimed, 3000000)
+        self.assertEqual(len(mgr._docker_client.images.list(name='karrlab/test_gc')), 3)
+
+        report = mgr.collect_garbage(keep_versions=2, max_size='0B')
+        self.assertFalse(report.dry_run)
+        self.assertEqual(len(mgr._docker_client.images.list(name='karrlab/test_gc')), 1)
+        self.assertGreaterEqual(report.bytes_reclaimed, 3000000)
+
+        # the configured tags are kept
+        report = mgr.collect_garbage(keep_versions=0)
+        self.assertEqual([image.tags for image in mgr._docker_client.images.list(name='karrlab/test_gc')],
+                         [['karrlab/test_gc:0.0.3', 'karrlab/test_gc:latest']])
+
+
+@unittest.skipIf(whichcraft.which('docker') is None, 'Test requires Docker and Docker isn''t installed.')
+class WcEnvManagerExportImportImageTestCase(unittest.TestCase):
+    def setUp(self):
+        self.mgr = mgr = wc_env_manager.core.WcEnvManager()
+        self.context_path = tempfile.mkdtemp()
+        self.archive_path = tempfile.mkdtemp()
+
+        dockerfile_path = os.path.join(self.context_path, 'Dockerfile')
+        with open(dockerfile_path, 'w') as file:
+            file.write('FROM busybox\n')
+            file.write('RUN head -c 3000000 /dev/urandom > /data\n')
+        self.image = mgr._build_image('karrlab/test_export', ['0.0.1', 'latest'], dockerfile_path, {},
+                                      self.context_path)
+
+    def tearDown(self):
+        shutil.rmtree(self.context_path)
+        shutil.rmtree(self.archive_path)
+        for image in self.mgr._docker_client.images.list(name='karrlab/test_export'):
+            self.mgr._docker_client.images.remove(image.id, force=True)
+
+    def test_export_import(self):
+        mgr = self.mgr
+        image = self.image
+
+        manifest = mgr.export_image(image, self.archive_path, chunk_size=1000000)
+        self.assertTrue(manifest['complete'])
+        self.assertEqual(manifest['image'], image.id)
+        self.assertEqual(manifest['layers'], image.attrs['RootFS']['Layers'])
+        self.assertTrue(os.path.isfile(os.path.join(self.archive_path, 'manifest.json')))
+        n_blobs = len(os.listdir(os.path.join(self.archive_path, 'blobs')))
+        self.assertGreater(n_blobs, 3)
+
+        # resume export
+        with mock.patch('wc_env_manager.archive.ChunkedWriter') as writer:
+            mgr.export_image(image, self.archive_path, chunk_size=1000000)
+        writer.assert_not_called()
+
+        # import
+        mgr._docker_client.images.remove(image.id, force=True)
+        imported_image = mgr.import_image(self.archive_path)
+        self.assertEqual(imported_image.id, image.id)
+        self.assertEqual(sorted(imported_image.tags), ['karrlab/test_export:0.0.1', 'karrlab/test_export:latest'])
+
+        # corrupted archive
+        with open(os.path.join(self.archive_path, 'blobs', sorted(os.listdir(
+                os.path.join(self.archive_path, 'blobs')))[0]), 'r+b') as file:
+            file.write(b'\x00' * 10)
+        mgr._docker_client.images.remove(image.id, force=True)
+        with self.assertRaisesRegex(wc_env_manager.WcEnvManagerError, 'is corrupted'):
+            mgr.import_image(self.archive_path)
+
+    def test_export_import_without_base_image(self):
+        mgr = self.mgr
+        image = self.image
+        base_image = mgr._docker_client.images.get('busybox')
+
+        manifest = mgr.export_image(image, self.archive_path, base_image=base_image)
+        omitted = [member for member in manifest['members'] if member.get('omitted', False)]
+        self.assertEqual([member['sha256'] for member in omitted], base_image.attrs['RootFS']['Layers'])
+
+        mgr._docker_client.images.remove(image.id, force=True)
+        imported_image = mgr.import_image(self.archive_path)
+        self.assertEqual(imported_image.id, image.id)
+
+
+class WcEnvManagerFakeDockerTestCase(unittest.TestCase):
+    """ Test the manager with an in-process fake of Docker """
+
+    def setUp(self):
+        self.client = wc_env_manager.fake_docker.FakeDockerClient(
+            exec_handler=wc_env_manager.fake_docker.ScriptedExecHandler())
+        self.mgr = wc_env_manager.core.WcEnvManager({'verbose': False}, docker_client=self.client)
+        self.mgr.config['network']['containers'] = {}
+        self.image = self.client.add_image([self.mgr.config['image']['repo'] + ':' + self.mgr.config['image']['tags'][0]])
+        self.mgr.refresh_state()
+
+    def test_make_docker_client(self):
+        mgr = wc_env_manager.core.WcEnvManager({
+            'verbose': False,
+            'docker_client_factory': 'wc_env_manager.fake_docker.FakeDockerClient',
+        })
+        self.assertIsInstance(mgr._docker_client, wc_env_manager.fake_docker.FakeDockerClient)
+
+        mgr.config['docker_client_factory'] = 'wc_env_manager.fake_docker.UndefinedClient'
+        with self.assertRaisesRegex(wc_env_manager.WcEnvManagerError, 'could not be imported'):
+            mgr.make_docker_client()
+
+    def test_build_container(self):
+        mgr = self.mgr
+        self.assertEqual(mgr._image, self.image)
+
+        container = mgr.build_container()
+        self.assertEqual(container.image, self.image)
+        self.assertEqual(mgr.get_containers(), [container])
+        self.assertEqual(mgr.get_latest_container(), container)
+
+        mgr.run_process_in_container(['pip', 'freeze'])
+        self.assertEqual(self.client.exec_handler.commands, [(container.name, ['pip', 'freeze'])])
+
+    def test_build_network(self):
+        mgr = self.mgr
+        self.client.exec_handler.outputs.append(('mongo --eval db.stats()', 0, b''))
+        port = 6379
+        port_closed = ('nc -z -w 1 redis {}'.format(port), 1, b'')
+        self.client.exec_handler.outputs.append(port_closed)
+
+        def sidecar(**ready):
+            return {'image': mgr._image.id, 'environment': {}, 'shm_size': '64MB', 'ready': ready}
+        mgr.config['network']['containers'] = {
+            'postgres': sidecar(log_pattern='^database system is ready', timeout=5.),
+            'mongo': sidecar(command='mongo --eval db.stats()', timeout=5.),
+            'redis': sidecar(port=port, timeout=5.),
+        }
+
+        def start_sidecars():
+            time.sleep(0.2)
+            self.client.write_log(self.client.containers.get('postgres'), 'starting\ndatabase system is ready\n')
+            self.client.exec_handler.outputs.remove(port_closed)
+        self.client.set_latency('containers.create', 0.05)
+        thread = threading.Thread(target=start_sidecars)
+        thread.start()
+        try:
+            start = time.time()
+            durations = mgr.build_network()
+            duration = time.time() - start
+        finally:
+            thread.join()
+
+        self.assertEqual(set(durations.keys()), set(['postgres', 'mongo', 'redis']))
+        self.assertGreaterEqual(duration, 0.2)
+        self.assertLess(duration, 5.)
+        self.assertGreaterEqual(durations['postgres'], 0.2)
+        self.assertGreaterEqual(durations['redis'], 0.2)
+        self.assertEqual(self.client.max_concurrency['containers.create'], 3)
+
+        # mongo was ready at its first probe, while redis was probed until its port opened
+        commands = [' '.join(cmd) for _, cmd in self.client.exec_handler.commands]
+        mongo_probes = [i_cmd for i_cmd, cmd in enumerate(commands) if cmd == 'mongo --eval db.stats()']
+        redis_probes = [i_cmd for i_cmd, cmd in enumerate(commands) if cmd.startswith('nc ')]
+        self.assertEqual(len(mongo_probes), 1)
+        self.assertGreater(len(redis_probes), 1)
+        self.assertLess(mongo_probes[0], redis_probes[-1])
+
+        # the port is probed from a throwaway container on the network, rather than from the host
+        probes = [cmd for name, cmd in self.client.exec_handler.commands if cmd[0] == 'nc']
+        self.assertEqual(probes[-1], ['nc', '-z', '-w', '1', 'redis', str(port)])
+        self.assertEqual(self.client.images.get(mgr.config['network']['probe_image']).tags,
+                         [mgr.config['network']['probe_image'] + ':latest'])
+        self.assertEqual(sorted(container.name for container in self.client.containers.list(all=True)),
+                         ['mongo', 'postgres', 'redis'])
+
+        # sidecar which never becomes ready
+        mgr.config['network']['containers'] = {
+            'mysql': sidecar(log_pattern='ready for connections', timeout=0.2),
+        }
+        with self.assertRaisesRegex(wc_env_manager.WcEnvManagerError, 'mysql was not ready within 0.2 s'):
+            mgr.build_network()
+
+    def test_concurrent_operations(self):
+        mgr = self.mgr
+        for i_container in range(4):
+            self.client.add_container(mgr._image.id, name='wc_env-2020-01-01-00-00-0{}'.format(i_container),
+                                      running=True)
+        self.client.set_latency('containers.stop', 0.1)
+        self.client.inject_failure('containers.stop', count=1)
+
+        results = mgr.stop_containers(max_workers=4)
+        self.assertEqual(self.client.max_concurrency['containers.stop'], 4)
+        self.assertEqual(len([result for result in results if result.error]), 1)
+        self.assertEqual(len([container for container in mgr.get_containers() if container.status == 'exited']), 3)
+
+    def test_build_base_image_profiles(self):
+        mgr = self.mgr
+        builds = []
+
+        def build_image(image_repo, image_tags, dockerfile_path, build_args, context_path, **kwargs):
+            with open(dockerfile_path, 'r') as file:
+                builds.append((build_args, file.read()))
+
+        with mock.patch.object(mgr, 'get_required_python_packages', return_value=['numpy']):
+            with mock.patch.object(mgr, '_build_image', side_effect=build_image):
+                mgr.build_base_image(target='final')
+                mgr.build_base_image(target='final', profile='slim')
+                with self.assertRaisesRegex(wc_env_manager.WcEnvManagerError, 'Profile must be'):
+                    mgr.build_base_image(target='final', profile='tiny')
+
+        tags = mgr.config['base_image']['tags']
+        self.assertEqual(builds[0][0]['slim'], '')
+        self.assertEqual(builds[0][0]['npm_install'], 'True')
+        self.assertEqual(builds[0][0]['image_tag'], tags[1])
+        self.assertNotIn('strip --strip-unneeded', builds[0][1])
+        self.assertNotIn('LABEL ' + mgr.BASE_IMAGE_PROFILE_LABEL, builds[0][1])
+        self.assertEqual(builds[1][0]['slim'], 'True')
+        self.assertEqual(builds[1][0]['npm_install'], '')
+        self.assertEqual(builds[1][0]['image_tag'], tags[1] + '-slim')
+        self.assertIn('strip --strip-unneeded', builds[1][1])
+        self.assertNotIn('find /usr/local /opt ', builds[1][1])
+        self.assertIn('LABEL {}=slim'.format(mgr.BASE_IMAGE_PROFILE_LABEL), builds[1][1])
+        self.assertIn('> ' + mgr.BASE_IMAGE_SLIM_REPORT_PATH, builds[1][1])
+
+        self.assertEqual(mgr.get_base_image_tags(), list(tags))
+        self.assertEqual(mgr.get_base_image_tags(profile='slim'), [tag + '-slim' for tag in tags])
+        mgr.config['base_image']['profile'] = 'slim'
+        self.assertEqual(mgr.get_base_image_tags(), [tag + '-slim' for tag in tags])
+
+    def test_build_base_image_with_compiler_cache(self):
+        mgr = self.mgr
+        builds = []
+
+        def build_image(image_repo, image_tags, dockerfile_path, build_args, context_path, **kwargs):
+            with open(dockerfile_path, 'r') as file:
+                builds.append((build_args, file.read(), os.listdir(context_path), kwargs))
+
+        mgr.config['network']['containers']['ccache'] = {'image': 'redis', 'cache': 'ccache'}
+        with mock.patch.object(mgr, 'get_required_python_packages', return_value=['numpy']):
+            with mock.patch.object(mgr, 'build_network', return_value={}) as build_network:
+                with mock.patch.object(mgr, '_build_image', side_effect=build_image):
+                    mgr.build_base_image(target='final')
+        build_network.assert_called_once_with()
+
+        # the cache is reached over the network, rather than copied into an early layer
+        build_args, dockerfile, context, kwargs = builds[0]
+        self.assertEqual(build_args['ccache_install'], 'True')
+        self.assertEqual(build_args['ccache_remote_storage'], 'redis://ccache:6379')
+        self.assertEqual(kwargs['network_mode'], mgr.config['network']['name'])
+        self.assertEqual(dockerfile.count('ARG CCACHE_REMOTE_STORAGE=redis://ccache:6379'), 2)
+        self.assertNotIn('COPY ccache', dockerfile)
+        self.assertNotIn('ccache', context)
+
+    def test_build_base_image_output(self):
+        mgr = self.mgr
+        mgr.config['verbose'] = True
+        config = mgr.config['base_image']
+        config['build_history_path'] = None
+        unsquashed_image = self.client.add_image([config['repo_unsquashed'] + ':' + config['tags'][0]], size=200)
+        self.client.add_image([config['repo'] + ':' + config['tags'][0]], size=100)
+
+        # the handler which prints the log of the squash is removed
+        log = logging.getLogger()
+        handlers = list(log.handlers)
+        stdout = io.StringIO()
+        with mock.patch.object(mgr, 'get_required_python_packages', return_value=['numpy']):
+            with mock.patch.object(mgr, '_build_image', return_value=unsquashed_image):
+                with mock.patch('docker_squash.squash.Squash') as Squash:
+                    Squash.return_value.run.side_effect = lambda: log.info('Squashing image')
+                    with contextlib.redirect_stdout(stdout):
+                        mgr.build_base_image()
+        self.assertIn('Squashing image', stdout.getvalue())
+        self.assertIn('Squashed full base image', stdout.getvalue())
+        self.assertEqual(log.handlers, handlers)
+
+        # the output of processes on the host is printed to `sys.stdout`
+        stdout = io.StringIO()
+        with contextlib.redirect_stdout(stdout):
+            mgr.run_process_on_host(['sh', '-c', 'echo out; echo err >&2'])
+        self.assertEqual(stdout.getvalue(), 'out\nerr\n')
+        with self.assertRaises(subprocess.CalledProcessError):
+            with contextlib.redirect_stdout(io.StringIO()):
+                mgr.run_process_on_host(['sh', '-c', 'exit 1'])
+
+    def test_build_image_from_slim_base_image(self):
+        mgr = self.mgr
+        config = mgr.config['base_image']
+        self.client.add_image([config['repo'] + ':' + config['tags'][0]],
+                              labels={mgr.BASE_IMAGE_PROFILE_LABEL: 'slim'})
+        with self.assertRaisesRegex(wc_env_manager.WcEnvManagerError, 'must be built from a full base image'):
+            mgr.build_image()
+
+    def test_build_base_image_requirements_tiers(self):
+        mgr = self.mgr
+        contexts = []
+
+        def build_image(image_repo, image_tags, dockerfile_path, build_args, context_path, **kwargs):
+            context = {}
+            for tier in ['pinned', 'unpinned', 'git']:
+                with open(os.path.join(context_path, 'requirements.{}.txt'.format(tier)), 'r') as file:
+                    context[tier] = file.read()
+                with open(os.path.join(context_path, 'constraints.{}.txt'.format(tier)), 'r') as file:
+                    context[tier + '_constraints'] = file.read()
+            with open(dockerfile_path, 'r') as file:
+                context['Dockerfile'] = file.read()
+            contexts.append(context)
+
+        reqs = ['git+https://github.com/KarrLab/wc_utils.git#egg=wc_utils', 'numpy == 1.18.1', 'pandas', 'scipy >= 1.4']
+        with mock.patch.object(mgr, 'get_required_python_packages', return_value=reqs):
+            with mock.patch.object(mgr, '_build_image', side_effect=build_image):
+                mgr.build_base_image(target='final')
+
+        context = contexts[0]
+        self.assertEqual(context['pinned'], 'numpy == 1.18.1')
+        self.assertEqual(context['unpinned'], 'pandas\nscipy >= 1.4')
+        self.assertEqual(context['git'], 'git+https://github.com/KarrLab/wc_utils.git#egg=wc_utils')
+
+        # each tier is installed with the constraints of the previous tiers
+        self.assertEqual(context['pinned_constraints'], '')
+        self.assertEqual(context['unpinned_constraints'], 'numpy == 1.18.1')
+        self.assertEqual(context['git_constraints'], 'numpy == 1.18.1\npandas\nscipy >= 1.4')
+        self.assertIn('install -c /tmp/constraints.unpinned.txt -r /tmp/requirements.unpinned.txt', context['Dockerfile'])
+        self.assertIn('install -c /tmp/constraints.git.txt -r /tmp/requirements.git.txt', context['Dockerfile'])
+        self.assertLess(context['Dockerfile'].index('COPY requirements.pinned.txt'),
+                        context['Dockerfile'].index('COPY requirements.unpinned.txt'))
+        self.assertLess(context['Dockerfile'].index('COPY requirements.unpinned.txt'),
+                        context['Dockerfile'].index('COPY requirements.git.txt'))
+
+    def test_get_base_image_layer_order(self):
+        mgr = self.mgr
+        temp_dir_name = tempfile.mkdtemp()
+        mgr.config['base_image']['build_history_path'] = os.path.join(temp_dir_name, 'history.json')
+
+        history = wc_env_manager.layer_order.BuildHistory(mgr.config['base_image']['build_history_path'])
+        history.add('latest', {'Install Python packages': 'a', 'install cplex': 'b'})
+        history.add('latest', {'Install Python packages': 'a2', 'install cplex': 'b'})
+        history.add('latest', {'Install Python packages': 'a3', 'install cplex': 'b'})
+
+        proposal = mgr.get_base_image_layer_order()
+        self.assertEqual(proposal.n_builds, 2)
+        self.assertEqual(proposal.change_counts, {'Install Python packages': 2})
+        # the ETE3 package, which depends on the Python packages, is kept after them
+        self.assertEqual(proposal.proposed_order[-2:],
+                         ['Install Python packages', 'Install NCBI taxonomy database and ETE3 package'])
+        self.assertNotEqual(proposal.current_order[-2], 'Install Python packages')
+        self.assertLess(proposal.proposed_order.index('install cplex'),
+                        proposal.proposed_order.index('Install Python packages'))
+        self.assertLess(proposal.proposed_rebuilt, proposal.current_rebuilt)
+
+        # apply the proposed order to builds
+        dockerfiles = []
+
+        def build_image(image_repo, image_tags, dockerfile_path, build_args, context_path, **kwargs):
+            with open(dockerfile_path, 'r') as file:
+                dockerfiles.append(file.read())
+
+        mgr.config['base_image']['reorder_layers'] = True
+        with mock.patch.object(mgr, 'get_required_python_packages', return_value=['numpy']):
+            with mock.patch.object(mgr, '_build_image', side_effect=build_image):
+                mgr.build_base_image(target='final')
+        self.assertLess(dockerfiles[0].index('# Save image tag to file'),
+                        dockerfiles[0].index('# Install Python packages'))
+        self.assertLess(dockerfiles[0].index('# Install Python packages'),
+                        dockerfiles[0].index('# Install NCBI taxonomy database and ETE3 package'))
+        self.assertLess(dockerfiles[0].index('# Install NCBI taxonomy database and ETE3 package'),
+                        dockerfiles[0].index('# end reorderable sections'))
+
+        mgr.config['base_image']['build_history_path'] = None
+        with self.assertRaisesRegex(wc_env_manager.WcEnvManagerError, 'must be configured'):
+            mgr.get_base_image_layer_order()
+
+        shutil.rmtree(temp_dir_name)
+
+    def test_lock_python_requirements(self):
+        mgr = self.mgr
+        temp_dir_name = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, temp_dir_name)
+        python_version = '.'.join(mgr.config['base_image']['build_args']['python_version'].split('.')[0:2])
+
+        with self.assertRaisesRegex(wc_env_manager.WcEnvManagerError, 'must be configured'):
+            mgr.lock_python_requirements()
+
+        mgr.config['base_image']['lock_path'] = os.path.join(temp_dir_name,
+                                                             'requirements.py{python_version_major_minor}.lock')
+        lock_path = os.path.join(temp_dir_name, 'requirements.py{}.lock'.format(python_version))
+        self.assertEqual(mgr.get_python_requirements_lock_path(), lock_path)
+        self.assertEqual(mgr.get_base_image_build_args()['locked'], '')
+
+        reqs = ['git+https://github.com/KarrLab/wc_utils.git#egg=wc_utils', 'numpy']
+        revisions = {'git+https://github.com/KarrLab/wc_utils.git#egg=wc_utils': 'a' * 40}
+        lock = (b'git+https://github.com/KarrLab/wc_utils.git@' + b'a' * 40 + b'#egg=wc_utils\n'
+                b'    # via -r /tmp/requirements.in\n'
+                b'numpy==1.18.1 \\\n'
+                b'    --hash=sha256:1111 \\\n'
+                b'    --hash=sha256:2222\n'
+                b'    # via -r /tmp/requirements.in\n')
+        with mock.patch.object(mgr, 'get_required_python_packages', return_value=reqs):
+            with mock.patch.object(mgr, 'get_python_package_revisions', return_value=revisions):
+                with mock.patch.object(self.client.containers, 'run', return_value=lock) as run:
+                    self.assertEqual(mgr.lock_python_requirements(), lock_path)
+                with mock.patch.object(self.client.containers, 'run',
+                                       side_effect=docker.errors.ContainerError(None, 1, 'sh', None, b'No match')):
+                    with self.assertRaisesRegex(wc_env_manager.WcEnvManagerError, 'could not be resolved:\n  No match'):
+                        mgr.lock_python_requirements()
+
+        self.assertEqual(run.call_args[0][0], 'python:' + python_version)
+        script = run.call_args[0][1][2]
+        self.assertIn('\ngit+https://github.com/KarrLab/wc_utils.git@' + 'a' * 40 + '#egg=wc_utils\nnumpy\n', script)
+        self.assertIn('pip-compile --quiet --generate-hashes', script)
+        with open(lock_path, 'r') as file:
+            self.assertEqual(wc_env_manager.core.parse_python_requirements_lock(file.read()), [
+                'git+https://github.com/KarrLab/wc_utils.git@' + 'a' * 40 + '#egg=wc_utils',
+                'numpy==1.18.1 --hash=sha256:1111 --hash=sha256:2222',
+            ])
+
+        # builds install the locked requirements without resolving their dependencies
+        contexts = []
+
+        def build_image(image_repo, image_tags, dockerfile_path, build_args, context_path, **kwargs):
+            context = {}
+            for tier in ['pinned', 'git']:
+                with open(os.path.join(context_path, 'requirements.{}.txt'.format(tier)), 'r') as file:
+                    context[tier] = file.read()
+            with open(dockerfile_path, 'r') as file:
+                context['Dockerfile'] = file.read()
+            contexts.append(context)
+
+        with open(lock_path, 'r') as file:
+            self.assertEqual(wc_env_manager.core.get_python_requirements_lock_digest(file.read()),
+                             wc_env_manager.core.get_python_requirements_digest(list(reversed(reqs))))
+        self.assertEqual(wc_env_manager.core.get_python_requirements_lock_digest('numpy==1.18.1\n'), None)
+
+        self.assertEqual(mgr.get_base_image_build_args()['locked'], 'True')
+        with mock.patch.object(mgr, 'get_required_python_packages', return_value=reqs):
+            with mock.patch.object(mgr, '_build_image', side_effect=build_image):
+                with mock.patch.object(self.client.containers, 'run') as run:
+                    mgr.build_base_image(target='final')
+        run.assert_not_called()
+        self.assertEqual(contexts[0]['pinned'], 'numpy==1.18.1 --hash=sha256:1111 --hash=sha256:2222')
+        self.assertEqual(contexts[0]['git'], 'git+https://github.com/KarrLab/wc_utils.git@' + 'a' * 40 + '#egg=wc_utils')
+        self.assertIn('install --no-deps --require-hashes -r /tmp/requirements.pinned.txt', contexts[0]['Dockerfile'])
+        self.assertIn('install --no-deps -r /tmp/requirements.git.txt', contexts[0]['Dockerfile'])
+
+        # builds lock the requirements again when they no longer match the lock
+        relock = lock.replace(b'numpy==1.18.1', b'numpy==1.18.2') + b'scipy==1.4.1 \\\n    --hash=sha256:3333\n'
+        reqs = reqs + ['scipy']
+        with mock.patch.object(mgr, 'get_required_python_packages', return_value=reqs):
+            with mock.patch.object(mgr, 'get_python_package_revisions', return_value=revisions):
+                with mock.patch.object(mgr, '_build_image', side_effect=build_image):
+                    with mock.patch.object(self.client.containers, 'run', return_value=relock) as run:
+                        with self.assertWarnsRegex(UserWarning, 'is out of date'):
+                            mgr.build_base_image(target='final')
+        run.assert_called_once()
+        self.assertEqual(contexts[1]['pinned'], 'numpy==1.18.2 --hash=sha256:1111 --hash=sha256:2222\n'
+                                                'scipy==1.4.1 --hash=sha256:3333')
+        with open(lock_path, 'r') as file:
+            self.assertEqual(wc_env_manager.core.get_python_requirements_lock_digest(file.read()),
+                             wc_env_manager.core.get_python_requirements_digest(reqs))
+
+    def test_get_base_image_slim_report(self):
+        mgr = self.mgr
+        with mock.patch.object(self.client.containers, 'run', return_value=b'size_before=300\nsize_after=100\n'):
+            self.assertEqual(mgr.get_base_image_slim_report(self.image), {'size_before': 300, 'size_after': 100})
+        with mock.patch.object(self.client.containers, 'run',
+                               side_effect=docker.errors.ContainerError(None, 1, 'cat', None, b'No such file')):
+            self.assertEqual(mgr.get_base_image_slim_report(self.image), None)
+
+    def test_get_python_variant(self):
+        mgr = self.mgr
+        base_tags = list(mgr.config['base_image']['tags'])
+        variant = mgr.get_python_variant('3.8.2')
+
+        self.assertEqual(variant.config['base_image']['tags'], [tag + '-py3.8' for tag in base_tags])
+        self.assertEqual(variant.config['base_image']['build_args']['python_version'], '3.8.2')
+        self.assertEqual(variant.config['base_image']['build_args']['python_version_major_minor'], '3.8')
+        self.assertEqual(variant.config['image']['tags'][0], mgr.config['image']['tags'][0] + '-py3.8')
+        self.assertEqual(variant.config['image']['python_version'], '3.8')
+        self.assertEqual(variant._image, None)
+        self.assertIs(variant._docker_client, mgr._docker_client)
+
+        # the configuration of the manager is unchanged
+        self.assertEqual(mgr.config['base_image']['tags'], base_tags)
+
+    def test_build_matrix(self):
+        mgr = self.mgr
+        builds = []
+
+        def build_base_image(variant, target=None):
+            if target:
+                builds.append(('shared', target))
+                return None
+            time.sleep(0.1)
+            builds.append(('base_image', variant.config['base_image']['build_args']['python_version']))
+            if variant.config['image']['python_version'] == '3.9':
+                raise wc_env_manager.WcEnvManagerError('Python 3.9 is not supported')
+            return variant.config['base_image']['tags'][0]
+
+        def build_image(variant):
+            time.sleep(0.1)
+            builds.append(('image', variant.config['image']['python_version']))
+            return variant.config['image']['tags'][0]
+
+        with mock.patch.object(wc_env_manager.core.WcEnvManager, 'build_base_image', autospec=True,
+                               side_effect=build_base_image):
+            with mock.patch.object(wc_env_manager.core.WcEnvManager, 'build_image', autospec=True,
+                                   side_effect=build_image):
+                report = mgr.build_matrix(['3.7.6', '3.8.2', '3.9.0'])
+
+        self.assertEqual(builds[0], ('shared', mgr.BASE_IMAGE_SHARED_STAGE))
+        self.assertEqual(sorted(builds[1:]), [
+            ('base_image', '3.7.6'), ('base_image', '3.8.2'), ('base_image', '3.9.0'),
+            ('image', '3.7'), ('image', '3.8'),
+        ])
+        self.assertLess(report.duration, 0.4)
+        self.assertEqual([result.python_version for result in report.results], ['3.7.6', '3.8.2', '3.9.0'])
+        self.assertEqual(report.results[1].image, mgr.config['image']['tags'][0] + '-py3.8')
+        self.assertGreaterEqual(report.results[1].duration, 0.2)
+        self.assertEqual(report.results[0].error, None)
+        self.assertEqual(report.results[2].image, None)
+        self.assertRegex(str(report.results[2].error), 'not supported')
+
+    def test_cache_volumes(self):
+        mgr = self.mgr
+        mgr.config['container']['cache_volumes'] = {
+            'wc_pip_cache': {'bind': '/root/.cache/pip', 'mode': 'rw'},
+            'wc_ete3_cache': {'bind': '/root/.etetoolkit', 'mode': 'ro'},
+        }
+
+        container = mgr.build_container()
+        self.assertEqual(container.attrs['HostConfig']['volumes']['wc_pip_cache'],
+                         {'bind': '/root/.cache/pip', 'mode': 'rw'})
+        self.assertEqual(container.attrs['HostConfig']['volumes']['wc_ete3_cache'],
+                         {'bind': '/root/.etetoolkit', 'mode': 'ro'})
+        self.assertEqual(sorted(volume.name for volume in self.client.volumes.list()),
+                         ['wc_ete3_cache', 'wc_pip_cache'])
+        self.assertEqual(self.client.volumes.get('wc_pip_cache').attrs['Labels'],
+                         {mgr.CACHE_VOLUME_LABEL: '/root/.cache/pip'})
+
+        # the volumes are shared with subsequent containers
+        self.client.calls.clear()
+        mgr.config['container']['name_format'] = 'wc_env-2'
+        container_2 = mgr.build_container()
+        self.assertEqual(self.client.calls['volumes.create'], 0)
+
+        with self.assertRaisesRegex(wc_env_manager.WcEnvManagerError, 'could not be removed'):
+            mgr.remove_cache_volumes()
+        container.remove(force=True)
+        container_2.remove(force=True)
+        mgr.remove_cache_volumes()
+        self.assertEqual(self.client.volumes.list(), [])
+
+    def test_analyze_image(self):
+        mgr = self.mgr
+        image = self.client.add_image(['karrlab/wc_env:0.0.2'], layers=[
+            wc_env_manager.fake_docker.make_layer({'usr/lib/libx.so': b'x' * 100, 'tmp/solver.tgz': b's' * 20}),
+            wc_env_manager.fake_docker.make_layer({'usr/lib/libx.so': b'x' * 110}),
+        ])
+
+        analysis = mgr.analyze_image('karrlab/wc_env:0.0.2')
+        self.assertEqual(analysis.image, image.id)
+        self.assertEqual(analysis.size, 130)
+        self.assertEqual(analysis.wasted_bytes, 100)
+        self.assertEqual(analysis.get_build_artifacts(), [('/tmp/solver.tgz', 20, 'temporary file')])
+
+        image.attrs['RootFS']['Layers'].append('sha256:' + '0' * 64)
+        with self.assertRaisesRegex(wc_env_manager.WcEnvManagerError, 'could not be analyzed'):
+            mgr.analyze_image(image)
+
+    def test_collect_garbage(self):
+        mgr = self.mgr
+        repo = mgr.config['image']['repo']
+        old_image = self.client.add_image([repo + ':0.0.1'], size=10)
+        used_image = self.client.add_image([repo + ':0.0.2', 'other/repo:0.0.2'], size=10)
+        built_image = self.client.add_image([], size=10, labels={mgr.IMAGE_REPO_LABEL: repo})
+        child_image = self.client.add_image([], size=10)
+        self.client._images[child_image.id]['Parent'] = self.image.id
+        pulled_image = self.client.add_image([], size=10)
+        self.client._images[pulled_image.id]['RepoDigests'] = [repo + '@sha256:' + '0' * 64]
+        other_image = self.client.add_image([], size=10, labels={mgr.IMAGE_REPO_LABEL: 'other/repo'})
+
+        report = mgr.collect_garbage(keep_versions=0, dry_run=True)
+        self.assertEqual(set(image['image'].id for image in report.images),
+                         set([old_image.id, used_image.id, built_image.id, child_image.id, pulled_image.id]))
+
+        # images are removed without force, and images which are still used are skipped
+        self.client.add_container(old_image.id, name='new_container')
+        remove_image = self.client.images.remove
+
+        def remove(image, **kwargs):
+            if image == pulled_image.id:
+                raise docker.errors.APIError('Image {} is being used by a container'.format(image))
+            return remove_image(image, **kwargs)
+        with mock.patch.object(self.client.images, 'remove', side_effect=remove) as remove_mock:
+            report = mgr.collect_garbage(keep_versions=0)
+        for call in remove_mock.call_args_list:
+            self.assertNotIn('force', call[1])
+        self.assertEqual(set(image['image'].id for image in report.images),
+                         set([used_image.id, built_image.id, child_image.id]))
+        self.assertEqual(self.client.images.get(pulled_image.id).id, pulled_image.id)
+        self.assertEqual(self.client.images.get(old_image.id).tags, [repo + ':0.0.1'])
+        self.assertEqual(self.client.images.get(used_image.id).tags, ['other/repo:0.0.2'])
+        self.assertEqual(self.client.images.get(other_image.id).id, other_image.id)
+        self.assertEqual(self.client.images.get(self.image.id).id, self.image.id)
+
+    def test_push_watched_paths(self):
+        mgr = self.mgr
+        mgr.build_container()
+
+        local_dir_name = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, local_dir_name)
+        for dir_name in ['old', 'new']:
+            os.mkdir(os.path.join(local_dir_name, dir_name))
+            with open(os.path.join(local_dir_name, dir_name, 'a.txt'), 'w') as file:
+                file.write('a')
+        root = {'host': local_dir_name, 'container': '/tmp/watch', 'exclude': []}
+        os.makedirs(self.client.get_host_path('/tmp/watch'))
+
+        # modified directories are not walked
+        report = wc_env_manager.core.SyncReport(wc_env_manager.core.SyncDirection.to_container)
+        mgr._push_watched_paths(root, set([os.path.join(local_dir_name, 'old')]), report)
+        self.assertEqual(report.files_transferred, [])
+
+        # created and moved directories are walked
+        new_dir_name = os.path.join(local_dir_name, 'new')
+        mgr._push_watched_paths(root, set([new_dir_name, os.path.join(local_dir_name, 'removed')]), report,
+                                dirs=set([new_dir_name]))
+        self.assertEqual(report.files_transferred, ['new/a.txt'])
+        self.assertEqual(report.files_deleted, ['removed'])
+        self.assertTrue(os.path.isfile(self.client.get_host_path('/tmp/watch/new/a.txt')))
+        self.assertFalse(os.path.isfile(self.client.get_host_path('/tmp/watch/old/a.txt')))
+
+    def test_retrieve_path(self):
+        mgr = self.mgr
+        self.client.exec_handler = wc_env_manager.fake_docker.run_on_host
+        self.client.root = '/'
+        container_dirname = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, container_dirname)
+        mgr.build_container()
+
+        with open(os.path.join(container_dirname, 'a.h5'), 'wb') as file:
+            file.write(b'\0' * 100000)
+        with open(os.path.join(container_dirname, 'b.csv'), 'w') as file:
+            file.write('1,2\n')
+
+        for codec in ['none', 'gzip', 'xz']:
+            local_dirname = tempfile.mkdtemp()
+            self.addCleanup(shutil.rmtree, local_dirname)
+            report = mgr.retrieve_path(container_dirname, local_dirname, codec=codec)
+            self.assertEqual(report.files, ['a.h5', 'b.csv'])
+            self.assertEqual(report.bytes_uncompressed, 100004)
+            if codec == 'none':
+                self.assertGreater(report.bytes_compressed, 100004)
+            else:
+                self.assertLess(report.bytes_compressed, 10000)
+            with open(os.path.join(local_dirname, 'b.csv'), 'r') as file:
+                self.assertEqual(file.read(), '1,2\n')
+
+        # the archive is streamed rather than written within the container
+        self.assertEqual(sorted(os.listdir(container_dirname)), ['a.h5', 'b.csv'])
+        self.assertEqual(self.client.calls['containers.get_archive'], 0)
+
+    def test_tmpfs(self):
+        mgr = self.mgr
+        self.client.exec_handler = wc_env_manager.fake_docker.run_on_host
+        self.client.root = '/'
+        scratch_dirname = tempfile.mkdtemp()
+        local_dirname = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, scratch_dirname)
+        self.addCleanup(shutil.rmtree, local_dirname)
+        mgr.config['container']['tmpfs'] = {
+            scratch_dirname: {'size': '1 KiB', 'options': ['mode=1777']},
+        }
+        self.assertEqual(mgr.get_container_tmpfs(), {scratch_dirname: 'size=1024,mode=1777'})
+
+        container = mgr.build_container()
+        self.assertEqual(container.attrs['HostConfig']['tmpfs'], {scratch_dirname: 'size=1024,mode=1777'})
+
+        os.mkdir(os.path.join(scratch_dirname, 'checkpoints'))
+        with open(os.path.join(scratch_dirname, 'checkpoints', '1.h5'), 'w') as file:
+            file.write('checkpoint')
+        with open(os.path.join(scratch_dirname, 'log.txt'), 'w') as file:
+            file.write('log')
+
+        reports = mgr.flush_tmpfs(local_dirname, include=['*.h5'])
+        self.assertEqual(list(reports.keys()), [scratch_dirname])
+        self.assertEqual(reports[scratch_dirname].files, ['checkpoints/1.h5'])
+        with open(os.path.join(local_dirname, scratch_dirname.lstrip('/'), 'checkpoints', '1.h5'), 'r') as file:
+            self.assertEqual(file.read(), 'checkpoint')
+        self.assertFalse(os.path.isfile(os.path.join(local_dirname, scratch_dirname.lstrip('/'), 'log.txt')))
+
+        with self.assertRaisesRegex(wc_env_manager.WcEnvManagerError, 'is not a tmpfs mount'):
+            mgr.flush_tmpfs(local_dirname, container_paths=['/root'])
+
+    def test_get_python_package_revisions(self):
+        mgr = self.mgr
+        mgr.build_container()
+        self.client.exec_handler.outputs.append(('*rev-parse HEAD*', 0, b'0123abcd\n4567efab  -\n'))
+        with mock.patch('requests.get') as get:
+            revisions = mgr.get_python_package_revisions([
+                'numpy==1.18.1', 'pint [numpy] == 0.10', '-e /root/host/wc_utils'])
+        get.assert_not_called()
+        self.assertEqual(revisions, {
+            'numpy==1.18.1': '1.18.1',
+            'pint [numpy] == 0.10': '0.10',
+            '-e /root/host/wc_utils': '0123abcd 4567efab',
+        })
+        cmd = [cmd for _, cmd in self.client.exec_handler.commands if 'rev-parse' in ' '.join(cmd)][0]
+        self.assertIn('status --porcelain', cmd[2])
+        self.assertEqual(cmd[3], '/root/host/wc_utils')
+
+    def test_setup_container_without_upgrade(self):
+        mgr = self.mgr
+        mgr.build_container()
+        mgr.config['container']['python_packages'] = 'numpy'
+        os.makedirs(self.client.get_host_path(os.path.dirname(mgr.PYTHON_PACKAGE_REVISIONS_PATH)))
+        with mock.patch.object(mgr, 'get_python_package_revisions') as get_python_package_revisions:
+            mgr.setup_container()
+        get_python_package_revisions.assert_not_called()
+
+    def test_run_in_containers(self):
+        mgr = self.mgr
+        self.client.exec_handler.outputs.append(('pip freeze', 0, b'numpy==1.18.1\nscipy==1.4.1\n'))
+        containers = []
+        for i_container in range(4):
+            containers.append(self.client.add_container(
+                mgr._image.id, name='wc_env-2020-01-01-00-00-0{}'.format(i_container), running=True))
+        self.client.add_container(mgr._image.id, name='wc_env-2020-01-01-00-00-04', running=False)
+        self.client.set_latency('api.exec_start', 0.1)
+
+        lines = []
+        results = mgr.run_in_containers(['pip', 'freeze'], max_concurrency=4,
+                                        on_output=lambda container, line: lines.append((container, line)))
+        self.assertEqual(self.client.max_concurrency['api.exec_start'], 4)
+        self.assertEqual([result.container for result in results], [container.name for container in containers])
+        for result in results:
+            self.assertEqual(result.error, None)
+            self.assertEqual(result.result.exit_code, 0)
+            self.assertEqual(result.result.output, 'numpy==1.18.1\nscipy==1.4.1\n')
+            self.assertFalse(result.result.truncated)
+            self.assertGreaterEqual(result.duration, 0.1)
+        self.assertEqual(sorted(lines), sorted([(container.name, 'numpy==1.18.1') for container in containers] +
+                                               [(container.name, 'scipy==1.4.1') for container in containers]))
+
+        # truncated output, exit codes, and errors
+        self.client.exec_handler.outputs.insert(0, ('false', 1, b'error\n'))
+        self.client.inject_failure('api.exec_create', count=1)
+        results = mgr.run_in_containers('false', containers=containers[0:2], max_output=3)
+        self.assertEqual(len([result for result in results if result.error]), 1)
+        result = next(result for result in results if result.error is None)
+        self.assertEqual(result.result.exit_code, 1)
+        self.assertEqual(result.result.output, 'or\n')
+        self.assertTrue(result.result.truncated)
+
 
 @unittest.skipIf(whichcraft.which('docker') is None, 'Test requires Docker and Docker isn''t installed.')
 class WcEnvHostTestCase(unittest.TestCase):
@@ -825,6 +1910,99 @@ class FullWcEnvTestCase(unittest.TestCase):
             self.assertRegex(capture_output.get_text(), r'usage: wc-cli \[\-h\]')
 
 
+class ParseDurationTestCase(unittest.TestCase):
+    def test(self):
+        self.assertEqual(wc_env_manager.core.parse_duration('30s'), datetime.timedelta(seconds=30))
+        self.assertEqual(wc_env_manager.core.parse_duration('1.5h'), datetime.timedelta(minutes=90))
+        self.assertEqual(wc_env_manager.core.parse_duration(' 7d '), datetime.timedelta(days=7))
+        self.assertEqual(wc_env_manager.core.parse_duration('2w'), datetime.timedelta(days=14))
+        with self.assertRaisesRegex(wc_env_manager.WcEnvManagerError, 'must be a number'):
+            wc_env_manager.core.parse_duration('7 days')
+
+
+class PathMatchesPatternsTestCase(unittest.TestCase):
+    def test(self):
+        exclude = ['.git', '__pycache__', '*.pyc', 'docs/_build']
+        self.assertFalse(wc_env_manager.core.path_matches_patterns('pkg/core.py', exclude))
+        self.assertTrue(wc_env_manager.core.path_matches_patterns('pkg/__pycache__/core.cpython-37.pyc', exclude))
+        self.assertTrue(wc_env_manager.core.path_matches_patterns('.git/HEAD', exclude))
+        self.assertTrue(wc_env_manager.core.path_matches_patterns('core.pyc', exclude))
+        self.assertTrue(wc_env_manager.core.path_matches_patterns('docs/_build', exclude))
+        self.assertTrue(wc_env_manager.core.path_matches_patterns('docs/_build/index.html', exclude))
+        self.assertFalse(wc_env_manager.core.path_matches_patterns('pkg/docs/_build/index.html', exclude))
+        self.assertFalse(wc_env_manager.core.path_matches_patterns('pkg/core.py', None))
+
+
+class PartitionPythonRequirementsTestCase(unittest.TestCase):
+    def test(self):
+        tiers = wc_env_manager.core.partition_python_requirements([
+            'git+https://github.com/KarrLab/wc_utils.git#egg=wc_utils',
+            'log >= 2016.10.12',
+            'numpy == 1.18.1',
+            'pandas==1.*',
+            'scipy',
+            'sympy >= 1.4, == 1.5',
+            'tables[all]===3.6.1 ; python_version < "3.8"',
+        ])
+        self.assertEqual(list(tiers.keys()), ['pinned', 'unpinned', 'git'])
+        self.assertEqual(tiers['pinned'], ['numpy == 1.18.1', 'tables[all]===3.6.1 ; python_version < "3.8"'])
+        self.assertEqual(tiers['unpinned'], ['log >= 2016.10.12', 'pandas==1.*', 'scipy', 'sympy >= 1.4, == 1.5'])
+        self.assertEqual(tiers['git'], ['git+https://github.com/KarrLab/wc_utils.git#egg=wc_utils'])
+
+    def test_get_python_requirements_constraints(self):
+        self.assertEqual(wc_env_manager.core.get_python_requirements_constraints([
+            'git+https://github.com/KarrLab/wc_utils.git#egg=wc_utils',
+            'numpy==1.18.1 --hash=sha256:1111 --hash=sha256:2222',
+            'scipy >= 1.4',
+            'tables[all]===3.6.1 ; python_version < "3.8"',
+        ]), [
+            'numpy==1.18.1',
+            'scipy >= 1.4',
+            'tables===3.6.1 ; python_version < "3.8"',
+        ])
+
+
+class ParsePythonRequirementsLockTestCase(unittest.TestCase):
+    def test(self):
+        lock = '\n'.join([
+            '# Python requirements of the base image',
+            'git+https://github.com/KarrLab/wc_utils.git@0123#egg=wc_utils  # via -r requirements.in',
+            'numpy==1.18.1 \\',
+            '    --hash=sha256:1111 \\',
+            '    --hash=sha256:2222',
+            '    # via',
+            '    #   pandas',
+            'six==1.14.0 ; python_version < "3.8" \\',
+            '    --hash=sha256:3333',
+        ])
+        self.assertEqual(wc_env_manager.core.parse_python_requirements_lock(lock), [
+            'git+https://github.com/KarrLab/wc_utils.git@0123#egg=wc_utils',
+            'numpy==1.18.1 --hash=sha256:1111 --hash=sha256:2222',
+            'six==1.14.0 ; python_version < "3.8" --hash=sha256:3333',
+        ])
+        tiers = wc_env_manager.core.partition_python_requirements(
+            wc_env_manager.core.parse_python_requirements_lock(lock))
+        self.assertEqual(len(tiers['pinned']), 2)
+        self.assertEqual(tiers['unpinned'], [])
+        self.assertEqual(len(tiers['git']), 1)
+
+
+class ParseFormatSizeTestCase(unittest.TestCase):
+    def test_parse_size(self):
+        self.assertEqual(wc_env_manager.core.parse_size('512'), 512)
+        self.assertEqual(wc_env_manager.core.parse_size('1.5 kB'), 1500)
+        self.assertEqual(wc_env_manager.core.parse_size('100GB'), 100 * 1000 ** 3)
+        self.assertEqual(wc_env_manager.core.parse_size('2GiB'), 2 * 1024 ** 3)
+        self.assertEqual(wc_env_manager.core.parse_size('1T'), 1000 ** 4)
+        with self.assertRaisesRegex(wc_env_manager.WcEnvManagerError, 'must be a number'):
+            wc_env_manager.core.parse_size('many bytes')
+
+    def test_format_size(self):
+        self.assertEqual(wc_env_manager.core.format_size(512), '512.0 B')
+        self.assertEqual(wc_env_manager.core.format_size(1500000), '1.5 MB')
+        self.assertEqual(wc_env_manager.core.format_size(2 * 1000 ** 5), '2000.0 TB')
+
+
 class ExampleTestCase(unittest.TestCase):
     def test(self):
         self.assertTrue(True)
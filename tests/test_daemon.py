@@ -0,0 +1,159 @@
+""" Tests for wc_env_manager.daemon
+
+:Author: Jonathan Karr <jonrkarr@gmail.com>
+:Date: 2020-02-12
+:Copyright: 2020, Karr Lab
+:License: MIT
+"""
+
+import io
+import mock
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+import unittest
+import wc_env_manager.daemon
+
+
+class DaemonTestCase(unittest.TestCase):
+    def setUp(self):
+        self.dirname = tempfile.mkdtemp()
+        self.socket_path = os.path.join(self.dirname, 'wc_env_manager.sock')
+
+        patcher = mock.patch('wc_env_manager.core.WcEnvManager')
+        self.WcEnvManager = patcher.start()
+        self.addCleanup(patcher.stop)
+        self.WcEnvManager.return_value.config = {}
+        self.WcEnvManager.return_value.get_image_version.return_value = '1.2.3'
+
+        self.daemon = wc_env_manager.daemon.Daemon(socket_path=self.socket_path)
+        self.thread = threading.Thread(target=self.daemon.serve_forever)
+        self.thread.start()
+        while not os.path.exists(self.socket_path):
+            time.sleep(0.01)
+
+    def tearDown(self):
+        self.daemon.shutdown()
+        self.thread.join()
+        shutil.rmtree(self.dirname)
+
+    def run_in_daemon(self, argv):
+        stdout = io.StringIO()
+        stderr = io.StringIO()
+        exit_code = wc_env_manager.daemon.run_in_daemon(argv, socket_path=self.socket_path,
+                                                        stdout=stdout, stderr=stderr)
+        return exit_code, stdout.getvalue(), stderr.getvalue()
+
+    def test_run_in_daemon(self):
+        self.assertTrue(wc_env_manager.daemon.is_running(socket_path=self.socket_path))
+
+        self.assertEqual(self.run_in_daemon(['image', 'version']), (0, '1.2.3\n', ''))
+        self.assertEqual(self.WcEnvManager.call_count, 1)
+        self.assertEqual(self.WcEnvManager.return_value.refresh_state.call_count, 0)
+
+        # the manager is reused
+        self.assertEqual(self.run_in_daemon(['image', 'version']), (0, '1.2.3\n', ''))
+        self.assertEqual(self.WcEnvManager.call_count, 1)
+        self.assertEqual(self.WcEnvManager.return_value.refresh_state.call_count, 1)
+
+        # the manager is recreated when the configuration changes
+        with mock.patch.dict(os.environ, {'CONFIG__DOT__wc_env_manager__DOT__verbose': 'False'}):
+            self.assertEqual(self.run_in_daemon(['image', 'version'])[0], 0)
+        self.assertEqual(self.WcEnvManager.call_count, 2)
+        self.assertNotIn('CONFIG__DOT__wc_env_manager__DOT__verbose', os.environ)
+
+        # errors
+        exit_code, _, stderr = self.run_in_daemon(['undefined-command'])
+        self.assertEqual(exit_code, 2)
+        self.assertIn('invalid choice', stderr)
+
+        self.WcEnvManager.return_value.get_image_version.side_effect = Exception('Image not found')
+        exit_code, _, stderr = self.run_in_daemon(['image', 'version'])
+        self.assertEqual(exit_code, 1)
+        self.assertIn('Image not found', stderr)
+
+    def test_concurrent_requests(self):
+        running = threading.Event()
+        release = threading.Event()
+
+        def get_image_version(*args, **kwargs):
+            running.set()
+            release.wait(5.)
+            return '1.2.3'
+        self.WcEnvManager.return_value.get_image_version.side_effect = get_image_version
+
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(self.run_in_daemon(['image', 'version'])))
+                   for i_thread in range(2)]
+        threads[0].start()
+        self.assertTrue(running.wait(5.))
+        threads[1].start()
+
+        # the status is answered while a command runs
+        self.assertEqual(self.run_in_daemon(['daemon', 'status'])[0], 0)
+
+        # the commands are executed one at a time
+        time.sleep(0.1)
+        self.assertEqual(self.WcEnvManager.return_value.get_image_version.call_count, 1)
+        release.set()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(results, [(0, '1.2.3\n', '')] * 2)
+        self.assertEqual(self.WcEnvManager.return_value.get_image_version.call_count, 2)
+
+    def test_concurrent_responses(self):
+        lines = ['{}:{}\n'.format(i_thread, str(i_thread) * 2 ** 16) for i_thread in range(8)]
+
+        def write(line):
+            for i_line in range(10):
+                sys.stdout.write(line)
+
+        def get_image_version(*args, **kwargs):
+            threads = [threading.Thread(target=write, args=(line,)) for line in lines]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            return '1.2.3'
+        self.WcEnvManager.return_value.get_image_version.side_effect = get_image_version
+
+        # every response which the client receives parses
+        responses = list(wc_env_manager.daemon.send_request({'argv': ['image', 'version']},
+                                                            socket_path=self.socket_path))
+        self.assertEqual(responses[-1], {'exit_code': 0})
+        data = [response['data'] for response in responses[0:-1]]
+        self.assertEqual(sorted(data), sorted(lines * 10 + ['1.2.3', '\n']))
+
+    def test_status_stop(self):
+        exit_code, stdout, _ = self.run_in_daemon(['daemon', 'status'])
+        self.assertEqual(exit_code, 0)
+        self.assertIn(self.socket_path, stdout)
+
+        self.assertEqual(self.run_in_daemon(['daemon', 'stop']), (0, '', ''))
+        self.thread.join()
+        self.assertFalse(os.path.exists(self.socket_path))
+        self.assertFalse(wc_env_manager.daemon.is_running(socket_path=self.socket_path))
+        self.assertEqual(self.run_in_daemon(['image', 'version']), (None, '', ''))
+
+    def test_serve_forever_already_running(self):
+        with self.assertRaisesRegex(OSError, 'already running'):
+            wc_env_manager.daemon.Daemon(socket_path=self.socket_path).serve_forever()
+
+    def test_use_daemon(self):
+        with mock.patch.dict(os.environ, {'WC_ENV_MANAGER_SOCKET': self.socket_path}):
+            os.environ.pop('WC_ENV_MANAGER_NO_DAEMON', None)
+            self.assertTrue(wc_env_manager.daemon.use_daemon(['image', 'version']))
+            self.assertFalse(wc_env_manager.daemon.use_daemon([]))
+            self.assertFalse(wc_env_manager.daemon.use_daemon(['image', '--help']))
+            self.assertFalse(wc_env_manager.daemon.use_daemon(['image', 'export', '-']))
+            self.assertFalse(wc_env_manager.daemon.use_daemon(['daemon', 'status']))
+            self.assertFalse(wc_env_manager.daemon.use_daemon(['container', 'watch']))
+
+            os.environ['WC_ENV_MANAGER_NO_DAEMON'] = '1'
+            self.assertFalse(wc_env_manager.daemon.use_daemon(['image', 'version']))
+
+        with mock.patch.dict(os.environ, {'WC_ENV_MANAGER_SOCKET': os.path.join(self.dirname, 'other.sock')}):
+            self.assertFalse(wc_env_manager.daemon.use_daemon(['image', 'version']))
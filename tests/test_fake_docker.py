@@ -0,0 +1,278 @@
+""" Tests for wc_env_manager.fake_docker
+
+:Author: Jonathan Karr <jonrkarr@gmail.com>
+:Date: 2020-02-14
+:Copyright: 2020, Karr Lab
+:License: MIT
+"""
+
+import concurrent.futures
+import docker
+import gc
+import hashlib
+import io
+import json
+import os
+import shutil
+import tarfile
+import tempfile
+import time
+import unittest
+import wc_env_manager.fake_docker
+
+
+class FakeDockerClientTestCase(unittest.TestCase):
+    def setUp(self):
+        self.client = wc_env_manager.fake_docker.FakeDockerClient()
+        self.image = self.client.add_image(['karrlab/wc_env:latest', 'karrlab/wc_env:0.0.1'])
+        self.dirname = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.dirname)
+
+    def test_images(self):
+        client = self.client
+        self.assertEqual(client.images.get('karrlab/wc_env'), self.image)
+        self.assertEqual(client.images.get('karrlab/wc_env:0.0.1'), self.image)
+        self.assertEqual(client.images.get(self.image.id), self.image)
+        self.assertEqual(client.images.get(self.image.short_id), self.image)
+        with self.assertRaises(docker.errors.ImageNotFound):
+            client.images.get('karrlab/wc_env:0.0.2')
+
+        # tag and untag
+        image = client.images.pull('karrlab/wc_env', tag='0.0.2')
+        self.assertEqual(image.tags, ['karrlab/wc_env:0.0.2'])
+        self.assertTrue(image.tag('karrlab/wc_env', tag='latest'))
+        self.assertEqual(self.image.tags, ['karrlab/wc_env:latest', 'karrlab/wc_env:0.0.1'])
+        self.image.reload()
+        self.assertEqual(self.image.tags, ['karrlab/wc_env:0.0.1'])
+        self.assertEqual(client.images.get('karrlab/wc_env'), image)
+
+        self.assertEqual(len(client.images.list(name='karrlab/wc_env')), 2)
+        self.assertEqual(client.images.list(name='karrlab/other'), [])
+
+        # build
+        with self.assertRaises(docker.errors.BuildError):
+            client.images.build(path=self.dirname)
+        with open(os.path.join(self.dirname, 'Dockerfile'), 'w') as file:
+            file.write('FROM karrlab/wc_env\n')
+        built_image, log = client.images.build(path=self.dirname)
+        self.assertEqual(built_image.tags, [])
+        self.assertIn('Successfully built', list(log)[0]['stream'])
+        self.assertEqual(client.images.list(filters={'dangling': True}), [built_image])
+
+        # remove
+        client.images.remove('karrlab/wc_env:0.0.1')
+        with self.assertRaises(docker.errors.ImageNotFound):
+            client.images.get(self.image.id)
+
+    def test_save_image(self):
+        layer = wc_env_manager.fake_docker.make_layer({'etc/config': b'abc'})
+        image = self.client.add_image(['karrlab/wc_env:0.0.2'], layers=[layer])
+        self.assertEqual(image.attrs['RootFS']['Layers'], ['sha256:' + hashlib.sha256(layer).hexdigest()])
+
+        with tarfile.open(fileobj=io.BytesIO(b''.join(image.save(chunk_size=100)))) as tar_file:
+            manifest = json.loads(tar_file.extractfile('manifest.json').read().decode())
+            self.assertEqual(manifest[0]['RepoTags'], ['karrlab/wc_env:0.0.2'])
+            self.assertEqual(tar_file.extractfile(manifest[0]['Layers'][0]).read(), layer)
+
+    def test_containers(self):
+        client = self.client
+        container = client.containers.create('karrlab/wc_env', name='wc_env-1', labels={'key': 'val'}, ports={},
+                                             tmpfs={'/root/scratch': 'size=1024'})
+        self.assertEqual(container.name, 'wc_env-1')
+        self.assertEqual(container.status, 'created')
+        self.assertEqual(container.labels, {'key': 'val'})
+        self.assertEqual(container.image, self.image)
+        self.assertEqual(container.attrs['HostConfig'], {
+            'ports': {},
+            'tmpfs': {'/root/scratch': 'size=1024'},
+            'Tmpfs': {'/root/scratch': 'size=1024'},
+        })
+        self.assertEqual(client.containers.get('wc_env-1'), container)
+        self.assertEqual(client.containers.get(container.id[0:12]), container)
+        self.assertEqual(client.containers.list(), [])
+        self.assertEqual(client.containers.list(all=True), [container])
+
+        with self.assertRaisesRegex(docker.errors.APIError, 'Conflict'):
+            client.containers.create('karrlab/wc_env', name='wc_env-1')
+        with self.assertRaises(docker.errors.ImageNotFound):
+            client.containers.create('karrlab/other')
+
+        container.start()
+        self.assertEqual(container.status, 'running')
+        self.assertEqual(client.containers.list(), [container])
+        self.assertIn('cpu_stats', container.stats(stream=False))
+
+        with self.assertRaisesRegex(docker.errors.APIError, 'running container'):
+            container.remove()
+        container.stop()
+        self.assertEqual(container.status, 'exited')
+        container.remove()
+        with self.assertRaises(docker.errors.NotFound):
+            client.containers.get('wc_env-1')
+
+    def test_default_root_and_exec_handler(self):
+        client = self.client
+        self.assertNotEqual(client.root, '/')
+        self.assertEqual(os.listdir(client.root), [])
+        container = client.add_container('karrlab/wc_env', name='wc_env-1', running=True)
+        self.assertEqual(container.exec_run(['rm', '-rf', self.dirname]), (0, b''))
+        self.assertTrue(os.path.isdir(self.dirname))
+
+        archive = io.BytesIO()
+        with tarfile.open(fileobj=archive, mode='w') as tar_file:
+            info = tarfile.TarInfo('file.txt')
+            info.size = 3
+            tar_file.addfile(info, io.BytesIO(b'abc'))
+        with self.assertRaises(docker.errors.NotFound):
+            container.put_archive('/root/.ssh', archive.getvalue())
+        os.makedirs(client.get_host_path('/root/.ssh'))
+        self.assertTrue(container.put_archive('/root/.ssh', archive.getvalue()))
+        with open(os.path.join(client.root, 'root', '.ssh', 'file.txt'), 'rb') as file:
+            self.assertEqual(file.read(), b'abc')
+        stream, stat = container.get_archive('/root/.ssh/file.txt')
+        self.assertEqual(stat['name'], 'file.txt')
+
+        root = client.root
+        del client, container, self.client, self.image
+        gc.collect()
+        self.assertFalse(os.path.isdir(root))
+
+    def test_exec_and_archives(self):
+        client = wc_env_manager.fake_docker.FakeDockerClient(
+            exec_handler=wc_env_manager.fake_docker.run_on_host, root='/')
+        client.add_image(['karrlab/wc_env:latest'])
+        container = client.add_container('karrlab/wc_env', name='wc_env-1', running=True)
+
+        result = container.exec_run(['bash', '-c', 'echo $VAR'], environment={'VAR': 'value'})
+        self.assertEqual(result, (0, b'value\n'))
+        self.assertEqual(container.exec_run('false').exit_code, 1)
+
+        exec_id = client.api.exec_create(container.id, ['echo', 'streamed'])['Id']
+        self.assertEqual(b''.join(client.api.exec_start(exec_id, stream=True)), b'streamed\n')
+        self.assertEqual(client.api.exec_inspect(exec_id)['ExitCode'], 0)
+
+        archive = io.BytesIO()
+        with tarfile.open(fileobj=archive, mode='w') as tar_file:
+            info = tarfile.TarInfo('file.txt')
+            info.size = 3
+            tar_file.addfile(info, io.BytesIO(b'abc'))
+        self.assertTrue(container.put_archive(self.dirname, archive.getvalue()))
+        with open(os.path.join(self.dirname, 'file.txt'), 'rb') as file:
+            self.assertEqual(file.read(), b'abc')
+
+        stream, stat = container.get_archive(os.path.join(self.dirname, 'file.txt'))
+        self.assertEqual(stat['size'], 3)
+        with tarfile.open(fileobj=io.BytesIO(b''.join(stream))) as tar_file:
+            self.assertEqual(tar_file.extractfile('file.txt').read(), b'abc')
+
+        with self.assertRaises(docker.errors.NotFound):
+            container.get_archive(os.path.join(self.dirname, 'missing'))
+
+    def test_scripted_exec_handler(self):
+        handler = wc_env_manager.fake_docker.ScriptedExecHandler([
+            ('pip freeze', 0, b'numpy==1.18.1\n'),
+            ('false*', 1, b'error\n'),
+        ])
+        client = wc_env_manager.fake_docker.FakeDockerClient(exec_handler=handler)
+        client.add_image(['karrlab/wc_env:latest'])
+        container = client.add_container('karrlab/wc_env', name='wc_env-1', running=True)
+        self.assertEqual(container.exec_run('pip freeze'), (0, b'numpy==1.18.1\n'))
+        self.assertEqual(container.exec_run(['false', '--flag']), (1, b'error\n'))
+        self.assertEqual(container.exec_run('rm -rf /'), (0, b''))
+        self.assertEqual(handler.commands, [
+            ('wc_env-1', ['pip', 'freeze']),
+            ('wc_env-1', ['false', '--flag']),
+            ('wc_env-1', ['rm', '-rf', '/']),
+        ])
+
+    def test_networks(self):
+        client = self.client
+        network = client.networks.create('wc_network')
+        container = client.containers.run('karrlab/wc_env', name='wc_env-1', network='wc_network', detach=True)
+        network.reload()
+        self.assertEqual(network.containers, [container])
+        self.assertEqual(container.attrs['NetworkSettings']['Networks'], {'wc_network': {'IPAddress': '127.0.0.1'}})
+
+        self.assertEqual(container.logs(), b'')
+        client.write_log(container, 'ready\n')
+        self.assertEqual(container.logs(), b'ready\n')
+        self.assertEqual(client.networks.list(names=['wc_network']), [network])
+        network.disconnect(container)
+        network.reload()
+        self.assertEqual(network.containers, [])
+        network.remove()
+        with self.assertRaises(docker.errors.NotFound):
+            client.networks.get('wc_network')
+
+    def test_volumes(self):
+        client = self.client
+        volume = client.volumes.create('wc_pip_cache', labels={'key': 'val'})
+        self.assertEqual(volume.name, 'wc_pip_cache')
+        self.assertEqual(volume.attrs['Labels'], {'key': 'val'})
+        self.assertEqual(client.volumes.get('wc_pip_cache'), volume)
+        self.assertEqual(client.volumes.list(), [volume])
+
+        container = client.containers.create('karrlab/wc_env', volumes={'wc_pip_cache': {'bind': '/root/.cache/pip'}})
+        with self.assertRaisesRegex(docker.errors.APIError, 'in use'):
+            volume.remove()
+        container.remove()
+        volume.remove()
+        with self.assertRaises(docker.errors.NotFound):
+            client.volumes.get('wc_pip_cache')
+
+    def test_events(self):
+        client = self.client
+        events = client.events(filters={'type': ['container']})
+        container = client.containers.create('karrlab/wc_env', name='wc_env-1')
+        container.start()
+        events.close()
+        self.assertEqual([(event['Action'], event['Actor']['ID']) for event in events],
+                         [('create', container.id), ('start', container.id)])
+
+    def test_calls(self):
+        client = self.client
+        client.calls.clear()
+        client.containers.list(all=True)
+        client.images.get('karrlab/wc_env')
+        self.assertEqual(dict(client.calls), {'containers.list': 1, 'images.get': 1})
+
+    def test_latency_and_concurrency(self):
+        client = self.client
+        client.set_latency('containers.*', 0.2)
+        client.set_latency('containers.list', 0.)
+
+        start = time.time()
+        client.containers.list()
+        self.assertLess(time.time() - start, 0.2)
+
+        containers = [client.add_container('karrlab/wc_env', name='wc_env-{}'.format(i)) for i in range(4)]
+        client.set_latency('containers.get', 0.)
+        client.max_concurrency.clear()
+        start = time.time()
+        with concurrent.futures.ThreadPoolExecutor(max_workers=4) as executor:
+            list(executor.map(lambda container: container.start(), containers))
+        # concurrent starts take about one latency, and less than half of the time of serial starts (4 * 0.2 s)
+        self.assertLess(time.time() - start, 2 * 0.2)
+        self.assertEqual(client.max_concurrency['containers.start'], 4)
+
+        client = wc_env_manager.fake_docker.FakeDockerClient(latency=0.05)
+        start = time.time()
+        client.containers.list()
+        self.assertGreaterEqual(time.time() - start, 0.05)
+
+    def test_inject_failure(self):
+        client = self.client
+        container = client.add_container('karrlab/wc_env', name='wc_env-1')
+
+        client.inject_failure('containers.start', count=2)
+        for i_try in range(2):
+            with self.assertRaisesRegex(docker.errors.APIError, 'Simulated failure'):
+                container.start()
+        container.start()
+
+        client.inject_failure('images.*', exception=docker.errors.ImageNotFound('gone'), count=None)
+        for i_try in range(3):
+            with self.assertRaisesRegex(docker.errors.ImageNotFound, 'gone'):
+                client.images.get('karrlab/wc_env')
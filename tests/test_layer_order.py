@@ -0,0 +1,165 @@
+""" Tests for wc_env_manager.layer_order
+
+:Author: Jonathan Karr <jonrkarr@gmail.com>
+:Date: 2020-02-14
+:Copyright: 2020, Karr Lab
+:License: MIT
+"""
+
+import os
+import pkg_resources
+import shutil
+import tempfile
+import unittest
+import wc_env_manager.layer_order
+
+DOCKERFILE = '''FROM ubuntu
+
+# install Python
+ARG python_version=3.7.6
+RUN apt-get install -y \\
+        python3 \\
+    # && make test \\
+    && ldconfig
+
+# begin reorderable sections
+
+# solver
+COPY solver.lic /tmp/
+RUN install-solver
+
+# disabled solver
+
+# requirements
+# depends on: solver
+COPY requirements.txt /tmp/
+RUN pip install -r /tmp/requirements.txt
+
+# image tag
+ARG image_tag=0.0.1
+RUN echo ${image_tag} > /etc/docker-image-tag
+
+# end reorderable sections
+
+# final command
+CMD bash'''
+
+
+class LayerOrderTestCase(unittest.TestCase):
+    def setUp(self):
+        self.dirname = tempfile.mkdtemp()
+        self.sections = wc_env_manager.layer_order.parse_dockerfile_sections(DOCKERFILE)
+
+    def tearDown(self):
+        shutil.rmtree(self.dirname)
+
+    def test_parse_dockerfile_sections(self):
+        sections = self.sections
+        self.assertEqual(''.join(section.text for section in sections), DOCKERFILE)
+        self.assertEqual([section.name for section in sections], [
+            '', 'install Python', 'begin reorderable sections', 'solver', 'disabled solver', 'requirements',
+            'image tag', 'end reorderable sections', 'final command',
+        ])
+        self.assertEqual([section.name for section in sections if section.reorderable],
+                         ['solver', 'disabled solver', 'requirements', 'image tag'])
+        self.assertEqual(sections[1].instructions, [
+            'ARG python_version=3.7.6',
+            'RUN apt-get install -y python3 && ldconfig',
+        ])
+        self.assertEqual(sections[4].instructions, [])
+        self.assertEqual(sections[5].dependencies, ['solver'])
+        self.assertEqual(sections[3].dependencies, [])
+
+    def test_template_dependencies(self):
+        filename = pkg_resources.resource_filename('wc_env_manager', os.path.join('assets', 'base_image',
+                                                                                 'Dockerfile.template'))
+        with open(filename, 'r') as file:
+            sections = wc_env_manager.layer_order.parse_dockerfile_sections(file.read())
+        names = [section.name for section in sections if section.reorderable]
+        self.assertIn('Install Python packages', names)
+        for section in sections:
+            if section.reorderable:
+                for dependency in section.dependencies:
+                    self.assertIn(dependency, names[0:names.index(section.name)])
+        python_section = next(section for section in sections if section.name == 'Install Python packages')
+        self.assertIn('install gurobi', python_section.dependencies)
+        self.assertIn('COIN-OR: CBC (latest version compatible with CyLP)', python_section.dependencies)
+
+    def test_get_fingerprint(self):
+        section = self.sections[5]
+        with open(os.path.join(self.dirname, 'requirements.txt'), 'w') as file:
+            file.write('numpy\n')
+        fingerprint = section.get_fingerprint(context_path=self.dirname)
+        self.assertEqual(section.get_fingerprint(context_path=self.dirname), fingerprint)
+        with open(os.path.join(self.dirname, 'requirements.txt'), 'w') as file:
+            file.write('numpy\nscipy\n')
+        self.assertNotEqual(section.get_fingerprint(context_path=self.dirname), fingerprint)
+
+        # directories and glob patterns
+        section = wc_env_manager.layer_order.DockerfileSection('files', 'COPY data/ *.lic /tmp/')
+        os.makedirs(os.path.join(self.dirname, 'data', 'sub'))
+        with open(os.path.join(self.dirname, 'data', 'sub', 'a.csv'), 'w') as file:
+            file.write('1')
+        with open(os.path.join(self.dirname, 'solver.lic'), 'w') as file:
+            file.write('key')
+        fingerprint = section.get_fingerprint(context_path=self.dirname)
+        with open(os.path.join(self.dirname, 'data', 'sub', 'a.csv'), 'w') as file:
+            file.write('2')
+        fingerprint_2 = section.get_fingerprint(context_path=self.dirname)
+        self.assertNotEqual(fingerprint_2, fingerprint)
+        with open(os.path.join(self.dirname, 'solver.lic'), 'w') as file:
+            file.write('key2')
+        self.assertNotEqual(section.get_fingerprint(context_path=self.dirname), fingerprint_2)
+
+        section = self.sections[6]
+        fingerprint = section.get_fingerprint(build_args={'image_tag': '0.0.1'})
+        self.assertNotEqual(section.get_fingerprint(build_args={'image_tag': '0.0.2'}), fingerprint)
+        self.assertEqual(section.get_fingerprint(build_args={'python_version': '3.8.2'}),
+                         section.get_fingerprint())
+
+    def test_reorder_and_count_rebuilt_sections(self):
+        sections = wc_env_manager.layer_order.reorder_sections(self.sections, ['image tag', 'solver'])
+        self.assertEqual([section.name for section in sections if section.reorderable],
+                         ['image tag', 'solver', 'disabled solver', 'requirements'])
+
+        # sections are kept after the sections which they depend on
+        self.assertEqual([section.name for section in wc_env_manager.layer_order.reorder_sections(
+            self.sections, ['requirements', 'image tag', 'solver']) if section.reorderable],
+            ['image tag', 'solver', 'requirements', 'disabled solver'])
+        self.assertEqual([section.name for section in sections if not section.reorderable],
+                         [section.name for section in self.sections if not section.reorderable])
+
+        self.assertEqual(wc_env_manager.layer_order.count_rebuilt_sections(self.sections, {'requirements'}), 3)
+        self.assertEqual(wc_env_manager.layer_order.count_rebuilt_sections(sections, {'requirements'}), 2)
+        self.assertEqual(wc_env_manager.layer_order.count_rebuilt_sections(sections, {'install Python'}), 5)
+        self.assertEqual(wc_env_manager.layer_order.count_rebuilt_sections(sections, set()), 0)
+
+    def test_history_and_proposal(self):
+        filename = os.path.join(self.dirname, 'history', 'history.json')
+        history = wc_env_manager.layer_order.BuildHistory(filename)
+        fingerprints = {'install Python': 'a', 'solver': 'b', 'requirements': 'c', 'image tag': 'd'}
+        self.assertEqual(history.add('latest', fingerprints)['changed'], None)
+        self.assertEqual(history.add('latest', dict(fingerprints, requirements='c2', **{'image tag': 'd2'}))['changed'],
+                         ['image tag', 'requirements'])
+        self.assertEqual(history.add('latest', dict(fingerprints, requirements='c3', **{'image tag': 'd2'}))['changed'],
+                         ['requirements'])
+        self.assertEqual(history.add('other', fingerprints)['changed'], None)
+
+        history = wc_env_manager.layer_order.BuildHistory(filename)
+        self.assertEqual(len(history.records), 4)
+        self.assertEqual(history.get_change_counts(), {'requirements': 2, 'image tag': 1})
+
+        proposal = wc_env_manager.layer_order.LayerOrderProposal(self.sections, history)
+        self.assertEqual(proposal.current_order, ['solver', 'disabled solver', 'requirements', 'image tag'])
+        self.assertEqual(proposal.proposed_order, ['solver', 'disabled solver', 'image tag', 'requirements'])
+        self.assertEqual(proposal.n_builds, 2)
+        self.assertEqual(proposal.current_rebuilt, 3 + 3)
+        self.assertEqual(proposal.proposed_rebuilt, 3 + 2)
+
+        for solver in ['b2', 'b3', 'b4']:
+            history.add('latest', dict(fingerprints, solver=solver, requirements='c3', **{'image tag': 'd2'}))
+        proposal = wc_env_manager.layer_order.LayerOrderProposal(self.sections, history)
+        # the requirements are kept after the solver, which they depend on
+        self.assertEqual(proposal.proposed_order, ['disabled solver', 'image tag', 'solver', 'requirements'])
+        self.assertEqual(proposal.current_rebuilt, 3 + 3 + 3 * 4)
+        self.assertEqual(proposal.proposed_rebuilt, 4 + 2 + 3 * 3)
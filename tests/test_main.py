@@ -7,10 +7,28 @@
 """
 
 from wc_env_manager import __main__
+import capturer
+import importlib.util
 import mock
+import os
+import shutil
+import subprocess
+import sys
+import sysconfig
+import tempfile
 import unittest
+import wc_env_manager.core
+import wc_env_manager.fake_docker
+import wc_env_manager.layer_order
 import whichcraft
 
+# packages other than the standard library which the command line interface imports on startup
+EAGER_IMPORTS = ['cement', 'configobj', 'validate', 'wc_env_manager']
+
+# packages which should only be imported by the commands which need them
+LAZY_IMPORTS = ['dateutil', 'docker', 'docker_squash', 'git', 'jinja2', 'pkg_resources', 'requests',
+                'requirements', 'wc_utils', 'yaml']
+
 
 @unittest.skipIf(whichcraft.which('docker') is None, 'Test requires Docker and Docker isn''t installed.')
 class MainTestCase(unittest.TestCase):
@@ -43,6 +61,14 @@ class MainTestCase(unittest.TestCase):
         with __main__.App(argv=['base-image', 'version']) as app:
             app.run()
 
+        archive_path = tempfile.mkdtemp()
+        with __main__.App(argv=['base-image', 'export', archive_path, '--chunk-size', '100MB']) as app:
+            app.run()
+
+        with __main__.App(argv=['base-image', 'import', archive_path]) as app:
+            app.run()
+        shutil.rmtree(archive_path)
+
         with __main__.App(argv=['base-image', 'remove']) as app:
             app.run()
 
@@ -66,6 +92,14 @@ class MainTestCase(unittest.TestCase):
         with __main__.App(argv=['image', 'version']) as app:
             app.run()
 
+        archive_path = tempfile.mkdtemp()
+        with __main__.App(argv=['image', 'export', archive_path, '--chunk-size', '100MB', '--exclude-base']) as app:
+            app.run()
+
+        with __main__.App(argv=['image', 'import', archive_path]) as app:
+            app.run()
+        shutil.rmtree(archive_path)
+
         with __main__.App(argv=['image', 'remove']) as app:
             app.run()
 
@@ -94,9 +128,46 @@ class MainTestCase(unittest.TestCase):
         with __main__.App(argv=['container', 'build']) as app:
             app.run()
 
+        with __main__.App(argv=['container', 'upgrade']) as app:
+            app.run()
+
+        with __main__.App(argv=['container', 'upgrade', '--all']) as app:
+            app.run()
+
+        local_path = tempfile.mkdtemp()
+        with __main__.App(argv=['container', 'retrieve', '/etc', local_path, '--codec', 'xz',
+                                '--include', '*.conf', '--exclude', 'ssh']) as app:
+            app.run()
+        shutil.rmtree(local_path)
+
+        report = wc_env_manager.core.SyncReport(wc_env_manager.core.SyncDirection.to_container)
+        with mock.patch.object(wc_env_manager.core.WcEnvManager, 'watch_paths', return_value=report) as watch_paths:
+            with __main__.App(argv=['container', 'watch', '--debounce', '50', '--no-initial-sync']) as app:
+                app.run()
+        watch_paths.assert_called_once_with(initial_sync=False, debounce=0.05)
+
+        with __main__.App(argv=['container', 'run', '--max-workers', '2', '--', 'echo', 'here']) as app:
+            app.run()
+
+        with __main__.App(argv=['container', 'stop', '--max-workers', '2']) as app:
+            app.run()
+
+        with __main__.App(argv=['container', 'start', '--older-than', '0s']) as app:
+            app.run()
+
+        with __main__.App(argv=['container', 'restart', '--label', 'key=value']) as app:
+            app.run()
+
         with __main__.App(argv=['container', 'remove']) as app:
             app.run()
 
+    def test_gc(self):
+        with __main__.App(argv=['gc', '--dry-run', '--keep-versions', '1', '--max-size', '100GB', '--max-idle', '7d']) as app:
+            app.run()
+
+        with __main__.App(argv=['gc']) as app:
+            app.run()
+
     def test_all(self):
         with __main__.App(argv=['pull']) as app:
             app.run()
@@ -112,3 +183,213 @@ class MainTestCase(unittest.TestCase):
 
         with __main__.App(argv=['pull']) as app:
             app.run()
+
+
+class MainFakeDockerTestCase(unittest.TestCase):
+    """ Test the command line interface with an in-process fake of Docker """
+
+    def setUp(self):
+        self.client = wc_env_manager.fake_docker.FakeDockerClient(
+            exec_handler=wc_env_manager.fake_docker.ScriptedExecHandler([
+                ('pip freeze', 0, b'numpy==1.18.1\n'),
+                ('false', 1, b'error\n'),
+            ]))
+        self.mgr = wc_env_manager.core.WcEnvManager({'verbose': False}, docker_client=self.client)
+        image = self.client.add_image([self.mgr.config['image']['repo'] + ':' + self.mgr.config['image']['tags'][0]])
+        for i_container in range(2):
+            self.client.add_container(image.id, name='wc_env-2020-01-01-00-00-0{}'.format(i_container),
+                                      running=True)
+
+    def test_cache_volume(self):
+        with mock.patch.object(__main__, 'get_manager', return_value=self.mgr):
+            with capturer.CaptureOutput(relay=False) as capture_output:
+                with __main__.App(argv=['cache-volume', 'build']) as app:
+                    app.run()
+            self.assertIn('Cache volume wc_pip_cache is mounted at /root/.cache/pip (rw)', capture_output.get_text())
+            self.assertIn('wc_pip_cache', [volume.name for volume in self.client.volumes.list()])
+
+            with __main__.App(argv=['cache-volume', 'remove']) as app:
+                app.run()
+            self.assertEqual(self.client.volumes.list(), [])
+
+    def test_container_operations(self):
+        with mock.patch.object(__main__, 'get_manager', return_value=self.mgr):
+            with capturer.CaptureOutput(relay=False) as capture_output:
+                with __main__.App(argv=['container', 'stop', '--max-workers', '2']) as app:
+                    app.run()
+            self.assertIn('Stopped container wc_env-2020-01-01-00-00-01', capture_output.get_text())
+
+            # exit with a non-zero status if the operation failed for any container
+            for command in ['start', 'restart', 'stop', 'remove']:
+                self.client.inject_failure('containers.' + command)
+                with capturer.CaptureOutput(relay=False) as capture_output:
+                    with __main__.App(argv=['container', command]) as app:
+                        with self.assertRaises(SystemExit) as context:
+                            app.run()
+                self.assertEqual(context.exception.code, 1)
+                self.assertIn('Error: container', capture_output.get_text())
+
+    def test_container_flush_tmpfs(self):
+        self.client.exec_handler = wc_env_manager.fake_docker.run_on_host
+        self.client.root = '/'
+        scratch_dirname = tempfile.mkdtemp()
+        local_dirname = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, scratch_dirname)
+        self.addCleanup(shutil.rmtree, local_dirname)
+        with open(os.path.join(scratch_dirname, 'checkpoint.h5'), 'w') as file:
+            file.write('checkpoint')
+        self.mgr.config['container']['tmpfs'] = {scratch_dirname: {'size': '1GB'}}
+        self.mgr.build_container()
+
+        with mock.patch.object(__main__, 'get_manager', return_value=self.mgr):
+            with capturer.CaptureOutput(relay=False) as capture_output:
+                with __main__.App(argv=['container', 'flush-tmpfs', local_dirname, '--codec', 'none']) as app:
+                    app.run()
+        self.assertIn('Saved 1 files', capture_output.get_text())
+        self.assertTrue(os.path.isfile(os.path.join(local_dirname, scratch_dirname.lstrip('/'), 'checkpoint.h5')))
+
+    def test_build_matrix(self):
+        report = wc_env_manager.core.MatrixBuildReport()
+        report.shared_duration = 1.
+        report.duration = 3.
+        for python_version in ['3.7.6', '3.8.2']:
+            result = wc_env_manager.core.MatrixBuildResult(python_version)
+            result.image = self.client.add_image(['karrlab/wc_env:latest-py' + python_version[0:3]])
+            result.base_image_duration = 1.
+            result.image_duration = 1.
+            report.results.append(result)
+
+        with mock.patch.object(__main__, 'get_manager', return_value=self.mgr):
+            with mock.patch.object(self.mgr, 'build_matrix', return_value=report) as build_matrix:
+                with capturer.CaptureOutput(relay=False) as capture_output:
+                    with __main__.App(argv=['build-matrix', '3.7.6', '3.8.2', '--max-workers', '2']) as app:
+                        app.run()
+        build_matrix.assert_called_once_with(['3.7.6', '3.8.2'], max_workers=2)
+        text = capture_output.get_text()
+        self.assertIn('karrlab/wc_env:latest-py3.8', text)
+        self.assertIn('all versions in 3.0 s (sum of the durations of the builds: 5.0 s)', text)
+
+    def test_base_image_layer_order(self):
+        temp_dir_name = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, temp_dir_name)
+        self.mgr.config['base_image']['build_history_path'] = os.path.join(temp_dir_name, 'history.json')
+
+        with mock.patch.object(__main__, 'get_manager', return_value=self.mgr):
+            with capturer.CaptureOutput(relay=False) as capture_output:
+                with __main__.App(argv=['base-image', 'layer-order']) as app:
+                    app.run()
+            self.assertIn('The build history does not contain any rebuilds yet', capture_output.get_text())
+
+            history = wc_env_manager.layer_order.BuildHistory(self.mgr.config['base_image']['build_history_path'])
+            history.add('latest', {'Install Python packages': 'a', 'install cplex': 'b'})
+            history.add('latest', {'Install Python packages': 'a2', 'install cplex': 'b'})
+            with capturer.CaptureOutput(relay=False) as capture_output:
+                with __main__.App(argv=['base-image', 'layer-order']) as app:
+                    app.run()
+            text = capture_output.get_text()
+            self.assertRegex(text, r'\n +[0-9]+ +1  Install Python packages\n')
+            self.assertIn('Over 1 builds, the current order rebuilt', text)
+            self.assertIn('Set `base_image.reorder_layers`', text)
+
+            self.mgr.config['base_image']['build_history_path'] = None
+            with __main__.App(argv=['base-image', 'layer-order']) as app:
+                with self.assertRaisesRegex(SystemExit, 'must be configured'):
+                    app.run()
+
+    def test_base_image_lock(self):
+        temp_dir_name = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, temp_dir_name)
+        lock_path = os.path.join(temp_dir_name, 'requirements.lock')
+
+        def lock_python_requirements():
+            with open(lock_path, 'w') as file:
+                file.write('numpy==1.18.1 \\\n    --hash=sha256:1111\nscipy==1.4.1 \\\n    --hash=sha256:2222\n')
+            return lock_path
+
+        with mock.patch.object(__main__, 'get_manager', return_value=self.mgr):
+            with mock.patch.object(self.mgr, 'lock_python_requirements', side_effect=lock_python_requirements):
+                with capturer.CaptureOutput(relay=False) as capture_output:
+                    with __main__.App(argv=['base-image', 'lock']) as app:
+                        app.run()
+            self.assertIn('Locked 2 Python requirements to ' + lock_path, capture_output.get_text())
+
+            with __main__.App(argv=['base-image', 'lock']) as app:
+                with self.assertRaisesRegex(SystemExit, 'must be configured'):
+                    app.run()
+
+    def test_image_analyze(self):
+        repo = self.mgr.config['image']['repo']
+        self.client.add_image([repo + ':0.0.1'], layers=[
+            wc_env_manager.fake_docker.make_layer({'usr/lib/libx.so': b'x' * 100}),
+        ])
+        self.mgr._image = self.client.add_image([repo + ':0.0.2'], layers=[
+            wc_env_manager.fake_docker.make_layer({'usr/lib/libx.so': b'x' * 100, 'tmp/solver.tgz': b's' * 20}),
+            wc_env_manager.fake_docker.make_layer({'usr/lib/libx.so': b'x' * 2000}),
+        ])
+
+        with mock.patch.object(__main__, 'get_manager', return_value=self.mgr):
+            with capturer.CaptureOutput(relay=False) as capture_output:
+                with __main__.App(argv=['image', 'analyze', '--compare', '0.0.1', '--depth', '2']) as app:
+                    app.run()
+        text = capture_output.get_text()
+        self.assertIn('in 2 files and 2 layers; 100.0 B wasted by overwritten or deleted files', text)
+        self.assertIn('/usr/lib/libx.so (layer 0, overwritten by layer 1)', text)
+        self.assertIn('/tmp/solver.tgz (temporary file)', text)
+        self.assertIn('Changes from {}:0.0.1'.format(repo), text)
+
+    def test_container_run(self):
+        with mock.patch.object(__main__, 'get_manager', return_value=self.mgr):
+            with capturer.CaptureOutput(relay=False) as capture_output:
+                with __main__.App(argv=['container', 'run', '--', 'pip', 'freeze']) as app:
+                    app.run()
+            text = capture_output.get_text()
+            self.assertIn('==> wc_env-2020-01-01-00-00-00 (exit code 0', text)
+            self.assertIn('numpy==1.18.1', text)
+            self.assertIn('Ran in 2 containers: 2 succeeded, 0 failed', text)
+
+            with capturer.CaptureOutput(relay=False) as capture_output:
+                with __main__.App(argv=['container', 'run', '--stream', 'false']) as app:
+                    with self.assertRaises(SystemExit):
+                        app.run()
+            text = capture_output.get_text()
+            self.assertIn('wc_env-2020-01-01-00-00-01: error', text)
+            self.assertIn('Ran in 2 containers: 0 succeeded, 2 failed', text)
+
+
+class ImportTimeTestCase(unittest.TestCase):
+    def get_imported_packages(self, args):
+        """ Get the top-level packages which a Python process imports
+
+        Args:
+            args (:obj:`list` of :obj:`str`): arguments to the Python interpreter
+
+        Returns:
+            :obj:`tuple`: standard output of the process and set of the names of the imported packages
+        """
+        result = subprocess.run([sys.executable, '-X', 'importtime'] + args,
+                                stdout=subprocess.PIPE, stderr=subprocess.PIPE, check=True)
+
+        # parse lines of the form `import time: self [us] | cumulative | imported package`
+        imported = set()
+        for line in result.stderr.decode().split('\n'):
+            if not line.startswith('import time:') or 'cumulative' in line:
+                continue
+            imported.add(line.split('|')[2].strip().partition('.')[0])
+        return result.stdout.decode(), imported
+
+    def test_import_time(self):
+        output, imported = self.get_imported_packages(['-m', 'wc_env_manager', '--version'])
+        self.assertEqual(output.strip(), __main__.wc_env_manager.__version__)
+        self.assertEqual(imported.intersection(LAZY_IMPORTS), set())
+
+        # ignore the packages which the interpreter imports on startup (e.g., `.pth` hooks of the environment)
+        _, startup_imported = self.get_imported_packages(['-c', 'pass'])
+        stdlib_dirnames = [os.path.realpath(sysconfig.get_paths()[key]) + os.sep for key in ['stdlib', 'platstdlib']]
+        non_stdlib_imported = set()
+        for name in imported.difference(startup_imported):
+            spec = importlib.util.find_spec(name)
+            origin = os.path.realpath(spec.origin) if spec and spec.has_location else None
+            if origin and ('site-packages' in origin or not any(origin.startswith(dirname)
+                                                                 for dirname in stdlib_dirnames)):
+                non_stdlib_imported.add(name)
+        self.assertLessEqual(non_stdlib_imported, set(EAGER_IMPORTS))
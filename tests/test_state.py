@@ -0,0 +1,224 @@
+""" Tests for wc_env_manager.state
+
+:Author: Jonathan Karr <jonrkarr@gmail.com>
+:Date: 2020-02-13
+:Copyright: 2020, Karr Lab
+:License: MIT
+"""
+
+from datetime import datetime, timezone
+import docker
+import mock
+import queue
+import unittest
+import wc_env_manager.state
+
+
+class EventStream(object):
+    def __init__(self):
+        self.queue = queue.Queue()
+
+    def __iter__(self):
+        while True:
+            event = self.queue.get()
+            if event is None:
+                return
+            yield event
+
+    def close(self):
+        self.queue.put(None)
+
+
+class DockerClient(object):
+    """ Docker client which serves images and containers from dictionaries """
+
+    def __init__(self):
+        self.images_by_id = {}
+        self.containers_by_id = {}
+        self.events_stream = EventStream()
+        self.n_queries = 0
+
+        self.images = mock.Mock()
+        self.images.list.side_effect = self.list_images
+        self.images.get.side_effect = self.get_image
+        self.containers = mock.Mock()
+        self.containers.list.side_effect = self.list_containers
+        self.containers.get.side_effect = self.get_container
+
+    def events(self, since=None, decode=None, filters=None):
+        return self.events_stream
+
+    def list_images(self):
+        self.n_queries += 1
+        return [self.copy_image(image) for image in self.images_by_id.values()]
+
+    def get_image(self, name):
+        self.n_queries += 1
+        for image in self.images_by_id.values():
+            if name == image.id or name in image.tags or name + ':latest' in image.tags:
+                return self.copy_image(image)
+        raise docker.errors.ImageNotFound(name)
+
+    def list_containers(self, all=False):
+        self.n_queries += 1
+        return [self.copy_container(container) for container in self.containers_by_id.values()]
+
+    def get_container(self, id):
+        self.n_queries += 1
+        if id not in self.containers_by_id:
+            raise docker.errors.NotFound(id)
+        return self.copy_container(self.containers_by_id[id])
+
+    def add_image(self, id, tags):
+        for image in self.images_by_id.values():
+            image.tags = [tag for tag in image.tags if tag not in tags]
+        self.images_by_id[id] = mock.Mock(id=id, tags=list(tags))
+
+    def add_container(self, id, name, image_id, running=False):
+        self.containers_by_id[id] = mock.Mock(id=id, attrs={
+            'Image': image_id,
+            'Created': '2020-02-13T10:00:00.000000000Z',
+            'State': {'Running': running, 'StartedAt': '0001-01-01T00:00:00Z', 'FinishedAt': '0001-01-01T00:00:00Z'},
+        })
+        self.containers_by_id[id].name = name
+
+    @staticmethod
+    def copy_image(image):
+        return mock.Mock(id=image.id, tags=list(image.tags))
+
+    @staticmethod
+    def copy_container(container):
+        copy = mock.Mock(id=container.id, attrs=dict(container.attrs))
+        copy.name = container.name
+        return copy
+
+
+class DockerStateCacheTestCase(unittest.TestCase):
+    def setUp(self):
+        self.client = DockerClient()
+        self.client.add_image('sha256:' + 'a' * 64, ['karrlab/wc_env:latest', 'karrlab/wc_env:0.0.1'])
+        self.client.add_container('1' * 64, 'wc_env-2020-02-13-10-00-00', 'sha256:' + 'a' * 64)
+        self.cache = wc_env_manager.state.DockerStateCache(self.client)
+        self.cache.start()
+
+    def tearDown(self):
+        self.cache.stop()
+
+    def test_lookups(self):
+        n_queries = self.client.n_queries
+        self.assertTrue(self.cache.running)
+
+        image = self.cache.get_image('karrlab/wc_env')
+        self.assertEqual(image.id, 'sha256:' + 'a' * 64)
+        self.assertEqual(self.cache.get_image('karrlab/wc_env:0.0.1').id, image.id)
+        self.assertEqual(self.cache.get_image('sha256:' + 'a' * 64).id, image.id)
+        self.assertEqual(self.cache.get_image('aaaaaaaaaaaa').id, image.id)
+        self.assertEqual(self.cache.get_image('karrlab/wc_env:0.0.2'), None)
+        self.assertEqual(self.cache.get_image('karrlab/other'), None)
+        self.assertEqual(len(self.cache.get_images()), 1)
+
+        container = self.cache.get_container('wc_env-2020-02-13-10-00-00')
+        self.assertEqual(container.id, '1' * 64)
+        self.assertEqual(self.cache.get_container('111111').id, container.id)
+        self.assertEqual(self.cache.get_container('other'), None)
+        self.assertEqual(len(self.cache.get_containers()), 1)
+        self.assertEqual(self.cache.get_container_activity(container), datetime(2020, 2, 13, 10, tzinfo=timezone.utc))
+
+        self.assertEqual(self.client.n_queries, n_queries)
+
+    def test_image_events(self):
+        # new version of an image
+        self.client.add_image('sha256:' + 'b' * 64, ['karrlab/wc_env:latest', 'karrlab/wc_env:0.0.2'])
+        self.cache.handle_event({'Type': 'image', 'Action': 'tag', 'Actor': {'ID': 'sha256:' + 'b' * 64}})
+        self.assertEqual(self.cache.get_image('karrlab/wc_env').id, 'sha256:' + 'b' * 64)
+        self.assertEqual(self.cache.get_image('karrlab/wc_env:0.0.1').id, 'sha256:' + 'a' * 64)
+        self.assertEqual(self.cache.get_image('karrlab/wc_env:0.0.1').tags, ['karrlab/wc_env:0.0.1'])
+
+        # pull by reference
+        self.client.add_image('sha256:' + 'c' * 64, ['karrlab/wc_env_dependencies:latest'])
+        self.cache.handle_event({'Type': 'image', 'Action': 'pull', 'Actor': {'ID': 'karrlab/wc_env_dependencies:latest'}})
+        self.assertEqual(self.cache.get_image('karrlab/wc_env_dependencies').id, 'sha256:' + 'c' * 64)
+
+        # untag
+        self.client.images_by_id['sha256:' + 'a' * 64].tags = []
+        self.cache.handle_event({'Type': 'image', 'Action': 'untag', 'Actor': {'ID': 'sha256:' + 'a' * 64}})
+        self.assertEqual(self.cache.get_image('karrlab/wc_env:0.0.1'), None)
+        self.assertEqual(self.cache.get_image('sha256:' + 'a' * 64).tags, [])
+
+        # delete
+        self.client.images_by_id.pop('sha256:' + 'a' * 64)
+        self.cache.handle_event({'Type': 'image', 'Action': 'delete', 'Actor': {'ID': 'sha256:' + 'a' * 64}})
+        self.assertEqual(self.cache.get_image('sha256:' + 'a' * 64), None)
+
+        # ignored events
+        n_queries = self.client.n_queries
+        self.cache.handle_event({'Type': 'image', 'Action': 'push', 'Actor': {'ID': 'karrlab/wc_env:latest'}})
+        self.cache.handle_event({'Type': 'image', 'Action': 'tag', 'Actor': {}})
+        self.assertEqual(self.client.n_queries, n_queries)
+
+    def test_container_events(self):
+        id = '1' * 64
+
+        # start
+        self.client.containers_by_id[id].attrs['State']['Running'] = True
+        self.cache.handle_event({'Type': 'container', 'Action': 'start', 'Actor': {'ID': id},
+                                 'timeNano': 1581588000 * 10 ** 9})
+        container = self.cache.get_container(id)
+        self.assertTrue(container.attrs['State']['Running'])
+        self.assertEqual(self.cache.get_container_activity(container),
+                         datetime(2020, 2, 13, 10, tzinfo=timezone.utc))
+
+        # exec only updates activity
+        n_queries = self.client.n_queries
+        self.cache.handle_event({'Type': 'container', 'Action': 'exec_start: bash', 'Actor': {'ID': id},
+                                 'timeNano': 1581591600 * 10 ** 9})
+        self.assertEqual(self.client.n_queries, n_queries)
+        self.assertEqual(self.cache.get_container_activity(container),
+                         datetime(2020, 2, 13, 11, tzinfo=timezone.utc))
+
+        # rename
+        self.client.containers_by_id[id].name = 'renamed'
+        self.cache.handle_event({'Type': 'container', 'Action': 'rename', 'Actor': {'ID': id}})
+        self.assertEqual(self.cache.get_container('renamed').id, id)
+        self.assertEqual(self.cache.get_container('wc_env-2020-02-13-10-00-00'), None)
+
+        # create
+        self.client.add_container('2' * 64, 'wc_env-2020-02-13-11-00-00', 'sha256:' + 'a' * 64)
+        self.cache.handle_event({'Type': 'container', 'Action': 'create', 'Actor': {'ID': '2' * 64}})
+        self.assertEqual(len(self.cache.get_containers()), 2)
+
+        # destroy
+        self.client.containers_by_id.pop(id)
+        self.cache.handle_event({'Type': 'container', 'Action': 'destroy', 'Actor': {'ID': id}})
+        self.assertEqual(self.cache.get_container(id), None)
+        self.assertEqual(len(self.cache.get_containers()), 1)
+
+        # event for a container which was removed before the event was processed
+        self.cache.handle_event({'Type': 'container', 'Action': 'create', 'Actor': {'ID': '3' * 64}})
+        self.assertEqual(len(self.cache.get_containers()), 1)
+
+    def test_events_stream(self):
+        self.client.add_image('sha256:' + 'b' * 64, ['karrlab/wc_env:latest'])
+        self.client.events_stream.queue.put({'Type': 'image', 'Action': 'tag', 'Actor': {'ID': 'sha256:' + 'b' * 64}})
+        self.client.events_stream.close()
+        self.cache._thread.join()
+        self.assertEqual(self.cache.get_image('karrlab/wc_env').id, 'sha256:' + 'b' * 64)
+
+        # the index isn't current after the stream ends
+        self.assertFalse(self.cache.running)
+        self.client.events_stream = EventStream()
+        self.cache.start()
+        self.assertTrue(self.cache.running)
+
+    def test_stop(self):
+        self.cache.stop()
+        self.assertFalse(self.cache.running)
+        self.assertEqual(self.cache._thread, None)
+
+
+class NormalizeImageRefTestCase(unittest.TestCase):
+    def test(self):
+        self.assertEqual(wc_env_manager.state.normalize_image_ref('karrlab/wc_env'), 'karrlab/wc_env:latest')
+        self.assertEqual(wc_env_manager.state.normalize_image_ref('karrlab/wc_env:0.0.1'), 'karrlab/wc_env:0.0.1')
+        self.assertEqual(wc_env_manager.state.normalize_image_ref('localhost:5000/wc_env'), 'localhost:5000/wc_env:latest')
+        self.assertEqual(wc_env_manager.state.normalize_image_ref('wc_env@sha256:abc'), 'wc_env@sha256:abc')
@@ -7,12 +7,29 @@
 """
 
 import cement
+import sys
 import wc_env_manager
 import wc_env_manager.core
+import wc_env_manager.daemon
 
 VERBOSE = True
 
 
+def get_manager(verbose=VERBOSE):
+    """ Get a manager. Within the daemon, get the daemon's long-lived manager.
+
+    Args:
+        verbose (:obj:`bool`, optional): if :obj:`True`, print status messages
+
+    Returns:
+        :obj:`wc_env_manager.core.WcEnvManager`: manager
+    """
+    daemon = wc_env_manager.daemon.get_current_daemon()
+    if daemon:
+        return daemon.get_manager(verbose)
+    return wc_env_manager.core.WcEnvManager({'verbose': verbose})
+
+
 class BaseController(cement.Controller):
     """ Base controller for command line application """
 
@@ -29,6 +46,100 @@ class BaseController(cement.Controller):
         self._parser.print_help()
 
 
+EXPORT_ARGUMENTS = [
+    (['path'], dict(type=str, help='Path to directory for the archive, or - for standard output')),
+    (['--level'], dict(type=int, default=3, help='zstd compression level')),
+    (['--chunk-size'], dict(type=str, default=None,
+                            help='Maximum size of each file of the archive (e.g., 1GB)')),
+]
+
+IMPORT_ARGUMENTS = [
+    (['path'], dict(type=str, help='Path to directory of the archive, or - for standard input')),
+]
+
+
+def export_image(mgr, image, pargs, base_image=None):
+    """ Export an image to a compressed archive according to the command line arguments
+
+    Args:
+        mgr (:obj:`wc_env_manager.core.WcEnvManager`): manager
+        image (:obj:`docker.models.images.Image`): image
+        pargs (:obj:`argparse.Namespace`): parsed command line arguments
+        base_image (:obj:`docker.models.images.Image`, optional): image whose layers should be
+            omitted from the archive
+    """
+    kwargs = {}
+    if pargs.chunk_size:
+        kwargs['chunk_size'] = wc_env_manager.core.parse_size(pargs.chunk_size)
+    mgr.export_image(image, pargs.path, level=pargs.level, base_image=base_image, **kwargs)
+
+
+ANALYZE_ARGUMENTS = [
+    (['--compare'], dict(type=str, default=None,
+                         help='Compare the sizes of the directories with another version of the image '
+                              '(a tag of the image or a `repo:tag` reference)')),
+    (['--depth'], dict(type=int, default=3, help='Depth of the directories to report')),
+    (['--top'], dict(type=int, default=20, help='Number of directories, artifacts, and overwritten files to report')),
+]
+
+
+def analyze_image(mgr, image, repo, pargs):
+    """ Print the sizes of the layers and largest directories of an image, its wasted bytes and leftover
+    build artifacts, and, optionally, a comparison with another version of the image
+
+    Args:
+        mgr (:obj:`wc_env_manager.core.WcEnvManager`): manager
+        image (:obj:`docker.models.images.Image`): image
+        repo (:obj:`str`): repository of the image, used to resolve tags passed to `--compare`
+        pargs (:obj:`argparse.Namespace`): parsed command line arguments
+    """
+    import wc_env_manager.analysis
+    format_size = wc_env_manager.core.format_size
+
+    analysis = mgr.analyze_image(image)
+    print('Image {}: {} in {} files and {} layers; {} wasted by overwritten or deleted files'.format(
+        ', '.join(analysis.tags) or analysis.image, format_size(analysis.size), len(analysis.files),
+        len(analysis.layers), format_size(analysis.wasted_bytes)))
+
+    print('\nLayers:')
+    for i_layer, summary in enumerate(analysis.get_layer_summaries()):
+        print('  {:>3}  {:>10}  {:>8} files  {:>10} wasted  {}'.format(
+            i_layer, format_size(summary['size']), summary['files'], format_size(summary['wasted']),
+            summary['digest'][0:19]))
+
+    print('\nLargest directories:')
+    for dirname, size in analysis.get_largest_directories(depth=pargs.depth, n=pargs.top):
+        print('  {:>10}  {}'.format(format_size(size), dirname))
+
+    if analysis.wasted:
+        print('\nLargest overwritten or deleted files:')
+        for file in sorted(analysis.wasted, key=lambda file: -file.size)[0:pargs.top]:
+            print('  {:>10}  {} (layer {}, {} by layer {})'.format(
+                format_size(file.size), file.path, file.layer, file.reason, file.hidden_by))
+
+    artifacts = analysis.get_build_artifacts()
+    if artifacts:
+        print('\nBuild artifacts ({}):'.format(format_size(sum(size for _, size, _ in artifacts))))
+        for path, size, description in artifacts[0:pargs.top]:
+            print('  {:>10}  {} ({})'.format(format_size(size), path, description))
+
+    if pargs.compare:
+        other_ref = pargs.compare if ':' in pargs.compare else '{}:{}'.format(repo, pargs.compare)
+        other = mgr.analyze_image(other_ref)
+        print('\nChanges from {} ({} -> {}):'.format(other_ref, format_size(other.size), format_size(analysis.size)))
+        for dirname, old_size, new_size in wc_env_manager.analysis.diff_analyses(
+                other, analysis, depth=pargs.depth)[0:pargs.top]:
+            print('  {}{:>10}  {:>10} -> {:>10}  {}'.format(
+                '+' if new_size > old_size else '-', format_size(abs(new_size - old_size)),
+                format_size(old_size), format_size(new_size), dirname))
+
+
+PROFILE_ARGUMENTS = [
+    (['--profile'], dict(type=str, default=None, choices=['full', 'slim'],
+                         help='Build profile; slim images are tagged with the suffix -slim (default: configured)')),
+]
+
+
 class BaseImageController(cement.Controller):
     """ Build, push, and pull the base image, *wc_env_dependencies* """
 
@@ -44,40 +155,95 @@ class BaseImageController(cement.Controller):
     def _default(self):
         self._parser.print_help()
 
-    @cement.ex(help='Build base image')
+    @cement.ex(help='Build base image; the slim profile builds a runtime-only image', arguments=PROFILE_ARGUMENTS)
     def build(self):
-        mgr = wc_env_manager.core.WcEnvManager({'verbose': VERBOSE})
-        mgr.build_base_image()
+        mgr = get_manager(VERBOSE)
+        mgr.build_base_image(profile=self.app.pargs.profile)
         print('Built base image {}:{{{}}}'.format(
-            mgr.config['base_image']['repo'], ', '.join(mgr.config['base_image']['tags'])))
-
-    @cement.ex(help='Push base image')
+            mgr.config['base_image']['repo'], ', '.join(mgr.get_base_image_tags(profile=self.app.pargs.profile))))
+
+    @cement.ex(help='Propose an order of the layers of the base image by how often their inputs change',
+               arguments=PROFILE_ARGUMENTS)
+    def layer_order(self):
+        mgr = get_manager(False)
+        try:
+            proposal = mgr.get_base_image_layer_order(profile=self.app.pargs.profile)
+        except wc_env_manager.core.WcEnvManagerError as exception:
+            raise SystemExit(str(exception))
+
+        print('{:>8}  {:>8}  {}'.format('Current', 'Changes', 'Proposed order'))
+        for name in proposal.proposed_order:
+            print('{:>8}  {:>8}  {}'.format(proposal.current_order.index(name) + 1,
+                                            proposal.change_counts.get(name, 0), name))
+
+        if proposal.n_builds:
+            print('Over {} builds, the current order rebuilt {} sections ({:.1f} per build); '
+                  'the proposed order would have rebuilt {} sections ({:.1f} per build)'.format(
+                      proposal.n_builds,
+                      proposal.current_rebuilt, proposal.current_rebuilt / proposal.n_builds,
+                      proposal.proposed_rebuilt, proposal.proposed_rebuilt / proposal.n_builds))
+        else:
+            print('The build history does not contain any rebuilds yet')
+        if proposal.proposed_order != proposal.current_order and not mgr.config['base_image']['reorder_layers']:
+            print('Set `base_image.reorder_layers` to apply the proposed order to builds')
+
+    @cement.ex(help='Resolve the Python requirements of the base image and lock their versions and hashes')
+    def lock(self):
+        mgr = get_manager(VERBOSE)
+        try:
+            lock_path = mgr.lock_python_requirements()
+        except wc_env_manager.core.WcEnvManagerError as exception:
+            raise SystemExit(str(exception))
+        with open(lock_path, 'r') as file:
+            reqs = wc_env_manager.core.parse_python_requirements_lock(file.read())
+        print('Locked {} Python requirements to {}'.format(len(reqs), lock_path))
+
+    @cement.ex(help='Push base image', arguments=PROFILE_ARGUMENTS)
     def push(self):
-        mgr = wc_env_manager.core.WcEnvManager({'verbose': VERBOSE})
+        mgr = get_manager(VERBOSE)
         config = mgr.config['base_image']
+        tags = mgr.get_base_image_tags(profile=self.app.pargs.profile)
         mgr.login_docker_hub()
-        mgr.push_image(config['repo_unsquashed'], config['tags'])
-        mgr.push_image(config['repo'], config['tags'])
+        mgr.push_image(config['repo_unsquashed'], tags)
+        mgr.push_image(config['repo'], tags)
 
-    @cement.ex(help='Pull base image')
+    @cement.ex(help='Pull base image', arguments=PROFILE_ARGUMENTS)
     def pull(self):
-        mgr = wc_env_manager.core.WcEnvManager({'verbose': VERBOSE})
+        mgr = get_manager(VERBOSE)
         config = mgr.config['base_image']
-        mgr.pull_image(config['repo_unsquashed'], config['tags'])
-        mgr.pull_image(config['repo'], config['tags'])
+        tags = mgr.get_base_image_tags(profile=self.app.pargs.profile)
+        mgr.pull_image(config['repo_unsquashed'], tags)
+        mgr.pull_image(config['repo'], tags)
 
-    @cement.ex(help='Remove base image')
+    @cement.ex(help='Remove base image', arguments=PROFILE_ARGUMENTS)
     def remove(self):
-        mgr = wc_env_manager.core.WcEnvManager({'verbose': VERBOSE})
+        mgr = get_manager(VERBOSE)
         config = mgr.config['base_image']
-        mgr.remove_image(config['repo_unsquashed'], config['tags'], force=True)
-        mgr.remove_image(config['repo'], config['tags'], force=True)
+        tags = mgr.get_base_image_tags(profile=self.app.pargs.profile)
+        mgr.remove_image(config['repo_unsquashed'], tags, force=True)
+        mgr.remove_image(config['repo'], tags, force=True)
 
     @cement.ex(help='Get base image version')
     def version(self):
-        mgr = wc_env_manager.core.WcEnvManager({'verbose': VERBOSE})
+        mgr = get_manager(VERBOSE)
         print(mgr.get_image_version(mgr._base_image))
 
+    @cement.ex(help='Export base image to a compressed archive for offline distribution',
+               arguments=EXPORT_ARGUMENTS)
+    def export(self):
+        mgr = get_manager(VERBOSE and self.app.pargs.path != '-')
+        export_image(mgr, mgr._base_image, self.app.pargs)
+
+    @cement.ex(help='Analyze the sizes of the layers and files of the base image', arguments=ANALYZE_ARGUMENTS)
+    def analyze(self):
+        mgr = get_manager(False)
+        analyze_image(mgr, mgr._base_image, mgr.config['base_image']['repo'], self.app.pargs)
+
+    @cement.ex(label='import', help='Import base image from a compressed archive', arguments=IMPORT_ARGUMENTS)
+    def import_image(self):
+        mgr = get_manager(VERBOSE and self.app.pargs.path != '-')
+        mgr.import_image(self.app.pargs.path)
+
 
 class ImageController(cement.Controller):
     """ Build, push, and pull the image, *wc_env* """
@@ -96,35 +262,55 @@ class ImageController(cement.Controller):
 
     @cement.ex(help='Build image')
     def build(self):
-        mgr = wc_env_manager.core.WcEnvManager({'verbose': VERBOSE})
+        mgr = get_manager(VERBOSE)
         mgr.build_image()
         print('Built image {}:{{{}}}'.format(
             mgr.config['image']['repo'], ', '.join(mgr.config['image']['tags'])))
 
     @cement.ex(help='Push image')
     def push(self):
-        mgr = wc_env_manager.core.WcEnvManager({'verbose': VERBOSE})
+        mgr = get_manager(VERBOSE)
         config = mgr.config['image']
         mgr.login_docker_hub()
         mgr.push_image(config['repo'], config['tags'])
 
     @cement.ex(help='Pull image')
     def pull(self):
-        mgr = wc_env_manager.core.WcEnvManager({'verbose': VERBOSE})
+        mgr = get_manager(VERBOSE)
         config = mgr.config['image']
         mgr.pull_image(config['repo'], config['tags'])
 
     @cement.ex(help='Remove image')
     def remove(self):
-        mgr = wc_env_manager.core.WcEnvManager({'verbose': VERBOSE})
+        mgr = get_manager(VERBOSE)
         config = mgr.config['image']
         mgr.remove_image(config['repo'], config['tags'], force=True)
 
     @cement.ex(help='Get image version')
     def version(self):
-        mgr = wc_env_manager.core.WcEnvManager({'verbose': VERBOSE})
+        mgr = get_manager(VERBOSE)
         print(mgr.get_image_version(mgr._image))
 
+    @cement.ex(help='Export image to a compressed archive for offline distribution',
+               arguments=EXPORT_ARGUMENTS + [
+                   (['--exclude-base'], dict(action='store_true',
+                                             help='Omit the layers of the base image from the archive')),
+               ])
+    def export(self):
+        mgr = get_manager(VERBOSE and self.app.pargs.path != '-')
+        export_image(mgr, mgr._image, self.app.pargs,
+                     base_image=mgr._base_image if self.app.pargs.exclude_base else None)
+
+    @cement.ex(help='Analyze the sizes of the layers and files of the image', arguments=ANALYZE_ARGUMENTS)
+    def analyze(self):
+        mgr = get_manager(False)
+        analyze_image(mgr, mgr._image, mgr.config['image']['repo'], self.app.pargs)
+
+    @cement.ex(label='import', help='Import image from a compressed archive', arguments=IMPORT_ARGUMENTS)
+    def import_image(self):
+        mgr = get_manager(VERBOSE and self.app.pargs.path != '-')
+        mgr.import_image(self.app.pargs.path)
+
 
 class NetworkController(cement.Controller):
     """ Build and remove a Docker network """
@@ -143,15 +329,130 @@ class NetworkController(cement.Controller):
 
     @cement.ex(help='Build network')
     def build(self):
-        mgr = wc_env_manager.core.WcEnvManager({'verbose': VERBOSE})
+        mgr = get_manager(VERBOSE)
         mgr.build_network()
 
     @cement.ex(help='Remove network')
     def remove(self):
-        mgr = wc_env_manager.core.WcEnvManager({'verbose': VERBOSE})
+        mgr = get_manager(VERBOSE)
         mgr.remove_network()
 
 
+class CacheVolumeController(cement.Controller):
+    """ Build and remove the Docker volumes for the caches which are shared among containers """
+
+    class Meta:
+        label = 'cache-volume'
+        description = 'Build and remove the Docker volumes for the caches which are shared among containers'
+        help = 'Build and remove the Docker volumes for the caches which are shared among containers'
+        stacked_on = 'base'
+        stacked_type = 'nested'
+        arguments = []
+
+    @cement.ex(hide=True)
+    def _default(self):
+        self._parser.print_help()
+
+    @cement.ex(help='Build cache volumes')
+    def build(self):
+        mgr = get_manager(VERBOSE)
+        config = mgr.config['container']['cache_volumes']
+        for volume in mgr.build_cache_volumes():
+            print('Cache volume {} is mounted at {} ({})'.format(
+                volume.name, config[volume.name]['bind'], config[volume.name]['mode']))
+
+    @cement.ex(help='Remove cache volumes')
+    def remove(self):
+        mgr = get_manager(VERBOSE)
+        mgr.remove_cache_volumes()
+
+
+CONTAINER_FILTER_ARGUMENTS = [
+    (['--older-than'], dict(type=str, default=None,
+                            help='Only containers created at least this long ago (e.g., 12h, 7d)')),
+    (['--image-version'], dict(type=str, default=None,
+                               help='Only containers of this version of the image')),
+    (['--label'], dict(type=str, action='append', default=[], dest='labels',
+                       help='Only containers with this label (KEY=VALUE)')),
+    (['--max-workers'], dict(type=int, default=None,
+                             help='Maximum number of concurrent operations')),
+]
+
+
+def get_filtered_containers(mgr, pargs):
+    """ Get the WC containers which match the filters of the command line arguments
+
+    Args:
+        mgr (:obj:`wc_env_manager.core.WcEnvManager`): manager
+        pargs (:obj:`argparse.Namespace`): parsed command line arguments
+
+    Returns:
+        :obj:`list` of :obj:`docker.models.containers.Container`: containers
+    """
+    return mgr.get_containers(
+        older_than=wc_env_manager.core.parse_duration(pargs.older_than) if pargs.older_than else None,
+        image_version=pargs.image_version,
+        labels=dict(label.partition('=')[::2] for label in pargs.labels))
+
+
+def print_container_operation_results(verb, results):
+    """ Print the results of an operation on containers
+
+    Args:
+        verb (:obj:`str`): past tense of the operation (e.g., `Removed`)
+        results (:obj:`list` of :obj:`wc_env_manager.core.ContainerOperationResult`): results
+
+    Returns:
+        :obj:`int`: number of containers for which the operation failed
+    """
+    n_failed = 0
+    for result in results:
+        if result.error is None:
+            print('{} container {} ({:.1f} s)'.format(verb, result.container, result.duration))
+        else:
+            n_failed += 1
+            print('Error: container {}: {}'.format(result.container, str(result.error)))
+    return n_failed
+
+
+def print_container_process_results(results, print_output=True):
+    """ Print the exit code, duration, and output of a process run in containers
+
+    Args:
+        results (:obj:`list` of :obj:`wc_env_manager.core.ContainerOperationResult`): results
+        print_output (:obj:`bool`, optional): if :obj:`True`, print the output of each container
+
+    Returns:
+        :obj:`int`: number of containers in which the process failed
+    """
+    n_failed = 0
+    for result in results:
+        if result.error is not None:
+            n_failed += 1
+            print('Error: container {}: {}'.format(result.container, str(result.error)))
+            continue
+
+        process = result.result
+        if process.exit_code != 0:
+            n_failed += 1
+        print('==> {} (exit code {}, {:.1f} s) <=='.format(result.container, process.exit_code, result.duration))
+        if print_output:
+            if process.truncated:
+                print('[output truncated]')
+            output = process.output[0:-1] if process.output.endswith('\n') else process.output
+            if output:
+                print(output)
+
+    if results:
+        slowest = max(results, key=lambda result: result.duration)
+        print('Ran in {} containers: {} succeeded, {} failed; slowest: {} ({:.1f} s)'.format(
+            len(results), len(results) - n_failed, n_failed, slowest.container, slowest.duration))
+    else:
+        print('No containers matched')
+
+    return n_failed
+
+
 class ContainerController(cement.Controller):
     """ Build and remove containers of *wc_env* """
 
@@ -170,15 +471,212 @@ class ContainerController(cement.Controller):
 
     @cement.ex(help='Build container')
     def build(self):
-        mgr = wc_env_manager.core.WcEnvManager({'verbose': VERBOSE})
+        mgr = get_manager(VERBOSE)
         mgr.build_container()
         mgr.setup_container()
         print('Built container {}'.format(mgr._container.name))
 
-    @cement.ex(help='Remove container')
+    @cement.ex(help='Upgrade the Python packages of the latest container which have changed',
+               arguments=[
+                   (['--all'], dict(action='store_true', help='Upgrade all of the Python packages')),
+               ])
+    def upgrade(self):
+        mgr = get_manager(VERBOSE)
+        mgr.setup_container(upgrade=True, incremental=not self.app.pargs.all)
+        print('Upgraded container {}'.format(mgr._container.name))
+
+    @cement.ex(help='Push changes to the configured host directories into the latest container until interrupted',
+               arguments=[
+                   (['--debounce'], dict(type=float, default=None,
+                                         help='Time to wait for further changes before pushing changes (ms)')),
+                   (['--no-initial-sync'], dict(action='store_true',
+                                                help='Do not synchronize the directories before watching them')),
+               ])
+    def watch(self):
+        args = self.app.pargs
+        mgr = get_manager(VERBOSE)
+        kwargs = {}
+        if args.debounce is not None:
+            kwargs['debounce'] = args.debounce / 1000.
+        report = mgr.watch_paths(initial_sync=not args.no_initial_sync, **kwargs)
+        print('Pushed {} files and deleted {} files'.format(len(report.files_transferred), len(report.files_deleted)))
+
+    @cement.ex(help='Retrieve compressed files from the latest container',
+               arguments=[
+                   (['container_path'], dict(type=str, help='Path to directory within the container')),
+                   (['local_path'], dict(type=str, help='Path to directory on the host')),
+                   (['--codec'], dict(type=str, default=None, choices=['none', 'gzip', 'xz', 'zstd'],
+                                      help='Compression codec')),
+                   (['--level'], dict(type=int, default=None, help='Compression level')),
+                   (['--include'], dict(type=str, action='append', default=[],
+                                        help='Glob pattern of files to retrieve (e.g., *.h5)')),
+                   (['--exclude'], dict(type=str, action='append', default=[],
+                                        help='Glob pattern of files not to retrieve (e.g., checkpoints)')),
+               ])
+    def retrieve(self):
+        args = self.app.pargs
+        mgr = get_manager(VERBOSE)
+        mgr.retrieve_path(args.container_path, args.local_path, codec=args.codec, level=args.level,
+                          include=args.include, exclude=args.exclude)
+
+    @cement.ex(help='Save the contents of the tmpfs scratch directories of the latest container to the host',
+               arguments=[
+                   (['local_path'], dict(type=str, help='Path to directory on the host')),
+                   (['--path'], dict(type=str, action='append', default=None, dest='container_paths',
+                                     help='Path of a tmpfs mount to save (default: all tmpfs mounts)')),
+                   (['--codec'], dict(type=str, default=None, choices=['none', 'gzip', 'xz', 'zstd'],
+                                      help='Compression codec')),
+                   (['--level'], dict(type=int, default=None, help='Compression level')),
+                   (['--include'], dict(type=str, action='append', default=[],
+                                        help='Glob pattern of files to save (e.g., *.h5)')),
+                   (['--exclude'], dict(type=str, action='append', default=[],
+                                        help='Glob pattern of files not to save')),
+               ])
+    def flush_tmpfs(self):
+        args = self.app.pargs
+        mgr = get_manager(VERBOSE)
+        reports = mgr.flush_tmpfs(args.local_path, container_paths=args.container_paths, codec=args.codec,
+                                  level=args.level, include=args.include, exclude=args.exclude)
+        for container_path, report in reports.items():
+            print('Saved {} files ({}) from {}'.format(len(report.files),
+                                                       wc_env_manager.core.format_size(report.bytes_uncompressed),
+                                                       container_path))
+
+    @cement.ex(help='Concurrently run a command in the running containers (e.g., run -- pip freeze)',
+               arguments=[
+                   (['cmd'], dict(type=str, nargs='+', help='Command to run')),
+                   (['--work-dir'], dict(type=str, default=None, help='Working directory within the containers')),
+                   (['--env'], dict(type=str, action='append', default=[],
+                                    help='Environment variable (KEY=VALUE)')),
+                   (['--stream'], dict(action='store_true',
+                                       help='Print the output of each container, prefixed by its name, '
+                                            'as it is produced')),
+                   (['--max-output'], dict(type=str, default=None,
+                                           help='Maximum size of the output to print for each container (e.g., 4KB)')),
+               ] + CONTAINER_FILTER_ARGUMENTS)
+    def run(self):
+        args = self.app.pargs
+        mgr = get_manager(VERBOSE)
+        containers = [container for container in get_filtered_containers(mgr, args)
+                      if container.status == 'running']
+
+        kwargs = {}
+        if args.stream:
+            kwargs['on_output'] = lambda container, line: print('{}: {}'.format(container, line), flush=True)
+        if args.max_output is not None:
+            kwargs['max_output'] = wc_env_manager.core.parse_size(args.max_output)
+        results = mgr.run_in_containers(args.cmd, containers=containers, max_concurrency=args.max_workers,
+                                        work_dir=args.work_dir,
+                                        env=dict(var.partition('=')[::2] for var in args.env),
+                                        **kwargs)
+        if print_container_process_results(results, print_output=not args.stream):
+            raise SystemExit(1)
+
+    @cement.ex(help='Stop containers', arguments=CONTAINER_FILTER_ARGUMENTS)
+    def stop(self):
+        mgr = get_manager(VERBOSE)
+        if print_container_operation_results('Stopped', mgr.stop_containers(
+                containers=get_filtered_containers(mgr, self.app.pargs),
+                max_workers=self.app.pargs.max_workers)):
+            raise SystemExit(1)
+
+    @cement.ex(help='Start containers', arguments=CONTAINER_FILTER_ARGUMENTS)
+    def start(self):
+        mgr = get_manager(VERBOSE)
+        if print_container_operation_results('Started', mgr.start_containers(
+                containers=get_filtered_containers(mgr, self.app.pargs),
+                max_workers=self.app.pargs.max_workers)):
+            raise SystemExit(1)
+
+    @cement.ex(help='Restart containers', arguments=CONTAINER_FILTER_ARGUMENTS)
+    def restart(self):
+        mgr = get_manager(VERBOSE)
+        if print_container_operation_results('Restarted', mgr.restart_containers(
+                containers=get_filtered_containers(mgr, self.app.pargs),
+                max_workers=self.app.pargs.max_workers)):
+            raise SystemExit(1)
+
+    @cement.ex(help='Remove containers', arguments=CONTAINER_FILTER_ARGUMENTS)
     def remove(self):
-        mgr = wc_env_manager.core.WcEnvManager({'verbose': VERBOSE})
-        mgr.remove_containers(force=True)
+        mgr = get_manager(VERBOSE)
+        if print_container_operation_results('Removed', mgr.remove_containers(
+                force=True,
+                containers=get_filtered_containers(mgr, self.app.pargs),
+                max_workers=self.app.pargs.max_workers)):
+            raise SystemExit(1)
+
+
+class GarbageCollectionController(cement.Controller):
+    """ Remove old images and idle containers """
+
+    class Meta:
+        label = 'gc'
+        description = 'Remove old images and idle containers'
+        help = 'Remove old images and idle containers'
+        stacked_on = 'base'
+        stacked_type = 'embedded'
+        arguments = []
+
+    @cement.ex(help='Remove old versions of the images, dangling images, and idle containers',
+               arguments=[
+                   (['--keep-versions'], dict(type=int, default=None,
+                                              help='Number of versions of each image to keep')),
+                   (['--max-size'], dict(type=str, default=None,
+                                         help='Maximum total size of the images (e.g., 100GB)')),
+                   (['--max-idle'], dict(type=str, default=None,
+                                         help='Maximum idle time of stopped containers (e.g., 7d)')),
+                   (['--dry-run'], dict(action='store_true',
+                                        help='Only report the images and containers that would be removed')),
+               ])
+    def gc(self):
+        args = self.app.pargs
+        mgr = get_manager(VERBOSE)
+        report = mgr.collect_garbage(keep_versions=args.keep_versions, max_size=args.max_size,
+                                     max_container_idle=args.max_idle, dry_run=args.dry_run)
+
+        verb = 'Would remove' if report.dry_run else 'Removed'
+        for container in report.containers:
+            print('{} container {} ({})'.format(verb, container['container'].name,
+                                                wc_env_manager.core.format_size(container['size'])))
+        for image in report.images:
+            print('{} image {} ({})'.format(verb, ', '.join(image['image'].tags) or image['image'].short_id,
+                                            wc_env_manager.core.format_size(image['size'])))
+        print('{} {}'.format('Would reclaim' if report.dry_run else 'Reclaimed',
+                             wc_env_manager.core.format_size(report.bytes_reclaimed)))
+
+
+class DaemonController(cement.Controller):
+    """ Start, stop, and get the status of the daemon """
+
+    class Meta:
+        label = 'daemon'
+        description = 'Start, stop, and get the status of the daemon which serves commands with a long-lived manager'
+        help = 'Start, stop, and get the status of the daemon which serves commands with a long-lived manager'
+        stacked_on = 'base'
+        stacked_type = 'nested'
+        arguments = []
+
+    @cement.ex(hide=True)
+    def _default(self):
+        self._parser.print_help()
+
+    @cement.ex(help='Start the daemon and serve commands until it is stopped')
+    def start(self):
+        daemon = wc_env_manager.daemon.Daemon()
+        print('Serving commands at {}'.format(daemon.socket_path))
+        sys.stdout.flush()
+        daemon.serve_forever()
+
+    @cement.ex(help='Stop the daemon')
+    def stop(self):
+        if wc_env_manager.daemon.run_in_daemon(['daemon', 'stop']) is None:
+            raise SystemExit('The daemon is not running')
+        print('Stopped daemon')
+
+    @cement.ex(help='Get the status of the daemon')
+    def status(self):
+        if wc_env_manager.daemon.run_in_daemon(['daemon', 'status']) is None:
+            raise SystemExit('The daemon is not running')
 
 
 class AllController(cement.Controller):
@@ -199,7 +697,7 @@ class AllController(cement.Controller):
 
     @cement.ex(help='Build base image, image, and container')
     def build(self):
-        mgr = wc_env_manager.core.WcEnvManager({'verbose': VERBOSE})
+        mgr = get_manager(VERBOSE)
         mgr.remove_containers()
         mgr.build_base_image()
         mgr.build_image()
@@ -211,9 +709,38 @@ class AllController(cement.Controller):
             mgr.config['image']['repo'], ', '.join(mgr.config['image']['tags'])))
         print('Built container {}'.format(mgr._container.name))
 
+    @cement.ex(help='Concurrently build the base image and image for several versions of Python',
+               arguments=[
+                   (['python_versions'], dict(type=str, nargs='+', metavar='python_version',
+                                              help='Version of Python (e.g., 3.8.2)')),
+                   (['--max-workers'], dict(type=int, default=None,
+                                            help='Maximum number of concurrent builds')),
+               ])
+    def build_matrix(self):
+        args = self.app.pargs
+        mgr = get_manager(VERBOSE)
+        report = mgr.build_matrix(args.python_versions, max_workers=args.max_workers)
+
+        print('{:<10} {:>12} {:>12} {:>12}  {}'.format('Python', 'Base image', 'Image', 'Total', 'Tags'))
+        for result in report.results:
+            if result.error is None:
+                tags = ', '.join(result.image.tags)
+            else:
+                tags = 'Error: {}'.format(str(result.error).split('\n')[0])
+            print('{:<10} {:>10.1f} s {:>10.1f} s {:>10.1f} s  {}'.format(
+                result.python_version, result.base_image_duration or 0., result.image_duration or 0.,
+                result.duration, tags))
+        print(('Built shared stage in {:.1f} s and all versions in {:.1f} s '
+               '(sum of the durations of the builds: {:.1f} s)').format(
+            report.shared_duration, report.duration,
+            report.shared_duration + sum(result.duration for result in report.results)))
+
+        if any(result.error is not None for result in report.results):
+            raise SystemExit(1)
+
     @cement.ex(help='Push base image and image')
     def push(self):
-        mgr = wc_env_manager.core.WcEnvManager({'verbose': VERBOSE})
+        mgr = get_manager(VERBOSE)
         mgr.login_docker_hub()
 
         config = mgr.config['base_image']
@@ -227,7 +754,7 @@ class AllController(cement.Controller):
 
     @cement.ex(help='Pull base image and image')
     def pull(self):
-        mgr = wc_env_manager.core.WcEnvManager({'verbose': VERBOSE})
+        mgr = get_manager(VERBOSE)
 
         config = mgr.config['base_image']
         mgr.pull_image(config['repo_unsquashed'], config['tags'])
@@ -240,7 +767,7 @@ class AllController(cement.Controller):
 
     @cement.ex(help='Remove base image, image, and containers')
     def remove(self):
-        mgr = wc_env_manager.core.WcEnvManager({'verbose': VERBOSE})
+        mgr = get_manager(VERBOSE)
 
         config = mgr.config['base_image']
         mgr.remove_image(config['repo_unsquashed'], config['tags'], force=True)
@@ -264,11 +791,24 @@ class App(cement.App):
             BaseImageController,
             ImageController,
             NetworkController,
+            CacheVolumeController,
             ContainerController,
+            GarbageCollectionController,
+            DaemonController,
             AllController,
         ]
 
 
 def main():
+    argv = sys.argv[1:]
+    if wc_env_manager.daemon.use_daemon(argv):
+        exit_code = wc_env_manager.daemon.run_in_daemon(argv)
+        if exit_code is not None:
+            sys.exit(exit_code)
+
     with App() as app:
         app.run()
+
+
+if __name__ == '__main__':
+    main()
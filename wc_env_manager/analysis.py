@@ -0,0 +1,338 @@
+""" Analysis of the sizes of the layers and files of Docker images
+
+The output of `docker save` is streamed once: the tar archive of each layer is read member by
+member, without extracting it, to build an index of the paths and sizes of the files of each layer.
+The indices are then replayed from the base layer to the top layer, applying the whiteouts of each
+layer, to determine the files of the image, the bytes of the lower layers which are hidden by
+files which are overwritten or deleted by upper layers, and the leftover build artifacts.
+
+:Author: Jonathan Karr <jonrkarr@gmail.com>
+:Date: 2020-02-14
+:Copyright: 2020, Karr Lab
+:License: MIT
+"""
+
+import bisect
+import fnmatch
+import os
+import re
+import tarfile
+import wc_env_manager.archive
+
+# glob patterns of files which are typically left over from builds, and their descriptions
+BUILD_ARTIFACT_PATTERNS = [
+    ('/tmp/*', 'temporary file'),
+    ('/var/tmp/*', 'temporary file'),
+    ('/var/lib/apt/lists/*', 'apt package list'),
+    ('/var/cache/apt/*', 'apt package cache'),
+    ('/root/.cache/*', 'download cache'),
+    ('/root/.ccache/*', 'compiler cache'),
+    ('*.o', 'object file'),
+    ('*.tar', 'archive'),
+    ('*.tar.gz', 'archive'),
+    ('*.tgz', 'archive'),
+    ('*.tar.bz2', 'archive'),
+    ('*.tar.xz', 'archive'),
+    ('*.zip', 'archive'),
+]
+
+WHITEOUT_PREFIX = '.wh.'
+OPAQUE_WHITEOUT = '.wh..wh..opq'
+
+
+class LayerIndex(object):
+    """ Index of the files of a layer of a Docker image
+
+    Attributes:
+        digest (:obj:`str`): SHA-256 digest of the uncompressed tar archive of the layer (`sha256:...`)
+        files (:obj:`dict`): dictionary which maps the absolute path of each file of the layer to its size (bytes)
+        deleted (:obj:`list` of :obj:`str`): paths which the layer deletes from the lower layers (whiteouts)
+        opaque_dirs (:obj:`list` of :obj:`str`): directories whose contents in the lower layers the
+            layer hides (opaque whiteouts)
+    """
+
+    def __init__(self, digest=None):
+        """
+        Args:
+            digest (:obj:`str`, optional): digest of the layer
+        """
+        self.digest = digest
+        self.files = {}
+        self.deleted = []
+        self.opaque_dirs = []
+
+    @property
+    def size(self):
+        """ Get the total size of the files of the layer
+
+        Returns:
+            :obj:`int`: size (bytes)
+        """
+        return sum(self.files.values())
+
+
+class WastedFile(object):
+    """ File of a lower layer which is hidden by an upper layer
+
+    Attributes:
+        path (:obj:`str`): path of the file
+        size (:obj:`int`): size of the file (bytes)
+        layer (:obj:`int`): index of the layer of the file
+        hidden_by (:obj:`int`): index of the layer which overwrites or deletes the file
+        reason (:obj:`str`): `overwritten` or `deleted`
+    """
+
+    def __init__(self, path, size, layer, hidden_by, reason):
+        self.path = path
+        self.size = size
+        self.layer = layer
+        self.hidden_by = hidden_by
+        self.reason = reason
+
+
+class ImageAnalysis(object):
+    """ Analysis of the sizes of the layers and files of a Docker image
+
+    Attributes:
+        image (:obj:`str`): id of the image
+        tags (:obj:`list` of :obj:`str`): tags of the image
+        layers (:obj:`list` of :obj:`LayerIndex`): index of each layer, from the base layer to the top layer
+        files (:obj:`dict`): dictionary which maps the path of each file of the image to its size (bytes)
+            and the index of the layer which provides it
+        wasted (:obj:`list` of :obj:`WastedFile`): files of lower layers which are hidden by upper layers
+    """
+
+    def __init__(self, layers, image=None, tags=None):
+        """
+        Args:
+            layers (:obj:`list` of :obj:`LayerIndex`): index of each layer, from the base layer to the top layer
+            image (:obj:`str`, optional): id of the image
+            tags (:obj:`list` of :obj:`str`, optional): tags of the image
+        """
+        self.image = image
+        self.tags = tags or []
+        self.layers = layers
+        self.files = {}
+        self.wasted = []
+
+        for i_layer, layer in enumerate(layers):
+            # the paths within the whiteouts are found by bisecting the sorted paths of the lower layers
+            if layer.opaque_dirs or layer.deleted:
+                paths = sorted(self.files.keys())
+            for dirname in layer.opaque_dirs:
+                self._hide(dirname, i_layer, 'deleted', paths=paths, descendants_only=True)
+            for path in layer.deleted:
+                self._hide(path, i_layer, 'deleted', paths=paths)
+            for path, size in layer.files.items():
+                self._hide(path, i_layer, 'overwritten')
+                self.files[path] = (size, i_layer)
+
+    def _hide(self, path, i_layer, reason, paths=None, descendants_only=False):
+        """ Hide a path, and the paths within it, of the lower layers
+
+        Args:
+            path (:obj:`str`): path
+            i_layer (:obj:`int`): index of the layer which hides the path
+            reason (:obj:`str`): `overwritten` or `deleted`
+            paths (:obj:`list` of :obj:`str`, optional): sorted paths of the files of the lower layers,
+                including paths which have already been hidden. If provided, also hide the paths
+                within the path.
+            descendants_only (:obj:`bool`, optional): if :obj:`True`, only hide the paths within the path
+        """
+        hidden = []
+        if not descendants_only and path in self.files:
+            hidden.append(path)
+        if paths is not None:
+            prefix = path.rstrip('/') + '/'
+            i_path = bisect.bisect_left(paths, prefix)
+            while i_path < len(paths) and paths[i_path].startswith(prefix):
+                if paths[i_path] in self.files:
+                    hidden.append(paths[i_path])
+                i_path += 1
+        for other in hidden:
+            size, i_other_layer = self.files.pop(other)
+            if i_other_layer != i_layer:
+                self.wasted.append(WastedFile(other, size, i_other_layer, i_layer, reason))
+
+    @property
+    def size(self):
+        """ Get the total size of the files of the image
+
+        Returns:
+            :obj:`int`: size (bytes)
+        """
+        return sum(size for size, _ in self.files.values())
+
+    @property
+    def wasted_bytes(self):
+        """ Get the total size of the files of lower layers which are hidden by upper layers
+
+        Returns:
+            :obj:`int`: size (bytes)
+        """
+        return sum(file.size for file in self.wasted)
+
+    def get_directory_sizes(self, depth=3):
+        """ Get the total size of the files within each directory, up to a depth
+
+        Args:
+            depth (:obj:`int`, optional): maximum depth of the directories (e.g., `/usr/local/lib` has depth 3)
+
+        Returns:
+            :obj:`dict`: dictionary which maps the path of each directory to the total size of its files (bytes)
+        """
+        sizes = {}
+        for path, (size, _) in self.files.items():
+            parts = path.strip('/').split('/')[0:-1]
+            for i_part in range(1, min(depth, len(parts)) + 1):
+                dirname = '/' + '/'.join(parts[0:i_part])
+                sizes[dirname] = sizes.get(dirname, 0) + size
+        return sizes
+
+    def get_largest_directories(self, depth=3, n=20):
+        """ Get the largest directories of a depth, and any shallower directories which directly contain files
+
+        Args:
+            depth (:obj:`int`, optional): depth of the directories
+            n (:obj:`int`, optional): number of directories
+
+        Returns:
+            :obj:`list` of :obj:`tuple`: path and total size of the files (bytes) of each of the largest
+                directories, sorted by size
+        """
+        sizes = {}
+        for path, (size, _) in self.files.items():
+            parts = path.strip('/').split('/')[0:-1]
+            dirname = '/' + '/'.join(parts[0:depth])
+            sizes[dirname] = sizes.get(dirname, 0) + size
+        return sorted(sizes.items(), key=lambda item: (-item[1], item[0]))[0:n]
+
+    def get_build_artifacts(self, patterns=None):
+        """ Get the leftover build artifacts of the image, such as temporary files, package caches, and archives
+
+        Args:
+            patterns (:obj:`list` of :obj:`tuple`, optional): glob pattern and description of each type of
+                artifact. Default: :obj:`BUILD_ARTIFACT_PATTERNS`
+
+        Returns:
+            :obj:`list` of :obj:`tuple`: path, size (bytes), and description of each artifact, sorted by size
+        """
+        if patterns is None:
+            patterns = BUILD_ARTIFACT_PATTERNS
+        patterns = [(re.compile(fnmatch.translate(pattern)), description) for pattern, description in patterns]
+
+        artifacts = []
+        for path, (size, _) in self.files.items():
+            for pattern, description in patterns:
+                if pattern.match(path):
+                    artifacts.append((path, size, description))
+                    break
+        return sorted(artifacts, key=lambda artifact: (-artifact[1], artifact[0]))
+
+    def get_layer_summaries(self):
+        """ Get the size, number of files, and the number of bytes which are hidden by upper layers of each layer
+
+        Returns:
+            :obj:`list` of :obj:`dict`: summary of each layer, from the base layer to the top layer
+        """
+        summaries = [{
+            'digest': layer.digest,
+            'size': layer.size,
+            'files': len(layer.files),
+            'wasted': 0,
+        } for layer in self.layers]
+        for file in self.wasted:
+            summaries[file.layer]['wasted'] += file.size
+        return summaries
+
+
+def index_layer(file, digest=None):
+    """ Index the files of the tar archive of a layer by streaming through it
+
+    Args:
+        file (:obj:`io.IOBase`): tar archive of the layer
+        digest (:obj:`str`, optional): digest of the layer. Default: the SHA-256 digest of the archive
+
+    Returns:
+        :obj:`LayerIndex`: index of the layer
+    """
+    reader = wc_env_manager.archive.HashingReader(file)
+    index = LayerIndex(digest)
+    with tarfile.open(fileobj=reader, mode='r|') as tar_file:
+        for member in tar_file:
+            path = os.path.normpath('/' + member.name)
+            dirname, basename = os.path.split(path)
+            if basename == OPAQUE_WHITEOUT:
+                index.opaque_dirs.append(dirname)
+            elif basename.startswith(WHITEOUT_PREFIX):
+                index.deleted.append(os.path.join(dirname, basename[len(WHITEOUT_PREFIX):]))
+            elif not member.isdir():
+                index.files[path] = member.size
+
+    if digest is None:
+        for _ in wc_env_manager.archive.iter_file(reader):
+            pass
+        index.digest = 'sha256:' + reader.hash.hexdigest()
+    return index
+
+
+def analyze_image_archive(stream, layer_digests, image=None, tags=None):
+    """ Analyze the layers of an image by streaming through the output of `docker save`
+
+    Args:
+        stream (:obj:`iterable` of :obj:`bytes`): output of `docker save` (e.g., from `Image.save`)
+        layer_digests (:obj:`list` of :obj:`str`): digests of the uncompressed layers of the image
+            (`RootFS.Layers`), from the base layer to the top layer
+        image (:obj:`str`, optional): id of the image
+        tags (:obj:`list` of :obj:`str`, optional): tags of the image
+
+    Returns:
+        :obj:`ImageAnalysis`: analysis of the image
+
+    Raises:
+        :obj:`ValueError`: if the output of `docker save` doesn't contain all of the layers of the image
+    """
+    indices = {}
+    with tarfile.open(fileobj=wc_env_manager.archive.IteratorReader(stream), mode='r|') as tar_file:
+        for member in tar_file:
+            if not member.isfile():
+                continue
+
+            # layers are stored as `blobs/sha256/<digest>` (OCI layout) or `<id>/layer.tar` (legacy layout)
+            blob = re.match(r'^blobs/sha256/([0-9a-f]{64})$', member.name)
+            if blob and 'sha256:' + blob.group(1) in layer_digests:
+                index = index_layer(tar_file.extractfile(member), digest='sha256:' + blob.group(1))
+            elif member.name.endswith('/layer.tar'):
+                index = index_layer(tar_file.extractfile(member))
+            else:
+                continue
+            indices[index.digest] = index
+
+    missing_digests = [digest for digest in layer_digests if digest not in indices]
+    if missing_digests:
+        raise ValueError('The archive does not contain layers:\n  {}'.format('\n  '.join(missing_digests)))
+
+    return ImageAnalysis([indices[digest] for digest in layer_digests], image=image, tags=tags)
+
+
+def diff_analyses(old, new, depth=3):
+    """ Compare the sizes of the directories of two images
+
+    Args:
+        old (:obj:`ImageAnalysis`): analysis of the old image
+        new (:obj:`ImageAnalysis`): analysis of the new image
+        depth (:obj:`int`, optional): maximum depth of the directories
+
+    Returns:
+        :obj:`list` of :obj:`tuple`: path, old size (bytes), and new size (bytes) of each directory
+            whose size changed, sorted by the absolute change in size
+    """
+    old_sizes = old.get_directory_sizes(depth=depth)
+    new_sizes = new.get_directory_sizes(depth=depth)
+    changes = []
+    for dirname in set(old_sizes.keys()) | set(new_sizes.keys()):
+        old_size = old_sizes.get(dirname, 0)
+        new_size = new_sizes.get(dirname, 0)
+        if old_size != new_size:
+            changes.append((dirname, old_size, new_size))
+    return sorted(changes, key=lambda change: (-abs(change[2] - change[1]), change[0]))
@@ -0,0 +1,292 @@
+""" Utilities for streaming, chunking, and compressing archives of Docker images and containers
+
+:Author: Jonathan Karr <jonrkarr@gmail.com>
+:Date: 2020-02-10
+:Copyright: 2020, Karr Lab
+:License: MIT
+"""
+
+import hashlib
+import io
+import os
+import tarfile
+
+
+class IteratorReader(io.RawIOBase):
+    """ Read-only file-like object over an iterator of byte strings, such as the
+    streams returned by `Image.save` and `Container.get_archive`
+
+    Attributes:
+        _iterator (:obj:`iterator`): iterator of byte strings
+        _buffer (:obj:`bytes`): unread bytes of the current byte string
+    """
+
+    def __init__(self, iterable):
+        """
+        Args:
+            iterable (:obj:`iterable` of :obj:`bytes`): byte strings
+        """
+        self._iterator = iter(iterable)
+        self._buffer = b''
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        while not self._buffer:
+            try:
+                self._buffer = next(self._iterator)
+            except StopIteration:
+                return 0
+        n_bytes = min(len(buffer), len(self._buffer))
+        buffer[0:n_bytes] = self._buffer[0:n_bytes]
+        self._buffer = self._buffer[n_bytes:]
+        return n_bytes
+
+
+class HashingReader(io.RawIOBase):
+    """ Read-only file-like object which computes the SHA-256 digest of the bytes read from another file
+
+    Attributes:
+        file (:obj:`io.IOBase`): file-like object
+        hash (:obj:`hashlib._Hash`): hash of the bytes which have been read
+    """
+
+    def __init__(self, file):
+        """
+        Args:
+            file (:obj:`io.IOBase`): file-like object
+        """
+        self.file = file
+        self.hash = hashlib.sha256()
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        data = self.file.read(len(buffer))
+        n_bytes = len(data)
+        buffer[0:n_bytes] = data
+        self.hash.update(data)
+        return n_bytes
+
+
+def iter_file(file, block_size=2 ** 20):
+    """ Iterate over the blocks of a file-like object
+
+    Args:
+        file (:obj:`io.IOBase`): file-like object
+        block_size (:obj:`int`, optional): size of each block (bytes)
+
+    Returns:
+        :obj:`iterator` of :obj:`bytes`: blocks
+    """
+    while True:
+        block = file.read(block_size)
+        if not block:
+            break
+        yield block
+
+
+def extract_tar_member(tar_file, member, dirname):
+    """ Extract a member of a tar archive into a directory, without its ownership or permissions,
+    rejecting members which would be written outside of the directory (e.g., absolute paths or
+    paths which contain `..`)
+
+    Archives are extracted with the `data` filter where it is available (Python >= 3.8.17); otherwise,
+    the path of the member is validated before it is extracted.
+
+    Args:
+        tar_file (:obj:`tarfile.TarFile`): archive
+        member (:obj:`tarfile.TarInfo`): member of the archive
+        dirname (:obj:`str`): directory to extract the member into
+
+    Raises:
+        :obj:`ValueError`: if the member is not a regular file or directory, or if it would be
+            written outside of :obj:`dirname`
+    """
+    if hasattr(tarfile, 'data_filter'):
+        try:
+            tar_file.extract(member, dirname, set_attrs=False, filter='data')
+        except tarfile.FilterError as exception:
+            raise ValueError('Archive member {} cannot be extracted: {}'.format(member.name, exception))
+        return
+
+    if not (member.isfile() or member.isdir()):
+        raise ValueError('Archive member {} is not a regular file or directory'.format(member.name))
+    root = os.path.realpath(dirname)
+    path = os.path.realpath(os.path.join(root, member.name))
+    if os.path.isabs(member.name) or '..' in member.name.replace('\\', '/').split('/') \
+            or os.path.commonpath([root, path]) != root:
+        raise ValueError('Archive member {} would be extracted outside of {}'.format(member.name, dirname))
+    tar_file.extract(member, dirname, set_attrs=False)
+
+
+class ChunkedWriter(object):
+    """ Write a stream into a sequence of files of at most a fixed size
+
+    Attributes:
+        dirname (:obj:`str`): directory for the chunk files
+        prefix (:obj:`str`): prefix for the names of the chunk files
+        chunk_size (:obj:`int`): maximum size of each chunk (bytes)
+        chunks (:obj:`list` of :obj:`dict`): name, size, and SHA-256 digest of each chunk
+        _file (:obj:`io.BufferedWriter`): current chunk file
+        _hash (:obj:`hashlib._Hash`): hash of the current chunk
+    """
+
+    def __init__(self, dirname, prefix, chunk_size):
+        """
+        Args:
+            dirname (:obj:`str`): directory for the chunk files
+            prefix (:obj:`str`): prefix for the names of the chunk files
+            chunk_size (:obj:`int`): maximum size of each chunk (bytes)
+        """
+        self.dirname = dirname
+        self.prefix = prefix
+        self.chunk_size = chunk_size
+        self.chunks = []
+        self._file = None
+        self._hash = None
+
+    def write(self, data):
+        """ Write data
+
+        Args:
+            data (:obj:`bytes`): data
+        """
+        while data:
+            if self._file is None:
+                self._open_chunk()
+            n_bytes = min(len(data), self.chunk_size - self.chunks[-1]['size'])
+            self._file.write(data[0:n_bytes])
+            self._hash.update(data[0:n_bytes])
+            self.chunks[-1]['size'] += n_bytes
+            data = data[n_bytes:]
+            if self.chunks[-1]['size'] == self.chunk_size:
+                self._close_chunk()
+
+    def close(self):
+        """ Close the current chunk """
+        if self._file is not None:
+            self._close_chunk()
+
+    def _open_chunk(self):
+        name = '{}.{:05d}'.format(self.prefix, len(self.chunks))
+        self._file = open(os.path.join(self.dirname, name), 'wb')
+        self._hash = hashlib.sha256()
+        self.chunks.append({'file': name, 'size': 0})
+
+    def _close_chunk(self):
+        self._file.close()
+        self.chunks[-1]['sha256'] = self._hash.hexdigest()
+        self._file = None
+        self._hash = None
+
+
+class ChunkedReader(io.RawIOBase):
+    """ Read a stream from a sequence of chunk files written by :obj:`ChunkedWriter`, verifying
+    the size and digest of each chunk before any of its bytes are read
+
+    Each chunk is read twice: once to verify it, and once to read it. This ensures that the bytes of
+    corrupted or truncated chunks are never returned, including chunks which the consumer of the
+    stream doesn't read to their ends (e.g., the last chunk of a compressed stream).
+
+    Attributes:
+        dirname (:obj:`str`): directory of the chunk files
+        chunks (:obj:`list` of :obj:`dict`): name, size, and SHA-256 digest of each chunk
+        _i_chunk (:obj:`int`): index of the current chunk
+        _file (:obj:`io.BufferedReader`): current chunk file
+    """
+
+    def __init__(self, dirname, chunks):
+        """
+        Args:
+            dirname (:obj:`str`): directory of the chunk files
+            chunks (:obj:`list` of :obj:`dict`): name, size, and SHA-256 digest of each chunk
+        """
+        self.dirname = dirname
+        self.chunks = chunks
+        self._i_chunk = -1
+        self._file = None
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        while True:
+            if self._file is None:
+                if self._i_chunk + 1 >= len(self.chunks):
+                    return 0
+                self._i_chunk += 1
+                self._file = self._open_chunk(self.chunks[self._i_chunk])
+
+            n_bytes = self._file.readinto(buffer)
+            if n_bytes:
+                return n_bytes
+
+            self._file.close()
+            self._file = None
+
+    def _open_chunk(self, chunk):
+        """ Verify the size and digest of a chunk, and open it
+
+        Args:
+            chunk (:obj:`dict`): name, size, and SHA-256 digest of the chunk
+
+        Returns:
+            :obj:`io.BufferedReader`: chunk file, positioned at its beginning
+
+        Raises:
+            :obj:`ValueError`: if the chunk is truncated or corrupted
+        """
+        file = open(os.path.join(self.dirname, chunk['file']), 'rb')
+        hash = hashlib.sha256()
+        size = 0
+        for block in iter_file(file):
+            hash.update(block)
+            size += len(block)
+        if size != chunk['size'] or hash.hexdigest() != chunk['sha256']:
+            file.close()
+            raise ValueError('Chunk {} is corrupted'.format(chunk['file']))
+        file.seek(0)
+        return file
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+        super().close()
+
+
+def is_chunk_complete(dirname, chunk):
+    """ Determine whether a chunk file was completely written
+
+    Args:
+        dirname (:obj:`str`): directory of the chunk files
+        chunk (:obj:`dict`): name, size, and SHA-256 digest of the chunk
+
+    Returns:
+        :obj:`bool`: :obj:`True` if the chunk file exists and has the expected size
+    """
+    filename = os.path.join(dirname, chunk['file'])
+    return 'sha256' in chunk and os.path.isfile(filename) and os.path.getsize(filename) == chunk['size']
+
+
+def get_chain_ids(diff_ids):
+    """ Get the chain id of each prefix of the layers of an image. Docker uses chain ids to
+    identify stacks of layers in its layer store.
+
+    Args:
+        diff_ids (:obj:`list` of :obj:`str`): digests of the uncompressed layers of an image (e.g.,
+            `sha256:...`), from the base layer to the top layer
+
+    Returns:
+        :obj:`list` of :obj:`str`: chain id of each prefix of the layers
+    """
+    chain_ids = []
+    for diff_id in diff_ids:
+        if chain_ids:
+            chain_ids.append('sha256:' + hashlib.sha256('{} {}'.format(chain_ids[-1], diff_id).encode()).hexdigest())
+        else:
+            chain_ids.append(diff_id)
+    return chain_ids
@@ -1,5 +1,9 @@
 """ Configuration
 
+The validated configuration is cached in memory and in `~/.wc/cache`, keyed on the modification times,
+sizes, and SHA-256 digests of the default, schema, and user configuration files, the configuration
+environment variables, and the template context. The cache is reused until any of these change.
+
 :Author: Jonathan Karr <jonrkarr@gmail.com>
 :Date: 2018-02-09
 :Copyright: 2018, Karr Lab
@@ -7,33 +11,213 @@
 """
 
 import configobj
+import copy
+import hashlib
 import os
 import pathlib
-import pkg_resources
-import wc_utils.config
+import pickle
+import string
+import tempfile
+import validate
+
+CACHE_FILENAME = os.path.expanduser(os.path.join('~', '.wc', 'cache', 'wc_env_manager.config.pickle'))
+CACHE_FORMAT = 1
+_cache = {}
+_config_specs = {}
 
 
-def get_config(extra=None):
+def get_config(extra=None, use_cache=True):
     """ Get configuration
 
     Args:
         extra (:obj:`dict`, optional): additional configuration to override
+        use_cache (:obj:`bool`, optional): if :obj:`True`, use the cached configuration if the
+            configuration files haven't changed
 
     Returns:
         :obj:`configobj.ConfigObj`: nested dictionary with the configuration settings loaded from the configuration source(s).
     """
-    paths = wc_utils.config.ConfigPaths(
-        default=pkg_resources.resource_filename('wc_env_manager', 'config/core.default.cfg'),
-        schema=pkg_resources.resource_filename('wc_env_manager', 'config/core.schema.cfg'),
-        user=(
+    paths = get_config_paths()
+    context = get_config_context()
+
+    if not use_cache:
+        return _read_config(paths, context, extra=extra)
+
+    key = get_config_cache_key(paths, context)
+    base_config = _cache.get(key, None)
+    if base_config is None:
+        base_config = _read_cached_config(key)
+        if base_config is None:
+            base_config = _read_config(paths, context).dict()
+            _write_cached_config(key, base_config)
+        _cache.clear()
+        _cache[key] = base_config
+
+    # merge and validate extra configuration; fall back to reading the configuration files to report errors
+    config = configobj.ConfigObj(copy.deepcopy(base_config), configspec=_get_config_spec(paths['schema']))
+    if extra:
+        config.merge(_substitute_context(copy.deepcopy(extra), context))
+        result = config.validate(validate.Validator(), copy=True, preserve_errors=True)
+        if result is not True or configobj.get_extra_values(config):
+            return _read_config(paths, context, extra=extra)
+    return config
+
+
+def get_config_paths():
+    """ Get the paths to the default, schema, and user configuration files
+
+    Returns:
+        :obj:`dict`: paths to the default configuration (`default`), schema (`schema`), and
+            user configuration files (`user`)
+    """
+    return {
+        'default': os.path.join(os.path.dirname(__file__), 'core.default.cfg'),
+        'schema': os.path.join(os.path.dirname(__file__), 'core.schema.cfg'),
+        'user': (
             'wc_env_manager.cfg',
             os.path.expanduser('~/.wc/wc_env_manager.cfg'),
         ),
-    )
+    }
+
 
-    context = {
+def get_config_context():
+    """ Get the context for substitution into configuration templates
+
+    Returns:
+        :obj:`dict`: context
+    """
+    return {
         'HOME': str(pathlib.Path.home()),
-        'ROOT': pkg_resources.resource_filename('wc_env_manager', '.'),
+        'ROOT': os.path.join(os.path.dirname(os.path.dirname(__file__)), '.'),
     }
 
-    return wc_utils.config.ConfigManager(paths).get_config(extra=extra, context=context)
+
+def get_config_cache_key(paths, context):
+    """ Get the key of the cached configuration for the current configuration files, environment
+    variables, and context
+
+    Args:
+        paths (:obj:`dict`): paths to the default, schema, and user configuration files
+        context (:obj:`dict`): context for template substitution
+
+    Returns:
+        :obj:`str`: key
+    """
+    key = hashlib.sha256()
+    key.update(str(CACHE_FORMAT).encode())
+    for path in [paths['default'], paths['schema']] + list(paths['user']):
+        key.update(os.path.abspath(path).encode())
+        if os.path.isfile(path):
+            stat = os.stat(path)
+            key.update('{}:{}'.format(stat.st_mtime_ns, stat.st_size).encode())
+            with open(path, 'rb') as file:
+                key.update(hashlib.sha256(file.read()).digest())
+        else:
+            key.update(b'missing')
+    for name, val in sorted(os.environ.items()):
+        if name.startswith('CONFIG__DOT__'):
+            key.update('{}={}'.format(name, val).encode())
+    for name, val in sorted(context.items()):
+        key.update('{}={}'.format(name, val).encode())
+    return key.hexdigest()
+
+
+def clear_config_cache():
+    """ Clear the in-memory and on-disk caches of the configuration """
+    _cache.clear()
+    if os.path.isfile(CACHE_FILENAME):
+        os.remove(CACHE_FILENAME)
+
+
+def _read_config(paths, context, extra=None):
+    """ Read and validate the configuration files
+
+    Args:
+        paths (:obj:`dict`): paths to the default, schema, and user configuration files
+        context (:obj:`dict`): context for template substitution
+        extra (:obj:`dict`, optional): additional configuration to override
+
+    Returns:
+        :obj:`configobj.ConfigObj`: configuration
+    """
+    import wc_utils.config
+
+    config_paths = wc_utils.config.ConfigPaths(default=paths['default'], schema=paths['schema'], user=paths['user'])
+    return wc_utils.config.ConfigManager(config_paths).get_config(extra=extra, context=context)
+
+
+def _read_cached_config(key):
+    """ Read the configuration from the on-disk cache
+
+    Args:
+        key (:obj:`str`): key of the configuration
+
+    Returns:
+        :obj:`dict`: configuration, or :obj:`None` if the cache doesn't contain the configuration
+    """
+    try:
+        with open(CACHE_FILENAME, 'rb') as file:
+            cached = pickle.load(file)
+    except Exception:
+        return None
+    if not isinstance(cached, dict) or cached.get('key', None) != key:
+        return None
+    return cached['config']
+
+
+def _write_cached_config(key, config):
+    """ Save the configuration to the on-disk cache. Errors (e.g., read-only home directories) are ignored.
+
+    Args:
+        key (:obj:`str`): key of the configuration
+        config (:obj:`dict`): configuration
+    """
+    try:
+        dirname = os.path.dirname(CACHE_FILENAME)
+        if not os.path.isdir(dirname):
+            os.makedirs(dirname)
+        fid, temp_filename = tempfile.mkstemp(dir=dirname)
+        with os.fdopen(fid, 'wb') as file:
+            pickle.dump({'key': key, 'config': config}, file, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(temp_filename, CACHE_FILENAME)
+    except OSError:
+        pass
+
+
+def _get_config_spec(path):
+    """ Get the parsed configuration schema
+
+    Args:
+        path (:obj:`str`): path to the schema
+
+    Returns:
+        :obj:`configobj.ConfigObj`: schema
+    """
+    if path not in _config_specs:
+        _config_specs[path] = configobj.ConfigObj(path, list_values=False, _inspec=True)
+    return _config_specs[path]
+
+
+def _substitute_context(config, context):
+    """ Substitute context into the templates of the keys and values of a configuration
+
+    Args:
+        config (:obj:`dict`): configuration
+        context (:obj:`dict`): context for template substitution
+
+    Returns:
+        :obj:`dict`: configuration
+    """
+    to_sub = [config]
+    while to_sub:
+        dictionary = to_sub.pop()
+        for key in list(dictionary.keys()):
+            val = dictionary.pop(key)
+            if isinstance(val, dict):
+                to_sub.append(val)
+            elif isinstance(val, (list, tuple)):
+                val = [string.Template(v).substitute(context) if isinstance(v, str) else v for v in val]
+            elif isinstance(val, str):
+                val = string.Template(val).substitute(context)
+            dictionary[string.Template(key).substitute(context)] = val
+    return config
@@ -5,6 +5,8 @@
     * *wc_env*: image with WC models and WC modeling tools and their dependencies
     * *wc_env_dependencies*: base image with third party dependencies
 
+* Concurrently build the Docker images for several versions of Python
+* Analyze the sizes of the layers and files of the Docker images
 * Remove the Docker images
 * Push/pull the Docker images
 * Create Docker containers
@@ -16,7 +18,11 @@
     5. Install Python packages in mounted directories from host
 
 * Copy files to/from Docker container
+* Incrementally synchronize directories between the host and Docker containers
+* Retrieve compressed results from Docker containers
+* Save the contents of tmpfs scratch directories of Docker containers
 * List Docker containers of the image
+* Concurrently run processes in many Docker containers
 * Get CPU, memory, network usage statistics of Docker containers
 * Stop Docker containers
 * Remove Docker containers
@@ -29,29 +35,31 @@
 :License: MIT
 """
 
-from datetime import datetime
+from datetime import datetime, timedelta, timezone
+import concurrent.futures
 import copy
 import configobj
-import dateutil.parser
-import docker
-import docker_squash.squash
 import enum
-import git
+import fnmatch
 import glob
-import jinja2
+import hashlib
+import importlib
+import io
+import json
 import logging
 import os
 import re
-import requests
-import requirements
 import shutil
 import subprocess
 import sys
+import tarfile
 import tempfile
+import threading
 import time
+import urllib.parse
 import warnings
+import wc_env_manager.archive
 import wc_env_manager.config.core
-import yaml
 
 
 class WcEnvUser(enum.Enum):
@@ -60,6 +68,12 @@ class WcEnvUser(enum.Enum):
     container_user = 999
 
 
+class SyncDirection(enum.Enum):
+    """ Directions in which paths can be synchronized between the host and a container """
+    to_container = 0
+    from_container = 1
+
+
 class WcEnvManager(object):
     """ Manage computing environments (Docker containers) for whole-cell modeling
 
@@ -71,77 +85,237 @@ class WcEnvManager(object):
         _base_image (:obj:`docker.models.images.Image`): current base Docker image
         _image (:obj:`docker.models.images.Image`): current Docker image
         _container (:obj:`docker.models.containers.Container`): current Docker container
+        _state_cache (:obj:`wc_env_manager.state.DockerStateCache`): in-memory index of the Docker
+            images and containers, or :obj:`None` if `config['state_cache']` is :obj:`False`
+        _build_history_lock (:obj:`threading.Lock`): lock for recording builds of the base image in the
+            build history, which is shared by the managers of the variants of a matrix build
     """
 
     IMAGE_OS_SEP = '/'
-
-    def __init__(self, config=None):
+    EXPORT_CHUNK_SIZE = 256 * 2 ** 20
+    SYNC_MAX_ARGS_LENGTH = 64 * 2 ** 10
+    WATCH_DEBOUNCE = 0.02
+    RUN_MAX_OUTPUT = 64 * 2 ** 10
+    READY_TIMEOUT = 120.
+    READY_POLL_INTERVAL = 0.05
+    READY_MAX_POLL_INTERVAL = 2.
+    WATCH_POLL_INTERVAL = 0.5
+    WATCH_EVENT_TYPES = ('created', 'modified', 'moved', 'deleted')
+    RETRIEVE_CODECS = {
+        'none': 'cat',
+        'gzip': 'gzip -c',
+        'xz': 'xz -c -T0',
+        'zstd': 'zstd -c -q -T0',
+    }
+    _EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+    BASE_IMAGE_SHARED_STAGE = 'system'
+    BASE_IMAGE_SLIM_REPORT_PATH = '/etc/docker-image-slim-report'
+    BASE_IMAGE_SLIM_TAG_SUFFIX = '-slim'
+    BASE_IMAGE_PROFILE_LABEL = 'wc_env_manager.profile'
+    IMAGE_REPO_LABEL = 'wc_env_manager.repo'
+    CACHE_VOLUME_LABEL = 'wc_env_manager.cache'
+    PYTHON_PACKAGE_REVISIONS_PATH = '/var/lib/wc_env_manager/python_packages.json'
+    CACHE_DEFAULT_URLS = {
+        'apt': 'http://{}:3142',
+        'pypi': 'http://{}:5000/index/',
+        'http': 'http://{}:3128',
+        'ccache': 'redis://{}:6379',
+    }
+
+    def __init__(self, config=None, docker_client=None):
         """
         Args:
             config (:obj:`dict`, optional): Dictionary of configuration options. See
             `wc_env_manager/config/core.schema.cfg`.
+            docker_client (:obj:`docker.client.DockerClient`, optional): client connected to the
+                Docker daemon. Default: a client made by :obj:`make_docker_client`
         """
-
         # get configuration
-        self.config = config = wc_env_manager.config.core.get_config(extra={
+        self.config = wc_env_manager.config.core.get_config(extra={
             'wc_env_manager': config or {}})['wc_env_manager']
 
         # load Docker client
-        self._docker_client = docker.from_env()
+        self._docker_client = docker_client or self.make_docker_client()
+        self._state_cache = None
+        self._build_history_lock = threading.Lock()
 
         # get image and current container
         self._base_image_unsquashed = None
         self._base_image = None
         self._image = None
         self._container = None
+        self.refresh_state()
+
+    def make_docker_client(self):
+        """ Make a client connected to the Docker daemon with the factory `config['docker_client_factory']`,
+        or with :obj:`docker.from_env` if no factory is configured. For example, set the factory to
+        `wc_env_manager.fake_docker.FakeDockerClient` to use an in-process fake of Docker.
+
+        Returns:
+            :obj:`docker.client.DockerClient`: client
+
+        Raises:
+            :obj:`WcEnvManagerError`: if the factory cannot be imported
+        """
+        factory_name = self.config['docker_client_factory']
+        if not factory_name:
+            import docker
+            return docker.from_env()
 
+        module_name, _, attr_name = factory_name.rpartition('.')
+        try:
+            factory = getattr(importlib.import_module(module_name), attr_name)
+        except (ImportError, AttributeError, ValueError) as exception:
+            raise WcEnvManagerError('Docker client factory {} could not be imported:\n  {}'.format(
+                factory_name, str(exception)))
+        return factory()
+
+    def refresh_state(self):
+        """ Discover the latest images and container, e.g., after they have been changed by other processes """
+        config = self.config
         self.set_image(config['base_image']['repo_unsquashed'], self.get_latest_image(config['base_image']['repo_unsquashed']))
         self.set_image(config['base_image']['repo'], self.get_latest_image(config['base_image']['repo']))
         self.set_image(config['image']['repo'], self.get_latest_image(config['image']['repo']))
         self.set_container(self.get_latest_container())
 
-    def build_base_image(self):
+    def build_base_image(self, target=None, profile=None):
         """ Build base Docker image for WC modeling environment
 
         Before executing this method, you must download CPLEX and obtain licenses for
         Gurobi, MINOS, Mosek, and XPRESS. See the `documentation <building_images>` for more information.
 
+        The *slim* profile builds a runtime-only image, e.g., for compute nodes. The slim profile
+        overrides the build arguments with `config['base_image']['slim_build_args']` (e.g., to omit
+        Node and Docker) and, after the packages are installed, removes the compilers, headers,
+        documentation, and caches, strips the compiled binaries, and precompiles the bytecode of the
+        Python packages. Because the image is squashed, the removed files are not part of the image.
+        The sizes of the file system before and after the cleanup are saved in the image to
+        :obj:`BASE_IMAGE_SLIM_REPORT_PATH` (see :obj:`get_base_image_slim_report`). Slim images are tagged
+        with the suffix :obj:`BASE_IMAGE_SLIM_TAG_SUFFIX` (see :obj:`get_base_image_tags`) and labeled with
+        :obj:`BASE_IMAGE_PROFILE_LABEL` so that they don't replace the full image from which the image is built.
+
+        If the lock of the Python requirements (:obj:`get_python_requirements_lock_path`) exists, the
+        locked requirements are installed without resolving their dependencies (see
+        :obj:`lock_python_requirements`). If the requirements changed since they were locked, a
+        warning is issued and the requirements are locked again before the build.
+
+        Each build records which sections of the Dockerfile have inputs which changed since the previous
+        build in the build history (`config['base_image']['build_history_path']`). See
+        :obj:`get_base_image_layer_order`.
+
+        Args:
+            target (:obj:`str`, optional): only build this stage of the Dockerfile (e.g.,
+                :obj:`BASE_IMAGE_SHARED_STAGE`), tagged `<repo_unsquashed>:<target>` and not squashed
+            profile (:obj:`str`, optional): build profile (`full` or `slim`). Default: `config['base_image']['profile']`
+
         Returns:
             :obj:`docker.models.images.Image`: Docker image
         """
+        import docker_squash.squash
+        import jinja2
+        import wc_env_manager.layer_order
+
         config = self.config['base_image']
+        build_args = self.get_base_image_build_args(profile=profile)
+        profile = 'slim' if build_args['slim'] else 'full'
+        tags = self.get_base_image_tags(profile=profile)
 
         # create temporary directory for build context
         temp_dir_name = tempfile.mkdtemp()
         shutil.rmtree(temp_dir_name)
         shutil.copytree(config['context_path'], temp_dir_name)
 
-        # save list of Python package requirements to context path
+        # save the tiers of the Python package requirements to context path; each tier is installed
+        # in a separate layer so that changes to the volatile tiers don't reinstall the stable tiers.
+        # Each tier is installed with the constraints of the previous tiers so that the installed
+        # versions match those of a single resolution of all of the requirements
         reqs = self.get_required_python_packages()
-        with open(os.path.join(temp_dir_name, 'requirements.txt'), 'w') as file:
-            file.write('\n'.join(reqs))
+        if build_args['locked']:
+            lock_path = self.get_python_requirements_lock_path()
+            with open(lock_path, 'r') as file:
+                lock = file.read()
+            if get_python_requirements_lock_digest(lock) != get_python_requirements_digest(reqs):
+                warnings.warn(('The lock {} is out of date because the Python requirements changed since they '
+                               'were locked; the requirements will be locked again').format(lock_path), UserWarning)
+                self.lock_python_requirements()
+                with open(lock_path, 'r') as file:
+                    lock = file.read()
+            reqs = parse_python_requirements_lock(lock)
+        tiers = partition_python_requirements(reqs)
+        constraints = []
+        for tier, reqs in tiers.items():
+            with open(os.path.join(temp_dir_name, 'requirements.{}.txt'.format(tier)), 'w') as file:
+                file.write('\n'.join(reqs))
+            with open(os.path.join(temp_dir_name, 'constraints.{}.txt'.format(tier)), 'w') as file:
+                file.write('\n'.join(constraints))
+            constraints = constraints + get_python_requirements_constraints(reqs)
+        if self.config['verbose']:
+            print('Installing {}{} Python requirements in separate layers'.format(
+                ', '.join('{} {}'.format(len(reqs), tier) for tier, reqs in tiers.items()),
+                ' locked' if build_args['locked'] else ''))
 
         # render Dockerfile
         template_dockerfile_name = config['dockerfile_template_path']
         with open(template_dockerfile_name) as file:
             template = jinja2.Template(file.read())
 
-        build_args = copy.copy(config['build_args'])
-        build_args['image_tag'] = config['tags'][1]
+        # route downloads through the caching sidecars of the network
+        cache_build_args = self.get_cache_build_args()
+        if cache_build_args:
+            self.build_network()
+            network_mode = self.config['network']['name']
+        else:
+            network_mode = None
+        build_args.update(cache_build_args)
+
+        # move the sections of the Dockerfile whose inputs change often to later layers, and
+        # fingerprint the inputs of each section to record which inputs change
+        sections = wc_env_manager.layer_order.parse_dockerfile_sections(template.render(**build_args))
+        if config['reorder_layers'] and config['build_history_path']:
+            history = wc_env_manager.layer_order.BuildHistory(config['build_history_path'])
+            proposal = wc_env_manager.layer_order.LayerOrderProposal(sections, history)
+            sections = wc_env_manager.layer_order.reorder_sections(sections, proposal.proposed_order)
+        fingerprints = {section.name: section.get_fingerprint(build_args, temp_dir_name)
+                        for section in sections if section.instructions}
+
         dockerfile_path = os.path.join(temp_dir_name, 'Dockerfile')
-        template.stream(**build_args).dump(dockerfile_path)
+        with open(dockerfile_path, 'w') as file:
+            file.write(''.join(section.text for section in sections))
+
+        # build stage
+        if target:
+            image = self._build_image(config['repo_unsquashed'], [target], dockerfile_path,
+                                      build_args, temp_dir_name,
+                                      pull_base_image=True,
+                                      network_mode=network_mode,
+                                      target=target)
+            shutil.rmtree(temp_dir_name)
+            return image
 
         # build image
-        image_unsquashed = self._build_image(config['repo_unsquashed'], config['tags'], dockerfile_path,
+        image_unsquashed = self._build_image(config['repo_unsquashed'], tags, dockerfile_path,
                                              build_args, temp_dir_name,
-                                             pull_base_image=True)
+                                             pull_base_image=True,
+                                             network_mode=network_mode)
         self._base_image_unsquashed = image_unsquashed
 
+        # record which inputs changed since the previous build
+        if config['build_history_path']:
+            with self._build_history_lock:
+                record = wc_env_manager.layer_order.BuildHistory(config['build_history_path']).add(
+                    tags[0], fingerprints)
+            if self.config['verbose'] and record['changed'] is not None:
+                print('Inputs of {} sections of the Dockerfile changed since the previous build{}'.format(
+                    len(record['changed']), ''.join('\n  ' + name for name in record['changed'])))
+
         # cleanup temporary directory
         shutil.rmtree(temp_dir_name)
 
-        # squash image
+        # squash image; the handler which prints the log is removed afterwards because `sys.stdout` can
+        # be the stream of a single request of the daemon (see :obj:`wc_env_manager.daemon`)
         log = logging.getLogger()
+        handler = None
+        level = log.level
         if self.config['verbose']:
             log.setLevel(logging.INFO)
 
@@ -151,23 +325,187 @@ class WcEnvManager(object):
             formatter = logging.Formatter('%(asctime)s %(name)-12s %(levelname)-8s %(message)s')
             handler.setFormatter(formatter)
 
-        docker_squash.squash.Squash(
-            log=log,
-            image=config['repo_unsquashed'] + ':' + config['tags'][0],
-            tag=config['repo'] + ':' + config['tags'][0]).run()
+        try:
+            docker_squash.squash.Squash(
+                log=log,
+                image=config['repo_unsquashed'] + ':' + tags[0],
+                tag=config['repo'] + ':' + tags[0]).run()
+        finally:
+            if handler is not None:
+                log.removeHandler(handler)
+                log.setLevel(level)
 
         # get squashed image
-        image = self._docker_client.images.get(config['repo'] + ':' + config['tags'][0])
+        image = self._docker_client.images.get(config['repo'] + ':' + tags[0])
         self._base_image = image
 
         # tag squashed image
-        for tag in config['tags']:
+        for tag in tags:
             assert(image.tag(config['repo'], tag=tag))
         image.reload()
 
+        if self.config['verbose']:
+            print('Squashed {} base image from {} to {}'.format(
+                profile, format_size(image_unsquashed.attrs['Size']), format_size(image.attrs['Size'])))
+            if profile == 'slim':
+                report = self.get_base_image_slim_report(image)
+                if report:
+                    print('Slim cleanup reduced the file system from {} to {}'.format(
+                        format_size(report['size_before']), format_size(report['size_after'])))
+
         # return image
         return image
 
+    def get_base_image_build_args(self, profile=None):
+        """ Get the arguments for rendering and building the Dockerfile of the base image, except for
+        the arguments which route downloads through caching sidecars (see :obj:`get_cache_build_args`)
+
+        Args:
+            profile (:obj:`str`, optional): build profile (`full` or `slim`). Default: `config['base_image']['profile']`
+
+        Returns:
+            :obj:`dict`: build arguments
+
+        Raises:
+            :obj:`WcEnvManagerError`: if the profile is invalid
+        """
+        config = self.config['base_image']
+
+        build_args = dict(config['build_args'])
+        build_args['image_tag'] = self.get_base_image_tags(profile=profile)[1]
+        build_args['ccache_install'] = 'True' if any(
+            attrs.get('cache', None) == 'ccache' for attrs in self.config['network']['containers'].values()) else ''
+
+        profile = profile or config['profile']
+        if profile == 'slim':
+            build_args.update(config['slim_build_args'])
+            build_args['slim'] = 'True'
+        else:
+            build_args['slim'] = ''
+
+        lock_path = self.get_python_requirements_lock_path()
+        build_args['locked'] = 'True' if lock_path and os.path.isfile(lock_path) else ''
+
+        return build_args
+
+    def get_base_image_tags(self, profile=None):
+        """ Get the tags of the base image for a build profile. The tags of slim images have the suffix
+        :obj:`BASE_IMAGE_SLIM_TAG_SUFFIX` (e.g., `latest-slim`).
+
+        Args:
+            profile (:obj:`str`, optional): build profile (`full` or `slim`). Default: `config['base_image']['profile']`
+
+        Returns:
+            :obj:`list` of :obj:`str`: tags
+
+        Raises:
+            :obj:`WcEnvManagerError`: if the profile is invalid
+        """
+        config = self.config['base_image']
+        profile = profile or config['profile']
+        if profile == 'slim':
+            return [tag + self.BASE_IMAGE_SLIM_TAG_SUFFIX for tag in config['tags']]
+        elif profile == 'full':
+            return list(config['tags'])
+        else:
+            raise WcEnvManagerError('Profile must be `full` or `slim`, not `{}`'.format(profile))
+
+    def get_base_image_layer_order(self, profile=None):
+        """ Propose an order of the reorderable sections of the Dockerfile of the base image which
+        moves the sections whose inputs changed most often in the build history
+        (`config['base_image']['build_history_path']`) to later layers, and estimate how many fewer
+        sections the builds of the history would have rebuilt with the proposed order. Set
+        `config['base_image']['reorder_layers']` to apply the proposed order to each build.
+
+        Args:
+            profile (:obj:`str`, optional): build profile (`full` or `slim`). Default: `config['base_image']['profile']`
+
+        Returns:
+            :obj:`wc_env_manager.layer_order.LayerOrderProposal`: proposed order
+
+        Raises:
+            :obj:`WcEnvManagerError`: if the build history is not configured
+        """
+        import jinja2
+        import wc_env_manager.layer_order
+
+        config = self.config['base_image']
+        if not config['build_history_path']:
+            raise WcEnvManagerError('The build history (`base_image.build_history_path`) must be configured')
+
+        with open(config['dockerfile_template_path']) as file:
+            template = jinja2.Template(file.read())
+        sections = wc_env_manager.layer_order.parse_dockerfile_sections(
+            template.render(**self.get_base_image_build_args(profile=profile)))
+        history = wc_env_manager.layer_order.BuildHistory(config['build_history_path'])
+        return wc_env_manager.layer_order.LayerOrderProposal(sections, history)
+
+    def get_base_image_slim_report(self, image):
+        """ Get the sizes of the file system of a slim base image before and after its cleanup
+
+        Args:
+            image (:obj:`docker.models.images.Image` or :obj:`str`): base image
+
+        Returns:
+            :obj:`dict`: sizes (bytes) of the file system before (`size_before`) and after (`size_after`) the
+                cleanup, or :obj:`None` if the image wasn't built with the slim profile
+        """
+        import docker
+
+        try:
+            output = self._docker_client.containers.run(
+                image, ['cat', self.BASE_IMAGE_SLIM_REPORT_PATH], entrypoint=[], remove=True)
+        except docker.errors.ContainerError:
+            return None
+
+        report = {}
+        for line in output.decode().split('\n'):
+            key, sep, value = line.strip().partition('=')
+            if sep:
+                report[key] = int(value)
+        return report
+
+    def get_cache_build_args(self):
+        """ Get the build arguments which route the downloads of builds through the caching
+        sidecars (`config['network']['containers'][*]['cache']`) of the network
+
+        * *apt*: ``apt_proxy``, used by apt
+        * *pypi*: ``pip_index_url`` and ``pip_trusted_host``, used by pip
+        * *http*: ``http_proxy`` and ``https_proxy``, used by wget, curl, git, etc. HTTPS downloads are
+          tunneled through the proxy (``CONNECT``), which can't cache them unless it intercepts TLS
+          (e.g., squid's SSL bump)
+        * *ccache*: ``ccache_remote_storage``, the remote storage of the compiler cache (ccache). The
+          cache is reached over the network by the compilers, rather than copied into the image, so
+          that changes to the cache don't invalidate the cached layers of the image.
+
+        Returns:
+            :obj:`dict`: build arguments
+        """
+        build_args = {}
+        no_proxy = []
+        for name, attrs in self.config['network']['containers'].items():
+            if not attrs.get('cache', None):
+                continue
+
+            url = attrs.get('url', None) or self.CACHE_DEFAULT_URLS[attrs['cache']].format(name)
+            no_proxy.append(name)
+
+            if attrs['cache'] == 'apt':
+                build_args['apt_proxy'] = url
+            elif attrs['cache'] == 'pypi':
+                build_args['pip_index_url'] = url
+                build_args['pip_trusted_host'] = urllib.parse.urlparse(url).hostname
+            elif attrs['cache'] == 'ccache':
+                build_args['ccache_remote_storage'] = url
+            else:
+                build_args['http_proxy'] = url
+                build_args['https_proxy'] = url
+
+        if 'http_proxy' in build_args:
+            build_args['no_proxy'] = ','.join(no_proxy)
+
+        return build_args
+
     def get_required_python_packages(self):
         """ Get Python packages required for the WC models and WC modeling
             tools (`config['image']['python_packages']`)
@@ -176,6 +514,8 @@ class WcEnvManager(object):
             :obj:`list` of :obj:`str`: list of Python requirements in
                 requirements.txt format
         """
+        import git
+
         # make temporary directory
         temp_dir_name = tempfile.mkdtemp()
 
@@ -263,6 +603,99 @@ class WcEnvManager(object):
         # return requirements
         return sorted(unique_reqs)
 
+    def get_python_requirements_lock_path(self):
+        """ Get the path of the lock of the Python requirements of the base image
+        (`config['base_image']['lock_path']`, formatted with the build arguments of the base image,
+        e.g., `{python_version_major_minor}`)
+
+        Returns:
+            :obj:`str`: path, or :obj:`None` if no lock is configured
+        """
+        config = self.config['base_image']
+        if not config['lock_path']:
+            return None
+        build_args = dict(config['build_args'])
+        build_args.setdefault('python_version_major_minor', '.'.join(build_args['python_version'].split('.')[0:2]))
+        return config['lock_path'].format(**build_args)
+
+    def lock_python_requirements(self):
+        """ Resolve the full transitive set of the Python requirements of the base image
+        (:obj:`get_required_python_packages`) in a builder container (`config['base_image']['lock_image']`,
+        default: `python:<major>.<minor>`), and save their exact versions and the hashes of their
+        distributions to the lock (:obj:`get_python_requirements_lock_path`). While the lock exists,
+        builds of the base image install the locked requirements with `--no-deps --require-hashes`, without
+        resolving their dependencies. The requirements which are installed from Git are pinned to their
+        current commits. Because pip can't verify the hashes of Git repositories, these requirements are
+        installed with `--no-deps` only.
+
+        The header of the lock contains the digest of the requirements from which it was made
+        (:obj:`get_python_requirements_digest`). Builds of the base image lock the requirements again
+        when the requirements no longer match this digest.
+
+        Returns:
+            :obj:`str`: path to the lock
+
+        Raises:
+            :obj:`WcEnvManagerError`: if no lock is configured or the requirements could not be resolved
+        """
+        import docker
+
+        config = self.config['base_image']
+        lock_path = self.get_python_requirements_lock_path()
+        if not lock_path:
+            raise WcEnvManagerError('The lock (`base_image.lock_path`) must be configured')
+
+        # pin the requirements which are installed from Git to their current commits
+        reqs = self.get_required_python_packages()
+        revisions = self.get_python_package_revisions([req for req in reqs if req.startswith('git+')])
+        pinned_reqs = []
+        for req in reqs:
+            revision = revisions.get(req, None)
+            if revision and re.match(r'^[0-9a-f]{40}$', revision):
+                url, sep, fragment = req[4:].partition('#')
+                parsed_url = urllib.parse.urlparse(url)
+                path = parsed_url.path.rpartition('@')[0] if '@' in parsed_url.path else parsed_url.path
+                req = 'git+' + parsed_url._replace(path=path + '@' + revision).geturl() + sep + fragment
+            pinned_reqs.append(req)
+
+        # resolve the requirements with pip-tools, routing downloads through the caching sidecars of the network
+        script = '\n'.join(['set -e', 'cat > /tmp/requirements.in << "EOF"'] + pinned_reqs + [
+            'EOF',
+            'pip install --quiet pip-tools >&2',
+            'pip-compile --quiet --generate-hashes --allow-unsafe --no-header'
+            ' --output-file /tmp/requirements.lock /tmp/requirements.in >&2',
+            'cat /tmp/requirements.lock',
+        ])
+
+        cache_build_args = self.get_cache_build_args()
+        if cache_build_args:
+            self.build_network()
+            network = self.config['network']['name']
+        else:
+            network = None
+        environment = {name.upper(): value for name, value in cache_build_args.items() if name != 'apt_proxy'}
+
+        python_version = '.'.join(config['build_args']['python_version'].split('.')[0:2])
+        image = config['lock_image'] or 'python:' + python_version
+        try:
+            output = self._docker_client.containers.run(image, ['sh', '-c', script], entrypoint=[],
+                                                        environment=environment, network=network, remove=True)
+        except docker.errors.ContainerError as exception:
+            raise WcEnvManagerError('Python requirements could not be resolved:\n  {}'.format(
+                (exception.stderr or b'').decode().strip().replace('\n', '\n  ')))
+
+        # save lock
+        dirname = os.path.dirname(os.path.abspath(lock_path))
+        if not os.path.isdir(dirname):
+            os.makedirs(dirname)
+        with open(lock_path, 'w') as file:
+            file.write('# Python requirements of the base image for Python {}, locked by '
+                       '`wc-env-manager base-image lock`\n'.format(python_version))
+            file.write('# requirements digest: {}\n'.format(get_python_requirements_digest(reqs)))
+            file.write(output.decode())
+
+        return lock_path
+
     def build_image(self):
         """ Build Docker image for WC modeling environment
 
@@ -270,8 +703,23 @@ class WcEnvManager(object):
             :obj:`docker.models.images.Image`: Docker image
 
         Raises:
-            :obj:`WcEnvManagerError`: if a copied configuration file clashes with
+            :obj:`WcEnvManagerError`: if a copied configuration file clashes with a file of the image, or
+                if the base image was built with the slim profile
         """
+        import docker
+        import jinja2
+
+        # the image needs the compilers and headers of a full base image
+        base_image_name = self.config['base_image']['repo'] + ':' + self.config['base_image']['tags'][0]
+        try:
+            base_image = self._docker_client.images.get(base_image_name)
+        except docker.errors.ImageNotFound:
+            base_image = None
+        base_image_profile = (base_image.labels or {}).get(self.BASE_IMAGE_PROFILE_LABEL, 'full') if base_image else 'full'
+        if base_image_profile != 'full':
+            raise WcEnvManagerError('The image must be built from a full base image, not from {}, which was built '
+                                    'with the {} profile'.format(base_image_name, base_image_profile))
+
         # create temporary directory for build context
         temp_dir_name = tempfile.mkdtemp()
 
@@ -337,7 +785,7 @@ class WcEnvManager(object):
 
     def _build_image(self, image_repo, image_tags,
                      dockerfile_path, build_args, context_path,
-                     pull_base_image=False):
+                     pull_base_image=False, network_mode=None, target=None):
         """ Build Docker image
 
         Args:
@@ -348,6 +796,12 @@ class WcEnvManager(object):
             context_path (:obj:`str`): path to context for Dockerfile
             pull_base_image (:obj:`bool`, optional): if :obj:`True`, pull the
                 latest version of the base image
+            network_mode (:obj:`str`, optional): network for the containers of the
+                `RUN` directives
+            target (:obj:`str`, optional): stage of the Dockerfile to build. Default: the last stage
+
+        The image is labeled with its repository (:obj:`IMAGE_REPO_LABEL`) so that its previous
+        versions can be recognized by :obj:`collect_garbage` once they are untagged.
 
         Returns:
             :obj:`docker.models.images.Image`: Docker image
@@ -357,6 +811,9 @@ class WcEnvManager(object):
                 context doesn't contain the Dockerfile file, or there is an error building
                 the image
         """
+        import docker
+        import requests
+
         # build image
         if self.config['verbose']:
             print('Building image {} with tags {{{}}} in {} ...'.format(
@@ -375,6 +832,9 @@ class WcEnvManager(object):
                 dockerfile=os.path.basename(dockerfile_path),
                 pull=pull_base_image,
                 buildargs=build_args,
+                network_mode=network_mode,
+                target=target,
+                labels={self.IMAGE_REPO_LABEL: image_repo},
                 rm=True,
             )
         except requests.exceptions.ConnectionError as exception:
@@ -415,12 +875,89 @@ class WcEnvManager(object):
         # return image
         return image
 
+    def get_python_variant(self, python_version):
+        """ Get a manager for the variant of the base image and image for a version of Python
+
+        The tags of the images of the variant have the suffix `-py<major>.<minor>` (e.g.,
+        `latest-py3.8`).
+
+        Args:
+            python_version (:obj:`str`): version of Python (e.g., `3.8.2`)
+
+        Returns:
+            :obj:`WcEnvManager`: manager which shares the Docker client of this manager
+        """
+        major_minor = '.'.join(python_version.split('.')[0:2])
+        suffix = '-py' + major_minor
+
+        variant = copy.copy(self)
+        variant.config = config = copy.deepcopy(self.config)
+        config['base_image']['tags'] = [tag + suffix for tag in config['base_image']['tags']]
+        config['base_image']['build_args']['python_version'] = python_version
+        config['base_image']['build_args']['python_version_major_minor'] = major_minor
+        config['image']['tags'] = [tag + suffix for tag in config['image']['tags']]
+        config['image']['python_version'] = major_minor
+
+        variant._base_image_unsquashed = None
+        variant._base_image = None
+        variant._image = None
+        variant._container = None
+        return variant
+
+    def build_matrix(self, python_versions, max_workers=None):
+        """ Concurrently build the base image and image for each of several versions of Python
+
+        The stage of the base image which doesn't depend on the version of Python
+        (:obj:`BASE_IMAGE_SHARED_STAGE`) is built first so that the builds of all of the
+        versions reuse its cached layers. The images of each version are tagged as described in
+        :obj:`get_python_variant`.
+
+        Args:
+            python_versions (:obj:`list` of :obj:`str`): versions of Python (e.g., `3.7.6`, `3.8.2`)
+            max_workers (:obj:`int`, optional): maximum number of concurrent builds. Default: one per
+                version of Python
+
+        Returns:
+            :obj:`MatrixBuildReport`: images and timing of the build of each version of Python
+        """
+        report = MatrixBuildReport()
+        start = time.time()
+
+        # build the network and the shared stage once for all of the versions
+        if self.get_cache_build_args():
+            self.build_network()
+        self.build_base_image(target=self.BASE_IMAGE_SHARED_STAGE)
+        report.shared_duration = time.time() - start
+
+        def build(python_version):
+            result = MatrixBuildResult(python_version)
+            variant = self.get_python_variant(python_version)
+            try:
+                step_start = time.time()
+                result.base_image = variant.build_base_image()
+                result.base_image_duration = time.time() - step_start
+
+                step_start = time.time()
+                result.image = variant.build_image()
+                result.image_duration = time.time() - step_start
+            except Exception as exception:
+                result.error = exception
+            return result
+
+        with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers or max(1, len(python_versions))) as executor:
+            report.results = list(executor.map(build, python_versions))
+
+        report.duration = time.time() - start
+        return report
+
     def get_config_file_paths_to_copy_to_image(self):
         """ Get list of configuration file paths to copy from ~/.wc to Docker image
 
         Returns:
             :obj:`list` of :obj:`dict`: configuration file paths to copy from ~/.wc to Docker image
         """
+        import yaml
+
         host_dirname = self.config['image']['config_path']
         image_dirname = self.IMAGE_OS_SEP.join(['/root', '.wc'])
 
@@ -509,6 +1046,322 @@ class WcEnvManager(object):
             self._image = image
         return image
 
+    def export_image(self, image, path, level=3, chunk_size=EXPORT_CHUNK_SIZE, base_image=None):
+        """ Export a Docker image to a compressed archive for offline distribution
+
+        The output of `docker save` is streamed through a multithreaded zstd compressor. If
+        :obj:`path` is `-`, the compressed archive is written to standard output. Otherwise, the
+        archive is written to a directory which contains
+
+        * `manifest.json`: the tags of the image, the digests of its layers, and the
+          metadata, digest, and chunks of each file in the output of `docker save`
+        * `blobs/`: the compressed files, split into chunks of at most :obj:`chunk_size` bytes
+
+        Exports to directories are resumable: files whose chunks were completely written by a
+        previous export of the same image are not compressed again. Note that Docker can't resume
+        `docker save` at an offset, so resuming an export still streams (and discards) the entire
+        output of `docker save` up to the first incomplete file; resuming saves the time to compress
+        and write the completed files, but not the time for the daemon to save the image.
+
+        Args:
+            image (:obj:`docker.models.images.Image` or :obj:`str`): image or name of image
+            path (:obj:`str`): path to directory for the archive, or `-` for standard output
+            level (:obj:`int`, optional): zstd compression level
+            chunk_size (:obj:`int`, optional): maximum size of each chunk (bytes)
+            base_image (:obj:`docker.models.images.Image` or :obj:`str`, optional): if provided,
+                omit the layers of this image from the archive (e.g., because the nodes where
+                the archive will be imported already have the base image)
+
+        Returns:
+            :obj:`dict`: manifest of the archive, or :obj:`None` if the archive was written to
+                standard output
+
+        Raises:
+            :obj:`WcEnvManagerError`: if zstandard is not installed
+        """
+        zstandard = self._import_zstandard()
+        if isinstance(image, str):
+            image = self._docker_client.images.get(image)
+        if isinstance(base_image, str):
+            base_image = self._docker_client.images.get(base_image)
+        compressor = zstandard.ZstdCompressor(level=level, threads=-1)
+
+        # stream to standard output
+        if path == '-':
+            compress_obj = compressor.compressobj()
+            for block in image.save(named=True):
+                sys.stdout.buffer.write(compress_obj.compress(block))
+            sys.stdout.buffer.write(compress_obj.flush())
+            sys.stdout.buffer.flush()
+            return None
+
+        # read manifest of previous, incomplete export
+        blobs_dirname = os.path.join(path, 'blobs')
+        if not os.path.isdir(blobs_dirname):
+            os.makedirs(blobs_dirname)
+        manifest_filename = os.path.join(path, 'manifest.json')
+        prev_members = []
+        if os.path.isfile(manifest_filename):
+            with open(manifest_filename, 'r') as file:
+                prev_manifest = json.load(file)
+            if prev_manifest['image'] == image.id:
+                prev_members = prev_manifest['members']
+
+        layers = image.attrs['RootFS'].get('Layers', [])
+        if base_image:
+            omitted_layers = set(base_image.attrs['RootFS'].get('Layers', []))
+        else:
+            omitted_layers = set()
+        manifest = {
+            'format': 1,
+            'image': image.id,
+            'tags': image.tags,
+            'layers': layers,
+            'codec': 'zstd',
+            'members': [],
+            'complete': False,
+        }
+
+        # compress each file of the output of `docker save`
+        with tarfile.open(fileobj=wc_env_manager.archive.IteratorReader(image.save()), mode='r|') as tar_file:
+            for i_member, member in enumerate(tar_file):
+                entry = {
+                    'name': member.name,
+                    'type': member.type.decode(),
+                    'mode': member.mode,
+                    'mtime': member.mtime,
+                    'size': member.size,
+                    'linkname': member.linkname,
+                }
+
+                if member.isfile():
+                    prev_entry = prev_members[i_member] if i_member < len(prev_members) else {}
+                    blob_digest = re.match(r'^blobs/sha256/([0-9a-f]{64})$', member.name)
+
+                    if blob_digest and 'sha256:' + blob_digest.group(1) in omitted_layers:
+                        entry['sha256'] = 'sha256:' + blob_digest.group(1)
+                        entry['omitted'] = True
+
+                    elif prev_entry.get('name', None) == member.name and prev_entry.get('size', None) == member.size \
+                            and 'sha256' in prev_entry \
+                            and all(wc_env_manager.archive.is_chunk_complete(blobs_dirname, chunk)
+                                    for chunk in prev_entry.get('chunks', [])):
+                        entry = prev_entry
+
+                    else:
+                        member_hash = hashlib.sha256()
+                        writer = wc_env_manager.archive.ChunkedWriter(
+                            blobs_dirname, '{:06d}'.format(i_member), chunk_size)
+                        compress_obj = compressor.compressobj()
+                        for block in wc_env_manager.archive.iter_file(tar_file.extractfile(member)):
+                            member_hash.update(block)
+                            writer.write(compress_obj.compress(block))
+                        writer.write(compress_obj.flush())
+                        writer.close()
+
+                        entry['sha256'] = 'sha256:' + member_hash.hexdigest()
+                        if entry['sha256'] in omitted_layers:
+                            for chunk in writer.chunks:
+                                os.remove(os.path.join(blobs_dirname, chunk['file']))
+                            entry['omitted'] = True
+                        else:
+                            entry['chunks'] = writer.chunks
+
+                manifest['members'].append(entry)
+                self._write_image_archive_manifest(manifest_filename, manifest)
+
+        manifest['complete'] = True
+        self._write_image_archive_manifest(manifest_filename, manifest)
+
+        if self.config['verbose']:
+            size = sum(member['size'] for member in manifest['members'])
+            compressed_size = sum(chunk['size'] for member in manifest['members'] for chunk in member.get('chunks', []))
+            print('Exported image {} to {}: {} compressed to {}'.format(
+                ', '.join(image.tags) or image.short_id, path, format_size(size), format_size(compressed_size)))
+
+        return manifest
+
+    def import_image(self, path):
+        """ Import a Docker image from a compressed archive created by :obj:`export_image`
+
+        The archive is decompressed and streamed into `docker load`. Layers that are
+        already present in the local Docker daemon are skipped.
+
+        Args:
+            path (:obj:`str`): path to directory of the archive, or `-` for standard input
+
+        Returns:
+            :obj:`docker.models.images.Image`: Docker image
+
+        Raises:
+            :obj:`WcEnvManagerError`: if zstandard is not installed, the archive is incomplete,
+                the archive is corrupted, or the archive omits layers that are not present locally
+        """
+        zstandard = self._import_zstandard()
+        decompressor = zstandard.ZstdDecompressor()
+
+        # stream from standard input
+        if path == '-':
+            reader = decompressor.stream_reader(sys.stdin.buffer)
+            return self._docker_client.images.load(wc_env_manager.archive.iter_file(reader))[0]
+
+        with open(os.path.join(path, 'manifest.json'), 'r') as file:
+            manifest = json.load(file)
+        if not manifest['complete']:
+            raise WcEnvManagerError('Archive {} is incomplete; resume its export'.format(path))
+
+        # determine which layers are already present locally
+        local_chain_ids = set()
+        for image in self._docker_client.images.list(all=True):
+            local_chain_ids.update(wc_env_manager.archive.get_chain_ids(image.attrs['RootFS'].get('Layers', [])))
+        present_layers = set()
+        for layer, chain_id in zip(manifest['layers'], wc_env_manager.archive.get_chain_ids(manifest['layers'])):
+            if chain_id in local_chain_ids:
+                present_layers.add(layer)
+
+        missing_layers = [member['sha256'] for member in manifest['members']
+                          if member.get('omitted', False) and member['sha256'] not in present_layers]
+        if missing_layers:
+            raise WcEnvManagerError('Archive {} omits layers which are not present locally:\n  {}'.format(
+                path, '\n  '.join(missing_layers)))
+
+        # stream the output of `docker save`, without the layers that are already present, into `docker load`
+        blobs_dirname = os.path.join(path, 'blobs')
+        errors = []
+
+        def write_tar(file):
+            try:
+                with tarfile.open(fileobj=file, mode='w|') as tar_file:
+                    for member in manifest['members']:
+                        info = tarfile.TarInfo(member['name'])
+                        info.type = member['type'].encode()
+                        info.mode = member['mode']
+                        info.mtime = member['mtime']
+                        info.linkname = member['linkname']
+
+                        if info.isfile():
+                            if member.get('sha256', None) in present_layers:
+                                continue
+                            info.size = member['size']
+                            chunks = wc_env_manager.archive.ChunkedReader(blobs_dirname, member['chunks'])
+                            tar_file.addfile(info, decompressor.stream_reader(chunks))
+                        else:
+                            tar_file.addfile(info)
+            except Exception as exception:
+                errors.append(exception)
+            finally:
+                file.close()
+
+        read_fd, write_fd = os.pipe()
+        thread = threading.Thread(target=write_tar, args=(os.fdopen(write_fd, 'wb'),))
+        thread.start()
+        try:
+            with os.fdopen(read_fd, 'rb') as file:
+                self._docker_client.images.load(wc_env_manager.archive.iter_file(file))
+        except Exception as exception:
+            if not errors:
+                raise WcEnvManagerError('Image could not be loaded from archive {}:\n  {}'.format(
+                    path, str(exception).replace('\n', '\n  ')))
+        finally:
+            thread.join()
+        if errors:
+            raise WcEnvManagerError('Archive {} is corrupted:\n  {}'.format(
+                path, str(errors[0]).replace('\n', '\n  ')))
+
+        # tag image
+        image = self._docker_client.images.get(manifest['image'])
+        for tag in manifest['tags']:
+            repo, _, tag = tag.rpartition(':')
+            assert(image.tag(repo, tag=tag))
+        image.reload()
+        for tag in manifest['tags']:
+            self.set_image(tag.rpartition(':')[0], image)
+
+        if self.config['verbose']:
+            print('Imported image {} from {} ({} of {} layers were already present)'.format(
+                ', '.join(image.tags) or image.short_id, path, len(present_layers), len(manifest['layers'])))
+
+        return image
+
+    def analyze_image(self, image):
+        """ Analyze the sizes of the layers and files of an image, the bytes of its layers which are
+        hidden by files which are overwritten or deleted by upper layers, and its leftover build artifacts
+
+        The layers are streamed from the Docker daemon and indexed without extracting them.
+
+        Args:
+            image (:obj:`docker.models.images.Image` or :obj:`str`): image
+
+        Returns:
+            :obj:`wc_env_manager.analysis.ImageAnalysis`: analysis of the image
+
+        Raises:
+            :obj:`WcEnvManagerError`: if the layers of the image could not be read
+        """
+        import wc_env_manager.analysis
+
+        if isinstance(image, str):
+            image = self._docker_client.images.get(image)
+
+        try:
+            return wc_env_manager.analysis.analyze_image_archive(
+                image.save(), image.attrs['RootFS'].get('Layers', []), image=image.id, tags=image.tags)
+        except ValueError as exception:
+            raise WcEnvManagerError('Image {} could not be analyzed: {}'.format(image.short_id, str(exception)))
+
+    @staticmethod
+    def _write_image_archive_manifest(filename, manifest):
+        """ Atomically write the manifest of an image archive
+
+        Args:
+            filename (:obj:`str`): path to the manifest
+            manifest (:obj:`dict`): manifest
+        """
+        with open(filename + '.tmp', 'w') as file:
+            json.dump(manifest, file, indent=2)
+        os.replace(filename + '.tmp', filename)
+
+    @staticmethod
+    def _import_zstandard():
+        """ Import the optional zstandard package
+
+        Returns:
+            :obj:`module`: zstandard
+
+        Raises:
+            :obj:`WcEnvManagerError`: if zstandard is not installed
+        """
+        try:
+            import zstandard
+        except ImportError:
+            raise WcEnvManagerError('zstandard must be installed to compress archives: pip install wc_env_manager[zstd]')
+        return zstandard
+
+    def get_state_cache(self):
+        """ Get the in-memory index of the Docker images and containers, which is kept current by the
+        Docker events stream. The index is (re)filled if it isn't current, e.g., after the connection
+        to the Docker daemon was interrupted.
+
+        Returns:
+            :obj:`wc_env_manager.state.DockerStateCache`: index, or :obj:`None` if `config['state_cache']`
+                is :obj:`False`
+        """
+        import wc_env_manager.state
+
+        if not self.config['state_cache']:
+            return None
+        if self._state_cache is None:
+            self._state_cache = wc_env_manager.state.DockerStateCache(self._docker_client)
+        if not self._state_cache.running:
+            self._state_cache.start()
+        return self._state_cache
+
+    def close(self):
+        """ Stop keeping the in-memory index of the Docker images and containers current """
+        if self._state_cache is not None:
+            self._state_cache.stop()
+            self._state_cache = None
+
     def set_image(self, image_repo, image):
         """ Set the Docker image for WC modeling environment
 
@@ -518,7 +1371,11 @@ class WcEnvManager(object):
                 or name of Docker image
         """
         if isinstance(image, str):
-            image = self._docker_client.images.get(image)
+            state_cache = self.get_state_cache()
+            if state_cache and state_cache.get_image(image):
+                image = state_cache.get_image(image)
+            else:
+                image = self._docker_client.images.get(image)
 
         if image_repo == self.config['base_image']['repo_unsquashed']:
             self._base_image_unsquashed = image
@@ -536,6 +1393,12 @@ class WcEnvManager(object):
         Returns:
             :obj:`docker.models.images.Image`: Docker image
         """
+        import docker
+
+        state_cache = self.get_state_cache()
+        if state_cache:
+            return state_cache.get_image(image_repo)
+
         try:
             return self._docker_client.images.get(image_repo)
         except docker.errors.ImageNotFound:
@@ -557,7 +1420,21 @@ class WcEnvManager(object):
                 return version
 
     def build_network(self):
-        """ Create Docker network """
+        """ Create Docker network
+
+        The other containers of the network are created concurrently. This method returns once
+        each of the other containers passes the readiness probes configured in its `ready` section.
+
+        Returns:
+            :obj:`dict`: dictionary which maps the name of each of the other containers to the time
+                it took to start and become ready (seconds)
+
+        Raises:
+            :obj:`WcEnvManagerError`: if any of the other containers could not be created or did
+                not become ready
+        """
+        import docker
+
         config = self.config['network']
 
         # create network, if necessary
@@ -566,31 +1443,143 @@ class WcEnvManager(object):
         except docker.errors.NotFound:
             self._docker_client.networks.create(config['name'])
 
-        # create other containers, if necessary
-        for name, attrs in config['containers'].items():
+        # create other containers, if necessary, and wait for them to be ready
+        def create_container(name):
+            start = time.time()
+            attrs = config['containers'][name]
             try:
                 container = self._docker_client.containers.get(name)
             except docker.errors.NotFound:
-                self._docker_client.containers.run(
+                container = self._docker_client.containers.run(
                     attrs['image'], name=name,
                     environment=attrs['environment'],
+                    volumes=attrs.get('volumes', {}),
                     network=config['name'],
                     shm_size=attrs['shm_size'],
                     detach=True,
                     restart_policy={'name': 'always'})
 
+            ready = attrs.get('ready', {})
+            self.wait_for_container(container,
+                                    port=ready.get('port', None),
+                                    command=ready.get('command', None),
+                                    log_pattern=ready.get('log_pattern', None),
+                                    timeout=ready.get('timeout', None) or self.READY_TIMEOUT)
+            duration = time.time() - start
+            if self.config['verbose']:
+                print('Container {} is ready ({:.1f} s)'.format(name, duration))
+            return duration
+
+        results = self.run_concurrently(create_container, list(config['containers'].keys()),
+                                        max_workers=max(1, len(config['containers'])))
+        self._raise_concurrent_errors('Containers could not be created', results)
+        return {result.container: result.result for result in results}
+
+    def wait_for_container(self, container, port=None, command=None, log_pattern=None, timeout=READY_TIMEOUT):
+        """ Wait for a Docker container to be running and to pass its readiness probes. The probes
+        are polled with exponential backoff.
+
+        Args:
+            container (:obj:`docker.models.containers.Container`): container
+            port (:obj:`int`, optional): TCP port which the container must accept connections on
+                the network (see :obj:`_is_port_open`)
+            command (:obj:`list` of :obj:`str` or :obj:`str`, optional): command which must exit
+                with code 0 in the container
+            log_pattern (:obj:`str`, optional): regular expression which the logs of the container must match
+            timeout (:obj:`float`, optional): maximum time to wait (seconds)
+
+        Returns:
+            :obj:`float`: time it took the container to become ready (seconds)
+
+        Raises:
+            :obj:`WcEnvManagerError`: if the container doesn't become ready within :obj:`timeout`
+        """
+        start = time.time()
+        interval = self.READY_POLL_INTERVAL
+        while True:
+            container.reload()
+            if container.status == 'running' and self._is_container_ready(container, port, command, log_pattern):
+                return time.time() - start
+
+            remaining = timeout - (time.time() - start)
+            if remaining <= 0:
+                raise WcEnvManagerError('Container {} was not ready within {:.1f} s (status: {})'.format(
+                    container.name, timeout, container.status))
+            time.sleep(min(interval, remaining))
+            interval = min(2 * interval, self.READY_MAX_POLL_INTERVAL)
+
+    def _is_container_ready(self, container, port=None, command=None, log_pattern=None):
+        """ Determine whether a running Docker container passes its readiness probes
+
+        Args:
+            container (:obj:`docker.models.containers.Container`): container
+            port (:obj:`int`, optional): TCP port which the container must accept connections on
+                the network (see :obj:`_is_port_open`)
+            command (:obj:`list` of :obj:`str` or :obj:`str`, optional): command which must exit
+                with code 0 in the container
+            log_pattern (:obj:`str`, optional): regular expression which the logs of the container must match
+
+        Returns:
+            :obj:`bool`: :obj:`True` if the container passes all of the probes
+        """
+        if port and not self._is_port_open(container, port):
+            return False
+
+        if command and container.exec_run(command).exit_code != 0:
+            return False
+
+        if log_pattern and not re.search(log_pattern, container.logs().decode('utf-8', errors='replace'),
+                                         re.MULTILINE):
+            return False
+
+        return True
+
+    def _is_port_open(self, container, port):
+        """ Determine whether a container accepts TCP connections on a port of the network
+
+        The port is probed from a throwaway container (`config['network']['probe_image']`) on the
+        network, which reaches the container by its name, rather than from the host, which can't
+        reach the addresses of the network when the Docker daemon runs in a virtual machine (e.g.,
+        Docker Desktop) or on another host.
+
+        Args:
+            container (:obj:`docker.models.containers.Container`): container on the network
+            port (:obj:`int`): TCP port
+
+        Returns:
+            :obj:`bool`: :obj:`True` if the container accepts connections on the port
+        """
+        import docker
+
+        config = self.config['network']
+        try:
+            self._docker_client.containers.run(config['probe_image'],
+                                               ['nc', '-z', '-w', '1', container.name, str(port)],
+                                               network=config['name'], remove=True)
+        except docker.errors.ContainerError:
+            return False
+        return True
+
     def remove_network(self):
-        """ Remove Docker network """
+        """ Remove Docker network
+
+        The other containers of the network are removed concurrently.
+        """
+        import docker
+
         config = self.config['network']
 
         # remove other containers, if they exist
-        for name, attrs in config['containers'].items():
+        def remove_container(name):
             try:
                 container = self._docker_client.containers.get(name)
                 container.remove(force=True)
             except docker.errors.NotFound:
                 pass
 
+        results = self.run_concurrently(remove_container, list(config['containers'].keys()))
+        self._raise_concurrent_errors('Containers could not be removed', results)
+
         # remove network, if it exists
         try:
             network = self._docker_client.networks.get(config['name'])
@@ -613,14 +1602,19 @@ class WcEnvManager(object):
         # build network if needed
         self.build_network()
 
+        # build cache volumes if needed
+        self.build_cache_volumes()
+
         # create container
         img_config = self.config['image']
         cnt_config = self.config['container']
         container = self._container = self._docker_client.containers.run(
             img_config['repo'] + ':' + img_config['tags'][0], name=name,
             environment=cnt_config['environment'],
-            volumes=cnt_config['paths_to_mount'],
+            volumes=self.get_container_volumes(),
+            tmpfs=self.get_container_tmpfs(),
             ports=cnt_config['ports'],
+            labels=cnt_config['labels'],
             entrypoint=[],
             command='bash',
             stdin_open=True, tty=tty,
@@ -631,6 +1625,76 @@ class WcEnvManager(object):
         # return container
         return container
 
+    def get_container_volumes(self):
+        """ Get the host paths and cache volumes to mount into containers
+
+        Returns:
+            :obj:`dict`: dictionary which maps each host path (`config['container']['paths_to_mount']`)
+                and the name of each cache volume (`config['container']['cache_volumes']`) to the
+                path to mount it within containers (`bind`) and its mode (`ro` or `rw`)
+        """
+        volumes = {}
+        for host_path, attrs in self.config['container']['paths_to_mount'].items():
+            volumes[host_path] = {'bind': attrs['bind'], 'mode': attrs['mode']}
+        for name, attrs in self.config['container'].get('cache_volumes', {}).items():
+            volumes[name] = {'bind': attrs['bind'], 'mode': attrs.get('mode', None) or 'rw'}
+        return volumes
+
+    def get_container_tmpfs(self):
+        """ Get the tmpfs scratch directories to mount into containers (`config['container']['tmpfs']`)
+
+        Returns:
+            :obj:`dict`: dictionary which maps the path of each tmpfs mount within containers to
+                its mount options (e.g., `size=4294967296,mode=1777`)
+        """
+        tmpfs = {}
+        for container_path, attrs in self.config['container'].get('tmpfs', {}).items():
+            options = []
+            if attrs.get('size', None):
+                options.append('size={}'.format(parse_size(attrs['size'])))
+            options.extend(attrs.get('options', None) or [])
+            tmpfs[container_path] = ','.join(options)
+        return tmpfs
+
+    def build_cache_volumes(self):
+        """ Create the named Docker volumes for the caches which are shared among containers
+        (`config['container']['cache_volumes']`), such as the caches of pip, ete3, and datanator,
+        with their configured drivers and driver options
+
+        Returns:
+            :obj:`list` of :obj:`docker.models.volumes.Volume`: volumes
+        """
+        import docker
+
+        volumes = []
+        for name, attrs in self.config['container'].get('cache_volumes', {}).items():
+            try:
+                volume = self._docker_client.volumes.get(name)
+            except docker.errors.NotFound:
+                volume = self._docker_client.volumes.create(name, driver=attrs.get('driver', None) or 'local',
+                                                            driver_opts=dict(attrs.get('driver_opts', {})),
+                                                            labels={self.CACHE_VOLUME_LABEL: attrs['bind']})
+                if self.config['verbose']:
+                    print('Created cache volume {}'.format(name))
+            volumes.append(volume)
+        return volumes
+
+    def remove_cache_volumes(self):
+        """ Remove the named Docker volumes for the caches which are shared among containers
+
+        Raises:
+            :obj:`WcEnvManagerError`: if a volume is used by a container
+        """
+        import docker
+
+        for name in self.config['container'].get('cache_volumes', {}).keys():
+            try:
+                self._docker_client.volumes.get(name).remove()
+            except docker.errors.NotFound:
+                pass
+            except docker.errors.APIError as error:
+                raise WcEnvManagerError('Cache volume {} could not be removed:\n  {}'.format(name, str(error)))
+
     def make_container_name(self):
         """ Create a timestamped name for a Docker container
 
@@ -639,11 +1703,20 @@ class WcEnvManager(object):
         """
         return datetime.now().strftime(self.config['container']['name_format'])
 
-    def setup_container(self, upgrade=False):
+    def setup_container(self, upgrade=False, incremental=False):
         """ Install Python packages into Docker container
 
+        When the packages are upgraded, the revisions of the installed packages
+        (`config['container']['python_packages']`) are recorded in the container so that
+        subsequent incremental upgrades only reinstall the packages that have changed. The
+        revisions are not queried when the packages are not upgraded, and packages which were
+        installed without recording their revisions are reinstalled by the next incremental upgrade.
+
         Args:
             upgrade (:obj:`bool`, optional): if :obj:`True`, upgrade package
+            incremental (:obj:`bool`, optional): if :obj:`True` and :obj:`upgrade` is
+                :obj:`True`, only upgrade the packages whose revisions have changed since
+                they were installed
         """
         # copy paths to container
         paths_to_copy = \
@@ -666,27 +1739,207 @@ class WcEnvManager(object):
         self.run_process_in_container(['chmod', '0600', '/root/.ssh/id_rsa'])
 
         # install Python packages
-        lines = self.config['container']['python_packages'].split('\n')
-        for line in lines:
+        lines = []
+        for line in self.config['container']['python_packages'].split('\n'):
             line = line.strip()
             if line and not line.startswith('#'):
-                cmd = ['pip{}'.format(self.config['image']['python_version']), 'install']
+                lines.append(line)
 
-                if line.startswith('-e '):
-                    cmd += ['-e', line[3:].strip()]
-                else:
-                    cmd += [line]
+        # the revisions are only needed to decide which packages to upgrade
+        if upgrade:
+            revisions = self.get_python_package_revisions(lines)
+        else:
+            revisions = {line: None for line in lines}
+        if upgrade and incremental:
+            installed_revisions = self.get_installed_python_package_revisions()
+            lines = [line for line in lines
+                     if revisions[line] is None or revisions[line] != installed_revisions.get(line, None)]
+            lines = self.sort_python_packages_by_dependencies(lines)
+        else:
+            installed_revisions = {}
+
+        for line in lines:
+            cmd = ['pip{}'.format(self.config['image']['python_version']), 'install']
 
-                if upgrade:
-                    cmd.append('-U')
+            if line.startswith('-e '):
+                cmd += ['-e', line[3:].strip()]
+            else:
+                cmd += [line]
+
+            if upgrade:
+                cmd.append('-U')
+
+            self.run_process_in_container(cmd, container_user=WcEnvUser.root)
 
-                self.run_process_in_container(cmd, container_user=WcEnvUser.root)
+        # record revisions of installed packages
+        for line in lines:
+            installed_revisions[line] = revisions[line]
+        self.set_installed_python_package_revisions(installed_revisions)
 
         # run additional setup
         cmd = self.config['container']['setup_script']
         if cmd:
             self.run_process_in_container(['bash', '-c', cmd], container_user=WcEnvUser.root)
 
+    def get_python_package_revisions(self, lines):
+        """ Get the current revision of each Python package requirement
+
+        * Git URLs (e.g., `git+https://github.com/KarrLab/wc_utils.git#egg=wc_utils`): SHA of
+          the requested branch, tag, or commit, obtained with `git ls-remote`
+        * Paths in the container (e.g., `-e /root/host/Documents/wc_utils`): SHA of the `HEAD`
+          of the Git working tree, plus a hash of its uncommitted changes and of its status
+          (e.g., new untracked files)
+        * Pinned PyPI requirements (e.g., `numpy==1.18.1`): pinned version
+        * Other PyPI requirements (e.g., `numpy`): latest version at PyPI
+
+        Args:
+            lines (:obj:`list` of :obj:`str`): Python package requirements in requirements.txt format
+
+        Returns:
+            :obj:`dict`: dictionary which maps each requirement to its revision, or :obj:`None`
+                if the revision could not be determined
+        """
+        import git
+        import requests
+
+        revisions = {}
+        for line in lines:
+            path = line[3:].strip() if line.startswith('-e ') else line
+
+            try:
+                if path.startswith('git+'):
+                    url = path[4:].partition('#')[0]
+                    parsed_url = urllib.parse.urlparse(url)
+                    if '@' in parsed_url.path:
+                        repo_path, _, ref = parsed_url.path.rpartition('@')
+                        url = parsed_url._replace(path=repo_path).geturl()
+                    else:
+                        ref = 'HEAD'
+                    refs = git.cmd.Git().ls_remote(url, ref).split()
+                    revisions[line] = refs[0] if refs else ref
+
+                elif path.startswith('/') or path.startswith('.'):
+                    output, exit_code = self.run_process_in_container([
+                        'bash', '-c',
+                        'set -o pipefail; git -C "$0" rev-parse HEAD '
+                        '&& { git -C "$0" diff HEAD && git -C "$0" status --porcelain; } | sha1sum',
+                        path],
+                        check=False)
+                    if exit_code == 0:
+                        revisions[line] = ' '.join(output.replace(' -', '').split())
+                    else:
+                        revisions[line] = None
+
+                elif re.match(r'^[a-zA-Z0-9_\-\.]+ *(\[[^\]]*\])? *===? *[^,;\* ]+ *$', path):
+                    revisions[line] = re.split(r'===?', path)[1].strip()
+
+                else:
+                    name = re.match(r'^([a-zA-Z0-9_\-\.]+)', path).group(1)
+                    response = requests.get('https://pypi.org/pypi/{}/json'.format(name))
+                    response.raise_for_status()
+                    revisions[line] = response.json()['info']['version']
+
+            except (git.exc.GitCommandError, requests.exceptions.RequestException,
+                    AttributeError, KeyError, ValueError):
+                revisions[line] = None
+
+        return revisions
+
+    def get_installed_python_package_revisions(self):
+        """ Get the revisions of the Python packages which were installed into the current container
+
+        Returns:
+            :obj:`dict`: dictionary which maps each requirement to its installed revision
+        """
+        output, exit_code = self.run_process_in_container(
+            ['cat', self.PYTHON_PACKAGE_REVISIONS_PATH], check=False)
+        if exit_code != 0:
+            return {}
+        return json.loads(output)
+
+    def set_installed_python_package_revisions(self, revisions):
+        """ Record the revisions of the Python packages which were installed into the current container
+
+        Args:
+            revisions (:obj:`dict`): dictionary which maps each requirement to its installed revision
+        """
+        data = json.dumps(revisions, indent=2, sort_keys=True).encode()
+
+        archive = io.BytesIO()
+        with tarfile.open(fileobj=archive, mode='w') as file:
+            info = tarfile.TarInfo(os.path.basename(self.PYTHON_PACKAGE_REVISIONS_PATH))
+            info.size = len(data)
+            info.mtime = time.time()
+            file.addfile(info, io.BytesIO(data))
+
+        dirname = os.path.dirname(self.PYTHON_PACKAGE_REVISIONS_PATH)
+        self.run_process_in_container(['mkdir', '-p', dirname])
+        self._container.put_archive(dirname, archive.getvalue())
+
+    def sort_python_packages_by_dependencies(self, lines):
+        """ Sort Python package requirements so that each package is installed after the
+        packages that it depends on
+
+        The dependencies are obtained from the metadata of the packages installed in
+        the current container. Packages are otherwise kept in their configured order.
+
+        Args:
+            lines (:obj:`list` of :obj:`str`): Python package requirements in requirements.txt format
+
+        Returns:
+            :obj:`list` of :obj:`str`: sorted requirements
+        """
+        def normalize(name):
+            return re.sub(r'[\-\.]', '_', name).lower()
+
+        # get package names
+        names = {}
+        for line in lines:
+            path = line[3:].strip() if line.startswith('-e ') else line
+            egg = re.search(r'#egg=([a-zA-Z0-9_\-\.]+)', path)
+            if egg:
+                names[line] = normalize(egg.group(1))
+            elif path.startswith('/') or path.startswith('.'):
+                names[line] = normalize(os.path.basename(path.rstrip('/')))
+            else:
+                names[line] = normalize(re.match(r'^([a-zA-Z0-9_\-\.]*)', path).group(1))
+
+        # get dependencies of installed packages
+        requires = {}
+        if names:
+            output, _ = self.run_process_in_container(
+                ['pip{}'.format(self.config['image']['python_version']), 'show'] + sorted(set(names.values())),
+                check=False)
+            name = None
+            for output_line in output.split('\n'):
+                key, _, value = output_line.partition(':')
+                if key == 'Name':
+                    name = normalize(value.strip())
+                elif key == 'Requires' and name:
+                    requires[name] = set(normalize(req.strip()) for req in value.split(',') if req.strip())
+
+        def depends_on(name, other_name, visited):
+            if name in visited:
+                return False
+            visited.add(name)
+            reqs = requires.get(name, set())
+            return other_name in reqs or any(depends_on(req, other_name, visited) for req in reqs)
+
+        # sort packages topologically, preserving the configured order where possible
+        sorted_lines = []
+        unsorted_lines = list(lines)
+        while unsorted_lines:
+            for line in unsorted_lines:
+                if not any(depends_on(names[line], names[other_line], set())
+                           for other_line in unsorted_lines if other_line != line):
+                    break
+            else:
+                line = unsorted_lines[0]  # pragma: no cover # circular dependency
+            sorted_lines.append(line)
+            unsorted_lines.remove(line)
+
+        return sorted_lines
+
     def copy_path_to_container(self, local_path, container_path, overwrite=True, container_user=WcEnvUser.root):
         """ Copy file or directory to Docker container
 
@@ -737,6 +1990,651 @@ class WcEnvManager(object):
             local_path,
         ])
 
+    def retrieve_path(self, container_path, local_path, codec=None, level=None, include=None, exclude=None,
+                      container_user=WcEnvUser.root):
+        """ Retrieve the files in a directory of the current container, compressing them within the
+        container and decompressing them on the fly into the local directory
+
+        The selected files are archived and compressed within the container, and the compressed
+        archive is streamed to the host through the standard output of the process and extracted
+        with bounded memory, without writing the archive to the container's filesystem.
+
+        Args:
+            container_path (:obj:`str`): path to directory within the container
+            local_path (:obj:`str`): path to directory on the host
+            codec (:obj:`str`, optional): compression codec (`none`, `gzip`, `xz`, or `zstd`).
+                Default: `retrieve.codec`
+            level (:obj:`int`, optional): compression level. Default: `retrieve.level`, or the
+                default level of the codec
+            include (:obj:`list` of :obj:`str`, optional): glob patterns of files to retrieve.
+                Default: all files
+            exclude (:obj:`list` of :obj:`str`, optional): glob patterns of files not to retrieve
+            container_user (:obj:`WcEnvUser`, optional): user to read the files in the container
+
+        Returns:
+            :obj:`RetrievalReport`: files which were retrieved and their total uncompressed and
+                compressed sizes
+
+        Raises:
+            :obj:`WcEnvManagerError`: if the codec is not supported, or the files could not be
+                archived
+        """
+        if codec is None:
+            codec = self.config['retrieve']['codec']
+        if level is None:
+            level = self.config['retrieve']['level']
+        if codec not in self.RETRIEVE_CODECS:
+            raise WcEnvManagerError('Codec must be one of {}'.format(', '.join(sorted(self.RETRIEVE_CODECS))))
+        if codec == 'zstd':
+            zstandard = self._import_zstandard()
+
+        # select files
+        files = self._get_container_file_index(container_path, exclude=exclude, container_user=container_user)
+        if include:
+            files = {name: file for name, file in files.items() if path_matches_patterns(name, include)}
+
+        report = RetrievalReport()
+        report.files = sorted(files.keys())
+        report.bytes_uncompressed = sum(file['size'] for file in files.values())
+        if not files:
+            return report
+
+        # archive and compress files within the container, and stream the archive to the host
+        temp_dirname = self._exec_in_container(['mktemp', '-d'], container_user=container_user).decode().strip()
+        try:
+            file_list = '\0'.join(report.files).encode()
+            file_list_archive = io.BytesIO()
+            with tarfile.open(fileobj=file_list_archive, mode='w') as tar_file:
+                info = tarfile.TarInfo('files')
+                info.size = len(file_list)
+                info.uid = info.gid = container_user.value
+                tar_file.addfile(info, io.BytesIO(file_list))
+            self._container.put_archive(temp_dirname, file_list_archive.getvalue())
+
+            compress_cmd = self.RETRIEVE_CODECS[codec]
+            if level is not None and codec != 'none':
+                compress_cmd += ' -{}'.format(level)
+            api = self._docker_client.api
+            exec_id = api.exec_create(
+                self._container.id,
+                ['bash', '-c', 'set -o pipefail; tar -cf - -C "$0" --null -T "$1/files" | {}'.format(compress_cmd),
+                 container_path, temp_dirname],
+                stdout=True, stderr=False, user=container_user.name)['Id']
+            stream = api.exec_start(exec_id, stream=True)
+
+            # decompress and extract the archive
+            if not os.path.isdir(local_path):
+                os.makedirs(local_path)
+
+            def count_bytes(stream):
+                for block in stream:
+                    report.bytes_compressed += len(block)
+                    yield block
+
+            report.bytes_compressed = 0
+            compressed_file = io.BufferedReader(wc_env_manager.archive.IteratorReader(count_bytes(stream)))
+            if codec == 'zstd':
+                inner_file = zstandard.ZstdDecompressor().stream_reader(compressed_file)
+                inner_mode = 'r|'
+            else:
+                inner_file = compressed_file
+                inner_mode = {'none': 'r|', 'gzip': 'r|gz', 'xz': 'r|xz'}[codec]
+            with tarfile.open(fileobj=inner_file, mode=inner_mode) as inner_tar_file:
+                for member in inner_tar_file:
+                    if member.isfile():
+                        try:
+                            wc_env_manager.archive.extract_tar_member(inner_tar_file, member, local_path)
+                        except ValueError as exception:
+                            raise WcEnvManagerError(str(exception))
+                        os.utime(os.path.join(local_path, member.name), (member.mtime, member.mtime))
+            for _ in wc_env_manager.archive.iter_file(compressed_file):
+                pass
+
+            exit_code = api.exec_inspect(exec_id)['ExitCode']
+            if exit_code != 0:
+                raise WcEnvManagerError('Files could not be archived from {}:{} (exit code {})'.format(
+                    self._container.name, container_path, exit_code))
+
+        finally:
+            self._exec_in_container(['rm', '-rf', temp_dirname], container_user=container_user)
+
+        if self.config['verbose']:
+            print('Retrieved {} files ({} compressed to {}) from {}'.format(
+                len(report.files), format_size(report.bytes_uncompressed),
+                format_size(report.bytes_compressed), container_path))
+
+        return report
+
+    def flush_tmpfs(self, local_path, container_paths=None, codec=None, level=None, include=None, exclude=None,
+                    container_user=WcEnvUser.root):
+        """ Save the contents of tmpfs scratch directories of the current container to the host,
+        e.g., to keep the checkpoints of a simulation at the end of a job
+
+        The contents of each tmpfs mount are retrieved with :obj:`retrieve_path` into the
+        subdirectory of :obj:`local_path` with the path of the mount (e.g., `/root/scratch` is
+        saved to `<local_path>/root/scratch`).
+
+        Args:
+            local_path (:obj:`str`): path to directory on the host
+            container_paths (:obj:`list` of :obj:`str`, optional): paths of the tmpfs mounts to save.
+                Default: all of the tmpfs mounts of the container (`config['container']['tmpfs']`)
+            codec (:obj:`str`, optional): compression codec (`none`, `gzip`, `xz`, or `zstd`)
+            level (:obj:`int`, optional): compression level
+            include (:obj:`list` of :obj:`str`, optional): glob patterns of files to save.
+                Default: all files
+            exclude (:obj:`list` of :obj:`str`, optional): glob patterns of files not to save
+            container_user (:obj:`WcEnvUser`, optional): user to read the files in the container
+
+        Returns:
+            :obj:`dict`: dictionary which maps the path of each tmpfs mount to a :obj:`RetrievalReport`
+
+        Raises:
+            :obj:`WcEnvManagerError`: if a path is not a tmpfs mount of the container
+        """
+        self._container.reload()
+        mounts = self._container.attrs['HostConfig'].get('Tmpfs', None) or {}
+
+        if container_paths is None:
+            container_paths = sorted(mounts.keys())
+        for container_path in container_paths:
+            if container_path not in mounts:
+                raise WcEnvManagerError('{} is not a tmpfs mount of container {}'.format(
+                    container_path, self._container.name))
+
+        reports = {}
+        for container_path in container_paths:
+            reports[container_path] = self.retrieve_path(
+                container_path, os.path.join(local_path, container_path.lstrip('/')),
+                codec=codec, level=level, include=include, exclude=exclude, container_user=container_user)
+        return reports
+
+    def sync_path(self, local_path, container_path, direction=SyncDirection.to_container,
+                  delete=False, checksum=False, exclude=None, container_user=WcEnvUser.root):
+        """ Incrementally synchronize a directory between the host and the current Docker container
+
+        The size and modification time of each file are compared between the host and the
+        container. Files whose sizes differ, or which are missing from the destination, are
+        transferred. Files whose sizes are equal, but whose modification times differ, are
+        transferred only if their SHA-256 digests also differ; otherwise, the modification
+        times of the destination files are updated so that they are not hashed again. All of the
+        changed files are transferred in a single tar stream and their modification times are
+        preserved, so that unchanged files are skipped quickly by subsequent synchronizations.
+
+        Args:
+            local_path (:obj:`str`): path to directory on the host
+            container_path (:obj:`str`): path to directory within the container
+            direction (:obj:`SyncDirection`, optional): direction of the synchronization
+            delete (:obj:`bool`, optional): if :obj:`True`, delete files from the destination
+                which are not present in the source
+            checksum (:obj:`bool`, optional): if :obj:`True`, compare the digests of all files
+                whose sizes are equal, regardless of their modification times
+            exclude (:obj:`list` of :obj:`str`, optional): glob patterns of files to neither
+                synchronize nor delete (e.g., `__pycache__`, `*.pyc`)
+            container_user (:obj:`WcEnvUser`, optional): user to read and write the files in
+                the container
+
+        Returns:
+            :obj:`SyncReport`: files which were transferred and deleted, and the number of bytes
+                which were transferred and which did not need to be transferred
+
+        Raises:
+            :obj:`WcEnvManagerError`: if the source directory does not exist
+        """
+        to_container = direction == SyncDirection.to_container
+
+        if to_container and not os.path.isdir(local_path):
+            raise WcEnvManagerError('Directory {} does not exist'.format(local_path))
+        if not to_container and not os.path.isdir(local_path):
+            os.makedirs(local_path)
+
+        local_files = self._get_local_file_index(local_path, exclude=exclude)
+        container_files = self._get_container_file_index(container_path, create=to_container, exclude=exclude,
+                                                         container_user=container_user)
+        if to_container:
+            src_files, dest_files = local_files, container_files
+        else:
+            src_files, dest_files = container_files, local_files
+
+        # determine which files changed
+        changed = []
+        candidates = []
+        unchanged = []
+        for name, src_file in src_files.items():
+            dest_file = dest_files.get(name, None)
+            if dest_file is None or dest_file['size'] != src_file['size']:
+                changed.append(name)
+            elif checksum or dest_file['mtime'] != src_file['mtime']:
+                candidates.append(name)
+        if candidates:
+            local_digests = self._get_local_file_digests(local_path, candidates)
+            container_digests = self._get_container_file_digests(container_path, candidates,
+                                                                 container_user=container_user)
+            for name in candidates:
+                if local_digests[name] != container_digests.get(name, None):
+                    changed.append(name)
+                elif dest_files[name]['mtime'] != src_files[name]['mtime']:
+                    unchanged.append(name)
+        changed.sort()
+
+        report = SyncReport(direction)
+        report.files_transferred = changed
+        if delete:
+            report.files_deleted = sorted(set(dest_files.keys()).difference(src_files.keys()))
+        report.bytes_transferred = sum(src_files[name]['size'] for name in changed)
+        report.bytes_saved = sum(file['size'] for file in src_files.values()) - report.bytes_transferred
+
+        # align the modification times of unchanged files so that they are not hashed again
+        if unchanged:
+            self._set_file_mtimes(container_path if to_container else local_path,
+                                  {name: src_files[name]['mtime'] for name in unchanged},
+                                  in_container=to_container, container_user=container_user)
+
+        # transfer changed files and delete extraneous files
+        if to_container:
+            if changed:
+                self._put_files_in_container(local_path, container_path, changed, container_user=container_user)
+            for names in self._batch_paths(report.files_deleted):
+                self._exec_in_container(['sh', '-c', 'cd "$0" && rm -f -- "$@"', container_path] + names,
+                                        container_user=container_user)
+        else:
+            if changed:
+                self._get_files_from_container(container_path, local_path, changed, container_user=container_user)
+            for name in report.files_deleted:
+                os.remove(os.path.join(local_path, name))
+
+        if self.config['verbose']:
+            print('Synchronized {} files ({}), deleted {} files, and skipped {} of unchanged files'.format(
+                len(report.files_transferred), format_size(report.bytes_transferred),
+                len(report.files_deleted), format_size(report.bytes_saved)))
+
+        return report
+
+    def _get_local_file_index(self, dirname, exclude=None):
+        """ Get the size and modification time of each file in a directory on the host
+
+        Args:
+            dirname (:obj:`str`): path to directory
+            exclude (:obj:`list` of :obj:`str`, optional): glob patterns of files to ignore
+
+        Returns:
+            :obj:`dict`: dictionary which maps the path of each file relative to :obj:`dirname`
+                to its size (bytes) and modification time (seconds since the epoch)
+        """
+        files = {}
+        for root, _, filenames in os.walk(dirname):
+            for filename in filenames:
+                path = os.path.join(root, filename)
+                if os.path.islink(path) or not os.path.isfile(path):
+                    continue
+                stat = os.stat(path)
+                name = os.path.relpath(path, dirname).replace(os.sep, self.IMAGE_OS_SEP)
+                if not path_matches_patterns(name, exclude):
+                    files[name] = {'size': stat.st_size, 'mtime': int(stat.st_mtime)}
+        return files
+
+    def _get_container_file_index(self, dirname, create=False, exclude=None, container_user=WcEnvUser.root):
+        """ Get the size and modification time of each file in a directory in the current container
+
+        Args:
+            dirname (:obj:`str`): path to directory
+            create (:obj:`bool`, optional): if :obj:`True`, create the directory if it doesn't exist
+            exclude (:obj:`list` of :obj:`str`, optional): glob patterns of files to ignore
+            container_user (:obj:`WcEnvUser`, optional): user to read the directory
+
+        Returns:
+            :obj:`dict`: dictionary which maps the path of each file relative to :obj:`dirname`
+                to its size (bytes) and modification time (seconds since the epoch)
+        """
+        script = '{} && find "$0" -type f -printf "%P\\0%s\\0%T@\\0"'.format(
+            'mkdir -p "$0"' if create else 'cd "$0"')
+        output = self._exec_in_container(['sh', '-c', script, dirname], container_user=container_user)
+
+        files = {}
+        fields = output.split(b'\0')
+        for i_file in range(len(fields) // 3):
+            name, size, mtime = fields[3 * i_file:3 * (i_file + 1)]
+            name = name.decode()
+            if not path_matches_patterns(name, exclude):
+                files[name] = {'size': int(size), 'mtime': int(float(mtime))}
+        return files
+
+    @staticmethod
+    def _get_local_file_digests(dirname, names):
+        """ Get the SHA-256 digests of files on the host
+
+        Args:
+            dirname (:obj:`str`): path to directory
+            names (:obj:`list` of :obj:`str`): paths of files relative to :obj:`dirname`
+
+        Returns:
+            :obj:`dict`: dictionary which maps the path of each file to its digest
+        """
+        digests = {}
+        for name in names:
+            digest = hashlib.sha256()
+            with open(os.path.join(dirname, name), 'rb') as file:
+                for block in wc_env_manager.archive.iter_file(file):
+                    digest.update(block)
+            digests[name] = digest.hexdigest()
+        return digests
+
+    def _get_container_file_digests(self, dirname, names, container_user=WcEnvUser.root):
+        """ Get the SHA-256 digests of files in the current container
+
+        Args:
+            dirname (:obj:`str`): path to directory
+            names (:obj:`list` of :obj:`str`): paths of files relative to :obj:`dirname`
+            container_user (:obj:`WcEnvUser`, optional): user to read the files
+
+        Returns:
+            :obj:`dict`: dictionary which maps the path of each file to its digest. Files whose
+                names `sha256sum` escapes are omitted.
+        """
+        digests = {}
+        for batch in self._batch_paths(names):
+            output = self._exec_in_container(['sh', '-c', 'cd "$0" && sha256sum -- "$@"', dirname] + batch,
+                                             container_user=container_user)
+            for line in output.decode().split('\n'):
+                if line and not line.startswith('\\'):
+                    digest, _, name = line.partition('  ')
+                    digests[name] = digest
+        return digests
+
+    def _set_file_mtimes(self, dirname, mtimes, in_container=False, container_user=WcEnvUser.root):
+        """ Set the modification times of files on the host or in the current container
+
+        Args:
+            dirname (:obj:`str`): path to directory
+            mtimes (:obj:`dict`): dictionary which maps the path of each file relative to
+                :obj:`dirname` to its modification time (seconds since the epoch)
+            in_container (:obj:`bool`, optional): if :obj:`True`, set the modification times of
+                files in the current container rather than on the host
+            container_user (:obj:`WcEnvUser`, optional): user to write the files in the container
+        """
+        if not in_container:
+            for name, mtime in mtimes.items():
+                os.utime(os.path.join(dirname, name), (mtime, mtime))
+            return
+
+        script = 'cd "$0" && while [ $# -gt 0 ]; do touch -c -m -d "@$1" -- "$2" || exit 1; shift 2; done'
+        for batch in self._batch_paths(sorted(mtimes.keys())):
+            args = []
+            for name in batch:
+                args.extend([str(mtimes[name]), name])
+            self._exec_in_container(['sh', '-c', script, dirname] + args, container_user=container_user)
+
+    def _put_files_in_container(self, local_dirname, container_dirname, names, container_user=WcEnvUser.root):
+        """ Copy files from the host to the current container in a single tar stream
+
+        Args:
+            local_dirname (:obj:`str`): path to directory on the host
+            container_dirname (:obj:`str`): path to directory within the container
+            names (:obj:`list` of :obj:`str`): paths of the files relative to the directories
+            container_user (:obj:`WcEnvUser`, optional): owner of the files in the container
+        """
+        with tempfile.TemporaryFile() as archive_file:
+            with tarfile.open(fileobj=archive_file, mode='w') as tar_file:
+                for name in names:
+                    path = os.path.join(local_dirname, name)
+                    info = tar_file.gettarinfo(path, arcname=name)
+                    info.uid = info.gid = container_user.value
+                    info.uname = info.gname = ''
+                    with open(path, 'rb') as file:
+                        tar_file.addfile(info, file)
+            archive_file.seek(0)
+            self._container.put_archive(container_dirname, archive_file)
+
+    def _get_files_from_container(self, container_dirname, local_dirname, names, container_user=WcEnvUser.root):
+        """ Copy files from the current container to the host in tar streams
+
+        Args:
+            container_dirname (:obj:`str`): path to directory within the container
+            local_dirname (:obj:`str`): path to directory on the host
+            names (:obj:`list` of :obj:`str`): paths of the files relative to the directories
+            container_user (:obj:`WcEnvUser`, optional): user to read the files
+
+        Raises:
+            :obj:`WcEnvManagerError`: if the files could not be read
+        """
+        api = self._docker_client.api
+        for batch in self._batch_paths(names):
+            exec_id = api.exec_create(self._container.id, ['tar', '-cf', '-', '-C', container_dirname, '--'] + batch,
+                                      stdout=True, stderr=False, user=container_user.name)['Id']
+            stream = api.exec_start(exec_id, stream=True)
+            with tarfile.open(fileobj=wc_env_manager.archive.IteratorReader(stream), mode='r|') as tar_file:
+                for member in tar_file:
+                    if member.isfile():
+                        try:
+                            wc_env_manager.archive.extract_tar_member(tar_file, member, local_dirname)
+                        except ValueError as exception:
+                            raise WcEnvManagerError(str(exception))
+                        os.utime(os.path.join(local_dirname, member.name), (member.mtime, member.mtime))
+            exit_code = api.exec_inspect(exec_id)['ExitCode']
+            if exit_code != 0:
+                raise WcEnvManagerError('Files could not be copied from {}:{} (exit code {})'.format(
+                    self._container.name, container_dirname, exit_code))
+
+    def _exec_in_container(self, cmd, container_user=WcEnvUser.root):
+        """ Run a process in the current container and return its raw output, without printing it
+
+        Args:
+            cmd (:obj:`list` of :obj:`str`): command to run
+            container_user (:obj:`WcEnvUser`, optional): user to run the command
+
+        Returns:
+            :obj:`bytes`: output of the process
+
+        Raises:
+            :obj:`WcEnvManagerError`: if the command is not executed successfully
+        """
+        result = self._container.exec_run(cmd, user=container_user.name)
+        if result.exit_code != 0:
+            raise WcEnvManagerError('Command not successfully executed in Docker container:\n'
+                                    '  command: {}\n  exit code: {}\n  output: {}'.format(
+                                        cmd, result.exit_code, result.output.decode('utf-8', errors='replace')))
+        return result.output
+
+    def _batch_paths(self, names):
+        """ Split paths into batches which fit within the arguments of a command
+
+        Args:
+            names (:obj:`list` of :obj:`str`): paths
+
+        Returns:
+            :obj:`iterator` of :obj:`list` of :obj:`str`: batches of paths
+        """
+        batch = []
+        length = 0
+        for name in names:
+            if batch and length + len(name) + 1 > self.SYNC_MAX_ARGS_LENGTH:
+                yield batch
+                batch = []
+                length = 0
+            batch.append(name)
+            length += len(name) + 1
+        if batch:
+            yield batch
+
+    def watch_paths(self, paths=None, debounce=WATCH_DEBOUNCE, initial_sync=True,
+                    container_user=WcEnvUser.root, stop_event=None):
+        """ Watch directories on the host and push the files which are modified into the current
+        Docker container until interrupted
+
+        Changes are detected with inotify (via watchdog) and debounced: once a change is detected,
+        the files which changed are pushed after no further changes have been detected for
+        :obj:`debounce` seconds. The modified files within each directory are pushed in a single
+        tar archive, and deleted files are removed from the container.
+
+        Args:
+            paths (:obj:`dict`, optional): dictionary which maps paths to directories on the host to
+                dictionaries with the keys `container`, the path to the directory within the
+                container, and `exclude`, glob patterns of files to ignore. Default:
+                `container.paths_to_watch`
+            debounce (:obj:`float`, optional): time to wait for further changes before pushing
+                the changed files (seconds)
+            initial_sync (:obj:`bool`, optional): if :obj:`True`, synchronize each directory
+                (see :obj:`sync_path`) before watching it
+            container_user (:obj:`WcEnvUser`, optional): owner of the files in the container
+            stop_event (:obj:`threading.Event`, optional): event which stops watching when set
+
+        Returns:
+            :obj:`SyncReport`: files which were pushed and deleted
+
+        Raises:
+            :obj:`WcEnvManagerError`: if watchdog is not installed or no directories are configured
+        """
+        watchdog = self._import_watchdog()
+        if paths is None:
+            paths = self.config['container']['paths_to_watch']
+        if not paths:
+            raise WcEnvManagerError('No directories are configured to be watched')
+        if stop_event is None:
+            stop_event = threading.Event()
+
+        roots = []
+        for host_path, path_config in paths.items():
+            roots.append({
+                'host': os.path.abspath(os.path.expanduser(host_path)),
+                'container': path_config['container'],
+                'exclude': path_config.get('exclude', None) or [],
+            })
+
+        report = SyncReport(SyncDirection.to_container)
+        if initial_sync:
+            for root in roots:
+                root_report = self.sync_path(root['host'], root['container'], exclude=root['exclude'],
+                                             container_user=container_user)
+                report.bytes_saved += root_report.bytes_saved
+
+        # collect the paths which changed, and the directories which were created or moved and must be
+        # walked; the modification events of directories (e.g., changes of their mtimes when their
+        # files change) are ignored because the files themselves raise events
+        changed_paths = set()
+        changed_dirs = set()
+        changed = threading.Event()
+        lock = threading.Lock()
+
+        def on_any_event(event):
+            if event.event_type not in self.WATCH_EVENT_TYPES:
+                return
+            if event.is_directory and event.event_type == 'modified':
+                return
+            dest_path = getattr(event, 'dest_path', None)
+            with lock:
+                changed_paths.add(event.src_path)
+                if dest_path:
+                    changed_paths.add(dest_path)
+                if event.is_directory and event.event_type in ('created', 'moved'):
+                    changed_dirs.add(dest_path or event.src_path)
+            changed.set()
+
+        handler = watchdog.events.FileSystemEventHandler()
+        handler.on_any_event = on_any_event
+        observer = watchdog.observers.Observer()
+        for root in roots:
+            observer.schedule(handler, root['host'], recursive=True)
+        observer.start()
+
+        if self.config['verbose']:
+            print('Watching {}'.format(', '.join(root['host'] for root in roots)))
+
+        # push the changed files
+        try:
+            while not stop_event.is_set():
+                if not changed.wait(timeout=self.WATCH_POLL_INTERVAL):
+                    continue
+                changed.clear()
+                while changed.wait(timeout=debounce):
+                    changed.clear()
+
+                with lock:
+                    batch = set(changed_paths)
+                    batch_dirs = set(changed_dirs)
+                    changed_paths.clear()
+                    changed_dirs.clear()
+                for root in roots:
+                    self._push_watched_paths(root, batch, report, dirs=batch_dirs, container_user=container_user)
+        except KeyboardInterrupt:
+            pass
+        finally:
+            observer.stop()
+            observer.join()
+
+        return report
+
+    def _push_watched_paths(self, root, paths, report, dirs=None, container_user=WcEnvUser.root):
+        """ Push the files which changed within a watched directory into the current container
+
+        Only the directories which were created or moved (:obj:`dirs`) are walked; other changed
+        paths which are directories are ignored because the changes of their files are reported
+        separately.
+
+        Args:
+            root (:obj:`dict`): host path, container path, and excluded glob patterns of the
+                watched directory
+            paths (:obj:`set` of :obj:`str`): absolute paths on the host which changed
+            report (:obj:`SyncReport`): report to add the pushed and deleted files to
+            dirs (:obj:`set` of :obj:`str`, optional): absolute paths on the host of the directories
+                which were created or moved into the watched directory
+            container_user (:obj:`WcEnvUser`, optional): owner of the files in the container
+        """
+        modified = set()
+        deleted = set()
+        for path in paths:
+            if os.path.commonpath([root['host'], path]) != root['host'] or path == root['host']:
+                continue
+            name = os.path.relpath(path, root['host']).replace(os.sep, self.IMAGE_OS_SEP)
+            if path_matches_patterns(name, root['exclude']):
+                continue
+
+            if os.path.islink(path):
+                continue
+            elif os.path.isfile(path):
+                modified.add(name)
+            elif os.path.isdir(path):
+                if dirs and path in dirs:
+                    files = self._get_local_file_index(path, exclude=root['exclude'])
+                    modified.update(name + self.IMAGE_OS_SEP + file for file in files)
+            else:
+                deleted.add(name)
+
+        # ignore files which were deleted before they could be pushed, and paths within deleted directories
+        modified = sorted(name for name in modified if os.path.isfile(os.path.join(root['host'], name)))
+        deleted = sorted(name for name in deleted
+                         if not any(name.startswith(other_name + self.IMAGE_OS_SEP) for other_name in deleted))
+
+        if modified:
+            self._put_files_in_container(root['host'], root['container'], modified, container_user=container_user)
+        for names in self._batch_paths(deleted):
+            self._exec_in_container(['sh', '-c', 'cd "$0" && rm -rf -- "$@"', root['container']] + names,
+                                    container_user=container_user)
+
+        if modified or deleted:
+            n_bytes = sum(os.path.getsize(os.path.join(root['host'], name)) for name in modified)
+            report.files_transferred.extend(modified)
+            report.files_deleted.extend(deleted)
+            report.bytes_transferred += n_bytes
+            if self.config['verbose']:
+                print('Pushed {} files ({}) and deleted {} files in {}'.format(
+                    len(modified), format_size(n_bytes), len(deleted), root['container']))
+
+    @staticmethod
+    def _import_watchdog():
+        """ Import the optional watchdog package
+
+        Returns:
+            :obj:`module`: watchdog
+
+        Raises:
+            :obj:`WcEnvManagerError`: if watchdog is not installed
+        """
+        try:
+            import watchdog.events
+            import watchdog.observers
+        except ImportError:
+            raise WcEnvManagerError('watchdog must be installed to watch directories: pip install wc_env_manager[watch]')
+        return watchdog
+
     def set_container(self, container):
         """ Set the Docker containaer
 
@@ -745,7 +2643,11 @@ class WcEnvManager(object):
                 or name of Docker container
         """
         if isinstance(container, str):
-            container = self._docker_client.containers.get(container)
+            state_cache = self.get_state_cache()
+            if state_cache and state_cache.get_container(container):
+                container = state_cache.get_container(container)
+            else:
+                container = self._docker_client.containers.get(container)
         self._container = container
 
     def get_latest_container(self):
@@ -760,27 +2662,69 @@ class WcEnvManager(object):
         else:
             return None
 
-    def get_containers(self, sort_by_read_time=False):
+    def get_containers(self, sort_by_read_time=False, older_than=None, image_version=None, labels=None):
         """ Get list of Docker containers that are WC modeling environments
 
         Args:
             sort_by_read_time (:obj:`bool`): if :obj:`True`, sort by read time in descending order
-                (latest first)
+                (latest first). With the in-memory index of the Docker containers, running containers
+                are sorted before stopped containers, each by their latest activity.
+            older_than (:obj:`datetime.timedelta`, optional): if provided, only get containers
+                which were created at least this long ago
+            image_version (:obj:`str`, optional): if provided, only get containers of this
+                version of the image
+            labels (:obj:`dict`, optional): if provided, only get containers with these labels
 
         Returns:
             :obj:`list` of :obj:`docker.models.containers.Container`: list of Docker containers
                 that are WC modeling environments
         """
+        import dateutil.parser
+        import docker
+
+        state_cache = self.get_state_cache()
+        if state_cache:
+            all_containers = state_cache.get_containers()
+        else:
+            all_containers = self._docker_client.containers.list(all=True)
+
         containers = []
-        for container in self._docker_client.containers.list(all=True):
+        for container in all_containers:
             try:
                 datetime.strptime(container.name, self.config['container']['name_format'])
-                containers.append(container)
             except ValueError:
-                pass
+                continue
+
+            if older_than is not None:
+                created = dateutil.parser.parse(container.attrs['Created'])
+                if datetime.now(timezone.utc) - created < older_than:
+                    continue
+
+            if image_version is not None:
+                try:
+                    if state_cache:
+                        image = state_cache.get_image(container.attrs['Image'])
+                        if image is None:
+                            raise docker.errors.ImageNotFound(container.attrs['Image'])
+                    else:
+                        image = container.image
+                    if self.get_image_version(image) != image_version:
+                        continue
+                except docker.errors.ImageNotFound:
+                    continue
+
+            if labels and any(container.labels.get(key, None) != val for key, val in labels.items()):
+                continue
+
+            containers.append(container)
 
         if sort_by_read_time:
-            containers.sort(reverse=True, key=lambda container: dateutil.parser.parse(container.stats(stream=False)['read']))
+            if state_cache:
+                containers.sort(reverse=True, key=lambda container: (
+                    container.attrs['State']['Running'], state_cache.get_container_activity(container)))
+            else:
+                containers.sort(reverse=True, key=lambda container: dateutil.parser.parse(
+                    container.stats(stream=False)['read']))
 
         return containers
 
@@ -833,6 +2777,58 @@ class WcEnvManager(object):
 
         return (result.output.decode('utf-8')[0:-1], result.exit_code)
 
+    def run_in_containers(self, cmd, containers=None, max_concurrency=None, work_dir=None, env=None,
+                          container_user=WcEnvUser.root, max_output=RUN_MAX_OUTPUT, on_output=None):
+        """ Concurrently run a process in each of a list of Docker containers
+
+        Args:
+            cmd (:obj:`list` of :obj:`str` or :obj:`str`): command to run
+            containers (:obj:`list` of :obj:`docker.models.containers.Container`, optional): containers
+                to run the process in; default: all running containers that are WC modeling environments
+            max_concurrency (:obj:`int`, optional): maximum number of containers to run the process in
+                at once; default: `config['max_workers']`
+            work_dir (:obj:`str`, optional): path to working directory within the containers
+            env (:obj:`dict`, optional): key/value pairs of environment variables
+            container_user (:obj:`WcEnvUser`, optional): user to run the process in the containers
+            max_output (:obj:`int`, optional): maximum number of bytes of the output of each container
+                to keep; the last bytes are kept
+            on_output (:obj:`callable`, optional): function which is called with the name of the container
+                and each line of its output as the output is produced
+
+        Returns:
+            :obj:`list` of :obj:`ContainerOperationResult`: result for each container, in the same order as
+                :obj:`containers`, whose `result` is a :obj:`ContainerProcessResult`
+        """
+        if containers is None:
+            containers = [container for container in self.get_containers() if container.status == 'running']
+        api = self._docker_client.api
+
+        def run(container):
+            exec_id = api.exec_create(container.id, cmd, workdir=work_dir, environment=env or {},
+                                      user=container_user.name)['Id']
+
+            output = bytearray()
+            truncated = False
+            partial_line = b''
+            for chunk in api.exec_start(exec_id, stream=True):
+                output += chunk
+                if len(output) > max_output:
+                    del output[0:len(output) - max_output]
+                    truncated = True
+
+                if on_output:
+                    lines = (partial_line + chunk).split(b'\n')
+                    partial_line = lines.pop()
+                    for line in lines:
+                        on_output(container.name, line.decode('utf-8', errors='replace'))
+            if on_output and partial_line:
+                on_output(container.name, partial_line.decode('utf-8', errors='replace'))
+
+            return ContainerProcessResult(api.exec_inspect(exec_id)['ExitCode'],
+                                          output.decode('utf-8', errors='replace'), truncated=truncated)
+
+        return self.run_concurrently(run, containers, max_workers=max_concurrency)
+
     def get_container_stats(self):
         """ Get statistics about the CPU, io, memory, network performance of the Docker container
 
@@ -855,31 +2851,798 @@ class WcEnvManager(object):
         self._container.remove(force=force)
         self._container = None
 
-    def remove_containers(self, force=False):
-        """ Remove Docker all containers that are WC modeling environments
+    def stop_containers(self, containers=None, max_workers=None):
+        """ Concurrently stop Docker containers
+
+        Args:
+            containers (:obj:`list` of :obj:`docker.models.containers.Container`, optional): containers
+                to stop; default: all containers that are WC modeling environments
+            max_workers (:obj:`int`, optional): maximum number of concurrent operations;
+                default: `config['max_workers']`
+
+        Returns:
+            :obj:`list` of :obj:`ContainerOperationResult`: result of the operation for each container
+        """
+        if containers is None:
+            containers = self.get_containers()
+        return self.run_concurrently(lambda container: container.stop(), containers, max_workers=max_workers)
+
+    def start_containers(self, containers=None, max_workers=None):
+        """ Concurrently start Docker containers
+
+        Args:
+            containers (:obj:`list` of :obj:`docker.models.containers.Container`, optional): containers
+                to start; default: all containers that are WC modeling environments
+            max_workers (:obj:`int`, optional): maximum number of concurrent operations;
+                default: `config['max_workers']`
+
+        Returns:
+            :obj:`list` of :obj:`ContainerOperationResult`: result of the operation for each container
+        """
+        if containers is None:
+            containers = self.get_containers()
+        return self.run_concurrently(lambda container: container.start(), containers, max_workers=max_workers)
+
+    def restart_containers(self, containers=None, max_workers=None):
+        """ Concurrently restart Docker containers
+
+        Args:
+            containers (:obj:`list` of :obj:`docker.models.containers.Container`, optional): containers
+                to restart; default: all containers that are WC modeling environments
+            max_workers (:obj:`int`, optional): maximum number of concurrent operations;
+                default: `config['max_workers']`
+
+        Returns:
+            :obj:`list` of :obj:`ContainerOperationResult`: result of the operation for each container
+        """
+        if containers is None:
+            containers = self.get_containers()
+        return self.run_concurrently(lambda container: container.restart(), containers, max_workers=max_workers)
+
+    def remove_containers(self, force=False, containers=None, max_workers=None):
+        """ Concurrently remove Docker containers
 
         Args:
             force (:obj:`bool`, optional): if :obj:`True`, force removal of the container
                 (e.g. remove containers even if they are running)
+            containers (:obj:`list` of :obj:`docker.models.containers.Container`, optional): containers
+                to remove; default: all containers that are WC modeling environments
+            max_workers (:obj:`int`, optional): maximum number of concurrent operations;
+                default: `config['max_workers']`
+
+        Returns:
+            :obj:`list` of :obj:`ContainerOperationResult`: result of the operation for each container
+        """
+        if containers is None:
+            containers = self.get_containers()
+        results = self.run_concurrently(lambda container: container.remove(force=force), containers,
+                                        max_workers=max_workers)
+
+        if self._container is not None and any(
+                result.container == self._container.name and result.error is None for result in results):
+            self._container = None
+
+        return results
+
+    def run_concurrently(self, operation, containers, max_workers=None):
+        """ Concurrently apply an operation to each of a list of containers
+
+        Args:
+            operation (:obj:`callable`): function which takes a container as its argument
+            containers (:obj:`list`): containers (e.g., :obj:`docker.models.containers.Container`
+                or names of containers)
+            max_workers (:obj:`int`, optional): maximum number of concurrent operations;
+                default: `config['max_workers']`
+
+        Returns:
+            :obj:`list` of :obj:`ContainerOperationResult`: result of the operation for each
+                container, in the same order as :obj:`containers`
+        """
+        def run(container):
+            start = time.time()
+            try:
+                result = operation(container)
+                error = None
+            except Exception as exception:
+                result = None
+                error = exception
+            return ContainerOperationResult(getattr(container, 'name', container),
+                                            result=result, error=error,
+                                            duration=time.time() - start)
+
+        if not containers:
+            return []
+
+        with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers or self.config['max_workers']) as executor:
+            return list(executor.map(run, containers))
+
+    @staticmethod
+    def _raise_concurrent_errors(message, results):
+        """ Raise an error if any concurrent operation failed
+
+        Args:
+            message (:obj:`str`): message
+            results (:obj:`list` of :obj:`ContainerOperationResult`): results of the operations
+
+        Raises:
+            :obj:`WcEnvManagerError`: if any operation failed
+        """
+        errors = [result for result in results if result.error is not None]
+        if errors:
+            raise WcEnvManagerError('{}:\n  {}'.format(message, '\n  '.join(
+                '{}: {}'.format(result.container, str(result.error).replace('\n', '\n    '))
+                for result in errors)))
+
+    def get_image_inventory(self):
+        """ Get an inventory of the versions of the images of the configured repositories
+        (`config['base_image']['repo_unsquashed']`, `config['base_image']['repo']`,
+        `config['image']['repo']`) and of the dangling images of these repositories
+
+        Dangling images belong to the repositories if they were built for one of them (see
+        :obj:`IMAGE_REPO_LABEL`), if they were pulled from one of them, or if they were built from
+        one of their images. Other dangling images, such as those of other projects, are ignored.
+
+        Returns:
+            :obj:`list` of :obj:`dict`: list of images, each with the keys
+
+                * `image` (:obj:`docker.models.images.Image`): image
+                * `repo` (:obj:`str`): repository, or :obj:`None` for dangling images
+                * `version` (:obj:`str`): version
+                * `size` (:obj:`int`): size of the layers that are not shared with other images (bytes)
+                * `containers` (:obj:`list` of :obj:`str`): names of the containers of the image
+                * `last_used` (:obj:`datetime`): latest time that the image was built or that
+                  one of its containers ran
+        """
+        disk_usage = self._docker_client.df()
+        sizes = {}
+        for image_usage in disk_usage['Images'] or []:
+            sizes[image_usage['Id']] = image_usage['Size'] - max(image_usage.get('SharedSize', 0), 0)
+
+        containers = {}
+        last_used = {}
+        for container in self._docker_client.containers.list(all=True):
+            image_id = container.attrs['Image']
+            containers.setdefault(image_id, []).append(container.name)
+            last_used[image_id] = max(last_used.get(image_id, self._EPOCH), self._get_container_last_used(container))
+
+        repos = self._get_image_repos()
+        inventory = []
+        image_ids = set()
+        for repo in repos:
+            for image in self._docker_client.images.list(name=repo):
+                image_ids.add(image.id)
+                inventory.append(self._get_image_inventory_entry(image, repo, sizes, containers, last_used))
+
+        parents = {image.id: image.attrs.get('Parent', None) for image in self._docker_client.images.list(all=True)}
+        for image in self._docker_client.images.list(filters={'dangling': True}):
+            if image.id not in image_ids and self._is_dangling_image_of_repos(image, repos, image_ids, parents):
+                inventory.append(self._get_image_inventory_entry(image, None, sizes, containers, last_used))
+
+        return inventory
+
+    def _get_image_repos(self):
+        """ Get the configured repositories of the images
+
+        Returns:
+            :obj:`list` of :obj:`str`: repositories of the unsquashed base image, base image, and image
+        """
+        repos = []
+        for repo in [self.config['base_image']['repo_unsquashed'], self.config['base_image']['repo'],
+                     self.config['image']['repo']]:
+            if repo and repo not in repos:
+                repos.append(repo)
+        return repos
+
+    def _is_dangling_image_of_repos(self, image, repos, repo_image_ids, parents):
+        """ Determine whether a dangling image belongs to the configured repositories
+
+        Args:
+            image (:obj:`docker.models.images.Image`): dangling image
+            repos (:obj:`list` of :obj:`str`): repositories
+            repo_image_ids (:obj:`set` of :obj:`str`): ids of the tagged images of the repositories
+            parents (:obj:`dict`): dictionary which maps the id of each image to the id of its parent
+
+        Returns:
+            :obj:`bool`: :obj:`True` if the image was built for or pulled from one of the repositories,
+                or if it was built from one of their images
         """
+        if image.labels.get(self.IMAGE_REPO_LABEL, None) in repos:
+            return True
+        if any(digest.partition('@')[0] in repos for digest in image.attrs.get('RepoDigests', None) or []):
+            return True
+        parent = parents.get(image.id, None)
+        visited = set()
+        while parent and parent not in visited:
+            if parent in repo_image_ids:
+                return True
+            visited.add(parent)
+            parent = parents.get(parent, None)
+        return False
+
+    def _get_image_inventory_entry(self, image, repo, sizes, containers, last_used):
+        """ Get the inventory entry for an image
+
+        Args:
+            image (:obj:`docker.models.images.Image`): image
+            repo (:obj:`str`): repository
+            sizes (:obj:`dict`): dictionary which maps the id of each image to its unshared size
+            containers (:obj:`dict`): dictionary which maps the id of each image to the names of its containers
+            last_used (:obj:`dict`): dictionary which maps the id of each image to the last time
+                that one of its containers ran
+
+        Returns:
+            :obj:`dict`: inventory entry
+        """
+        import dateutil.parser
+
+        created = dateutil.parser.parse(image.attrs['Created'])
+        return {
+            'image': image,
+            'repo': repo,
+            'version': self.get_image_version(image),
+            'size': sizes.get(image.id, image.attrs.get('Size', 0)),
+            'containers': containers.get(image.id, []),
+            'last_used': max(created, last_used.get(image.id, self._EPOCH)),
+        }
+
+    def get_container_inventory(self):
+        """ Get an inventory of the containers that are WC modeling environments
+
+        Returns:
+            :obj:`list` of :obj:`dict`: list of containers, each with the keys
+
+                * `container` (:obj:`docker.models.containers.Container`): container
+                * `running` (:obj:`bool`): whether the container is running
+                * `size` (:obj:`int`): size of the writable layer of the container (bytes)
+                * `last_used` (:obj:`datetime`): latest time that the container was created, started, or stopped
+        """
+        sizes = {}
+        for container_usage in self._docker_client.df()['Containers'] or []:
+            sizes[container_usage['Id']] = container_usage.get('SizeRw', 0) or 0
+
+        inventory = []
         for container in self.get_containers():
-            container.remove(force=force)
-        self._container = None
+            inventory.append({
+                'container': container,
+                'running': container.attrs['State']['Running'],
+                'size': sizes.get(container.id, 0),
+                'last_used': self._get_container_last_used(container),
+            })
+        return inventory
+
+    def _get_container_last_used(self, container):
+        """ Get the last time that a container was used
+
+        Args:
+            container (:obj:`docker.models.containers.Container`): container
+
+        Returns:
+            :obj:`datetime`: current time if the container is running, otherwise the latest time that
+                the container was created, started, or stopped
+        """
+        import dateutil.parser
+
+        state = container.attrs['State']
+        if state['Running']:
+            return datetime.now(timezone.utc)
+        times = [dateutil.parser.parse(container.attrs['Created'])]
+        for key in ['StartedAt', 'FinishedAt']:
+            if state.get(key, None):
+                time_used = dateutil.parser.parse(state[key])
+                if time_used.year > 1:
+                    times.append(time_used)
+        return max(times)
+
+    def collect_garbage(self, keep_versions=None, max_size=None, max_container_idle=None, dry_run=False):
+        """ Remove old images and idle containers to reclaim disk space
+
+        #. Remove stopped containers that have been idle longer than :obj:`max_container_idle`
+        #. For each configured repository, remove all but the latest :obj:`keep_versions` versions
+        #. Remove the dangling images of the configured repositories (see :obj:`get_image_inventory`)
+        #. Remove the least recently used images until the total size of the images is at
+           most :obj:`max_size`
+
+        The configured tags of the images (e.g., `latest`) and the images of containers are never removed.
+        Images are removed without force: only their tags in the configured repositories are removed,
+        and images which are still used (e.g., by a container which was created meanwhile or by a
+        tag in another repository) are skipped and not reported.
+
+        Args:
+            keep_versions (:obj:`int`, optional): number of versions of each repository to keep;
+                default: `config['gc']['keep_versions']`
+            max_size (:obj:`int` or :obj:`str`, optional): maximum total size of the images (e.g., `100GB`);
+                default: `config['gc']['max_size']`
+            max_container_idle (:obj:`datetime.timedelta` or :obj:`str`, optional): maximum idle time
+                of stopped containers (e.g., `7d`); default: `config['gc']['max_container_idle']`
+            dry_run (:obj:`bool`, optional): if :obj:`True`, only report the images and containers
+                that would be removed
+
+        Returns:
+            :obj:`GarbageCollectionReport`: images and containers that were removed and the
+                amount of disk space that was reclaimed
+        """
+        import docker
+
+        config = self.config['gc']
+        if keep_versions is None:
+            keep_versions = config['keep_versions']
+        if max_size is None:
+            max_size = config['max_size']
+        if isinstance(max_size, str):
+            max_size = parse_size(max_size)
+        if max_container_idle is None:
+            max_container_idle = config['max_container_idle']
+        if isinstance(max_container_idle, str):
+            max_container_idle = parse_duration(max_container_idle)
+
+        report = GarbageCollectionReport(dry_run=dry_run)
+
+        # select idle containers
+        now = datetime.now(timezone.utc)
+        removed_container_names = set()
+        if max_container_idle is not None:
+            for container in self.get_container_inventory():
+                if not container['running'] and now - container['last_used'] > max_container_idle:
+                    report.containers.append(container)
+                    removed_container_names.add(container['container'].name)
+
+        # select images
+        protected_tags = set()
+        for repo, tags in [(self.config['base_image']['repo_unsquashed'], self.config['base_image']['tags']),
+                           (self.config['base_image']['repo'], self.config['base_image']['tags']),
+                           (self.config['image']['repo'], self.config['image']['tags'])]:
+            protected_tags.update('{}:{}'.format(repo, tag) for tag in tags)
+
+        candidates = []
+        kept_sizes = {}
+        versions = {}
+        for image in self.get_image_inventory():
+            image_id = image['image'].id
+            if set(image['image'].tags) & protected_tags \
+                    or set(image['containers']) - removed_container_names:
+                kept_sizes[image_id] = image['size']
+                continue
+            if image['repo'] is None:
+                report.images.append(image)
+                continue
+            versions.setdefault(image['repo'], []).append(image)
+
+        for repo_images in versions.values():
+            repo_images.sort(reverse=True, key=lambda image: (
+                tuple(int(part) for part in re.findall(r'\d+', image['version'] or '')), image['last_used']))
+            for image in repo_images[keep_versions:]:
+                report.images.append(image)
+            candidates.extend(repo_images[0:keep_versions])
+
+        # select least recently used images until the images fit within the quota
+        removed_image_ids = set(image['image'].id for image in report.images)
+        candidates = [image for image in candidates if image['image'].id not in removed_image_ids]
+        for image in candidates:
+            kept_sizes[image['image'].id] = image['size']
+        if max_size is not None:
+            candidates.sort(key=lambda image: image['last_used'])
+            for image in candidates:
+                if sum(kept_sizes.values()) <= max_size:
+                    break
+                if image['image'].id in kept_sizes:
+                    report.images.append(image)
+                    kept_sizes.pop(image['image'].id)
+
+        # remove duplicate entries for images with tags in multiple repositories
+        images = {}
+        for image in report.images:
+            images.setdefault(image['image'].id, image)
+        report.images = [image for image in images.values() if image['image'].id not in kept_sizes]
+
+        # remove containers and images
+        if dry_run:
+            report.bytes_reclaimed = sum(container['size'] for container in report.containers) \
+                + sum(image['size'] for image in report.images)
+        else:
+            disk_usage = self._get_disk_usage()
+
+            results = self.run_concurrently(lambda container: container.remove(),
+                                            [container['container'] for container in report.containers])
+            self._raise_concurrent_errors('Containers could not be removed', results)
+            if self._container is not None and self._container.name in removed_container_names:
+                self._container = None
+
+            repos = self._get_image_repos()
+            removed_images = []
+            for image in report.images:
+                refs = [tag for tag in image['image'].tags if tag.rpartition(':')[0] in repos] or [image['image'].id]
+                try:
+                    for ref in refs:
+                        self._docker_client.images.remove(ref)
+                except docker.errors.ImageNotFound:  # pragma: no cover # removed with a parent image
+                    pass
+                except docker.errors.APIError as exception:
+                    if self.config['verbose']:
+                        print('Image {} was skipped because it is in use: {}'.format(image['image'].id, str(exception)))
+                    continue
+                removed_images.append(image)
+                if self._base_image_unsquashed is not None and self._base_image_unsquashed.id == image['image'].id:
+                    self._base_image_unsquashed = None
+                if self._base_image is not None and self._base_image.id == image['image'].id:
+                    self._base_image = None
+                if self._image is not None and self._image.id == image['image'].id:
+                    self._image = None
+            report.images = removed_images
+
+            report.bytes_reclaimed = max(disk_usage - self._get_disk_usage(), 0)
+
+        return report
+
+    def _get_disk_usage(self):
+        """ Get the disk space used by the layers of images and containers
+
+        Returns:
+            :obj:`int`: disk space used by images and containers (bytes)
+        """
+        disk_usage = self._docker_client.df()
+        return (disk_usage['LayersSize'] or 0) + sum(
+            container.get('SizeRw', 0) or 0 for container in disk_usage['Containers'] or [])
 
     def run_process_on_host(self, cmd):
         """ Run a process on the host
 
+        The output of verbose processes is printed to :obj:`sys.stdout`, rather than written to the
+        file descriptors inherited by the process, so that it can be redirected (e.g., to the client
+        of the daemon, see :obj:`wc_env_manager.daemon`).
+
         Args:
             cmd (:obj:`list` of :obj:`str` or :obj:`str`): command to run
+
+        Raises:
+            :obj:`subprocess.CalledProcessError`: if the process fails
         """
-        if self.config['verbose']:
-            stdout = None
-            stderr = None
+        if not self.config['verbose']:
+            subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, check=True)
+            return
+
+        with subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.STDOUT) as process:
+            for line in process.stdout:
+                sys.stdout.write(line.decode('utf-8', errors='replace'))
+                sys.stdout.flush()
+        if process.returncode != 0:
+            raise subprocess.CalledProcessError(process.returncode, cmd)
+
+
+class ContainerOperationResult(object):
+    """ Result of an operation on a container
+
+    Attributes:
+        container (:obj:`str`): name of the container
+        result (:obj:`object`): value returned by the operation
+        error (:obj:`Exception`): error raised by the operation, or :obj:`None` if the operation succeeded
+        duration (:obj:`float`): duration of the operation in seconds
+    """
+
+    def __init__(self, container, result=None, error=None, duration=None):
+        """
+        Args:
+            container (:obj:`str`): name of the container
+            result (:obj:`object`, optional): value returned by the operation
+            error (:obj:`Exception`, optional): error raised by the operation
+            duration (:obj:`float`, optional): duration of the operation in seconds
+        """
+        self.container = container
+        self.result = result
+        self.error = error
+        self.duration = duration
+
+
+class ContainerProcessResult(object):
+    """ Result of a process run in a container
+
+    Attributes:
+        exit_code (:obj:`int`): exit code of the process
+        output (:obj:`str`): output of the process
+        truncated (:obj:`bool`): if :obj:`True`, only the end of the output was kept
+    """
+
+    def __init__(self, exit_code, output, truncated=False):
+        """
+        Args:
+            exit_code (:obj:`int`): exit code of the process
+            output (:obj:`str`): output of the process
+            truncated (:obj:`bool`, optional): if :obj:`True`, only the end of the output was kept
+        """
+        self.exit_code = exit_code
+        self.output = output
+        self.truncated = truncated
+
+
+def parse_duration(value):
+    """ Parse a duration such as `30s`, `15m`, `12h`, `7d`, or `2w`
+
+    Args:
+        value (:obj:`str`): duration
+
+    Returns:
+        :obj:`datetime.timedelta`: duration
+
+    Raises:
+        :obj:`WcEnvManagerError`: if the duration is invalid
+    """
+    match = re.match(r'^\s*(\d+(\.\d*)?)\s*([smhdw])\s*$', value)
+    if not match:
+        raise WcEnvManagerError('Duration "{}" must be a number followed by s, m, h, d, or w'.format(value))
+    units = {'s': 'seconds', 'm': 'minutes', 'h': 'hours', 'd': 'days', 'w': 'weeks'}
+    return timedelta(**{units[match.group(3)]: float(match.group(1))})
+
+
+class GarbageCollectionReport(object):
+    """ Images and containers removed by garbage collection
+
+    Attributes:
+        images (:obj:`list` of :obj:`dict`): images that were removed (see :obj:`WcEnvManager.get_image_inventory`)
+        containers (:obj:`list` of :obj:`dict`): containers that were removed
+            (see :obj:`WcEnvManager.get_container_inventory`)
+        bytes_reclaimed (:obj:`int`): disk space that was reclaimed, or, for dry runs,
+            an estimate of the disk space that would be reclaimed (bytes)
+        dry_run (:obj:`bool`): if :obj:`True`, the images and containers were not removed
+    """
+
+    def __init__(self, dry_run=False):
+        """
+        Args:
+            dry_run (:obj:`bool`, optional): if :obj:`True`, the images and containers were not removed
+        """
+        self.images = []
+        self.containers = []
+        self.bytes_reclaimed = 0
+        self.dry_run = dry_run
+
+
+def parse_size(value):
+    """ Parse a size such as `512MB`, `100GB`, or `1.5TiB`
+
+    Args:
+        value (:obj:`str`): size
+
+    Returns:
+        :obj:`int`: size (bytes)
+
+    Raises:
+        :obj:`WcEnvManagerError`: if the size is invalid
+    """
+    match = re.match(r'^\s*(\d+(\.\d*)?)\s*(([KMGT])(i?)B?|B)?\s*$', value, re.IGNORECASE)
+    if not match:
+        raise WcEnvManagerError('Size "{}" must be a number optionally followed by B, KB, MB, GB, or TB'.format(value))
+    multiplier = 1
+    if match.group(4):
+        base = 1024 if match.group(5) else 1000
+        multiplier = base ** ('KMGT'.index(match.group(4).upper()) + 1)
+    return int(float(match.group(1)) * multiplier)
+
+
+def format_size(value):
+    """ Format a size in human-readable units
+
+    Args:
+        value (:obj:`int`): size (bytes)
+
+    Returns:
+        :obj:`str`: formatted size (e.g., `1.5 GB`)
+    """
+    for unit in ['B', 'KB', 'MB', 'GB']:
+        if abs(value) < 1000:
+            return '{:.1f} {}'.format(value, unit)
+        value /= 1000.
+    return '{:.1f} TB'.format(value)
+
+
+def path_matches_patterns(name, patterns):
+    """ Determine whether a relative path matches any of a list of glob patterns. A pattern matches a
+    path if it matches the path, any of its parent directories, or any of its components (e.g.,
+    `__pycache__` matches `pkg/__pycache__/mod.pyc` and `docs/_build` matches `docs/_build/index.html`).
+
+    Args:
+        name (:obj:`str`): relative path, separated by `/`
+        patterns (:obj:`list` of :obj:`str`): glob patterns
+
+    Returns:
+        :obj:`bool`: :obj:`True` if the path matches any of the patterns
+    """
+    if not patterns:
+        return False
+    parts = name.split('/')
+    candidates = parts + ['/'.join(parts[0:i_part]) for i_part in range(2, len(parts) + 1)]
+    return any(fnmatch.fnmatch(candidate, pattern) for candidate in candidates for pattern in patterns)
+
+
+def partition_python_requirements(reqs):
+    """ Partition Python package requirements into tiers by how often they change:
+
+    * `pinned`: packages from PyPI pinned to a version (e.g., `numpy == 1.18.1` or a locked requirement
+      such as `numpy==1.18.1 --hash=sha256:...`)
+    * `unpinned`: other packages from PyPI (e.g., `scipy >= 1.4`)
+    * `git`: packages installed from Git repositories or other URLs, such as the KarrLab packages
+      (e.g., `git+https://github.com/KarrLab/wc_utils.git#egg=wc_utils`)
+
+    Args:
+        reqs (:obj:`list` of :obj:`str`): requirements in requirements.txt format
+
+    Returns:
+        :obj:`dict`: dictionary which maps each tier to its requirements, in the order in which the tiers
+            should be installed
+    """
+    tiers = {'pinned': [], 'unpinned': [], 'git': []}
+    for req in reqs:
+        if '://' in req:
+            tiers['git'].append(req)
+        elif re.match(r'^[^=<>!~,]+===?\s*[^\s,*]+\s*$', req.split(';')[0].split(' --')[0]):
+            tiers['pinned'].append(req)
         else:
-            stdout = subprocess.PIPE
-            stderr = subprocess.PIPE
+            tiers['unpinned'].append(req)
+    return tiers
+
+
+def get_python_requirements_constraints(reqs):
+    """ Get pip constraints which keep the versions of Python requirements when other requirements are
+    installed later (e.g., in a later tier, see :obj:`partition_python_requirements`)
+
+    Because constraints can't have extras or options (e.g., hashes), these are removed. Requirements which
+    are installed from URLs are skipped.
 
-        subprocess.run(cmd, stdout=stdout, stderr=stderr, check=True)
+    Args:
+        reqs (:obj:`list` of :obj:`str`): requirements in requirements.txt format
+
+    Returns:
+        :obj:`list` of :obj:`str`: constraints (e.g., `tables===3.6.1 ; python_version < "3.8"` for
+            `tables[all]===3.6.1 ; python_version < "3.8" --hash=sha256:...`)
+    """
+    constraints = []
+    for req in reqs:
+        if '://' in req:
+            continue
+        constraint = re.sub(r'^([^\[\s;=<>!~,]+)\s*\[[^\]]*\]', r'\1', req.split(' --')[0].strip())
+        if constraint:
+            constraints.append(constraint)
+    return constraints
+
+
+def parse_python_requirements_lock(text):
+    """ Parse a lock of Python requirements (see :obj:`WcEnvManager.lock_python_requirements`)
+
+    Args:
+        text (:obj:`str`): lock in requirements.txt format, with hashes on continuation lines
+
+    Returns:
+        :obj:`list` of :obj:`str`: requirements, each on a single line with its hashes
+            (e.g., `numpy==1.18.1 --hash=sha256:...`)
+    """
+    reqs = []
+    req = ''
+    for line in text.split('\n'):
+        stripped = re.split(r'(^|\s)#', line)[0].strip()
+        part = stripped.rstrip('\\').strip()
+        if part:
+            req = req + ' ' + part if req else part
+        if not stripped.endswith('\\') and req:
+            reqs.append(req)
+            req = ''
+    if req:
+        reqs.append(req)
+    return reqs
+
+
+def get_python_requirements_digest(reqs):
+    """ Get the digest of the Python requirements from which a lock is made, which is saved in the
+    header of the lock (see :obj:`WcEnvManager.lock_python_requirements`) to detect when the lock
+    is out of date. The digest doesn't depend on the order of the requirements.
+
+    Args:
+        reqs (:obj:`list` of :obj:`str`): requirements
+
+    Returns:
+        :obj:`str`: digest (e.g., `sha256:...`)
+    """
+    text = '\n'.join(sorted(set(req.strip() for req in reqs if req.strip())))
+    return 'sha256:' + hashlib.sha256(text.encode()).hexdigest()
+
+
+def get_python_requirements_lock_digest(text):
+    """ Get the digest of the Python requirements from which a lock was made from the header of
+    the lock (see :obj:`get_python_requirements_digest`)
+
+    Args:
+        text (:obj:`str`): lock
+
+    Returns:
+        :obj:`str`: digest, or :obj:`None` if the header of the lock doesn't contain a digest
+    """
+    match = re.search(r'^# requirements digest: (\S+)\s*$', text, re.MULTILINE)
+    return match.group(1) if match else None
+
+
+class RetrievalReport(object):
+    """ Files retrieved from a container by :obj:`WcEnvManager.retrieve_path`
+
+    Attributes:
+        files (:obj:`list` of :obj:`str`): paths of the files which were retrieved
+        bytes_uncompressed (:obj:`int`): total size of the files (bytes)
+        bytes_compressed (:obj:`int`): size of the compressed archive which was transferred (bytes)
+    """
+
+    def __init__(self):
+        self.files = []
+        self.bytes_uncompressed = 0
+        self.bytes_compressed = 0
+
+
+class MatrixBuildResult(object):
+    """ Build of the base image and image for a version of Python by :obj:`WcEnvManager.build_matrix`
+
+    Attributes:
+        python_version (:obj:`str`): version of Python
+        base_image (:obj:`docker.models.images.Image`): base image, or :obj:`None` if it wasn't built
+        image (:obj:`docker.models.images.Image`): image, or :obj:`None` if it wasn't built
+        base_image_duration (:obj:`float`): duration of the build of the base image (seconds)
+        image_duration (:obj:`float`): duration of the build of the image (seconds)
+        error (:obj:`Exception`): error raised by the build, or :obj:`None` if the build succeeded
+    """
+
+    def __init__(self, python_version):
+        """
+        Args:
+            python_version (:obj:`str`): version of Python
+        """
+        self.python_version = python_version
+        self.base_image = None
+        self.image = None
+        self.base_image_duration = None
+        self.image_duration = None
+        self.error = None
+
+    @property
+    def duration(self):
+        """ Get the total duration of the builds of the base image and image
+
+        Returns:
+            :obj:`float`: duration (seconds)
+        """
+        return (self.base_image_duration or 0.) + (self.image_duration or 0.)
+
+
+class MatrixBuildReport(object):
+    """ Builds of the base image and image for several versions of Python by :obj:`WcEnvManager.build_matrix`
+
+    Attributes:
+        results (:obj:`list` of :obj:`MatrixBuildResult`): build for each version of Python
+        shared_duration (:obj:`float`): duration of the build of the stage of the base image which
+            is shared by all of the versions (seconds)
+        duration (:obj:`float`): total wall-clock duration of the builds (seconds)
+    """
+
+    def __init__(self):
+        self.results = []
+        self.shared_duration = None
+        self.duration = None
+
+
+class SyncReport(object):
+    """ Files synchronized between the host and a container by :obj:`WcEnvManager.sync_path`
+
+    Attributes:
+        direction (:obj:`SyncDirection`): direction of the synchronization
+        files_transferred (:obj:`list` of :obj:`str`): paths of the files which were transferred
+        files_deleted (:obj:`list` of :obj:`str`): paths of the extraneous files which were deleted
+        bytes_transferred (:obj:`int`): total size of the files which were transferred (bytes)
+        bytes_saved (:obj:`int`): total size of the unchanged files which were not transferred (bytes)
+    """
+
+    def __init__(self, direction):
+        """
+        Args:
+            direction (:obj:`SyncDirection`): direction of the synchronization
+        """
+        self.direction = direction
+        self.files_transferred = []
+        self.files_deleted = []
+        self.bytes_transferred = 0
+        self.bytes_saved = 0
 
 
 class WcEnvManagerError(Exception):
@@ -0,0 +1,363 @@
+""" Long-running daemon which serves command line requests with a warm :obj:`wc_env_manager.core.WcEnvManager`
+
+The daemon keeps one manager, with its configuration, Docker connection, and discovered images and
+containers, and executes the commands of the command line interface on behalf of clients which
+connect to a Unix socket. Requests and responses are newline-delimited JSON messages. A client
+sends a request such as `{"argv": ["image", "version"], "cwd": "/path", "env": {...}}` and the
+daemon responds with the messages `{"stream": "stdout", "data": "..."}`, as the command prints its
+output, followed by `{"exit_code": 0}`.
+
+Each connection is served by its own thread, so that `daemon status` and `daemon stop` are answered
+while a command runs. Because the working directory, the environment variables, and the standard
+streams which a command uses are global to the process, the commands themselves are executed one at a
+time: the requests of other clients wait until the current command finishes.
+
+The path of the socket is `~/.wc/wc_env_manager.sock`, or the value of the environment variable
+`WC_ENV_MANAGER_SOCKET`. Set the environment variable `WC_ENV_MANAGER_NO_DAEMON` to run commands
+without the daemon.
+
+:Author: Jonathan Karr <jonrkarr@gmail.com>
+:Date: 2020-02-12
+:Copyright: 2020, Karr Lab
+:License: MIT
+"""
+
+import contextlib
+import json
+import os
+import socket
+import socketserver
+import sys
+import threading
+import traceback
+
+SOCKET_PATH = os.path.expanduser(os.path.join('~', '.wc', 'wc_env_manager.sock'))
+
+# commands which are always run by the client because they read from standard input, write binary
+# output to standard output, or run until they are interrupted
+LOCAL_COMMANDS = [
+    ['daemon'],
+    ['container', 'watch'],
+]
+
+# arguments which are always handled by the client
+LOCAL_ARGUMENTS = ['-h', '--help', '-v', '--version', '-']
+
+_current_daemon = None
+
+
+def get_socket_path():
+    """ Get the path of the socket of the daemon
+
+    Returns:
+        :obj:`str`: path
+    """
+    return os.getenv('WC_ENV_MANAGER_SOCKET', SOCKET_PATH)
+
+
+def get_current_daemon():
+    """ Get the daemon which is executing the current command
+
+    Returns:
+        :obj:`Daemon`: daemon, or :obj:`None` if the current command is not executed by a daemon
+    """
+    return _current_daemon
+
+
+def use_daemon(argv):
+    """ Determine whether a command should be sent to the daemon
+
+    Args:
+        argv (:obj:`list` of :obj:`str`): command line arguments
+
+    Returns:
+        :obj:`bool`: :obj:`True` if the command should be sent to the daemon
+    """
+    if os.getenv('WC_ENV_MANAGER_NO_DAEMON', None) or not argv:
+        return False
+    if any(arg in LOCAL_ARGUMENTS for arg in argv):
+        return False
+    if any(argv[0:len(command)] == command for command in LOCAL_COMMANDS):
+        return False
+    return os.path.exists(get_socket_path())
+
+
+def send_request(request, socket_path=None):
+    """ Send a request to the daemon and iterate over its responses
+
+    Args:
+        request (:obj:`dict`): request
+        socket_path (:obj:`str`, optional): path of the socket of the daemon
+
+    Returns:
+        :obj:`iterator` of :obj:`dict`: responses
+
+    Raises:
+        :obj:`OSError`: if the daemon is not running
+    """
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        sock.connect(socket_path or get_socket_path())
+        sock.sendall(json.dumps(request).encode() + b'\n')
+        with sock.makefile('rb') as file:
+            for line in file:
+                yield json.loads(line.decode())
+
+
+def is_running(socket_path=None):
+    """ Determine whether the daemon is running
+
+    Args:
+        socket_path (:obj:`str`, optional): path of the socket of the daemon
+
+    Returns:
+        :obj:`bool`: :obj:`True` if the daemon is running
+    """
+    try:
+        list(send_request({'argv': ['daemon', 'status']}, socket_path=socket_path))
+        return True
+    except OSError:
+        return False
+
+
+def run_in_daemon(argv, socket_path=None, stdout=None, stderr=None):
+    """ Run a command with the daemon
+
+    Args:
+        argv (:obj:`list` of :obj:`str`): command line arguments
+        socket_path (:obj:`str`, optional): path of the socket of the daemon
+        stdout (:obj:`io.TextIOBase`, optional): stream for the standard output of the command
+        stderr (:obj:`io.TextIOBase`, optional): stream for the standard error of the command
+
+    Returns:
+        :obj:`int`: exit code of the command, or :obj:`None` if the daemon is not running
+    """
+    streams = {
+        'stdout': stdout or sys.stdout,
+        'stderr': stderr or sys.stderr,
+    }
+    request = {
+        'argv': argv,
+        'cwd': os.getcwd(),
+        'env': {key: val for key, val in os.environ.items() if key.startswith('CONFIG__DOT__')},
+    }
+
+    responses = send_request(request, socket_path=socket_path)
+    try:
+        response = next(responses)
+    except (OSError, StopIteration):
+        return None
+
+    while True:
+        if 'exit_code' in response:
+            return response['exit_code']
+        streams[response['stream']].write(response['data'])
+        streams[response['stream']].flush()
+        try:
+            response = next(responses)
+        except StopIteration:
+            return 1
+
+
+class Daemon(object):
+    """ Daemon which serves command line requests with a long-lived manager
+
+    Attributes:
+        socket_path (:obj:`str`): path of the socket
+        _manager (:obj:`wc_env_manager.core.WcEnvManager`): manager
+        _manager_config_key (:obj:`str`): key of the configuration of the manager
+        _server (:obj:`socketserver.ThreadingUnixStreamServer`): server
+        _command_lock (:obj:`threading.Lock`): lock which serializes the execution of commands
+    """
+
+    def __init__(self, socket_path=None):
+        """
+        Args:
+            socket_path (:obj:`str`, optional): path of the socket
+        """
+        self.socket_path = socket_path or get_socket_path()
+        self._manager = None
+        self._manager_config_key = None
+        self._server = None
+        self._command_lock = threading.Lock()
+
+    def get_manager(self, verbose):
+        """ Get the long-lived manager. The manager is recreated if the configuration files, or the
+        configuration environment variables, of the current request differ from those of the manager.
+        The manager keeps an in-memory index of the Docker images and containers current with the
+        Docker events stream, so that refreshing its state doesn't query the Docker daemon.
+
+        Args:
+            verbose (:obj:`bool`): if :obj:`True`, print status messages
+
+        Returns:
+            :obj:`wc_env_manager.core.WcEnvManager`: manager
+        """
+        import wc_env_manager.config.core
+        import wc_env_manager.core
+
+        config_key = wc_env_manager.config.core.get_config_cache_key(
+            wc_env_manager.config.core.get_config_paths(),
+            wc_env_manager.config.core.get_config_context())
+        if self._manager is None or config_key != self._manager_config_key:
+            if self._manager is not None:
+                self._manager.close()
+            self._manager = wc_env_manager.core.WcEnvManager({'state_cache': True})
+            self._manager_config_key = config_key
+        else:
+            self._manager.refresh_state()
+        self._manager.config['verbose'] = verbose
+        return self._manager
+
+    def serve_forever(self):
+        """ Serve requests until the daemon is shut down
+
+        Raises:
+            :obj:`OSError`: if another daemon is already serving the socket
+        """
+        if os.path.exists(self.socket_path):
+            if is_running(socket_path=self.socket_path):
+                raise OSError('A daemon is already running at {}'.format(self.socket_path))
+            os.remove(self.socket_path)
+        dirname = os.path.dirname(self.socket_path)
+        if dirname and not os.path.isdir(dirname):
+            os.makedirs(dirname)
+
+        daemon = self
+
+        class RequestHandler(socketserver.StreamRequestHandler):
+            def handle(self):
+                daemon.handle(json.loads(self.rfile.readline().decode()), self.wfile)
+
+        umask = os.umask(0o077)
+        try:
+            self._server = socketserver.ThreadingUnixStreamServer(self.socket_path, RequestHandler)
+        finally:
+            os.umask(umask)
+
+        try:
+            self._server.serve_forever()
+        finally:
+            self._server.server_close()
+            self._server = None
+            if self._manager is not None:
+                self._manager.close()
+                self._manager = None
+            if os.path.exists(self.socket_path):
+                os.remove(self.socket_path)
+
+    def shutdown(self):
+        """ Stop serving requests """
+        if self._server:
+            self._server.shutdown()
+
+    def handle(self, request, file):
+        """ Handle a request
+
+        Status and stop requests are answered immediately. Commands change the working directory, the
+        environment variables, and the standard streams of the process, so they are executed one at a
+        time.
+
+        Args:
+            request (:obj:`dict`): request
+            file (:obj:`io.BufferedIOBase`): stream to write responses to
+        """
+        # the threads of a command (e.g., the workers of `run_in_containers`) can respond concurrently, and
+        # writes to sockets aren't atomic, so responses are written one at a time so that they don't interleave
+        lock = threading.Lock()
+
+        def respond(response):
+            data = json.dumps(response).encode() + b'\n'
+            with lock:
+                file.write(data)
+                file.flush()
+
+        argv = request['argv']
+        if argv == ['daemon', 'status']:
+            respond({'stream': 'stdout', 'data': 'Daemon {} is serving {}\n'.format(os.getpid(), self.socket_path)})
+            respond({'exit_code': 0})
+            return
+        if argv == ['daemon', 'stop']:
+            respond({'exit_code': 0})
+            self.shutdown_soon()
+            return
+
+        global _current_daemon
+        with self._command_lock:
+            cwd = os.getcwd()
+            env = {key: val for key, val in os.environ.items() if key.startswith('CONFIG__DOT__')}
+            try:
+                os.chdir(request.get('cwd', cwd))
+                for key in env:
+                    os.environ.pop(key)
+                os.environ.update(request.get('env', {}))
+                _current_daemon = self
+                exit_code = self.run_command(argv, respond)
+            finally:
+                _current_daemon = None
+                for key in list(os.environ.keys()):
+                    if key.startswith('CONFIG__DOT__'):
+                        os.environ.pop(key)
+                os.environ.update(env)
+                os.chdir(cwd)
+        respond({'exit_code': exit_code})
+
+    def shutdown_soon(self):
+        """ Stop serving requests after the current request (`shutdown` must be called from a
+        different thread than the thread which serves the requests) """
+        threading.Thread(target=self.shutdown).start()
+
+    def run_command(self, argv, respond):
+        """ Run a command of the command line interface
+
+        Args:
+            argv (:obj:`list` of :obj:`str`): command line arguments
+            respond (:obj:`callable`): function which sends a response to the client
+
+        Returns:
+            :obj:`int`: exit code
+        """
+        import wc_env_manager.__main__
+
+        stdout = ResponseWriter('stdout', respond)
+        stderr = ResponseWriter('stderr', respond)
+        with contextlib.redirect_stdout(stdout), contextlib.redirect_stderr(stderr):
+            try:
+                # the daemon, rather than each command, handles signals
+                with wc_env_manager.__main__.App(argv=argv, catch_signals=[]) as app:
+                    app.run()
+                exit_code = 0
+            except SystemExit as exception:
+                exit_code = exception.code if isinstance(exception.code, int) else (0 if exception.code is None else 1)
+            except Exception:
+                traceback.print_exc()
+                exit_code = 1
+        return exit_code
+
+
+class ResponseWriter(object):
+    """ Text stream which sends what is written to it to the client of the daemon
+
+    Attributes:
+        stream (:obj:`str`): name of the stream (`stdout` or `stderr`)
+        respond (:obj:`callable`): function which sends a response to the client
+    """
+
+    def __init__(self, stream, respond):
+        """
+        Args:
+            stream (:obj:`str`): name of the stream (`stdout` or `stderr`)
+            respond (:obj:`callable`): function which sends a response to the client
+        """
+        self.stream = stream
+        self.respond = respond
+
+    def write(self, data):
+        if data:
+            self.respond({'stream': self.stream, 'data': data})
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def isatty(self):
+        return False
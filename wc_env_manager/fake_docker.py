@@ -0,0 +1,1009 @@
+""" In-process fake of the parts of the docker-py client API which are used by :obj:`wc_env_manager.core.WcEnvManager`
+
+The fake stores images, containers, networks, and volumes in memory. The files of fake containers
+are stored in a temporary directory (:obj:`FakeDockerClient.root`), which is shared by the
+containers, and the processes which are executed in fake containers are answered by
+:obj:`ScriptedExecHandler` from a table of outputs without running them. Tests which need real
+processes can opt in to running them on the host with :obj:`run_on_host` and the root `/`, which
+makes the paths of the containers the paths of the host::
+
+    client = wc_env_manager.fake_docker.FakeDockerClient(
+        exec_handler=wc_env_manager.fake_docker.run_on_host, root='/')
+
+The fake counts the requests to each endpoint of the API (:obj:`FakeDockerClient.calls`) and the
+maximum number of concurrent requests to each endpoint (:obj:`FakeDockerClient.max_concurrency`),
+and it can simulate latency (:obj:`FakeDockerClient.set_latency`) and failures
+(:obj:`FakeDockerClient.inject_failure`). This makes it possible to test and benchmark the manager,
+including its concurrency, deterministically without a Docker daemon::
+
+    client = wc_env_manager.fake_docker.FakeDockerClient()
+    client.add_image(['karrlab/wc_env:latest'])
+    client.set_latency('containers.stop', 0.1)
+    client.inject_failure('containers.start', count=1)
+    mgr = wc_env_manager.core.WcEnvManager(docker_client=client)
+
+:Author: Jonathan Karr <jonrkarr@gmail.com>
+:Date: 2020-02-14
+:Copyright: 2020, Karr Lab
+:License: MIT
+"""
+
+from datetime import datetime, timezone
+import collections
+import copy
+import docker.errors
+import fnmatch
+import hashlib
+import io
+import json
+import os
+import queue
+import shlex
+import shutil
+import subprocess
+import tarfile
+import tempfile
+import threading
+import time
+import weakref
+
+ExecResult = collections.namedtuple('ExecResult', ['exit_code', 'output'])
+
+
+def run_on_host(container, cmd, workdir=None, environment=None, user=None):
+    """ Run a process of a fake container on the host. This should only be used with fake clients whose
+    root is `/` because the paths of the process are the paths of the host.
+
+    Args:
+        container (:obj:`FakeContainer`): container
+        cmd (:obj:`list` of :obj:`str` or :obj:`str`): command
+        workdir (:obj:`str`, optional): working directory
+        environment (:obj:`dict`, optional): environment variables
+        user (:obj:`str`, optional): user (ignored)
+
+    Returns:
+        :obj:`subprocess.Popen`: process
+    """
+    if isinstance(cmd, str):
+        cmd = shlex.split(cmd)
+    env = dict(os.environ)
+    env.update(environment or {})
+    return subprocess.Popen(cmd, cwd=workdir or None, env=env, stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
+
+
+class ScriptedExecHandler(object):
+    """ Answer the processes of fake containers from a table of outputs, without running them
+
+    Attributes:
+        outputs (:obj:`list` of :obj:`tuple`): list of tuples of a glob pattern of commands (joined
+            with spaces), an exit code, and an output. The first matching pattern is used.
+        default (:obj:`tuple`): exit code and output of commands which don't match any pattern
+        commands (:obj:`list` of :obj:`tuple`): name of the container and command of each process
+    """
+
+    def __init__(self, outputs=None, default=(0, b'')):
+        """
+        Args:
+            outputs (:obj:`list` of :obj:`tuple`, optional): list of tuples of a glob pattern of
+                commands, an exit code, and an output
+            default (:obj:`tuple`, optional): exit code and output of commands which don't match any pattern
+        """
+        self.outputs = list(outputs or [])
+        self.default = default
+        self.commands = []
+
+    def __call__(self, container, cmd, workdir=None, environment=None, user=None):
+        if isinstance(cmd, str):
+            cmd = shlex.split(cmd)
+        self.commands.append((container.name, cmd))
+        cmd_str = ' '.join(cmd)
+        for pattern, exit_code, output in self.outputs:
+            if fnmatch.fnmatchcase(cmd_str, pattern):
+                return ScriptedProcess(exit_code, output)
+        return ScriptedProcess(*self.default)
+
+
+class ScriptedProcess(object):
+    """ Process whose exit code and output are predetermined (:obj:`subprocess.Popen`-like)
+
+    Attributes:
+        returncode (:obj:`int`): exit code
+        stdout (:obj:`io.BytesIO`): output
+    """
+
+    def __init__(self, returncode, output):
+        self.returncode = returncode
+        self.stdout = io.BytesIO(output.encode() if isinstance(output, str) else output)
+
+    def communicate(self):
+        return self.stdout.read(), None
+
+    def wait(self):
+        return self.returncode
+
+
+def now():
+    """ Get the current time in the format of the Docker API
+
+    Returns:
+        :obj:`str`: current time
+    """
+    return datetime.now(timezone.utc).strftime('%Y-%m-%dT%H:%M:%S.%fZ')
+
+
+def make_id(*args):
+    """ Make a random id for a Docker object
+
+    Returns:
+        :obj:`str`: id
+    """
+    return hashlib.sha256(os.urandom(32) + repr(args).encode()).hexdigest()
+
+
+def make_layer(files):
+    """ Make the tar archive of a layer of an image
+
+    Args:
+        files (:obj:`dict`): dictionary which maps the path of each file of the layer to its contents.
+            Files can be deleted from lower layers with whiteouts (e.g., `tmp/.wh.file`).
+
+    Returns:
+        :obj:`bytes`: tar archive of the layer
+    """
+    archive = io.BytesIO()
+    with tarfile.open(fileobj=archive, mode='w') as tar_file:
+        for path, contents in files.items():
+            info = tarfile.TarInfo(path.lstrip('/'))
+            info.size = len(contents)
+            tar_file.addfile(info, io.BytesIO(contents))
+    return archive.getvalue()
+
+
+class FakeDockerClient(object):
+    """ In-process fake of :obj:`docker.client.DockerClient`
+
+    Attributes:
+        api (:obj:`FakeAPIClient`): low-level API
+        images (:obj:`FakeImageCollection`): images
+        containers (:obj:`FakeContainerCollection`): containers
+        networks (:obj:`FakeNetworkCollection`): networks
+        volumes (:obj:`FakeVolumeCollection`): volumes
+        calls (:obj:`collections.Counter`): number of requests to each endpoint of the API
+        max_concurrency (:obj:`collections.Counter`): maximum number of concurrent requests to each
+            endpoint of the API. Requests are only concurrent while their simulated latency elapses.
+        exec_handler (:obj:`callable`): function which starts the processes of containers and
+            returns a :obj:`subprocess.Popen`-like object (see :obj:`ScriptedExecHandler` and :obj:`run_on_host`)
+        root (:obj:`str`): directory of the host which is the root of the file systems of the containers
+        _images (:obj:`dict`): dictionary which maps the id of each image to its attributes
+        _containers (:obj:`dict`): dictionary which maps the id of each container to its attributes
+        _networks (:obj:`dict`): dictionary which maps the id of each network to its attributes
+        _volumes (:obj:`dict`): dictionary which maps the name of each volume to its attributes
+        _execs (:obj:`dict`): dictionary which maps the id of each exec instance to its state
+        _logs (:obj:`collections.defaultdict`): logs of each container
+        _layers (:obj:`dict`): dictionary which maps the digest of each layer to its tar archive
+        _event_streams (:obj:`list` of :obj:`FakeEventStream`): subscribers to events
+        _latencies (:obj:`list` of :obj:`tuple`): glob pattern of endpoints and latency (seconds)
+        _failures (:obj:`list` of :obj:`list`): glob pattern of endpoints, exception, and number of
+            remaining failures
+        _concurrency (:obj:`collections.Counter`): number of in-flight requests to each endpoint
+        _lock (:obj:`threading.RLock`): lock for the state of the fake
+    """
+
+    def __init__(self, exec_handler=None, latency=None, root=None):
+        """
+        Args:
+            exec_handler (:obj:`callable`, optional): function which starts the processes of
+                containers and returns a :obj:`subprocess.Popen`-like object. Default: a
+                :obj:`ScriptedExecHandler` which answers every process with exit code 0 and no output
+            latency (:obj:`float`, optional): latency of each request (seconds)
+            root (:obj:`str`, optional): directory of the host which is the root of the file systems of
+                the containers. Default: a temporary directory which is removed with the client
+        """
+        self.api = FakeAPIClient(self)
+        self.images = FakeImageCollection(self)
+        self.containers = FakeContainerCollection(self)
+        self.networks = FakeNetworkCollection(self)
+        self.volumes = FakeVolumeCollection(self)
+        self.calls = collections.Counter()
+        self.max_concurrency = collections.Counter()
+        self.exec_handler = exec_handler or ScriptedExecHandler()
+        if root is None:
+            root = tempfile.mkdtemp(prefix='wc_env_fake_docker_')
+            weakref.finalize(self, shutil.rmtree, root, True)
+        self.root = root
+        self._images = {}
+        self._containers = {}
+        self._networks = {}
+        self._volumes = {}
+        self._execs = {}
+        self._logs = collections.defaultdict(bytearray)
+        self._layers = {}
+        self._event_streams = []
+        self._latencies = []
+        self._failures = []
+        self._concurrency = collections.Counter()
+        self._lock = threading.RLock()
+        if latency:
+            self.set_latency('*', latency)
+
+    def set_latency(self, pattern, latency):
+        """ Simulate latency for the requests to the endpoints which match a pattern. Patterns
+        which are set later take precedence.
+
+        Args:
+            pattern (:obj:`str`): glob pattern of endpoints (e.g., `containers.*`)
+            latency (:obj:`float`): latency (seconds)
+        """
+        with self._lock:
+            self._latencies.insert(0, (pattern, latency))
+
+    def inject_failure(self, pattern, exception=None, count=1):
+        """ Make the next requests to the endpoints which match a pattern fail
+
+        Args:
+            pattern (:obj:`str`): glob pattern of endpoints (e.g., `containers.start`)
+            exception (:obj:`Exception`, optional): exception to raise. Default: :obj:`docker.errors.APIError`
+            count (:obj:`int`, optional): number of requests which should fail, or :obj:`None` for
+                all subsequent requests
+        """
+        if exception is None:
+            exception = docker.errors.APIError('Simulated failure of {}'.format(pattern))
+        with self._lock:
+            self._failures.append([pattern, exception, count])
+
+    def call(self, endpoint):
+        """ Record a request to an endpoint of the API, simulate its latency, and raise its injected failure
+
+        Args:
+            endpoint (:obj:`str`): endpoint (e.g., `containers.list`)
+
+        Raises:
+            :obj:`Exception`: if a failure was injected for the endpoint
+        """
+        with self._lock:
+            self.calls[endpoint] += 1
+            latency = next((latency for pattern, latency in self._latencies
+                            if fnmatch.fnmatchcase(endpoint, pattern)), 0.)
+            self._concurrency[endpoint] += 1
+            self.max_concurrency[endpoint] = max(self.max_concurrency[endpoint], self._concurrency[endpoint])
+
+        try:
+            if latency:
+                time.sleep(latency)
+        finally:
+            with self._lock:
+                self._concurrency[endpoint] -= 1
+
+        with self._lock:
+            for failure in self._failures:
+                pattern, exception, count = failure
+                if fnmatch.fnmatchcase(endpoint, pattern):
+                    if count is not None:
+                        failure[2] -= 1
+                        if failure[2] == 0:
+                            self._failures.remove(failure)
+                    raise exception
+
+    def emit(self, type, action, id, **attributes):
+        """ Send an event to the subscribers to events
+
+        Args:
+            type (:obj:`str`): type of the object (`image`, `container`, or `network`)
+            action (:obj:`str`): action (e.g., `create`)
+            id (:obj:`str`): id of the object
+            attributes (:obj:`dict`): attributes of the event
+        """
+        time = datetime.now(timezone.utc).timestamp()
+        event = {
+            'Type': type,
+            'Action': action,
+            'Actor': {'ID': id, 'Attributes': attributes},
+            'time': int(time),
+            'timeNano': int(time * 1e9),
+        }
+        with self._lock:
+            for stream in self._event_streams:
+                stream.queue.put(event)
+
+    def events(self, since=None, until=None, filters=None, decode=None):
+        self.call('events')
+        stream = FakeEventStream(self, (filters or {}).get('type', None))
+        with self._lock:
+            self._event_streams.append(stream)
+        return stream
+
+    def df(self):
+        self.call('df')
+        with self._lock:
+            return {
+                'LayersSize': sum(attrs['Size'] for attrs in self._images.values()),
+                'Images': [{'Id': attrs['Id'], 'Size': attrs['Size'], 'SharedSize': 0} for attrs in self._images.values()],
+                'Containers': [{'Id': attrs['Id'], 'SizeRw': 0} for attrs in self._containers.values()],
+                'Volumes': [],
+            }
+
+    def login(self, username=None, password=None, **kwargs):
+        self.call('login')
+        return {'Status': 'Login Succeeded'}
+
+    def close(self):
+        pass
+
+    def get_host_path(self, path):
+        """ Get the path in the file system of the host of a path in the file systems of the containers
+
+        Args:
+            path (:obj:`str`): absolute path in the file systems of the containers
+
+        Returns:
+            :obj:`str`: path in the file system of the host
+        """
+        return os.path.join(self.root, os.path.normpath('/' + path).lstrip('/'))
+
+    def add_image(self, tags, size=0, layers=None, labels=None):
+        """ Add an image
+
+        Args:
+            tags (:obj:`list` of :obj:`str`): references (`repo:tag`) of the image
+            size (:obj:`int`, optional): size of the image (bytes)
+            layers (:obj:`list` of :obj:`bytes`, optional): tar archive of each layer of the image,
+                from the base layer to the top layer
+            labels (:obj:`dict`, optional): labels of the image
+
+        Returns:
+            :obj:`FakeImage`: image
+        """
+        id = 'sha256:' + make_id(tags)
+        layer_digests = []
+        with self._lock:
+            for layer in layers or []:
+                digest = 'sha256:' + hashlib.sha256(layer).hexdigest()
+                self._layers[digest] = layer
+                layer_digests.append(digest)
+            self._images[id] = {
+                'Id': id,
+                'RepoTags': [],
+                'Created': now(),
+                'Size': size,
+                'RootFS': {'Type': 'layers', 'Layers': layer_digests},
+                'Config': {'Labels': dict(labels or {})},
+            }
+            for tag in tags:
+                self._tag_image(id, tag)
+        self.emit('image', 'create', id)
+        return FakeImage(self, self._images[id])
+
+    def add_container(self, image, name=None, running=False, labels=None, created=None):
+        """ Add a container
+
+        Args:
+            image (:obj:`str`): reference or id of the image of the container
+            name (:obj:`str`, optional): name
+            running (:obj:`bool`, optional): if :obj:`True`, start the container
+            labels (:obj:`dict`, optional): labels
+            created (:obj:`datetime`, optional): creation time
+
+        Returns:
+            :obj:`FakeContainer`: container
+        """
+        container = self.containers.create(image, name=name, labels=labels)
+        if created:
+            with self._lock:
+                self._containers[container.id]['Created'] = created.strftime('%Y-%m-%dT%H:%M:%S.%fZ')
+        if running:
+            container.start()
+        container.reload()
+        return container
+
+    def write_log(self, container, output):
+        """ Append output to the logs of a container
+
+        Args:
+            container (:obj:`FakeContainer`): container
+            output (:obj:`bytes` or :obj:`str`): output
+        """
+        with self._lock:
+            self._logs[container.id] += output.encode() if isinstance(output, str) else output
+
+    def _tag_image(self, id, ref):
+        """ Point a reference to an image
+
+        Args:
+            id (:obj:`str`): id of the image
+            ref (:obj:`str`): reference (`repo:tag`)
+        """
+        for other_id, attrs in self._images.items():
+            if ref in attrs['RepoTags'] and other_id != id:
+                attrs['RepoTags'].remove(ref)
+                self.emit('image', 'untag', other_id)
+        if ref not in self._images[id]['RepoTags']:
+            self._images[id]['RepoTags'].append(ref)
+            self.emit('image', 'tag', id, name=ref)
+
+    def _get_image_attrs(self, name):
+        """ Get the attributes of an image
+
+        Args:
+            name (:obj:`str`): reference, id, or short id of the image
+
+        Returns:
+            :obj:`dict`: attributes
+
+        Raises:
+            :obj:`docker.errors.ImageNotFound`: if the image doesn't exist
+        """
+        ref = name if '@' in name or ':' in name.rpartition('/')[2] else name + ':latest'
+        with self._lock:
+            for attrs in self._images.values():
+                if ref in attrs['RepoTags'] or name in attrs['RepoTags']:
+                    return attrs
+            prefix = name.partition('sha256:')[2] or name
+            matches = [attrs for id, attrs in self._images.items() if id[len('sha256:'):].startswith(prefix)]
+            if len(matches) == 1:
+                return matches[0]
+        raise docker.errors.ImageNotFound('No such image: {}'.format(name))
+
+    def _get_container_attrs(self, name):
+        """ Get the attributes of a container
+
+        Args:
+            name (:obj:`str`): name, id, or short id of the container
+
+        Returns:
+            :obj:`dict`: attributes
+
+        Raises:
+            :obj:`docker.errors.NotFound`: if the container doesn't exist
+        """
+        with self._lock:
+            for attrs in self._containers.values():
+                if attrs['Name'] == '/' + name.lstrip('/'):
+                    return attrs
+            matches = [attrs for id, attrs in self._containers.items() if id.startswith(name)]
+            if len(matches) == 1:
+                return matches[0]
+        raise docker.errors.NotFound('No such container: {}'.format(name))
+
+
+class FakeEventStream(object):
+    """ Stream of the events of a :obj:`FakeDockerClient`
+
+    Attributes:
+        client (:obj:`FakeDockerClient`): client
+        types (:obj:`list` of :obj:`str`): types of events to stream
+        queue (:obj:`queue.Queue`): events
+    """
+
+    def __init__(self, client, types=None):
+        self.client = client
+        self.types = types
+        self.queue = queue.Queue()
+
+    def __iter__(self):
+        while True:
+            event = self.queue.get()
+            if event is None:
+                return
+            if not self.types or event['Type'] in self.types:
+                yield event
+
+    def close(self):
+        with self.client._lock:
+            if self in self.client._event_streams:
+                self.client._event_streams.remove(self)
+        self.queue.put(None)
+
+
+class FakeModel(object):
+    """ Docker object
+
+    Attributes:
+        client (:obj:`FakeDockerClient`): client
+        attrs (:obj:`dict`): attributes
+    """
+
+    def __init__(self, client, attrs):
+        self.client = client
+        self.attrs = copy.deepcopy(attrs)
+
+    @property
+    def id(self):
+        return self.attrs['Id']
+
+    @property
+    def short_id(self):
+        return self.id.partition('sha256:')[2][0:10] or self.id[0:10]
+
+    def __eq__(self, other):
+        return isinstance(other, self.__class__) and self.id == other.id
+
+    def __hash__(self):
+        return hash('{}:{}'.format(self.__class__.__name__, self.id))
+
+
+class FakeImage(FakeModel):
+    """ Fake of :obj:`docker.models.images.Image` """
+
+    @property
+    def tags(self):
+        return [tag for tag in self.attrs['RepoTags'] if tag != '<none>:<none>']
+
+    @property
+    def labels(self):
+        return self.attrs.get('Config', {}).get('Labels', None) or {}
+
+    def reload(self):
+        self.client.call('images.get')
+        self.attrs = copy.deepcopy(self.client._get_image_attrs(self.id))
+
+    def tag(self, repository, tag=None, **kwargs):
+        self.client.call('images.tag')
+        with self.client._lock:
+            self.client._tag_image(self.id, '{}:{}'.format(repository, tag or 'latest'))
+        return True
+
+    def history(self):
+        self.client.call('images.history')
+        return []
+
+    def save(self, chunk_size=2 * 2 ** 20, named=False):
+        """ Stream the image in the legacy format of `docker save` (`<id>/layer.tar` for each layer) """
+        self.client.call('images.save')
+        archive = io.BytesIO()
+        with tarfile.open(fileobj=archive, mode='w') as tar_file:
+            manifest = {'Config': self.id.partition(':')[2] + '.json', 'RepoTags': self.tags, 'Layers': []}
+            for digest in self.attrs['RootFS']['Layers']:
+                layer = self.client._layers.get(digest, None)
+                if layer is None:
+                    continue
+                name = digest.partition(':')[2] + '/layer.tar'
+                info = tarfile.TarInfo(name)
+                info.size = len(layer)
+                tar_file.addfile(info, io.BytesIO(layer))
+                manifest['Layers'].append(name)
+            manifest = json.dumps([manifest]).encode()
+            info = tarfile.TarInfo('manifest.json')
+            info.size = len(manifest)
+            tar_file.addfile(info, io.BytesIO(manifest))
+        archive.seek(0)
+        return iter(lambda: archive.read(chunk_size), b'')
+
+
+class FakeContainer(FakeModel):
+    """ Fake of :obj:`docker.models.containers.Container` """
+
+    @property
+    def name(self):
+        return self.attrs['Name'].lstrip('/')
+
+    @property
+    def status(self):
+        return self.attrs['State']['Status']
+
+    @property
+    def labels(self):
+        return self.attrs['Config']['Labels'] or {}
+
+    @property
+    def image(self):
+        return self.client.images.get(self.attrs['Image'])
+
+    def reload(self):
+        self.client.call('containers.get')
+        self.attrs = copy.deepcopy(self.client._get_container_attrs(self.id))
+
+    def _set_state(self, status, running, action):
+        self.client.call('containers.' + action)
+        with self.client._lock:
+            state = self.client._get_container_attrs(self.id)['State']
+            state['Status'] = status
+            state['Running'] = running
+            if running:
+                state['StartedAt'] = now()
+            else:
+                state['FinishedAt'] = now()
+        self.client.emit('container', action, self.id)
+        self.reload()
+
+    def start(self, **kwargs):
+        self._set_state('running', True, 'start')
+
+    def stop(self, **kwargs):
+        self._set_state('exited', False, 'stop')
+
+    def kill(self, **kwargs):
+        self._set_state('exited', False, 'kill')
+
+    def restart(self, **kwargs):
+        self._set_state('running', True, 'restart')
+
+    def wait(self, **kwargs):
+        self.client.call('containers.wait')
+        return {'StatusCode': 0}
+
+    def remove(self, force=False, **kwargs):
+        self.client.call('containers.remove')
+        with self.client._lock:
+            attrs = self.client._get_container_attrs(self.id)
+            if attrs['State']['Running'] and not force:
+                raise docker.errors.APIError('You cannot remove a running container {}'.format(self.id))
+            self.client._containers.pop(self.id)
+        self.client.emit('container', 'destroy', self.id)
+
+    def exec_run(self, cmd, stdout=True, stderr=True, user='', environment=None, workdir=None, **kwargs):
+        self.client.call('containers.exec_run')
+        process = self.client.exec_handler(self, cmd, workdir=workdir, environment=environment, user=user)
+        output, _ = process.communicate()
+        self.client.emit('container', 'exec_start', self.id)
+        return ExecResult(process.returncode, output)
+
+    def logs(self, stdout=True, stderr=True, **kwargs):
+        self.client.call('containers.logs')
+        with self.client._lock:
+            return bytes(self.client._logs[self.id])
+
+    def put_archive(self, path, data):
+        self.client.call('containers.put_archive')
+        host_path = self.client.get_host_path(path)
+        if not os.path.isdir(host_path):
+            raise docker.errors.NotFound('Could not find the file {} in container {}'.format(path, self.name))
+        fileobj = io.BytesIO(data) if isinstance(data, bytes) else data
+        with tarfile.open(fileobj=fileobj, mode='r|*') as tar_file:
+            for member in tar_file:
+                member.uid = member.gid = os.getuid()
+                tar_file.extract(member, host_path, set_attrs=member.isfile())
+        return True
+
+    def get_archive(self, path, chunk_size=2 * 2 ** 20, encode_stream=False):
+        self.client.call('containers.get_archive')
+        host_path = self.client.get_host_path(path)
+        if not os.path.exists(host_path):
+            raise docker.errors.NotFound('Could not find the file {} in container {}'.format(path, self.name))
+        archive = io.BytesIO()
+        with tarfile.open(fileobj=archive, mode='w') as tar_file:
+            tar_file.add(host_path, arcname=os.path.basename(path))
+        archive.seek(0)
+        stat = os.stat(host_path)
+        return iter(lambda: archive.read(chunk_size), b''), {
+            'name': os.path.basename(path),
+            'size': stat.st_size,
+            'mode': stat.st_mode,
+            'mtime': datetime.fromtimestamp(stat.st_mtime, timezone.utc).isoformat(),
+        }
+
+    def stats(self, stream=True, decode=None):
+        self.client.call('containers.stats')
+        running = self.attrs['State']['Running']
+        stats = {
+            'read': now() if running else '0001-01-01T00:00:00Z',
+            'cpu_stats': {'cpu_usage': {'total_usage': 0}, 'system_cpu_usage': 0, 'online_cpus': 1},
+            'memory_stats': {'usage': 0, 'limit': 0},
+            'networks': {},
+        }
+        if stream:
+            return iter([stats])
+        return stats
+
+
+class FakeNetwork(FakeModel):
+    """ Fake of :obj:`docker.models.networks.Network` """
+
+    @property
+    def name(self):
+        return self.attrs['Name']
+
+    @property
+    def containers(self):
+        return [self.client.containers.get(id) for id in self.attrs['Containers']]
+
+    def reload(self):
+        self.client.call('networks.get')
+        self.attrs = copy.deepcopy(self.client.networks._get_attrs(self.id))
+
+    def connect(self, container, **kwargs):
+        self.client.call('networks.connect')
+        id = container.id if isinstance(container, FakeContainer) else self.client.containers.get(container).id
+        with self.client._lock:
+            self.client.networks._get_attrs(self.id)['Containers'][id] = {}
+            networks = self.client._get_container_attrs(id)['NetworkSettings']['Networks']
+            networks[self.name] = {'IPAddress': '127.0.0.1'}
+
+    def disconnect(self, container, **kwargs):
+        self.client.call('networks.disconnect')
+        id = container.id if isinstance(container, FakeContainer) else self.client.containers.get(container).id
+        with self.client._lock:
+            self.client.networks._get_attrs(self.id)['Containers'].pop(id, None)
+            self.client._get_container_attrs(id)['NetworkSettings']['Networks'].pop(self.name, None)
+
+    def remove(self):
+        self.client.call('networks.remove')
+        with self.client._lock:
+            self.client._networks.pop(self.id, None)
+
+
+class FakeVolume(FakeModel):
+    """ Fake of :obj:`docker.models.volumes.Volume` """
+
+    @property
+    def id(self):
+        return self.attrs['Name']
+
+    @property
+    def name(self):
+        return self.attrs['Name']
+
+    def reload(self):
+        self.client.call('volumes.get')
+        self.attrs = copy.deepcopy(self.client.volumes._get_attrs(self.id))
+
+    def remove(self, force=False):
+        self.client.call('volumes.remove')
+        with self.client._lock:
+            for attrs in self.client._containers.values():
+                if self.name in (attrs['HostConfig'].get('volumes', None) or {}):
+                    raise docker.errors.APIError('remove {}: volume is in use - [{}]'.format(self.name, attrs['Id']))
+            self.client._volumes.pop(self.name, None)
+
+
+class FakeCollection(object):
+    """ Collection of Docker objects
+
+    Attributes:
+        client (:obj:`FakeDockerClient`): client
+    """
+
+    def __init__(self, client):
+        self.client = client
+
+
+class FakeImageCollection(FakeCollection):
+    """ Fake of :obj:`docker.models.images.ImageCollection` """
+
+    def get(self, name):
+        self.client.call('images.get')
+        return FakeImage(self.client, self.client._get_image_attrs(name))
+
+    def list(self, name=None, all=False, filters=None):
+        self.client.call('images.list')
+        images = []
+        with self.client._lock:
+            for attrs in self.client._images.values():
+                if name and not any(tag.rpartition(':')[0] == name or tag == name for tag in attrs['RepoTags']):
+                    continue
+                if filters and filters.get('dangling', None) is not None and bool(attrs['RepoTags']) == filters['dangling']:
+                    continue
+                images.append(FakeImage(self.client, attrs))
+        return images
+
+    def build(self, path=None, dockerfile='Dockerfile', tag=None, buildargs=None, **kwargs):
+        self.client.call('images.build')
+        dockerfile_path = os.path.join(path, dockerfile)
+        if not os.path.isfile(dockerfile_path):
+            raise docker.errors.BuildError('Cannot locate specified Dockerfile: {}'.format(dockerfile), [])
+        image = self.client.add_image([tag] if tag else [], labels=kwargs.get('labels', None))
+        log = [{'stream': 'Successfully built {}\n'.format(image.short_id)}]
+        return self.get(image.id), iter(log)
+
+    def pull(self, repository, tag=None, **kwargs):
+        self.client.call('images.pull')
+        if tag is None and ':' in repository.rpartition('/')[2]:
+            repository, _, tag = repository.rpartition(':')
+        ref = '{}:{}'.format(repository, tag or 'latest')
+        try:
+            return FakeImage(self.client, self.client._get_image_attrs(ref))
+        except docker.errors.ImageNotFound:
+            image = self.client.add_image([ref])
+            self.client.emit('image', 'pull', ref)
+            return self.get(image.id)
+
+    def push(self, repository, tag=None, stream=False, decode=False, **kwargs):
+        self.client.call('images.push')
+        self.client._get_image_attrs('{}:{}'.format(repository, tag or 'latest'))
+        log = [{'status': 'Pushed', 'id': make_id(repository)[0:12]}]
+        return iter(log) if stream else ''
+
+    def remove(self, image, force=False, **kwargs):
+        self.client.call('images.remove')
+        with self.client._lock:
+            attrs = self.client._get_image_attrs(image)
+            if image in attrs['RepoTags'] and len(attrs['RepoTags']) > 1:
+                attrs['RepoTags'].remove(image)
+                self.client.emit('image', 'untag', attrs['Id'])
+                return
+            if not force and any(cnt['Image'] == attrs['Id'] for cnt in self.client._containers.values()):
+                raise docker.errors.APIError('Image {} is being used by a container'.format(image))
+            self.client._images.pop(attrs['Id'])
+        self.client.emit('image', 'delete', attrs['Id'])
+
+    def load(self, data):
+        self.client.call('images.load')
+        for _ in data:
+            pass
+        return []
+
+
+class FakeContainerCollection(FakeCollection):
+    """ Fake of :obj:`docker.models.containers.ContainerCollection` """
+
+    def get(self, container_id):
+        self.client.call('containers.get')
+        return FakeContainer(self.client, self.client._get_container_attrs(container_id))
+
+    def list(self, all=False, filters=None, sparse=False, **kwargs):
+        self.client.call('containers.list')
+        containers = []
+        with self.client._lock:
+            for attrs in self.client._containers.values():
+                if not all and not attrs['State']['Running']:
+                    continue
+                containers.append(FakeContainer(self.client, attrs))
+        if not sparse:
+            # docker-py inspects each container
+            for _ in containers:
+                self.client.call('containers.get')
+        return containers
+
+    def create(self, image, command=None, name=None, labels=None, environment=None, network=None, **kwargs):
+        self.client.call('containers.create')
+        image_attrs = self.client._get_image_attrs(image)
+        id = make_id(name)
+        name = name or 'fake_{}'.format(id[0:12])
+        with self.client._lock:
+            if any(attrs['Name'] == '/' + name for attrs in self.client._containers.values()):
+                raise docker.errors.APIError('Conflict. The container name "/{}" is already in use'.format(name))
+            self.client._containers[id] = {
+                'Id': id,
+                'Name': '/' + name,
+                'Image': image_attrs['Id'],
+                'Created': now(),
+                'Config': {
+                    'Image': image,
+                    'Cmd': command,
+                    'Labels': dict(labels or {}),
+                    'Env': ['{}={}'.format(key, val) for key, val in (environment or {}).items()],
+                },
+                # unlike Docker, the fake stores the keyword arguments of `create` (e.g., `volumes`)
+                'HostConfig': dict(copy.deepcopy(kwargs), Tmpfs=dict(kwargs.get('tmpfs', None) or {})),
+                # the fake maps the addresses of all containers to the loopback interface of the host
+                'NetworkSettings': {'Networks': {}},
+                'State': {
+                    'Status': 'created',
+                    'Running': False,
+                    'StartedAt': '0001-01-01T00:00:00Z',
+                    'FinishedAt': '0001-01-01T00:00:00Z',
+                },
+            }
+        self.client.emit('container', 'create', id)
+        if network:
+            self.client.networks.get(network).connect(id)
+        return self.get(id)
+
+    def run(self, image, command=None, detach=False, remove=False, **kwargs):
+        try:
+            container = self.create(image, command=command, **kwargs)
+        except docker.errors.ImageNotFound:
+            self.client.images.pull(image)
+            container = self.create(image, command=command, **kwargs)
+        container.start()
+        if detach:
+            return container
+
+        # like Docker, run the command to completion and return its output
+        process = self.client.exec_handler(container, command, workdir=kwargs.get('working_dir', None),
+                                           environment=kwargs.get('environment', None), user=kwargs.get('user', ''))
+        output, _ = process.communicate()
+        container.stop()
+        if remove:
+            container.remove()
+        if process.returncode != 0:
+            raise docker.errors.ContainerError(container, process.returncode, command, image, output)
+        return output
+
+
+class FakeNetworkCollection(FakeCollection):
+    """ Fake of :obj:`docker.models.networks.NetworkCollection` """
+
+    def _get_attrs(self, name):
+        with self.client._lock:
+            for id, attrs in self.client._networks.items():
+                if name in (id, attrs['Name']):
+                    return attrs
+        raise docker.errors.NotFound('network {} not found'.format(name))
+
+    def get(self, network_id, **kwargs):
+        self.client.call('networks.get')
+        return FakeNetwork(self.client, self._get_attrs(network_id))
+
+    def list(self, names=None, **kwargs):
+        self.client.call('networks.list')
+        with self.client._lock:
+            return [FakeNetwork(self.client, attrs) for attrs in self.client._networks.values()
+                    if not names or attrs['Name'] in names]
+
+    def create(self, name, **kwargs):
+        self.client.call('networks.create')
+        id = make_id(name)
+        with self.client._lock:
+            self.client._networks[id] = {'Id': id, 'Name': name, 'Containers': {}}
+        return self.get(id)
+
+
+class FakeVolumeCollection(FakeCollection):
+    """ Fake of :obj:`docker.models.volumes.VolumeCollection` """
+
+    def _get_attrs(self, name):
+        with self.client._lock:
+            if name in self.client._volumes:
+                return self.client._volumes[name]
+        raise docker.errors.NotFound('get {}: no such volume'.format(name))
+
+    def get(self, volume_id):
+        self.client.call('volumes.get')
+        return FakeVolume(self.client, self._get_attrs(volume_id))
+
+    def list(self, filters=None):
+        self.client.call('volumes.list')
+        with self.client._lock:
+            return [FakeVolume(self.client, attrs) for attrs in self.client._volumes.values()]
+
+    def create(self, name=None, driver='local', driver_opts=None, labels=None, **kwargs):
+        self.client.call('volumes.create')
+        name = name or make_id()
+        with self.client._lock:
+            if name not in self.client._volumes:
+                self.client._volumes[name] = {
+                    'Name': name,
+                    'Driver': driver or 'local',
+                    'Options': dict(driver_opts or {}),
+                    'Labels': dict(labels or {}),
+                    'Mountpoint': '/var/lib/docker/volumes/{}/_data'.format(name),
+                    'CreatedAt': now(),
+                }
+        return self.get(name)
+
+
+class FakeAPIClient(object):
+    """ Fake of the parts of :obj:`docker.api.client.APIClient` which are used by the manager
+
+    Attributes:
+        client (:obj:`FakeDockerClient`): client
+    """
+
+    def __init__(self, client):
+        self.client = client
+
+    def exec_create(self, container, cmd, stdout=True, stderr=True, user='', environment=None, workdir=None, **kwargs):
+        self.client.call('api.exec_create')
+        container = self.client.containers.get(container if isinstance(container, str) else container['Id'])
+        id = make_id(cmd)
+        with self.client._lock:
+            self.client._execs[id] = {
+                'container': container,
+                'cmd': cmd,
+                'user': user,
+                'environment': environment,
+                'workdir': workdir,
+                'stderr': stderr,
+                'process': None,
+            }
+        return {'Id': id}
+
+    def exec_start(self, exec_id, stream=False, **kwargs):
+        self.client.call('api.exec_start')
+        exec_instance = self.client._execs[exec_id]
+        exec_instance['process'] = process = self.client.exec_handler(
+            exec_instance['container'], exec_instance['cmd'], workdir=exec_instance['workdir'],
+            environment=exec_instance['environment'], user=exec_instance['user'])
+        if stream:
+            return iter(lambda: process.stdout.read(2 ** 16), b'')
+        output, _ = process.communicate()
+        return output
+
+    def exec_inspect(self, exec_id):
+        self.client.call('api.exec_inspect')
+        process = self.client._execs[exec_id]['process']
+        exit_code = None
+        if process is not None:
+            process.wait()
+            exit_code = process.returncode
+        return {'ExitCode': exit_code, 'Running': False}
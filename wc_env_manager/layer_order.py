@@ -0,0 +1,333 @@
+""" Ordering of the layers of the base image by the frequency with which their inputs change
+
+Docker reuses the cached layers of an image up to the first instruction whose inputs changed, and
+it rebuilds all of the following layers. The rendered Dockerfile of the base image is divided into
+sections, each of which starts with a comment line after a blank line (e.g., `# install cplex`).
+The inputs of each section are its instructions, the values of the build arguments which it
+declares, and the contents of the files which it copies from the build context (e.g., the
+requirements and license files). Each build records a fingerprint of the inputs of each section in
+a history. From the history, the sections between the markers :obj:`REORDERABLE_BEGIN` and
+:obj:`REORDERABLE_END` can be reordered so that the sections whose inputs change more often are
+built later, which reduces the number of sections which are rebuilt. A section which depends on
+other reorderable sections (e.g., the Python packages which are compiled against the solvers)
+declares them in comment lines which start with :obj:`DEPENDS_ON` (e.g.,
+`# depends on: install cplex; install gurobi`), and it is always kept after them.
+
+:Author: Jonathan Karr <jonrkarr@gmail.com>
+:Date: 2020-02-14
+:Copyright: 2020, Karr Lab
+:License: MIT
+"""
+
+from datetime import datetime, timezone
+import glob
+import hashlib
+import json
+import os
+
+REORDERABLE_BEGIN = '# begin reorderable sections'
+REORDERABLE_END = '# end reorderable sections'
+DEPENDS_ON = '# depends on:'
+HISTORY_MAX_RECORDS = 200
+
+
+class DockerfileSection(object):
+    """ Section of a Dockerfile
+
+    Attributes:
+        name (:obj:`str`): name of the section (its first comment line, without `#`)
+        text (:obj:`str`): text of the section
+        reorderable (:obj:`bool`): if :obj:`True`, the section is between the reorderable markers
+    """
+
+    def __init__(self, name, text, reorderable=False):
+        self.name = name
+        self.text = text
+        self.reorderable = reorderable
+
+    @property
+    def instructions(self):
+        """ Get the instructions of the section, without comments and line continuations
+
+        Returns:
+            :obj:`list` of :obj:`str`: instructions
+        """
+        instructions = []
+        instruction = ''
+        for line in self.text.split('\n'):
+            stripped = line.strip()
+            if not stripped or stripped.startswith('#'):
+                continue
+            part = stripped.rstrip('\\').strip()
+            instruction = instruction + ' ' + part if instruction else part
+            if not stripped.endswith('\\'):
+                instructions.append(instruction)
+                instruction = ''
+        if instruction:
+            instructions.append(instruction)
+        return instructions
+
+    @property
+    def dependencies(self):
+        """ Get the names of the sections which the section depends on, which are declared in comment
+        lines which start with :obj:`DEPENDS_ON` and separated by semicolons
+
+        Returns:
+            :obj:`list` of :obj:`str`: names of the sections which the section depends on
+        """
+        dependencies = []
+        for line in self.text.split('\n'):
+            if line.startswith(DEPENDS_ON):
+                dependencies.extend(name.strip() for name in line[len(DEPENDS_ON):].split(';') if name.strip())
+        return dependencies
+
+    def get_fingerprint(self, build_args=None, context_path=None):
+        """ Get a fingerprint of the inputs of the section: its instructions, the values of the build
+        arguments which it declares, and the contents of the files which it copies from the build context
+
+        Args:
+            build_args (:obj:`dict`, optional): values of the build arguments
+            context_path (:obj:`str`, optional): path to the build context
+
+        Returns:
+            :obj:`str`: SHA-256 digest of the inputs
+        """
+        build_args = build_args or {}
+        hash = hashlib.sha256()
+        for instruction in self.instructions:
+            hash.update(instruction.encode() + b'\n')
+            keyword, _, args = instruction.partition(' ')
+            keyword = keyword.upper()
+
+            if keyword == 'ARG':
+                name = args.partition('=')[0].strip()
+                if name in build_args:
+                    hash.update('{}={}\n'.format(name, build_args[name]).encode())
+
+            elif keyword in ('COPY', 'ADD') and context_path and '--from=' not in args:
+                sources = [arg for arg in args.split()[0:-1] if not arg.startswith('--')]
+                for source in sources:
+                    for path in sorted(glob.glob(os.path.join(context_path, source))):
+                        hash_path(hash, path, context_path)
+        return hash.hexdigest()
+
+
+def hash_path(hash, path, context_path):
+    """ Add the relative path and the contents of a file, or of each file in a directory, to a hash
+
+    Args:
+        hash (:obj:`hashlib._Hash`): hash
+        path (:obj:`str`): path to a file or directory
+        context_path (:obj:`str`): path which the paths of the files are relative to
+    """
+    if os.path.isdir(path):
+        for root, dirnames, filenames in os.walk(path):
+            dirnames.sort()
+            for filename in sorted(filenames):
+                hash_path(hash, os.path.join(root, filename), context_path)
+    elif os.path.isfile(path):
+        hash.update(os.path.relpath(path, context_path).replace(os.sep, '/').encode() + b'\n')
+        with open(path, 'rb') as file:
+            for block in iter(lambda: file.read(2 ** 20), b''):
+                hash.update(block)
+        hash.update(b'\n')
+
+
+def parse_dockerfile_sections(text):
+    """ Divide a Dockerfile into sections, each of which starts with a comment line after a blank line
+
+    Args:
+        text (:obj:`str`): Dockerfile
+
+    Returns:
+        :obj:`list` of :obj:`DockerfileSection`: sections; the text which precedes the first
+            section is a section named `''`
+    """
+    sections = [DockerfileSection('', '')]
+    reorderable = False
+    prev_line = ''
+    for line in text.split('\n'):
+        if line.startswith(REORDERABLE_BEGIN):
+            reorderable = True
+            sections.append(DockerfileSection(line[1:].strip(), line + '\n'))
+        elif line.startswith(REORDERABLE_END):
+            reorderable = False
+            sections.append(DockerfileSection(line[1:].strip(), line + '\n'))
+        elif line.startswith('#') and not prev_line.strip():
+            sections.append(DockerfileSection(line[1:].strip(), line + '\n', reorderable=reorderable))
+        else:
+            sections[-1].text += line + '\n'
+        prev_line = line
+    sections[-1].text = sections[-1].text[0:-1]
+    return sections
+
+
+def reorder_sections(sections, order):
+    """ Reorder the reorderable sections of a Dockerfile, keeping each section after the reorderable
+    sections which it depends on
+
+    Args:
+        sections (:obj:`list` of :obj:`DockerfileSection`): sections
+        order (:obj:`list` of :obj:`str`): names of the reorderable sections in their new order. The
+            reorderable sections which aren't in the order follow the others in their current order.
+            Sections are moved later than their position in the order where needed to follow the
+            sections which they depend on.
+
+    Returns:
+        :obj:`list` of :obj:`DockerfileSection`: reordered sections
+    """
+    positions = {name: i_name for i_name, name in enumerate(order)}
+    remaining = sorted((section for section in sections if section.reorderable),
+                       key=lambda section: positions.get(section.name, len(positions)))
+
+    # repeatedly take the first section in the order whose dependencies have been taken
+    reordered = []
+    while remaining:
+        remaining_names = set(section.name for section in remaining)
+        for i_section, section in enumerate(remaining):
+            if not any(name in remaining_names and name != section.name for name in section.dependencies):
+                break
+        else:
+            # cyclic dependencies: take the first of the remaining sections
+            i_section = 0
+        reordered.append(remaining.pop(i_section))
+
+    reordered = iter(reordered)
+    return [next(reordered) if section.reorderable else section for section in sections]
+
+
+def count_rebuilt_sections(sections, changed):
+    """ Count the sections which Docker rebuilds when the inputs of some sections change
+
+    Args:
+        sections (:obj:`list` of :obj:`DockerfileSection`): sections, in the order of the Dockerfile
+        changed (:obj:`set` of :obj:`str`): names of the sections whose inputs changed
+
+    Returns:
+        :obj:`int`: number of sections with instructions which are rebuilt
+    """
+    n_rebuilt = 0
+    rebuilding = False
+    for section in sections:
+        rebuilding = rebuilding or section.name in changed
+        if rebuilding and section.instructions:
+            n_rebuilt += 1
+    return n_rebuilt
+
+
+class BuildHistory(object):
+    """ History of the fingerprints of the inputs of the sections of the Dockerfile of each build
+
+    Attributes:
+        filename (:obj:`str`): path to the history
+        records (:obj:`list` of :obj:`dict`): time, tag, fingerprints of the sections, and names of
+            the sections whose inputs changed since the previous build of the same tag, of each build
+    """
+
+    def __init__(self, filename):
+        """
+        Args:
+            filename (:obj:`str`): path to the history
+        """
+        self.filename = filename
+        self.records = []
+        if os.path.isfile(filename):
+            with open(filename, 'r') as file:
+                self.records = json.load(file)
+
+    def get_previous_record(self, tag):
+        """ Get the record of the latest build of a tag
+
+        Args:
+            tag (:obj:`str`): tag
+
+        Returns:
+            :obj:`dict`: record, or :obj:`None` if the tag hasn't been built
+        """
+        for record in reversed(self.records):
+            if record['tag'] == tag:
+                return record
+        return None
+
+    def add(self, tag, fingerprints):
+        """ Record a build, and save the history
+
+        Args:
+            tag (:obj:`str`): tag
+            fingerprints (:obj:`dict`): dictionary which maps the name of each section to the
+                fingerprint of its inputs
+
+        Returns:
+            :obj:`dict`: record of the build; `changed` is :obj:`None` for the first build of the tag
+        """
+        prev_record = self.get_previous_record(tag)
+        if prev_record is None:
+            changed = None
+        else:
+            changed = sorted(name for name, fingerprint in fingerprints.items()
+                             if prev_record['fingerprints'].get(name, None) != fingerprint)
+
+        record = {
+            'time': datetime.now(timezone.utc).isoformat(),
+            'tag': tag,
+            'fingerprints': fingerprints,
+            'changed': changed,
+        }
+        self.records.append(record)
+        del self.records[0:-HISTORY_MAX_RECORDS]
+
+        dirname = os.path.dirname(os.path.abspath(self.filename))
+        if not os.path.isdir(dirname):
+            os.makedirs(dirname)
+        with open(self.filename + '.tmp', 'w') as file:
+            json.dump(self.records, file, indent=2)
+        os.replace(self.filename + '.tmp', self.filename)
+
+        return record
+
+    def get_change_counts(self):
+        """ Get the number of builds in which the inputs of each section changed
+
+        Returns:
+            :obj:`dict`: dictionary which maps the name of each section to the number of builds in which
+                its inputs changed
+        """
+        counts = {}
+        for record in self.records:
+            for name in record['changed'] or []:
+                counts[name] = counts.get(name, 0) + 1
+        return counts
+
+
+class LayerOrderProposal(object):
+    """ Proposed order of the reorderable sections of the Dockerfile of the base image
+
+    Attributes:
+        current_order (:obj:`list` of :obj:`str`): current order of the reorderable sections
+        proposed_order (:obj:`list` of :obj:`str`): proposed order of the reorderable sections
+        change_counts (:obj:`dict`): dictionary which maps the name of each section to the number of
+            builds in which its inputs changed
+        n_builds (:obj:`int`): number of builds with changes in the history
+        current_rebuilt (:obj:`int`): total number of sections which the builds of the history rebuilt
+            with the current order
+        proposed_rebuilt (:obj:`int`): total number of sections which the builds of the history would
+            have rebuilt with the proposed order
+    """
+
+    def __init__(self, sections, history):
+        """
+        Args:
+            sections (:obj:`list` of :obj:`DockerfileSection`): sections of the Dockerfile
+            history (:obj:`BuildHistory`): history of builds
+        """
+        self.change_counts = history.get_change_counts()
+        reorderable = [section for section in sections if section.reorderable]
+        self.current_order = [section.name for section in reorderable]
+        proposed_sections = reorder_sections(sections, [section.name for section in sorted(
+            reorderable, key=lambda section: self.change_counts.get(section.name, 0))])
+        self.proposed_order = [section.name for section in proposed_sections if section.reorderable]
+
+        builds = [set(record['changed']) for record in history.records if record['changed'] is not None]
+        self.n_builds = len(builds)
+        self.current_rebuilt = sum(count_rebuilt_sections(sections, changed) for changed in builds)
+        self.proposed_rebuilt = sum(count_rebuilt_sections(proposed_sections, changed) for changed in builds)
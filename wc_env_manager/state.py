@@ -0,0 +1,385 @@
+""" In-memory index of Docker images and containers which is kept current by the Docker events stream
+
+The index is filled once by listing the images and containers of the Docker daemon. Afterwards, a
+background thread subscribes to the image and container events of the daemon and updates the
+affected entries. Lookups are dictionary lookups, and they don't query the Docker daemon.
+
+:Author: Jonathan Karr <jonrkarr@gmail.com>
+:Date: 2020-02-13
+:Copyright: 2020, Karr Lab
+:License: MIT
+"""
+
+from datetime import datetime, timezone
+import re
+import threading
+
+
+class DockerStateCache(object):
+    """ In-memory index of Docker images and containers which is kept current by the Docker events stream
+
+    Attributes:
+        docker_client (:obj:`docker.client.DockerClient`): client connected to the Docker daemon
+        _images (:obj:`dict`): dictionary which maps the id of each image to the image
+        _image_refs (:obj:`dict`): dictionary which maps each reference (`repo:tag`) to the id of an image
+        _containers (:obj:`dict`): dictionary which maps the id of each container to the container
+        _container_names (:obj:`dict`): dictionary which maps the name of each container to its id
+        _container_activity (:obj:`dict`): dictionary which maps the id of each container to the
+            latest time of an event of the container
+        _lock (:obj:`threading.RLock`): lock for the index
+        _events (:obj:`docker.types.daemon.CancellableStream`): stream of events
+        _thread (:obj:`threading.Thread`): thread which processes the events
+        _running (:obj:`bool`): whether the index is being kept current
+    """
+
+    # container events which change the attributes of containers; other events (e.g., `exec_start`)
+    # only update the latest time of activity of containers
+    CONTAINER_RELOAD_ACTIONS = ('create', 'start', 'restart', 'stop', 'die', 'kill', 'oom', 'pause', 'unpause',
+                                'rename', 'update', 'health_status')
+    # image events which don't change images
+    IMAGE_IGNORE_ACTIONS = ('push', 'save')
+
+    def __init__(self, docker_client):
+        """
+        Args:
+            docker_client (:obj:`docker.client.DockerClient`): client connected to the Docker daemon
+        """
+        self.docker_client = docker_client
+        self._images = {}
+        self._image_refs = {}
+        self._containers = {}
+        self._container_names = {}
+        self._container_activity = {}
+        self._lock = threading.RLock()
+        self._events = None
+        self._thread = None
+        self._running = False
+
+    @property
+    def running(self):
+        """ Get whether the index is being kept current
+
+        Returns:
+            :obj:`bool`: :obj:`True` if the index is being kept current
+        """
+        return self._running
+
+    def start(self):
+        """ Fill the index and start keeping it current
+
+        Events which occur while the index is filled are replayed afterwards. Because each event
+        reloads the affected image or container, replaying events is harmless.
+        """
+        if self._running:
+            return
+
+        since = datetime.now(timezone.utc)
+        self._events = self.docker_client.events(since=since, decode=True,
+                                                 filters={'type': ['image', 'container']})
+        with self._lock:
+            self._images.clear()
+            self._image_refs.clear()
+            self._containers.clear()
+            self._container_names.clear()
+            self._container_activity.clear()
+            for image in self.docker_client.images.list():
+                self._add_image(image)
+            for container in self.docker_client.containers.list(all=True):
+                self._add_container(container)
+
+        self._running = True
+        self._thread = threading.Thread(target=self._process_events, args=(self._events,), daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """ Stop keeping the index current """
+        self._running = False
+        if self._events is not None:
+            self._events.close()
+            self._events = None
+        if self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join()
+        self._thread = None
+
+    def _process_events(self, events):
+        """ Update the index with each event of a stream
+
+        Args:
+            events (:obj:`iterator` of :obj:`dict`): events
+        """
+        try:
+            for event in events:
+                self.handle_event(event)
+        except Exception:
+            # e.g., the connection to the Docker daemon was closed
+            pass
+        finally:
+            # the index can no longer be trusted
+            self._running = False
+
+    def handle_event(self, event):
+        """ Update the index with an event
+
+        Args:
+            event (:obj:`dict`): event from the Docker events stream
+        """
+        import docker
+
+        event_type = event.get('Type', None)
+        action = (event.get('Action', None) or event.get('status', '')).partition(':')[0]
+        id = (event.get('Actor', None) or {}).get('ID', None) or event.get('id', None)
+        if not id:
+            return
+
+        if event_type == 'container':
+            with self._lock:
+                if action == 'destroy':
+                    self._remove_container(id)
+                    return
+                if id in self._containers:
+                    self._container_activity[id] = max(self._container_activity[id], get_event_time(event))
+                    if action not in self.CONTAINER_RELOAD_ACTIONS:
+                        return
+            try:
+                container = self.docker_client.containers.get(id)
+            except docker.errors.NotFound:
+                with self._lock:
+                    self._remove_container(id)
+                return
+            with self._lock:
+                self._add_container(container, get_event_time(event))
+
+        elif event_type == 'image':
+            if action in self.IMAGE_IGNORE_ACTIONS:
+                return
+            if action == 'delete':
+                with self._lock:
+                    self._remove_image(self.get_image_id(id) or id)
+                return
+            self._reload_image(id)
+
+    def _reload_image(self, name):
+        """ Reload an image from the Docker daemon, as well as the images which were previously
+        tagged with the references of the image
+
+        Args:
+            name (:obj:`str`): id or reference of the image
+        """
+        import docker
+
+        try:
+            image = self.docker_client.images.get(name)
+        except docker.errors.ImageNotFound:
+            with self._lock:
+                self._remove_image(self.get_image_id(name) or name)
+            return
+
+        with self._lock:
+            moved_from = set()
+            for ref in image.tags:
+                other_id = self._image_refs.get(ref, None)
+                if other_id is not None and other_id != image.id:
+                    moved_from.add(other_id)
+            self._add_image(image)
+
+        for other_id in moved_from:
+            self._reload_image(other_id)
+
+    def _add_image(self, image):
+        """ Add an image to the index, or replace the previous version of the image
+
+        Args:
+            image (:obj:`docker.models.images.Image`): image
+        """
+        self._remove_image(image.id)
+        self._images[image.id] = image
+        for ref in image.tags:
+            self._image_refs[ref] = image.id
+
+    def _remove_image(self, id):
+        """ Remove an image from the index
+
+        Args:
+            id (:obj:`str`): id of the image
+        """
+        image = self._images.pop(id, None)
+        if image is not None:
+            for ref in image.tags:
+                if self._image_refs.get(ref, None) == id:
+                    self._image_refs.pop(ref)
+
+    def _add_container(self, container, event_time=None):
+        """ Add a container to the index, or replace the previous version of the container
+
+        Args:
+            container (:obj:`docker.models.containers.Container`): container
+            event_time (:obj:`datetime`, optional): time of the event which triggered the update
+        """
+        activity = get_container_activity(container)
+        if container.id in self._container_activity:
+            activity = max(activity, self._container_activity[container.id])
+        if event_time is not None:
+            activity = max(activity, event_time)
+        self._remove_container(container.id)
+        self._containers[container.id] = container
+        self._container_names[container.name] = container.id
+        self._container_activity[container.id] = activity
+
+    def _remove_container(self, id):
+        """ Remove a container from the index
+
+        Args:
+            id (:obj:`str`): id of the container
+        """
+        container = self._containers.pop(id, None)
+        if container is not None and self._container_names.get(container.name, None) == id:
+            self._container_names.pop(container.name)
+        self._container_activity.pop(id, None)
+
+    def get_image_id(self, name):
+        """ Get the id of an image
+
+        Args:
+            name (:obj:`str`): reference (`repo` or `repo:tag`), id, or short id of the image
+
+        Returns:
+            :obj:`str`: id of the image, or :obj:`None` if the index doesn't contain the image
+        """
+        with self._lock:
+            id = self._image_refs.get(normalize_image_ref(name), None)
+            if id is None:
+                id = self._image_refs.get(name, None)
+            if id is None:
+                id = get_id_by_prefix(self._images, name)
+            return id
+
+    def get_image(self, name):
+        """ Get an image
+
+        Args:
+            name (:obj:`str`): reference (`repo` or `repo:tag`), id, or short id of the image
+
+        Returns:
+            :obj:`docker.models.images.Image`: image, or :obj:`None` if the index doesn't contain the image
+        """
+        with self._lock:
+            return self._images.get(self.get_image_id(name), None)
+
+    def get_images(self):
+        """ Get the images
+
+        Returns:
+            :obj:`list` of :obj:`docker.models.images.Image`: images
+        """
+        with self._lock:
+            return list(self._images.values())
+
+    def get_container(self, name):
+        """ Get a container
+
+        Args:
+            name (:obj:`str`): name, id, or short id of the container
+
+        Returns:
+            :obj:`docker.models.containers.Container`: container, or :obj:`None` if the index
+                doesn't contain the container
+        """
+        with self._lock:
+            id = self._container_names.get(name.lstrip('/'), None) or get_id_by_prefix(self._containers, name)
+            return self._containers.get(id, None)
+
+    def get_containers(self):
+        """ Get the containers
+
+        Returns:
+            :obj:`list` of :obj:`docker.models.containers.Container`: containers
+        """
+        with self._lock:
+            return list(self._containers.values())
+
+    def get_container_activity(self, container):
+        """ Get the latest time that a container was created, started, stopped, or received
+        another event (e.g., the execution of a process)
+
+        Args:
+            container (:obj:`docker.models.containers.Container`): container
+
+        Returns:
+            :obj:`datetime`: latest time of activity
+        """
+        with self._lock:
+            activity = self._container_activity.get(container.id, None)
+        if activity is None:
+            activity = get_container_activity(container)
+        return activity
+
+
+def normalize_image_ref(name):
+    """ Normalize a reference to an image by adding the default tag (`latest`) if the reference
+    doesn't have a tag or digest
+
+    Args:
+        name (:obj:`str`): reference
+
+    Returns:
+        :obj:`str`: normalized reference
+    """
+    if '@' in name or ':' in name.rpartition('/')[2]:
+        return name
+    return name + ':latest'
+
+
+def get_id_by_prefix(objects, name):
+    """ Get the id of a Docker object from a full or abbreviated id
+
+    Args:
+        objects (:obj:`dict`): dictionary which maps ids (e.g., `sha256:<hex digest>` or `<hex digest>`) to objects
+        name (:obj:`str`): full or abbreviated id, with or without the `sha256:` prefix
+
+    Returns:
+        :obj:`str`: id, or :obj:`None` if no object or multiple objects have the id
+    """
+    prefix = name.partition('sha256:')[2] or name
+    if not re.match(r'^[0-9a-f]+$', prefix):
+        return None
+    matches = [id for id in objects if (id.partition('sha256:')[2] or id).startswith(prefix)]
+    if len(matches) == 1:
+        return matches[0]
+    return None
+
+
+def get_event_time(event):
+    """ Get the time of an event
+
+    Args:
+        event (:obj:`dict`): event from the Docker events stream
+
+    Returns:
+        :obj:`datetime`: time
+    """
+    if 'timeNano' in event:
+        return datetime.fromtimestamp(event['timeNano'] / 1e9, timezone.utc)
+    if 'time' in event:
+        return datetime.fromtimestamp(event['time'], timezone.utc)
+    return datetime.now(timezone.utc)
+
+
+def get_container_activity(container):
+    """ Get the latest time that a container was created, started, or stopped from its attributes
+
+    Args:
+        container (:obj:`docker.models.containers.Container`): container
+
+    Returns:
+        :obj:`datetime`: time
+    """
+    import dateutil.parser
+
+    times = [dateutil.parser.parse(container.attrs['Created'])]
+    state = container.attrs.get('State', None) or {}
+    for key in ['StartedAt', 'FinishedAt']:
+        if state.get(key, None):
+            time = dateutil.parser.parse(state[key])
+            if time.year > 1:
+                times.append(time)
+    return max(times)